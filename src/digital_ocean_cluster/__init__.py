@@ -1,13 +1,56 @@
-from .cluster import (
-    DigitalOceanCluster,
-    DropletCluster,
-    DropletCmdArgs,
-    DropletCopyArgs,
-    DropletCreationArgs,
-)
-from .droplet_manager import Authentication, Droplet, DropletManager
-from .machines import ImageType, MachineSize, Region
-from .types import CompletedProcess, DropletException, SSHKey
+"""
+Tools for creating and driving clusters of DigitalOcean droplets.
+
+Names are imported from their submodules on first use, so importing the
+package (e.g. for the docluster command line) stays cheap.
+"""
+
+import importlib
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from .agent_client import AgentClient, AgentError
+    from .autoscaler import (
+        Autoscaler,
+        AutoscalerPolicy,
+        file_queue_depth,
+        redis_queue_depth,
+    )
+    from .catalog import Catalog, ImageInfo, RegionInfo, SizeInfo, load_catalog
+    from .cluster import (
+        DigitalOceanCluster,
+        DropletCluster,
+        DropletCmdArgs,
+        DropletCopyArgs,
+        DropletCreationArgs,
+    )
+    from .deploy import DeployReport, deploy_wheel
+    from .droplet_manager import Authentication, Droplet, DropletManager
+    from .gather import GatherReport, GatherResult
+    from .health import HealthMonitor, HealthState, NodeHealth
+    from .identity import Identity, set_identity
+    from .install import Installer, InstallReport, InstallStep
+    from .known_hosts import KnownHostsStore, set_known_hosts_store
+    from .log import setup_logging
+    from .machines import ImageType, MachineSize, Region
+    from .mesh import BandwidthMatrix
+    from .placement import PlacementPolicy, PlacementResult, RegionReport
+    from .process import CancelToken
+    from .progress import NodeProgress, Phase, Progress, TerminalRenderer
+    from .remote_script import RemoteScript, ScriptResult, StepResult
+    from .retry import Backoff, ErrorClass, RetryPolicy, retry_metrics
+    from .spec import ClusterPlan, ClusterSpec
+    from .straggler import StragglerPolicy, StragglerResult
+    from .sync import HotSync, SyncReport
+    from .task_queue import TaskQueue, TaskResult
+    from .transport import (
+        LocalTransport,
+        OpenSSHTransport,
+        ParamikoTransport,
+        Transport,
+        set_transport,
+    )
+    from .types import CommandError, CompletedProcess, DropletException, SSHKey
 
 __all__ = [
     "Authentication",
@@ -23,5 +66,148 @@ __all__ = [
     "DropletCluster",
     "DigitalOceanCluster",
     "DropletException",
+    "CommandError",
     "CompletedProcess",
+    "CancelToken",
+    "RemoteScript",
+    "ScriptResult",
+    "StepResult",
+    "GatherReport",
+    "GatherResult",
+    "Catalog",
+    "SizeInfo",
+    "RegionInfo",
+    "ImageInfo",
+    "load_catalog",
+    "PlacementPolicy",
+    "PlacementResult",
+    "RegionReport",
+    "Autoscaler",
+    "AutoscalerPolicy",
+    "file_queue_depth",
+    "redis_queue_depth",
+    "TaskQueue",
+    "TaskResult",
+    "AgentClient",
+    "AgentError",
+    "HealthMonitor",
+    "HealthState",
+    "NodeHealth",
+    "BandwidthMatrix",
+    "ClusterSpec",
+    "ClusterPlan",
+    "Installer",
+    "InstallStep",
+    "InstallReport",
+    "setup_logging",
+    "KnownHostsStore",
+    "set_known_hosts_store",
+    "Transport",
+    "OpenSSHTransport",
+    "ParamikoTransport",
+    "LocalTransport",
+    "set_transport",
+    "Identity",
+    "set_identity",
+    "Progress",
+    "Phase",
+    "NodeProgress",
+    "TerminalRenderer",
+    "StragglerPolicy",
+    "StragglerResult",
+    "ErrorClass",
+    "Backoff",
+    "RetryPolicy",
+    "retry_metrics",
+    "HotSync",
+    "SyncReport",
+    "DeployReport",
+    "deploy_wheel",
 ]
+
+# Public name -> submodule defining it.
+_EXPORTS = {
+    "AgentClient": "agent_client",
+    "AgentError": "agent_client",
+    "Autoscaler": "autoscaler",
+    "AutoscalerPolicy": "autoscaler",
+    "file_queue_depth": "autoscaler",
+    "redis_queue_depth": "autoscaler",
+    "Catalog": "catalog",
+    "ImageInfo": "catalog",
+    "RegionInfo": "catalog",
+    "SizeInfo": "catalog",
+    "load_catalog": "catalog",
+    "DigitalOceanCluster": "cluster",
+    "DropletCluster": "cluster",
+    "DropletCmdArgs": "cluster",
+    "DropletCopyArgs": "cluster",
+    "DropletCreationArgs": "cluster",
+    "DeployReport": "deploy",
+    "deploy_wheel": "deploy",
+    "Authentication": "droplet_manager",
+    "Droplet": "droplet_manager",
+    "DropletManager": "droplet_manager",
+    "GatherReport": "gather",
+    "GatherResult": "gather",
+    "HealthMonitor": "health",
+    "HealthState": "health",
+    "NodeHealth": "health",
+    "Identity": "identity",
+    "set_identity": "identity",
+    "Installer": "install",
+    "InstallReport": "install",
+    "InstallStep": "install",
+    "KnownHostsStore": "known_hosts",
+    "set_known_hosts_store": "known_hosts",
+    "setup_logging": "log",
+    "ImageType": "machines",
+    "MachineSize": "machines",
+    "Region": "machines",
+    "BandwidthMatrix": "mesh",
+    "PlacementPolicy": "placement",
+    "PlacementResult": "placement",
+    "RegionReport": "placement",
+    "CancelToken": "process",
+    "NodeProgress": "progress",
+    "Phase": "progress",
+    "Progress": "progress",
+    "TerminalRenderer": "progress",
+    "RemoteScript": "remote_script",
+    "ScriptResult": "remote_script",
+    "StepResult": "remote_script",
+    "Backoff": "retry",
+    "ErrorClass": "retry",
+    "RetryPolicy": "retry",
+    "retry_metrics": "retry",
+    "ClusterPlan": "spec",
+    "ClusterSpec": "spec",
+    "StragglerPolicy": "straggler",
+    "StragglerResult": "straggler",
+    "HotSync": "sync",
+    "SyncReport": "sync",
+    "TaskQueue": "task_queue",
+    "TaskResult": "task_queue",
+    "LocalTransport": "transport",
+    "OpenSSHTransport": "transport",
+    "ParamikoTransport": "transport",
+    "Transport": "transport",
+    "set_transport": "transport",
+    "CommandError": "types",
+    "CompletedProcess": "types",
+    "DropletException": "types",
+    "SSHKey": "types",
+}
+
+
+def __getattr__(name: str) -> Any:
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module}", __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> list[str]:
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,135 @@
+"""
+Remote worker agent.
+
+This file is shipped as-is to droplets and run with `python3 agent.py`, so it
+must only use the standard library. It serves framed requests on stdin and
+writes framed responses to stdout, which makes one long lived ssh session a
+low latency RPC channel (see agent_client.AgentClient).
+
+Frame: 9 byte header (kind: u8, request id: u32, payload length: u32, all
+big-endian) followed by a pickled payload.
+"""
+
+from __future__ import annotations
+
+import os
+import pickle
+import struct
+import subprocess
+import sys
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from typing import IO, Any
+
+HEADER = struct.Struct(">BII")
+
+KIND_PING = 1
+KIND_EXEC = 2
+KIND_READ = 3
+KIND_WRITE = 4
+KIND_CALL = 5
+KIND_SHUTDOWN = 6
+KIND_OK = 100
+KIND_ERROR = 101
+
+
+def read_frame(stream: IO[bytes]) -> tuple[int, int, bytes] | None:
+    header = _read_exact(stream, HEADER.size)
+    if header is None:
+        return None
+    kind, request_id, length = HEADER.unpack(header)
+    payload = _read_exact(stream, length) if length else b""
+    if payload is None:
+        return None
+    return kind, request_id, payload
+
+
+def write_frame(stream: IO[bytes], kind: int, request_id: int, payload: bytes) -> None:
+    stream.write(HEADER.pack(kind, request_id, len(payload)) + payload)
+    stream.flush()
+
+
+def _read_exact(stream: IO[bytes], size: int) -> bytes | None:
+    chunks = []
+    while size:
+        chunk = stream.read(size)
+        if not chunk:
+            return None
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+def _handle(kind: int, args: Any) -> Any:
+    if kind == KIND_PING:
+        return os.getpid()
+    if kind == KIND_EXEC:
+        command, timeout = args
+        cp = subprocess.run(
+            command, shell=True, capture_output=True, timeout=timeout, check=False
+        )
+        return cp.returncode, cp.stdout, cp.stderr
+    if kind == KIND_READ:
+        with open(args, "rb") as f:
+            return f.read()
+    if kind == KIND_WRITE:
+        path, data, mode = args
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = f"{path}.tmp.{os.getpid()}.{threading.get_ident()}"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        if mode is not None:
+            os.chmod(tmp, mode)
+        os.replace(tmp, path)
+        return len(data)
+    if kind == KIND_CALL:
+        fn, fn_args, fn_kwargs = args
+        return fn(*fn_args, **fn_kwargs)
+    raise ValueError(f"Unknown request kind: {kind}")
+
+
+def serve(stdin: IO[bytes], stdout: IO[bytes], workers: int = 16) -> None:
+    write_lock = threading.Lock()
+    pool = ThreadPoolExecutor(max_workers=workers)
+
+    def _respond(kind: int, request_id: int, payload: bytes) -> None:
+        try:
+            args = pickle.loads(payload) if payload else None
+            result = pickle.dumps(_handle(kind, args))
+            reply = KIND_OK
+        except BaseException as e:  # pylint: disable=broad-except
+            detail = "".join(traceback.format_exception(type(e), e, e.__traceback__))
+            result = pickle.dumps(f"{type(e).__name__}: {e}\n{detail}")
+            reply = KIND_ERROR
+        with write_lock:
+            write_frame(stdout, reply, request_id, result)
+
+    while True:
+        frame = read_frame(stdin)
+        if frame is None:
+            break
+        kind, request_id, payload = frame
+        if kind == KIND_SHUTDOWN:
+            with write_lock:
+                write_frame(stdout, KIND_OK, request_id, pickle.dumps(None))
+            break
+        if kind == KIND_PING:
+            # Answered inline: the cheapest possible round trip.
+            _respond(kind, request_id, payload)
+            continue
+        pool.submit(_respond, kind, request_id, payload)
+    pool.shutdown(wait=True)
+
+
+def main() -> None:
+    # Keep stray prints from user functions out of the protocol stream.
+    protocol_out = os.fdopen(os.dup(sys.stdout.fileno()), "wb", buffering=0)
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+    if len(sys.argv) > 1:
+        sys.path.insert(0, sys.argv[1])
+    serve(sys.stdin.buffer, protocol_out)
+
+
+if __name__ == "__main__":
+    main()
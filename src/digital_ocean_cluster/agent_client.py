@@ -0,0 +1,194 @@
+"""
+Client for the remote worker agent (see agent.py).
+
+start_agent ships agent.py to a droplet (plus, optionally, a wheel built with
+build_wheel.build_wheel so the droplet can import your code) and opens one
+persistent ssh session running it. Requests are multiplexed over that session
+so each call costs a round trip instead of an ssh handshake.
+"""
+
+import hashlib
+import itertools
+import pickle
+import shlex
+import subprocess
+import time
+from collections import deque
+from concurrent.futures import Future
+from pathlib import Path
+from threading import Lock, Thread
+from typing import TYPE_CHECKING, Any, Callable
+
+from digital_ocean_cluster import agent
+from digital_ocean_cluster.types import CompletedProcess, DropletException
+
+if TYPE_CHECKING:
+    from digital_ocean_cluster.droplet import Droplet
+
+REMOTE_AGENT_DIR = "/root/.cache/digital-ocean-cluster/agent"
+_AGENT_SOURCE = Path(agent.__file__).read_bytes()
+_AGENT_DIGEST = hashlib.sha256(_AGENT_SOURCE).hexdigest()[:16]
+
+
+class AgentError(DropletException):
+    pass
+
+
+class AgentClient:
+    """Framed RPC over the stdin/stdout of a child process running agent.py,
+    normally an ssh session (see start_agent)."""
+
+    def __init__(self, cmd_list: list[str], name: str = "agent") -> None:
+        self.name = name
+        self._proc = subprocess.Popen(
+            cmd_list,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+        self._ids = itertools.count(1)
+        self._pending: dict[int, Future] = {}
+        self._lock = Lock()
+        self._write_lock = Lock()
+        self._stderr_tail: deque[bytes] = deque(maxlen=50)
+        self._closed = False
+        Thread(target=self._read_loop, name=f"{name}-reader", daemon=True).start()
+        Thread(target=self._drain_stderr, name=f"{name}-stderr", daemon=True).start()
+
+    def _drain_stderr(self) -> None:
+        assert self._proc.stderr is not None
+        for line in self._proc.stderr:
+            self._stderr_tail.append(line)
+
+    def _read_loop(self) -> None:
+        assert self._proc.stdout is not None
+        while True:
+            frame = agent.read_frame(self._proc.stdout)
+            if frame is None:
+                break
+            kind, request_id, payload = frame
+            with self._lock:
+                future = self._pending.pop(request_id, None)
+            if future is None:
+                continue
+            try:
+                value = pickle.loads(payload)
+            except Exception as e:  # pylint: disable=broad-except
+                future.set_exception(AgentError(f"Bad response from {self.name}: {e}"))
+                continue
+            if kind == agent.KIND_OK:
+                future.set_result(value)
+            else:
+                future.set_exception(AgentError(f"{self.name}: {value}"))
+        self._proc.wait()
+        stderr = b"".join(self._stderr_tail).decode("utf-8", errors="replace")
+        with self._lock:
+            self._closed = True
+            pending = list(self._pending.values())
+            self._pending.clear()
+        for future in pending:
+            future.set_exception(
+                AgentError(f"{self.name} exited ({self._proc.returncode}): {stderr}")
+            )
+
+    def submit(self, kind: int, args: Any = None) -> Future:
+        future: Future = Future()
+        payload = pickle.dumps(args) if args is not None else b""
+        with self._lock:
+            if self._closed:
+                raise AgentError(f"{self.name} is closed")
+            request_id = next(self._ids)
+            self._pending[request_id] = future
+        assert self._proc.stdin is not None
+        try:
+            with self._write_lock:
+                agent.write_frame(self._proc.stdin, kind, request_id, payload)
+        except (BrokenPipeError, OSError) as e:
+            with self._lock:
+                self._pending.pop(request_id, None)
+            raise AgentError(f"{self.name} connection lost: {e}")
+        return future
+
+    def ping(self) -> float:
+        """Round trip time in seconds."""
+        start = time.perf_counter()
+        self.submit(agent.KIND_PING).result()
+        return time.perf_counter() - start
+
+    def exec(self, command: str, timeout: float | None = None) -> CompletedProcess:
+        rc, out, err = self.submit(agent.KIND_EXEC, (command, timeout)).result()
+        cp = subprocess.CompletedProcess([command], rc, out, err)
+        return CompletedProcess([command], cp)
+
+    def read_bytes(self, path: str | Path) -> bytes:
+        return self.submit(agent.KIND_READ, Path(path).as_posix()).result()
+
+    def write_bytes(
+        self, path: str | Path, data: bytes, mode: int | None = None
+    ) -> int:
+        args = (Path(path).as_posix(), data, mode)
+        return self.submit(agent.KIND_WRITE, args).result()
+
+    def call(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Call fn on the droplet. fn must be importable there (module level,
+        e.g. shipped in a wheel) since it is pickled by reference."""
+        return self.submit(agent.KIND_CALL, (fn, args, kwargs)).result()
+
+    def close(self) -> None:
+        with self._lock:
+            closed = self._closed
+        if not closed:
+            try:
+                self.submit(agent.KIND_SHUTDOWN).result(timeout=5)
+            except Exception:  # pylint: disable=broad-except
+                pass
+        try:
+            self._proc.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            self._proc.kill()
+
+    def __enter__(self) -> "AgentClient":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+
+def start_agent(
+    droplet: "Droplet", wheel: Path | None = None, python: str = "python3"
+) -> AgentClient:
+    """Ship the agent (and optionally wheel, e.g. from build_wheel) to droplet
+    and connect to it. Uploads are skipped when the droplet already has them:
+    the agent is stored under its hash, and a wheel is uploaded and installed
+    only once per content hash. The wheel is installed with
+    PIP_BREAK_SYSTEM_PACKAGES=1, since the agent runs on the system python
+    (which recent Ubuntu images mark externally managed)."""
+    agent_path = f"{REMOTE_AGENT_DIR}/agent-{_AGENT_DIGEST}.py"
+    cp = droplet.ssh_exec(
+        f"mkdir -p {REMOTE_AGENT_DIR} && "
+        f"{{ [ -f {agent_path} ] || {{ cat > {agent_path}.tmp && mv {agent_path}.tmp {agent_path}; }}; }}",
+        input=_AGENT_SOURCE,
+    )
+    if not cp.ok:
+        raise AgentError(f"Failed to install agent on {droplet.name}: {cp.stderr}")
+    if wheel is not None:
+        data = wheel.read_bytes()
+        digest = hashlib.sha256(data).hexdigest()[:16]
+        wheel_dir = f"{REMOTE_AGENT_DIR}/wheels/{digest}"
+        marker = shlex.quote(f"{wheel_dir}/installed")
+        cp = droplet.ssh_exec(f"test -f {marker}")
+        if not cp.ok:
+            remote_wheel = Path(f"{wheel_dir}/{wheel.name}")
+            cp = droplet.write_bytes(data, remote_wheel)
+            if cp.ok:
+                cp = droplet.ssh_exec(
+                    f"PIP_BREAK_SYSTEM_PACKAGES=1 {python} -m pip install --quiet "
+                    f"--force-reinstall --no-deps "
+                    f"{shlex.quote(remote_wheel.as_posix())} && touch {marker}"
+                )
+            if not cp.ok:
+                raise AgentError(
+                    f"Failed to install {wheel.name} on {droplet.name}: {cp.stderr}"
+                )
+    cmd_list = droplet.ssh_cmd_list(f"{python} -u {agent_path}", stdin=True)
+    return AgentClient(cmd_list, name=f"agent@{droplet.name}")
@@ -0,0 +1,244 @@
+"""
+Autoscaling controller for a DropletCluster.
+
+The Autoscaler polls a queue-depth metric and grows or shrinks the cluster
+towards ceil(depth / tasks_per_droplet) droplets. Watermarks add hysteresis
+so the cluster doesn't flap around the target, and separate cooldowns for
+scaling up and down keep it from reacting to every sample.
+"""
+
+import math
+import socket
+import time
+import uuid
+from dataclasses import dataclass, replace
+from pathlib import Path
+from threading import Event, Lock, Thread
+from typing import Callable
+
+from digital_ocean_cluster.cluster import (
+    DigitalOceanCluster,
+    DropletCluster,
+    DropletCreationArgs,
+)
+from digital_ocean_cluster.droplet_manager import Droplet
+from digital_ocean_cluster.log import get_logger
+from digital_ocean_cluster.types import THREAD_POOL
+
+logger = get_logger(__name__)
+
+MetricSource = Callable[[], float]
+
+
+def file_queue_depth(path: Path) -> MetricSource:
+    """Queue depth from a local file: an integer, or else its non-empty
+    line count. A missing file counts as an empty queue."""
+
+    def _read() -> float:
+        try:
+            text = path.read_text()
+        except FileNotFoundError:
+            return 0.0
+        try:
+            return float(int(text.strip()))
+        except ValueError:
+            return float(sum(1 for line in text.splitlines() if line.strip()))
+
+    return _read
+
+
+def redis_queue_depth(
+    key: str, host: str = "127.0.0.1", port: int = 6379, timeout: float = 2.0
+) -> MetricSource:
+    """Queue depth as LLEN of key on any server speaking the Redis protocol."""
+    encoded = key.encode("utf-8")
+    request = b"*2\r\n$4\r\nLLEN\r\n$%d\r\n%s\r\n" % (len(encoded), encoded)
+
+    def _read() -> float:
+        with socket.create_connection((host, port), timeout=timeout) as sock:
+            sock.sendall(request)
+            reply = b""
+            while not reply.endswith(b"\r\n"):
+                chunk = sock.recv(64)
+                if not chunk:
+                    break
+                reply += chunk
+        if not reply.startswith(b":"):
+            raise ValueError(f"Unexpected reply to LLEN {key}: {reply!r}")
+        return float(int(reply[1:].strip()))
+
+    return _read
+
+
+@dataclass
+class AutoscalerPolicy:
+    min_size: int = 0
+    max_size: int = 10
+    tasks_per_droplet: float = 10.0
+    # Scale up once depth exceeds high_watermark * current capacity and down
+    # once it drops below low_watermark * current capacity.
+    high_watermark: float = 1.0
+    low_watermark: float = 0.5
+    scale_up_cooldown: float = 60.0
+    scale_down_cooldown: float = 300.0
+    max_step: int = 5
+
+    def desired(self, depth: float) -> int:
+        target = math.ceil(depth / self.tasks_per_droplet) if depth > 0 else 0
+        return min(self.max_size, max(self.min_size, target))
+
+    def decide(
+        self,
+        depth: float,
+        current: int,
+        now: float,
+        last_up: float,
+        last_down: float,
+    ) -> int:
+        """Number of droplets to add (positive) or remove (negative)."""
+        capacity = current * self.tasks_per_droplet
+        desired = self.desired(depth)
+        if current < self.min_size:
+            return min(self.max_step, self.min_size - current)
+        if current > self.max_size:
+            return -min(self.max_step, current - self.max_size)
+        if desired > current and depth > capacity * self.high_watermark:
+            if now - last_up >= self.scale_up_cooldown:
+                return min(self.max_step, desired - current)
+        elif desired < current and depth < capacity * self.low_watermark:
+            # Cooldown after any change, so fresh droplets get a chance to work.
+            if now - max(last_up, last_down) >= self.scale_down_cooldown:
+                return -min(self.max_step, current - desired)
+        return 0
+
+
+class Autoscaler:
+    """Grow/shrink cluster from metric. New droplets are copies of template
+    with a unique name suffix; droplets are only removed if is_idle says so,
+    and drain is called on each before it is deleted."""
+
+    def __init__(
+        self,
+        cluster: DropletCluster,
+        template: DropletCreationArgs,
+        metric: MetricSource,
+        policy: AutoscalerPolicy | None = None,
+        is_idle: Callable[[Droplet], bool] | None = None,
+        drain: Callable[[Droplet], None] | None = None,
+        on_scale: Callable[[int, DropletCluster], None] | None = None,
+    ) -> None:
+        self.cluster = cluster
+        self.template = template
+        self.metric = metric
+        self.policy = policy or AutoscalerPolicy()
+        self.is_idle = is_idle
+        self.drain = drain
+        self.on_scale = on_scale
+        self.last_up = float("-inf")
+        self.last_down = float("-inf")
+        self._lock = Lock()
+        self._stop = Event()
+        self._thread: Thread | None = None
+
+    def step(self, now: float | None = None) -> int:
+        """Run one control iteration, returning the size change applied."""
+        with self._lock:
+            now = time.monotonic() if now is None else now
+            try:
+                depth = self.metric()
+            except (OSError, ValueError) as e:
+                logger.warning("Autoscaler metric failed, holding size: %s", e)
+                return 0
+            current = len(self.cluster.droplets)
+            delta = self.policy.decide(
+                depth, current, now, self.last_up, self.last_down
+            )
+            if delta > 0:
+                delta = self._scale_up(delta)
+                self.last_up = now
+            elif delta < 0:
+                delta = -self._scale_down(-delta)
+                if delta:
+                    self.last_down = now
+            if delta:
+                logger.info(
+                    "Autoscaler: depth=%s size %d -> %d",
+                    depth,
+                    current,
+                    current + delta,
+                )
+                if self.on_scale is not None:
+                    self.on_scale(delta, self.cluster)
+            return delta
+
+    def _scale_up(self, count: int) -> int:
+        # Each droplet needs its own idempotency key, or a retried create
+        # would adopt an earlier scale-up's droplet.
+        args = [
+            replace(
+                self.template,
+                name=f"{self.template.name}-{uuid.uuid4().hex[:8]}",
+                idempotency_key=None,
+            )
+            for _ in range(count)
+        ]
+        created = DigitalOceanCluster.create_droplets(args)
+        self.cluster.droplets.extend(created.droplets)
+        self.cluster.failed_droplets.update(created.failed_droplets)
+        return len(created.droplets)
+
+    def _scale_down(self, count: int) -> int:
+        # Newest droplets first: they are least likely to hold warm state.
+        candidates = list(reversed(self.cluster.droplets))
+        if self.is_idle is not None:
+            idle = list(THREAD_POOL.map(self.is_idle, candidates))
+            candidates = [d for d, ok in zip(candidates, idle) if ok]
+        victims = candidates[:count]
+        if not victims:
+            return 0
+
+        def _retire(droplet: Droplet) -> bool:
+            """Drain and delete droplet, False if either failed. delete()
+            returns a failed doctl call rather than raising it."""
+            try:
+                if self.drain is not None:
+                    self.drain(droplet)
+                error = droplet.delete()
+                if error is not None:
+                    raise error
+            except Exception as e:  # pylint: disable=broad-except
+                logger.warning(
+                    "Autoscaler could not retire droplet, keeping it: %s",
+                    e,
+                    extra={"droplet": droplet.name},
+                )
+                return False
+            return True
+
+        retired = list(THREAD_POOL.map(_retire, victims))
+        ids = {d.id for d, ok in zip(victims, retired) if ok}
+        self.cluster.droplets[:] = [d for d in self.cluster.droplets if d.id not in ids]
+        return len(ids)
+
+    def start(self, interval: float = 15.0) -> None:
+        """Run step every interval seconds on a background thread."""
+        if self._thread is not None:
+            return
+        self._stop.clear()
+
+        def _loop() -> None:
+            while not self._stop.is_set():
+                try:
+                    self.step()
+                except Exception:  # pylint: disable=broad-except
+                    logger.exception("Autoscaler step failed")
+                self._stop.wait(interval)
+
+        self._thread = Thread(target=_loop, name="autoscaler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
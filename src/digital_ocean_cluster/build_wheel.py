@@ -1,12 +1,37 @@
+import hashlib
+import os
+import shutil
 import subprocess
 import sys
+import tempfile
 from pathlib import Path
 
+from appdirs import user_cache_dir
+
 HERE = Path(__file__).parent
 PROJECT_ROOT = HERE.parent.parent
 
 PYTHON_EXE = sys.executable
 
+WHEEL_CACHE_DIR = Path(user_cache_dir("digital-ocean-cluster")) / "wheels"
+
+# Directories and files that are not part of a project's source.
+SOURCE_IGNORE_DIRS = {
+    ".git",
+    ".hg",
+    ".tox",
+    ".nox",
+    ".venv",
+    "venv",
+    "build",
+    "dist",
+    "__pycache__",
+    ".mypy_cache",
+    ".pytest_cache",
+    ".ruff_cache",
+}
+SOURCE_IGNORE_SUFFIXES = (".pyc", ".pyo", ".egg-info")
+
 
 def _file_list_whl(path: Path) -> list[Path]:
     out = list(path.iterdir())
@@ -14,34 +39,104 @@ def _file_list_whl(path: Path) -> list[Path]:
     return out
 
 
+def _run_build(cmd_list: list[str], cwd: Path) -> Path:
+    """Run a wheel build writing into a fresh directory, so the wheel it made
+    is the only one there. Returns that directory."""
+    out_dir = Path(tempfile.mkdtemp(prefix="docwheel-"))
+    cmd_list = cmd_list + [str(out_dir)]
+    print(f"Running: {subprocess.list2cmdline(cmd_list)}")
+    subprocess.run(cmd_list, check=True, cwd=str(cwd))
+    return out_dir
+
+
+def _take_wheel(out_dir: Path, dist_dir: Path) -> Path:
+    try:
+        wheels = _file_list_whl(out_dir)
+        if len(wheels) != 1:
+            raise ValueError(f"Expected one wheel file, got {len(wheels)}: {wheels}")
+        dist_dir.mkdir(exist_ok=True, parents=True)
+        dest = dist_dir / wheels[0].name
+        shutil.move(str(wheels[0]), dest)
+        return dest
+    finally:
+        shutil.rmtree(out_dir, ignore_errors=True)
+
+
 def build_wheel(setup_py: Path, dist_dir: Path, python: str | None = None) -> Path:
     python = python or PYTHON_EXE
     if not setup_py.exists():
         raise FileNotFoundError(f"setup.py not found: {setup_py}")
     if setup_py.name != "setup.py":
         raise ValueError(f"Input setup_py must be setup.py: {setup_py}")
-    dist_dir.mkdir(exist_ok=True, parents=True)
     project_root = setup_py.parent
     # python setup.py bdist_wheel
-    old_wheels = _file_list_whl(dist_dir)
-    cmd_list = [python, "setup.py", "bdist_wheel", "--dist-dir", str(dist_dir)]
-    cmd_str = subprocess.list2cmdline(cmd_list)
-    dist_dir.mkdir(exist_ok=True, parents=True)
-    print(f"Running: {cmd_str}")
-    subprocess.run(
-        cmd_list,
-        check=True,
-        cwd=str(project_root),
+    out_dir = _run_build(
+        [python, "setup.py", "bdist_wheel", "--dist-dir"], project_root
     )
-    # now find the new file
-    new_wheels = _file_list_whl(dist_dir)
-    if len(new_wheels) != 1:
-        raise ValueError(
-            f"Expected one wheel file, got {len(new_wheels)}: {new_wheels}"
+    return _take_wheel(out_dir, dist_dir)
+
+
+def build_project_wheel(
+    project_root: Path, dist_dir: Path, python: str | None = None
+) -> Path:
+    """Build project_root's wheel with setup.py if it has one, else with pip
+    (any pyproject.toml build backend)."""
+    python = python or PYTHON_EXE
+    setup_py = project_root / "setup.py"
+    if setup_py.exists():
+        return build_wheel(setup_py, dist_dir, python)
+    if not (project_root / "pyproject.toml").exists():
+        raise FileNotFoundError(f"No setup.py or pyproject.toml in {project_root}")
+    out_dir = _run_build(
+        [python, "-m", "pip", "wheel", "--no-deps", str(project_root), "-w"],
+        project_root,
+    )
+    return _take_wheel(out_dir, dist_dir)
+
+
+def source_files(project_root: Path) -> list[Path]:
+    """The files a wheel of project_root is built from, sorted."""
+    out: list[Path] = []
+    for dirpath, dirnames, filenames in os.walk(project_root):
+        dirnames[:] = [
+            d
+            for d in dirnames
+            if d not in SOURCE_IGNORE_DIRS and not d.endswith(SOURCE_IGNORE_SUFFIXES)
+        ]
+        out.extend(
+            Path(dirpath) / name
+            for name in filenames
+            if not name.endswith(SOURCE_IGNORE_SUFFIXES)
         )
-    diff = set(new_wheels) - set(old_wheels)
-    if len(diff) != 1:
-        # second course of action, look at the files and grab the one with the most recent timestamp
-        sorted_items = sorted(new_wheels, key=lambda x: x.stat().st_mtime, reverse=True)
-        return sorted_items[0]
-    return diff.pop()
+    return sorted(out)
+
+
+def source_hash(project_root: Path) -> str:
+    """sha256 over the paths and contents of source_files(project_root)."""
+    digest = hashlib.sha256()
+    for path in source_files(project_root):
+        digest.update(path.relative_to(project_root).as_posix().encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(hashlib.sha256(path.read_bytes()).digest())
+    return digest.hexdigest()
+
+
+def cached_wheel(
+    project_root: Path,
+    source_digest: str | None = None,
+    cache_dir: Path | None = None,
+    python: str | None = None,
+) -> tuple[Path, bool]:
+    """The wheel of project_root, built only if its source changed since the
+    last build. Returns (wheel, built)."""
+    source_digest = source_digest or source_hash(project_root)
+    entry = (cache_dir or WHEEL_CACHE_DIR) / source_digest[:32]
+    if entry.is_dir():
+        wheels = _file_list_whl(entry)
+        if len(wheels) == 1:
+            return wheels[0], False
+    wheel = build_project_wheel(project_root, entry, python)
+    for stale in _file_list_whl(entry):
+        if stale != wheel:
+            stale.unlink()
+    return wheel, True
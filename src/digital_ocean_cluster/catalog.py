@@ -0,0 +1,293 @@
+"""
+Machine catalog: sizes, regions and images loaded from the API.
+
+The catalog is cached on disk so most processes never spawn doctl for it, and
+falls back to the static MachineSize/Region/ImageType enums when offline.
+"""
+
+import json
+import math
+import re
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from threading import Lock
+from typing import Any
+
+from appdirs import user_cache_dir
+
+from digital_ocean_cluster.machines import ImageType, MachineSize, Region
+from digital_ocean_cluster.types import DropletException
+
+CATALOG_CACHE_FILE = Path(user_cache_dir("digital-ocean-cluster")) / "catalog.json"
+CATALOG_MAX_AGE = 24 * 60 * 60
+# The offline fallback is only kept this long before the API is tried again.
+CATALOG_OFFLINE_MAX_AGE = 60
+
+# Slug prefixes of the dedicated-CPU families, which DigitalOcean provisions
+# with up to 10 Gbps networking. Shared CPU sizes get ~2 Gbps.
+_DEDICATED_PREFIXES = ("c-", "c2-", "g-", "gd-", "m-", "m3-", "m6-", "so-", "so1_5-")
+_NAME_PATTERN = re.compile(r"(\d+)VCPU_(\d+)(GB|MB)")
+
+_LOCK = Lock()
+_CATALOG: "Catalog | None" = None
+
+
+@dataclass(frozen=True)
+class SizeInfo:
+    slug: str
+    vcpus: int
+    memory_mb: int
+    disk_gb: int = 0
+    transfer_tb: float = 0.0
+    price_monthly: float | None = None
+    price_hourly: float | None = None
+    regions: tuple[str, ...] = ()
+    available: bool = True
+    description: str = ""
+
+    @property
+    def memory_gb(self) -> float:
+        return self.memory_mb / 1024
+
+    @property
+    def cpu_optimized(self) -> bool:
+        return self.slug.startswith(("c-", "c2-"))
+
+    @property
+    def network_gbps(self) -> int:
+        """Estimated network bandwidth; the API does not report it."""
+        return 10 if self.slug.startswith(_DEDICATED_PREFIXES) else 2
+
+    @property
+    def machine_size(self) -> MachineSize | None:
+        try:
+            return MachineSize(self.slug)
+        except ValueError:
+            return None
+
+    @staticmethod
+    def from_api(data: dict[str, Any]) -> "SizeInfo":
+        return SizeInfo(
+            slug=data["slug"],
+            vcpus=int(data.get("vcpus", 0)),
+            memory_mb=int(data.get("memory", 0)),
+            disk_gb=int(data.get("disk", 0)),
+            transfer_tb=float(data.get("transfer", 0.0)),
+            price_monthly=data.get("price_monthly"),
+            price_hourly=data.get("price_hourly"),
+            regions=tuple(data.get("regions") or ()),
+            available=bool(data.get("available", True)),
+            description=data.get("description", ""),
+        )
+
+    @staticmethod
+    def from_enum(size: MachineSize) -> "SizeInfo | None":
+        match = _NAME_PATTERN.search(size.name)
+        if match:
+            vcpus = int(match.group(1))
+            memory = int(match.group(2)) * (1024 if match.group(3) == "GB" else 1)
+        elif size.name.startswith("C_"):
+            # c-N sizes: N vCPUs with 2GB each.
+            vcpus = int(size.name.split("_")[1])
+            memory = vcpus * 2 * 1024
+        else:
+            return None
+        return SizeInfo(slug=size.value, vcpus=vcpus, memory_mb=memory)
+
+
+@dataclass(frozen=True)
+class RegionInfo:
+    slug: str
+    name: str = ""
+    available: bool = True
+    sizes: tuple[str, ...] = ()
+    features: tuple[str, ...] = ()
+
+    @staticmethod
+    def from_api(data: dict[str, Any]) -> "RegionInfo":
+        return RegionInfo(
+            slug=data["slug"],
+            name=data.get("name", ""),
+            available=bool(data.get("available", True)),
+            sizes=tuple(data.get("sizes") or ()),
+            features=tuple(data.get("features") or ()),
+        )
+
+
+@dataclass(frozen=True)
+class ImageInfo:
+    slug: str
+    distribution: str = ""
+    name: str = ""
+
+    @staticmethod
+    def from_api(data: dict[str, Any]) -> "ImageInfo":
+        return ImageInfo(
+            slug=data.get("slug") or "",
+            distribution=data.get("distribution", ""),
+            name=data.get("name", ""),
+        )
+
+
+@dataclass
+class Catalog:
+    sizes: list[SizeInfo]
+    regions: list[RegionInfo]
+    images: list[ImageInfo]
+    fetched_at: float = 0.0
+    offline: bool = False
+    _by_slug: dict[str, SizeInfo] = field(default_factory=dict, init=False, repr=False)
+    _by_region: dict[str, set[str]] = field(
+        default_factory=dict, init=False, repr=False
+    )
+
+    def __post_init__(self) -> None:
+        # Cheapest first; unknown prices sort last, then by resources.
+        self.sizes.sort(
+            key=lambda s: (
+                s.price_hourly if s.price_hourly is not None else math.inf,
+                s.vcpus,
+                s.memory_mb,
+            )
+        )
+        self._by_slug = {s.slug: s for s in self.sizes}
+        for region in self.regions:
+            if region.sizes:
+                self._by_region[region.slug] = set(region.sizes)
+        for size in self.sizes:
+            for slug in size.regions:
+                self._by_region.setdefault(slug, set()).add(size.slug)
+
+    def size(self, slug: str) -> SizeInfo | None:
+        return self._by_slug.get(slug)
+
+    def region_slugs(self) -> list[str]:
+        return [r.slug for r in self.regions if r.available]
+
+    def available_in(self, size: str, region: str) -> bool:
+        sizes = self._by_region.get(region)
+        if sizes is None:
+            # Offline catalog: no availability data, assume yes.
+            return self.offline
+        return size in sizes
+
+    def find_sizes(
+        self,
+        min_vcpus: int = 1,
+        min_memory_gb: float = 0,
+        min_disk_gb: int = 0,
+        min_network_gbps: int = 0,
+        region: Region | str | None = None,
+        cpu_optimized: bool | None = None,
+        max_price_hourly: float | None = None,
+    ) -> list[SizeInfo]:
+        """Sizes meeting every constraint, cheapest first."""
+        region_slug = region.value if isinstance(region, Region) else region
+        out: list[SizeInfo] = []
+        for s in self.sizes:
+            if not s.available or s.vcpus < min_vcpus:
+                continue
+            if s.memory_mb < min_memory_gb * 1024 or s.disk_gb < min_disk_gb:
+                continue
+            if s.network_gbps < min_network_gbps:
+                continue
+            if cpu_optimized is not None and s.cpu_optimized != cpu_optimized:
+                continue
+            if max_price_hourly is not None and (
+                s.price_hourly is None or s.price_hourly > max_price_hourly
+            ):
+                continue
+            if region_slug is not None and not self.available_in(s.slug, region_slug):
+                continue
+            out.append(s)
+        return out
+
+    def select_size(self, **constraints: Any) -> SizeInfo:
+        """The cheapest size meeting the constraints of find_sizes."""
+        sizes = self.find_sizes(**constraints)
+        if not sizes:
+            raise DropletException(f"No machine size matches {constraints}")
+        return sizes[0]
+
+    def to_json(self) -> dict[str, Any]:
+        return {
+            "fetched_at": self.fetched_at,
+            "sizes": [asdict(s) for s in self.sizes],
+            "regions": [asdict(r) for r in self.regions],
+            "images": [asdict(i) for i in self.images],
+        }
+
+    @staticmethod
+    def from_json(data: dict[str, Any]) -> "Catalog":
+        def _tuples(d: dict[str, Any]) -> dict[str, Any]:
+            return {k: tuple(v) if isinstance(v, list) else v for k, v in d.items()}
+
+        return Catalog(
+            sizes=[SizeInfo(**_tuples(s)) for s in data["sizes"]],
+            regions=[RegionInfo(**_tuples(r)) for r in data["regions"]],
+            images=[ImageInfo(**i) for i in data["images"]],
+            fetched_at=data.get("fetched_at", 0.0),
+        )
+
+    @staticmethod
+    def from_api() -> "Catalog":
+        from digital_ocean_cluster.droplet_manager import DropletManager
+
+        return Catalog(
+            sizes=[SizeInfo.from_api(d) for d in DropletManager.list_sizes()],
+            regions=[RegionInfo.from_api(d) for d in DropletManager.list_regions()],
+            images=[ImageInfo.from_api(d) for d in DropletManager.list_images()],
+            fetched_at=time.time(),
+        )
+
+    @staticmethod
+    def from_enums() -> "Catalog":
+        sizes = [SizeInfo.from_enum(s) for s in MachineSize]
+        return Catalog(
+            sizes=[s for s in sizes if s is not None],
+            regions=[RegionInfo(slug=r.value) for r in Region],
+            images=[ImageInfo(slug=i.value) for i in ImageType],
+            fetched_at=time.time(),
+            offline=True,
+        )
+
+
+def load_catalog(
+    refresh: bool = False,
+    max_age: float = CATALOG_MAX_AGE,
+    cache_file: Path = CATALOG_CACHE_FILE,
+) -> Catalog:
+    """The machine catalog, from memory, the disk cache, the API or, failing
+    all of those, the static enums. The enums are only remembered for
+    CATALOG_OFFLINE_MAX_AGE, so a passing API failure is not cached for a day."""
+    global _CATALOG  # pylint: disable=global-statement
+    with _LOCK:
+        now = time.time()
+        if not refresh and _CATALOG is not None:
+            age_limit = max_age
+            if _CATALOG.offline:
+                age_limit = min(max_age, CATALOG_OFFLINE_MAX_AGE)
+            if now - _CATALOG.fetched_at < age_limit:
+                return _CATALOG
+        if not refresh and cache_file.exists():
+            try:
+                cached = Catalog.from_json(json.loads(cache_file.read_text()))
+                if now - cached.fetched_at < max_age:
+                    _CATALOG = cached
+                    return cached
+            except (ValueError, KeyError, TypeError):
+                pass
+        try:
+            catalog = Catalog.from_api()
+        except (DropletException, RuntimeError, OSError, ValueError):
+            # ValueError: malformed doctl output (json.JSONDecodeError)
+            catalog = Catalog.from_enums()
+            _CATALOG = catalog
+            return catalog
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp = cache_file.with_suffix(".tmp")
+        tmp.write_text(json.dumps(catalog.to_json()))
+        tmp.replace(cache_file)
+        _CATALOG = catalog
+        return catalog
@@ -0,0 +1,547 @@
+"""
+docluster: command line interface.
+
+    docluster list --tag web
+    docluster create --tag web --name web --count 4 --size s-2vcpu-2gb
+    docluster exec --tag web -- uname -a
+    docluster push --tag web ./app.tar.gz /root/app.tar.gz
+    docluster pull --tag web /var/log/syslog logs/{name}.log
+    docluster deploy --tag web ./myproject --relay 8
+    docluster watch --tag web ./app /root/app --post "systemctl restart app"
+    docluster delete --tag web
+
+Every command emits one JSON object per line on stdout, per droplet as soon as
+its result is available; progress chatter goes to stderr. exec, push and pull
+work on up to --max-parallel droplets at a time; they, deploy and watch bound
+each droplet by --timeout. Commands only accept the options they honour.
+
+`docluster daemon` serves commands on a local Unix socket. While it runs, the
+other commands are forwarded to it before the library is imported, so they
+skip loading the package, the doctl check and (for --cache-ttl seconds) the
+droplet listing. This module therefore imports the library lazily.
+"""
+
+import argparse
+import json
+import os
+import shlex
+import socket
+import socketserver
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from threading import Lock, local
+from typing import TYPE_CHECKING, Any, Callable
+
+from appdirs import user_cache_dir
+
+from digital_ocean_cluster.settings import LOG_LEVEL
+
+if TYPE_CHECKING:
+    from digital_ocean_cluster.droplet_manager import Droplet
+    from digital_ocean_cluster.types import CompletedProcess
+
+DEFAULT_SOCKET = Path(user_cache_dir("digital-ocean-cluster")) / "docluster.sock"
+DEFAULT_MAX_PARALLEL = 32
+
+Emit = Callable[[dict[str, Any]], None]
+
+
+class Session:
+    """State shared by commands. Short lived for a single invocation; in the
+    daemon it lives across invocations and caches droplet listings."""
+
+    def __init__(self, cache_ttl: float = 0.0) -> None:
+        self.cache_ttl = cache_ttl
+        self._lock = Lock()
+        self._listing: "list[Droplet] | None" = None
+        self._listed_at = 0.0
+        self._doctl_checked = False
+
+    def ensure_doctl(self) -> None:
+        # pylint: disable=import-outside-toplevel
+        from digital_ocean_cluster.ensure_doctl import ensure_doctl
+
+        if not self._doctl_checked:
+            ensure_doctl()
+            self._doctl_checked = True
+
+    def find(self, tags: list[str]) -> "list[Droplet]":
+        # pylint: disable=import-outside-toplevel
+        from digital_ocean_cluster.droplet_manager import DropletManager
+
+        self.ensure_doctl()
+        with self._lock:
+            fresh = time.time() - self._listed_at < self.cache_ttl
+            if self._listing is None or not fresh:
+                self._listing = DropletManager.list_droplets()
+                self._listed_at = time.time()
+            droplets = self._listing
+        return [d for d in droplets if all(tag in d.tags for tag in tags)]
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._listing = None
+
+
+def _cp_record(droplet: "Droplet", cp: "CompletedProcess") -> dict[str, Any]:
+    return {
+        "droplet": droplet.name,
+        "id": droplet.id,
+        "ok": cp.ok,
+        "returncode": cp.returncode,
+        "timed_out": cp.timed_out,
+        "stdout": cp.stdout,
+        "stderr": cp.stderr,
+    }
+
+
+def _droplet_record(droplet: "Droplet") -> dict[str, Any]:
+    data = droplet.data
+    ips = {
+        net.get("type"): net.get("ip_address")
+        for net in (data.get("networks") or {}).get("v4") or []
+    }
+    return {
+        "droplet": droplet.name,
+        "id": droplet.id,
+        "status": data.get("status"),
+        "size": data.get("size_slug"),
+        "region": (data.get("region") or {}).get("slug"),
+        "public_ip": ips.get("public"),
+        "private_ip": ips.get("private"),
+        "tags": droplet.tags,
+    }
+
+
+def _for_each(
+    args: argparse.Namespace,
+    droplets: "list[Droplet]",
+    fn: "Callable[[Droplet], CompletedProcess]",
+    emit: Emit,
+) -> int:
+    """Run fn on every droplet, max_parallel at a time, emitting results as
+    they complete. Returns the exit code."""
+    failures = 0
+    with ThreadPoolExecutor(max_workers=max(1, args.max_parallel)) as pool:
+        futures = {pool.submit(fn, d): d for d in droplets}
+        for future in as_completed(futures):
+            droplet = futures[future]
+            try:
+                record = _cp_record(droplet, future.result())
+            except Exception as e:  # pylint: disable=broad-except
+                record = {
+                    "droplet": droplet.name,
+                    "id": droplet.id,
+                    "ok": False,
+                    "error": str(e),
+                }
+            failures += not record["ok"]
+            emit(record)
+    return 1 if failures else 0
+
+
+def _local(args: argparse.Namespace, path: str) -> Path:
+    return Path(args.cwd) / path
+
+
+def cmd_list(session: Session, args: argparse.Namespace, emit: Emit) -> int:
+    for droplet in session.find(args.tag):
+        emit(_droplet_record(droplet))
+    return 0
+
+
+def cmd_create(session: Session, args: argparse.Namespace, emit: Emit) -> int:
+    # pylint: disable=import-outside-toplevel
+    from digital_ocean_cluster.cluster import DigitalOceanCluster, DropletCreationArgs
+    from digital_ocean_cluster.droplet_manager import Droplet
+    from digital_ocean_cluster.progress import Progress, TerminalRenderer
+
+    session.ensure_doctl()
+    creation_args = [
+        DropletCreationArgs(
+            name=f"{args.name}-{i}",
+            tags=args.tag,
+            size=args.size,
+            image=args.image,
+            region=args.region,
+        )
+        for i in range(args.count)
+    ]
+    progress = Progress("create")
+    failures = 0
+    with TerminalRenderer(progress):
+        futures = DigitalOceanCluster.async_create_droplets(creation_args, progress)
+        names = {future: name for name, future in futures.items()}
+        for future in as_completed(names):
+            result = future.result()
+            if isinstance(result, Droplet):
+                emit({**_droplet_record(result), "ok": True})
+            else:
+                failures += 1
+                emit({"droplet": names[future], "ok": False, "error": str(result)})
+    session.invalidate()
+    return 1 if failures else 0
+
+
+def cmd_exec(session: Session, args: argparse.Namespace, emit: Emit) -> int:
+    words = args.command[1:] if args.command[:1] == ["--"] else args.command
+    if not words:
+        raise ValueError("exec needs a command")
+    command = words[0] if len(words) == 1 else shlex.join(words)
+    return _for_each(
+        args,
+        session.find(args.tag),
+        lambda d: d.ssh_exec(command, timeout=args.timeout),
+        emit,
+    )
+
+
+def cmd_push(session: Session, args: argparse.Namespace, emit: Emit) -> int:
+    local = _local(args, args.local)
+    remote = Path(args.remote)
+    return _for_each(
+        args,
+        session.find(args.tag),
+        lambda d: d.copy_to(local, remote, chmod=args.chmod, timeout=args.timeout),
+        emit,
+    )
+
+
+def cmd_pull(session: Session, args: argparse.Namespace, emit: Emit) -> int:
+    remote = Path(args.remote)
+
+    def _pull(droplet: "Droplet") -> "CompletedProcess":
+        local = _local(args, args.local.format(name=droplet.name, id=droplet.id))
+        local.parent.mkdir(parents=True, exist_ok=True)
+        return droplet.copy_from(remote, local, timeout=args.timeout)
+
+    return _for_each(args, session.find(args.tag), _pull, emit)
+
+
+def cmd_watch(session: Session, args: argparse.Namespace, emit: Emit) -> int:
+    # pylint: disable=import-outside-toplevel
+    from digital_ocean_cluster.sync import HotSync, SyncReport
+
+    def _report(report: SyncReport) -> None:
+        emit(
+            {
+                "ok": report.ok,
+                "files": [str(p) for p in report.files],
+                "deleted": [str(p) for p in report.deleted],
+                "bytes": report.payload_bytes,
+                "latency": round(report.latency, 3),
+                "failed": sorted(d.name for d in report.failed),
+            }
+        )
+
+    sync = HotSync(
+        session.find(args.tag),
+        _local(args, args.local),
+        Path(args.remote),
+        post_sync=args.post,
+        debounce=args.debounce,
+        timeout=args.timeout,
+    )
+    sync.subscribe(_report)
+    with sync:
+        sync.wait()
+    return 0
+
+
+def cmd_deploy(session: Session, args: argparse.Namespace, emit: Emit) -> int:
+    # pylint: disable=import-outside-toplevel
+    from digital_ocean_cluster.deploy import deploy_wheel
+
+    report = deploy_wheel(
+        session.find(args.tag),
+        _local(args, args.project),
+        python=args.python,
+        pip_args=args.pip_arg,
+        relay_fanout=args.relay,
+        timeout=args.timeout,
+    )
+    for droplet, node in report.nodes.items():
+        emit(
+            {
+                "droplet": droplet.name,
+                "id": droplet.id,
+                "ok": node.ok,
+                "transfer": node.transfer,
+                "installed": node.installed,
+                "upload_time": round(node.upload_time, 3),
+                "install_time": round(node.install_time, 3),
+                "error": node.error,
+            }
+        )
+    emit(
+        {
+            "wheel": report.wheel.name,
+            "built": report.built,
+            "stages": {k: round(v, 3) for k, v in report.stages.items()},
+        }
+    )
+    return 0 if report.ok else 1
+
+
+def cmd_delete(session: Session, args: argparse.Namespace, emit: Emit) -> int:
+    # pylint: disable=import-outside-toplevel
+    from digital_ocean_cluster.cluster import DigitalOceanCluster, DropletCluster
+
+    droplets = session.find(args.tag)
+    if droplets:
+        DigitalOceanCluster.delete_cluster(DropletCluster(droplets, {}))
+    for droplet in droplets:
+        emit({"droplet": droplet.name, "id": droplet.id, "deleted": True})
+    session.invalidate()
+    return 0
+
+
+_PARSER_OUTPUT = local()
+
+
+class _Parser(argparse.ArgumentParser):
+    """ArgumentParser whose help and error text is collected while
+    run_command parses on this thread, and printed as usual otherwise."""
+
+    def _print_message(self, message: str, file: Any = None) -> None:
+        messages = getattr(_PARSER_OUTPUT, "messages", None)
+        if messages is None:
+            super()._print_message(message, file)
+        elif message:
+            messages.append(message)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    common = _Parser(add_help=False)
+    common.add_argument("--socket", type=Path, default=DEFAULT_SOCKET)
+    common.add_argument(
+        "--no-daemon", action="store_true", help="Don't use a running daemon"
+    )
+    common.add_argument(
+        "--log-level", default=LOG_LEVEL, help="DEBUG shows every command"
+    )
+    common.add_argument(
+        "--droplet-logs", type=Path, default=None, help="Per-droplet log files here"
+    )
+
+    tagged = _Parser(add_help=False, parents=[common])
+    tagged.add_argument("--tag", action="append", required=True, help="Repeatable")
+    timed = _Parser(add_help=False, parents=[tagged])
+    timed.add_argument(
+        "--timeout", type=float, default=None, help="Seconds per droplet"
+    )
+    fanned = _Parser(add_help=False, parents=[timed])
+    fanned.add_argument("--max-parallel", type=int, default=DEFAULT_MAX_PARALLEL)
+
+    parser = _Parser(
+        prog="docluster", description="Manage DigitalOcean droplet clusters."
+    )
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p = sub.add_parser("list", parents=[tagged], help="List droplets with all tags")
+    p.set_defaults(func=cmd_list)
+
+    p = sub.add_parser(
+        "create", parents=[tagged], help="Create NAME-0 .. NAME-{COUNT-1}"
+    )
+    p.add_argument("--name", required=True)
+    p.add_argument("--count", type=int, default=1)
+    p.add_argument("--size", default="s-2vcpu-2gb")
+    p.add_argument("--image", default="ubuntu-24-10-x64")
+    p.add_argument("--region", default="nyc1")
+    p.set_defaults(func=cmd_create)
+
+    p = sub.add_parser(
+        "exec", parents=[fanned], help="Run a shell command on every droplet"
+    )
+    p.add_argument("command", nargs=argparse.REMAINDER)
+    p.set_defaults(func=cmd_exec)
+
+    p = sub.add_parser(
+        "push", parents=[fanned], help="Copy a local file or directory to every droplet"
+    )
+    p.add_argument("local")
+    p.add_argument("remote")
+    p.add_argument("--chmod", default=None)
+    p.set_defaults(func=cmd_push)
+
+    p = sub.add_parser(
+        "pull", parents=[fanned], help="Copy a remote path from every droplet"
+    )
+    p.add_argument("remote")
+    p.add_argument(
+        "local", help="Local path; {name} and {id} are substituted per droplet"
+    )
+    p.set_defaults(func=cmd_pull)
+
+    p = sub.add_parser(
+        "deploy",
+        parents=[timed],
+        help="Build a project's wheel once and pip install it on every droplet",
+    )
+    p.add_argument("project", help="Project directory, or a built .whl")
+    p.add_argument("--python", default="python3", help="Python on the droplets")
+    p.add_argument("--pip-arg", action="append", default=[], help="Extra pip argument")
+    p.add_argument(
+        "--relay",
+        type=int,
+        default=None,
+        help="Peers each directly uploaded droplet serves the wheel to",
+    )
+    p.set_defaults(func=cmd_deploy)
+
+    p = sub.add_parser(
+        "watch",
+        parents=[timed],
+        help="Push changes under a local directory to every droplet until Ctrl-C",
+    )
+    p.add_argument("local")
+    p.add_argument("remote")
+    p.add_argument("--post", default=None, help="Run in REMOTE after each sync")
+    p.add_argument(
+        "--debounce", type=float, default=0.1, help="Seconds of quiet per batch"
+    )
+    p.set_defaults(func=cmd_watch)
+
+    p = sub.add_parser("delete", parents=[tagged], help="Delete droplets with all tags")
+    p.set_defaults(func=cmd_delete)
+
+    p = sub.add_parser(
+        "daemon", parents=[common], help="Serve commands on a Unix socket"
+    )
+    p.add_argument(
+        "--cache-ttl",
+        type=float,
+        default=30.0,
+        help="Seconds to reuse droplet listings",
+    )
+    p.set_defaults(func=None)
+    return parser
+
+
+def run_command(session: Session, argv: list[str], cwd: str, emit: Emit) -> int:
+    """Parse and run one invocation, reporting errors as a JSON line."""
+    # pylint: disable=import-outside-toplevel
+    from digital_ocean_cluster.types import DropletException
+
+    # The daemon's stderr is not the caller's: return argparse's usage and
+    # errors as a record instead.
+    _PARSER_OUTPUT.messages = messages = []
+    try:
+        args = build_parser().parse_args(argv)
+    except SystemExit as e:
+        code = int(e.code or 0)
+        text = "".join(messages)
+        emit({"ok": False, "error": text} if code else {"ok": True, "usage": text})
+        return code
+    finally:
+        _PARSER_OUTPUT.messages = None
+    if args.func is None:
+        emit({"ok": False, "error": "daemon can't be run through the daemon"})
+        return 2
+    args.cwd = cwd
+    try:
+        return args.func(session, args, emit)
+    except (DropletException, ValueError, OSError, TimeoutError) as e:
+        emit({"ok": False, "error": str(e)})
+        return 1
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    server: "_DaemonServer"
+
+    def handle(self) -> None:
+        request = json.loads(self.rfile.readline())
+        lock = Lock()
+
+        def _emit(record: dict[str, Any]) -> None:
+            line = json.dumps(record) + "\n"
+            with lock:
+                self.wfile.write(line.encode("utf-8"))
+                self.wfile.flush()
+
+        code = run_command(self.server.session, request["argv"], request["cwd"], _emit)
+        _emit({"exit": code})
+
+
+class _DaemonServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path: Path, session: Session) -> None:
+        self.session = session
+        super().__init__(str(path), _Handler)
+
+    def server_bind(self) -> None:
+        super().server_bind()
+        # Before listen(): nobody else can connect in between.
+        os.chmod(self.server_address, 0o600)
+
+
+def serve(path: Path, cache_ttl: float) -> None:
+    session = Session(cache_ttl=cache_ttl)
+    session.ensure_doctl()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if path.exists():
+        path.unlink()
+    with _DaemonServer(path, session) as server:
+        print(f"docluster daemon listening on {path}", file=sys.stderr)
+        try:
+            server.serve_forever()
+        finally:
+            path.unlink(missing_ok=True)
+
+
+def forward(path: Path, argv: list[str], out: Any) -> int | None:
+    """Run argv in the daemon at path. None if no daemon is listening."""
+    if not hasattr(socket, "AF_UNIX") or not path.exists():
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(str(path))
+    except OSError:
+        sock.close()
+        return None
+    with sock, sock.makefile("rwb") as stream:
+        request = {"argv": argv, "cwd": os.getcwd()}
+        stream.write(json.dumps(request).encode("utf-8") + b"\n")
+        stream.flush()
+        for line in stream:
+            record = json.loads(line)
+            if "exit" in record and len(record) == 1:
+                return int(record["exit"])
+            out.write(line.decode("utf-8"))
+            out.flush()
+    return 1
+
+
+def main(argv: list[str] | None = None) -> int:
+    argv = list(sys.argv[1:] if argv is None else argv)
+    args = build_parser().parse_args(argv)
+    out = sys.stdout
+    # A watch runs until interrupted, so it watches from this process.
+    if args.cmd not in ("daemon", "watch") and not args.no_daemon:
+        code = forward(args.socket, argv, out)
+        if code is not None:
+            return code
+    # pylint: disable=import-outside-toplevel
+    from digital_ocean_cluster.log import setup_logging
+
+    # Keep stdout machine readable: library logging goes to stderr.
+    setup_logging(args.log_level, stream=sys.stderr, droplet_log_dir=args.droplet_logs)
+    if args.cmd == "daemon":
+        serve(args.socket, args.cache_ttl)
+        return 0
+    lock = Lock()
+
+    def _emit(record: dict[str, Any]) -> None:
+        with lock:
+            out.write(json.dumps(record) + "\n")
+            out.flush()
+
+    return run_command(Session(), argv, os.getcwd(), _emit)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,33 +1,126 @@
+import shlex
 import time
 import warnings
-from concurrent.futures import Future
+from concurrent.futures import Future, wait
+from contextlib import AbstractContextManager, nullcontext
 from dataclasses import dataclass
 from pathlib import Path
-from tempfile import TemporaryDirectory
-from typing import Any, Callable
+from typing import TYPE_CHECKING, Any, Callable, Iterable, Iterator
 
 from digital_ocean_cluster.droplet_manager import Droplet, DropletManager
 from digital_ocean_cluster.ensure_doctl import ensure_doctl
-from digital_ocean_cluster.machines import ImageType, MachineSize, Region
+from digital_ocean_cluster.gather import GatherReport, gather
+from digital_ocean_cluster.identity import Identity, account_ssh_key
+from digital_ocean_cluster.machines import ImageType, MachineSize, Region, to_slug
+from digital_ocean_cluster.process import CancelToken
+from digital_ocean_cluster.progress import Phase, Progress, TerminalRenderer, path_size
+from digital_ocean_cluster.remote_script import RemoteScript, ScriptResult
+from digital_ocean_cluster.retry import RetryPolicy
+from digital_ocean_cluster.task_queue import TaskQueue, TaskResult
 from digital_ocean_cluster.types import (
     THREAD_POOL,
+    CommandError,
     CompletedProcess,
     DropletException,
     SSHKey,
 )
 
+if TYPE_CHECKING:
+    from digital_ocean_cluster.deploy import DeployReport
+    from digital_ocean_cluster.health import HealthMonitor
+    from digital_ocean_cluster.install import Installer, InstallReport
+    from digital_ocean_cluster.mesh import BandwidthMatrix
+    from digital_ocean_cluster.placement import PlacementPolicy, PlacementResult
+    from digital_ocean_cluster.spec import ClusterPlan, ClusterSpec
+    from digital_ocean_cluster.straggler import StragglerPolicy, StragglerResult
+    from digital_ocean_cluster.sync import HotSync
+
+# How long to wait for cancelled workers to hand back their killed results.
+_CANCEL_GRACE_SECONDS = 5
+
+
+def _collect_results(
+    futures: dict[Droplet, Future[Any]],
+    deadline: float | None,
+    cancel: CancelToken,
+) -> dict[Droplet, Any]:
+    """Wait up to deadline seconds for futures. Anything still running is then
+    cancelled, killing its ssh/scp child; droplets that never produced a result
+    are left out of the returned dict."""
+    _, pending = wait(futures.values(), timeout=deadline)
+    if pending:
+        cancel.cancel()
+        for future in pending:
+            future.cancel()
+        wait(pending, timeout=_CANCEL_GRACE_SECONDS)
+    out: dict[Droplet, Any] = {}
+    for droplet, future in futures.items():
+        if future.done() and not future.cancelled():
+            out[droplet] = future.result()
+    return out
+
+
+def _finish(progress: Progress, name: str, result: Any) -> None:
+    if isinstance(result, Exception):
+        progress.set_phase(name, Phase.FAILED, str(result))
+    elif isinstance(result, CompletedProcess) and not result.ok:
+        progress.set_phase(name, Phase.FAILED, result.stderr.strip()[-200:])
+    else:
+        progress.set_phase(name, Phase.READY)
+
+
+def _submit_tracked(
+    progress: Progress | None, name: str, fn: Callable[..., Any], *args: Any
+) -> Future[Any]:
+    """THREAD_POOL.submit(fn, *args), marking name ready or failed in progress
+    before the future completes, so waiters see the final phase."""
+    if progress is None:
+        return THREAD_POOL.submit(fn, *args)
+
+    def _task() -> Any:
+        try:
+            result = fn(*args)
+        except Exception as e:
+            _finish(progress, name, e)
+            raise
+        _finish(progress, name, result)
+        return result
+
+    def _cancelled(f: Future[Any]) -> None:
+        if f.cancelled():  # never ran
+            progress.set_phase(name, Phase.FAILED, "cancelled")
+
+    future = THREAD_POOL.submit(_task)
+    future.add_done_callback(_cancelled)
+    return future
+
+
+def _rendering(
+    progress: Progress | None, show_progress: bool
+) -> AbstractContextManager[Any]:
+    if show_progress and progress is not None:
+        return TerminalRenderer(progress)
+    return nullcontext()
+
 
 @dataclass
 class DropletCreationArgs:
     name: str
     tags: list[str]
     ssh_key: SSHKey | None = None
-    size: MachineSize = MachineSize.S_2VCPU_2GB
-    image: ImageType = ImageType.UBUNTU_24_10_X64
-    region: Region = Region.NYC_1
+    # Enum members, or any slug from the catalog (see catalog.load_catalog).
+    size: MachineSize | str = MachineSize.S_2VCPU_2GB
+    image: ImageType | str = ImageType.UBUNTU_24_10_X64
+    region: Region | str = Region.NYC_1
     # Use a function that throws if there is a failure to execute.
     install: Callable[[Droplet], Any] | None = None
     enable_monitoring: bool = True
+    # Log in with this identity instead of the process wide one; without
+    # ssh_key, the account key matching it is installed.
+    identity: Identity | None = None
+    # Tags the droplet so a retried create adopts it instead of making a
+    # second one; random when None.
+    idempotency_key: str | None = None
 
     def __post_init__(self) -> None:
         if "_" in self.name:
@@ -40,17 +133,17 @@ class DropletCreationArgs:
         args = [
             self.name,
             "--image",
-            self.image.value,
+            to_slug(self.image),
             "--size",
-            self.size.value,
+            to_slug(self.size),
             "--region",
-            self.region.value,
+            to_slug(self.region),
             "--wait",
         ]
         if self.tags is not None:
             args += ["--tag-names", ",".join(self.tags)]
         if self.ssh_key is not None:
-            args += ["--ssh-keys", str(self.ssh_key)]
+            args += ["--ssh-keys", self.ssh_key.fingerprint]
         return args
 
 
@@ -80,21 +173,135 @@ class DropletCluster:
     def __len__(self) -> int:
         return len(self.droplets)
 
-    def run_cmd(self, cmd: str) -> dict[Droplet, CompletedProcess]:
-        return DigitalOceanCluster.run_cluster_cmd(self.droplets, cmd)
+    def run_cmd(
+        self,
+        cmd: str,
+        timeout: float | None = None,
+        deadline: float | None = None,
+        retry: RetryPolicy | None = None,
+    ) -> dict[Droplet, CompletedProcess]:
+        return DigitalOceanCluster.run_cluster_cmd(
+            self.droplets, cmd, timeout=timeout, deadline=deadline, retry=retry
+        )
+
+    def run_script(
+        self,
+        script: str | list[tuple[str, str]] | RemoteScript,
+        args: list[str] | None = None,
+        env: dict[str, str] | None = None,
+        timeout: float | None = None,
+        deadline: float | None = None,
+    ) -> dict[Droplet, ScriptResult]:
+        """Run a script (or list of (name, script) steps) on every droplet using
+        one ssh session per droplet; the bundle is cached remotely by hash."""
+        return DigitalOceanCluster.run_cluster_script(
+            self.droplets, script, args, env, timeout=timeout, deadline=deadline
+        )
+
+    def map_tasks(
+        self,
+        fn: Callable[[Droplet, Any], Any],
+        items: Iterable[Any],
+        concurrency: int = 4,
+        max_attempts: int = 3,
+    ) -> Iterator[TaskResult]:
+        """Distribute items over the droplets with work stealing and retries,
+        streaming results as they complete. See task_queue.TaskQueue."""
+        queue = TaskQueue(self.droplets, concurrency, max_attempts)
+        return queue.map(fn, items)
+
+    def map_cmd(
+        self,
+        cmd_template: str,
+        items: Iterable[Any],
+        concurrency: int = 4,
+        max_attempts: int = 3,
+        timeout: float | None = None,
+    ) -> Iterator[TaskResult]:
+        """Run cmd_template.format(item=...) for every item across the cluster."""
+        queue = TaskQueue(self.droplets, concurrency, max_attempts)
+        return queue.map_cmd(cmd_template, items, timeout=timeout)
+
+    def start_agents(self, wheel: Path | None = None) -> dict[Droplet, Any]:
+        """Start the worker agent on every droplet. Values are AgentClients, or
+        the DropletException for droplets where it failed to start."""
+        return self.run_function(lambda droplet: droplet.start_agent(wheel))
+
+    def health_monitor(self, **kwargs: Any) -> "HealthMonitor":
+        """A HealthMonitor for this cluster; call start() to run it."""
+        from digital_ocean_cluster.health import HealthMonitor
+
+        return HealthMonitor(self, **kwargs)
+
+    def hot_sync(self, local_dir: Path, remote_dir: Path, **kwargs: Any) -> "HotSync":
+        """A HotSync pushing changes under local_dir to remote_dir on every
+        droplet; use it as a context manager or call start()."""
+        from digital_ocean_cluster.sync import HotSync
+
+        return HotSync(self.droplets, local_dir, remote_dir, **kwargs)
+
+    def deploy_wheel(self, project: Path, **kwargs: Any) -> "DeployReport":
+        """Build project's wheel (cached by source hash) and pip install it on
+        every droplet; see deploy.deploy_wheel."""
+        from digital_ocean_cluster.deploy import deploy_wheel
+
+        return deploy_wheel(self.droplets, project, **kwargs)
+
+    def install(
+        self, installer: "Installer", force: bool = False
+    ) -> dict[Droplet, "InstallReport"]:
+        """Run installer on every droplet, skipping steps already completed."""
+        return installer.run_cluster(self.droplets, force=force)
+
+    def private_ips(self) -> dict[Droplet, str]:
+        return {d: d.private_ip() for d in self.droplets}
+
+    def setup_mesh(self, ssh_config_path: Path | None = None) -> dict[Droplet, Any]:
+        """Make every droplet resolve the others by name to their private IP,
+        and optionally write a local ssh config (public IPs) for the cluster."""
+        from digital_ocean_cluster import mesh
+
+        if ssh_config_path is not None:
+            text = mesh.ssh_config(self.droplets, private=False)
+            ssh_config_path.write_text(text, encoding="utf-8")
+        return mesh.install_hosts(self.droplets)
+
+    def benchmark_network(
+        self, topology: str = "ring", megabytes: int = 256, pings: int = 50
+    ) -> "BandwidthMatrix":
+        """Measured bandwidth/latency between droplets over the private network."""
+        from digital_ocean_cluster.mesh import benchmark
+
+        return benchmark(self.droplets, topology, megabytes, pings)
 
     def run_function(self, function: Callable[[Droplet], Any]) -> dict[Droplet, Any]:
         return DigitalOceanCluster.run_cluster_function(self.droplets, function)
 
     def copy_to(
-        self, local_path: Path, remote_path: Path, chmod: str | None = None
+        self,
+        local_path: Path,
+        remote_path: Path,
+        chmod: str | None = None,
+        timeout: float | None = None,
+        deadline: float | None = None,
+        show_progress: bool = False,
     ) -> dict[Droplet, CompletedProcess]:
         return DigitalOceanCluster.run_cluster_copy_to(
-            self.droplets, local_path, remote_path, chmod=chmod
+            self.droplets,
+            local_path,
+            remote_path,
+            chmod=chmod,
+            timeout=timeout,
+            deadline=deadline,
+            show_progress=show_progress,
         )
 
     def copy_from(
-        self, local_path: Path, remote_path: Path
+        self,
+        local_path: Path,
+        remote_path: Path,
+        timeout: float | None = None,
+        deadline: float | None = None,
     ) -> dict[Droplet, CompletedProcess]:
         ensure_doctl()
         args = [
@@ -103,32 +310,120 @@ class DropletCluster:
             )
             for droplet in self.droplets
         ]
-        return DigitalOceanCluster.run_cluster_copy_from(args)
+        return DigitalOceanCluster.run_cluster_copy_from(
+            args, timeout=timeout, deadline=deadline
+        )
+
+    def gather(
+        self,
+        remote_path: Path,
+        local_template: str,
+        max_parallel: int = 8,
+        retries: int = 2,
+        compress: bool = True,
+        timeout: float | None = None,
+        deadline: float | None = None,
+    ) -> GatherReport:
+        """Pull remote_path from every droplet into per-droplet directories,
+        e.g. local_template="logs/{name}/{id}". See gather.gather."""
+        ensure_doctl()
+        return gather(
+            self.droplets,
+            remote_path,
+            local_template,
+            max_parallel=max_parallel,
+            retries=retries,
+            compress=compress,
+            timeout=timeout,
+            deadline=deadline,
+        )
+
+    def write_bytes(
+        self,
+        data: bytes,
+        remote_path: Path,
+        chmod: str | None = None,
+        timeout: float | None = None,
+        deadline: float | None = None,
+    ) -> dict[Droplet, CompletedProcess]:
+        return DigitalOceanCluster.run_cluster_write_bytes(
+            self.droplets,
+            data,
+            remote_path,
+            chmod=chmod,
+            timeout=timeout,
+            deadline=deadline,
+        )
+
+    def write_text(
+        self,
+        text: str,
+        remote_path: Path,
+        chmod: str | None = None,
+        timeout: float | None = None,
+        deadline: float | None = None,
+    ) -> dict[Droplet, CompletedProcess]:
+        return self.write_bytes(
+            text.encode("utf-8"),
+            remote_path,
+            chmod=chmod,
+            timeout=timeout,
+            deadline=deadline,
+        )
+
+    def read_bytes(
+        self,
+        remote_path: Path,
+        timeout: float | None = None,
+        deadline: float | None = None,
+    ) -> dict[Droplet, bytes | DropletException]:
+        cmd = "cat " + shlex.quote(remote_path.as_posix())
+        results = self.run_cmd(cmd, timeout=timeout, deadline=deadline)
+        out: dict[Droplet, bytes | DropletException] = {}
+        for droplet, cp in results.items():
+            if cp.ok:
+                out[droplet] = cp.stdout_bytes
+            else:
+                out[droplet] = CommandError.from_process(
+                    f"Error reading {remote_path}",
+                    cp,
+                    droplet=droplet.name,
+                    droplet_id=droplet.id,
+                    operation="read_bytes",
+                )
+        return out
 
     def copy_text_to(
-        self, text: str, remote_path: Path
+        self,
+        text: str,
+        remote_path: Path,
+        timeout: float | None = None,
+        deadline: float | None = None,
     ) -> dict[Droplet, CompletedProcess]:
         ensure_doctl()
-        with TemporaryDirectory() as tmpdir:
-            tmp = Path(tmpdir) / "tmp.txt"
-            with open(tmp, "w", newline="\n") as f:
-                f.write(text)
-            out = self.copy_to(tmp, remote_path)
-            # time.sleep(1)  # Give time for the file handle to expire.
-            return out
+        return self.write_text(text, remote_path, timeout=timeout, deadline=deadline)
 
     def copy_text_from(
-        self, remote_path: Path
+        self,
+        remote_path: Path,
+        timeout: float | None = None,
+        deadline: float | None = None,
     ) -> dict[Droplet, str | DropletException]:
         ensure_doctl()
         cmd = "cat " + remote_path.as_posix()
-        results = self.run_cmd(cmd)
+        results = self.run_cmd(cmd, timeout=timeout, deadline=deadline)
         out: dict[Droplet, str | DropletException] = {}
         for droplet, cp in results.items():
             if cp.returncode == 0:
                 out[droplet] = cp.stdout
             else:
-                out[droplet] = DropletException(cp.stderr)
+                out[droplet] = CommandError.from_process(
+                    f"Error reading {remote_path}",
+                    cp,
+                    droplet=droplet.name,
+                    droplet_id=droplet.id,
+                    operation="copy_text_from",
+                )
         return out
 
     def delete(self) -> list[Droplet]:
@@ -151,18 +446,35 @@ class DigitalOceanCluster:
         return DropletCluster(droplets=droplets, failed_droplets={})
 
     @staticmethod
-    def delete_cluster(tags: list[str] | DropletCluster) -> list[Droplet]:
+    def delete_cluster(
+        tags: list[str] | DropletCluster,
+        progress: Progress | None = None,
+        show_progress: bool = False,
+    ) -> list[Droplet]:
         ensure_doctl()
         if isinstance(tags, list):
             droplets = DropletManager.find_droplets(tags=tags)
         else:
             droplets = tags.droplets
+        if show_progress and progress is None:
+            progress = Progress("delete")
+        if progress is not None:
+            for droplet in droplets:
+                progress.add(droplet.name)
+
+        def _delete(droplet: Droplet) -> DropletException | None:
+            if progress is not None:
+                progress.set_phase(droplet.name, Phase.DELETING)
+            return droplet.delete()
+
+        with _rendering(progress, show_progress):
+            for droplet in droplets:
+                _submit_tracked(progress, droplet.name, _delete, droplet)
+            DigitalOceanCluster._wait_until_gone(droplets)
+        return droplets
 
-        def _delete(droplet: Droplet) -> None:
-            droplet.delete()
-
-        THREAD_POOL.map(_delete, droplets)
-        droplets = [d for d in droplets]
+    @staticmethod
+    def _wait_until_gone(droplets: list[Droplet]) -> None:
         timeout = time.time() + 60
         while time.time() < timeout:
             found_droplets = DropletManager.find_droplets()
@@ -178,27 +490,39 @@ class DigitalOceanCluster:
             time.sleep(1)
         else:
             raise TimeoutError("Timeout waiting for droplets to delete.")
-        return droplets
 
     @staticmethod
     def async_create_droplets(
         args: list[DropletCreationArgs],
+        progress: Progress | None = None,
     ) -> dict[str, Future[Droplet | Exception]]:
+        """Start creating every droplet of args. progress, if given, follows
+        each one from creating through cloud-init and install to ready."""
         ensure_doctl()
         # check that the names are unique
         names = [arg.name for arg in args]
         if len(names) != len(set(names)):
             raise ValueError("Names must be unique.")
+        # One key lookup per identity for the whole batch, not one per droplet.
+        account_keys: dict[Identity | None, SSHKey | DropletException] = {}
+        for arg in args:
+            if arg.ssh_key is None and arg.identity not in account_keys:
+                try:
+                    account_keys[arg.identity] = account_ssh_key(arg.identity)
+                except DropletException as e:
+                    account_keys[arg.identity] = e
         tmp: dict[str, Callable[[], Droplet | Exception]] = {}
         for arg in args:
             name = arg.name
-            ssh_key = arg.ssh_key
+            ssh_key = arg.ssh_key or account_keys[arg.identity]
+            identity = arg.identity
             tags = arg.tags
             size = arg.size
             image = arg.image
             region = arg.region
             install = arg.install
             enable_monitoring = arg.enable_monitoring
+            idempotency_key = arg.idempotency_key
 
             def task(
                 name=name,
@@ -208,7 +532,12 @@ class DigitalOceanCluster:
                 image=image,
                 region=region,
                 install=install,
+                enable_monitoring=enable_monitoring,
+                identity=identity,
+                idempotency_key=idempotency_key,
             ) -> Droplet | Exception:
+                if isinstance(ssh_key, DropletException):
+                    return ssh_key
                 droplet: Droplet | Exception = DropletManager.create_droplet(
                     name=name,
                     ssh_key=ssh_key,
@@ -218,10 +547,15 @@ class DigitalOceanCluster:
                     region=region,
                     check=False,
                     enable_monitoring=enable_monitoring,
+                    identity=identity,
+                    progress=progress,
+                    idempotency_key=idempotency_key,
                 )
                 if isinstance(droplet, Exception):
                     return droplet
                 if install is not None:
+                    if progress is not None:
+                        progress.set_phase(name, Phase.INSTALLING)
                     try:
                         install(droplet)
                     except Exception as e:
@@ -229,26 +563,39 @@ class DigitalOceanCluster:
                 return droplet
 
             tmp.update({name: task})
+        if progress is not None:
+            for name in tmp:
+                progress.add(name)
         out: dict[str, Future[Droplet | Exception]] = {}
         for name, tsk in tmp.items():
-            future = THREAD_POOL.submit(tsk)
+            future = _submit_tracked(progress, name, tsk)
             out[name] = future
         return out
 
     @staticmethod
     def create_droplets(
         args: list[DropletCreationArgs],
+        progress: Progress | None = None,
+        show_progress: bool = False,
     ) -> DropletCluster:
+        """Create the droplets of args and wait for all of them. With
+        show_progress a summary line is redrawn on stderr meanwhile."""
         ensure_doctl()
+        if show_progress and progress is None:
+            progress = Progress("create")
         futures: dict[str, Future[Droplet | Exception]] = (
-            DigitalOceanCluster.async_create_droplets(args)
+            DigitalOceanCluster.async_create_droplets(args, progress=progress)
         )
+        with _rendering(progress, show_progress):
+            wait(futures.values())
         droplets: list[Droplet] = []
         failed: dict[str, DropletException] = {}
         for name, future in futures.items():
             result = future.result()
             if isinstance(result, Exception):
-                failed[name] = DropletException(str(result))
+                failed[name] = DropletException.wrap(
+                    result, droplet=name, operation="create_droplet"
+                )
             else:
                 droplet = result
                 assert isinstance(droplet, Droplet)
@@ -256,10 +603,67 @@ class DigitalOceanCluster:
         cluster = DropletCluster(droplets=droplets, failed_droplets=failed)
         return cluster
 
+    @staticmethod
+    def create_placed_droplets(
+        args: list[DropletCreationArgs],
+        regions: list[Region | str],
+        policy: "PlacementPolicy | None" = None,
+        latencies: dict[str, float] | None = None,
+        capacity: dict[str, int] | None = None,
+    ) -> "PlacementResult":
+        """Spread args across regions (see placement.create_placed_droplets)."""
+        from digital_ocean_cluster.placement import (
+            PlacementPolicy,
+            create_placed_droplets,
+        )
+
+        return create_placed_droplets(
+            args,
+            regions,
+            policy=policy or PlacementPolicy.SPREAD,
+            latencies=latencies,
+            capacity=capacity,
+        )
+
+    @staticmethod
+    def create_droplets_replacing_stragglers(
+        args: list[DropletCreationArgs],
+        policy: "StragglerPolicy | None" = None,
+        progress: Progress | None = None,
+    ) -> "StragglerResult":
+        """create_droplets, racing a replacement against droplets that take
+        much longer than the rest (see straggler.create_with_stragglers)."""
+        from digital_ocean_cluster.straggler import create_with_stragglers
+
+        return create_with_stragglers(args, policy, progress)
+
+    @staticmethod
+    def plan_cluster(spec: "ClusterSpec") -> "ClusterPlan":
+        """What apply_cluster(spec) would create, keep, replace and delete."""
+        from digital_ocean_cluster.spec import plan_cluster
+
+        ensure_doctl()
+        return plan_cluster(spec)
+
+    @staticmethod
+    def apply_cluster(spec: "ClusterSpec") -> DropletCluster:
+        """Bring the droplets tagged with spec.tags in line with spec, only
+        touching the droplets that differ from it."""
+        from digital_ocean_cluster.spec import apply_plan, plan_cluster
+
+        ensure_doctl()
+        return apply_plan(plan_cluster(spec))
+
     @staticmethod
     def async_run_cluster_cmd(
-        droplets: list[Droplet], cmd: str
+        droplets: list[Droplet],
+        cmd: str,
+        timeout: float | None = None,
+        cancel: CancelToken | None = None,
+        retry: RetryPolicy | None = None,
     ) -> dict[Droplet, Future[CompletedProcess]]:
+        """Start cmd on every droplet. cmd is run once unless retry is given
+        (only for commands that are safe to repeat)."""
         ensure_doctl()
         # futures: list[Future[CompletedProcess]] = []
         droplet: Droplet
@@ -267,7 +671,9 @@ class DigitalOceanCluster:
         for droplet in droplets:
 
             def task(droplet: Droplet = droplet, cmd: str = cmd) -> CompletedProcess:
-                return droplet.ssh_exec(cmd)
+                return droplet.ssh_exec(
+                    cmd, timeout=timeout, cancel=cancel, retry=retry
+                )
 
             future = THREAD_POOL.submit(task)
             out[droplet] = future
@@ -275,17 +681,67 @@ class DigitalOceanCluster:
 
     @staticmethod
     def run_cluster_cmd(
-        droplets: list[Droplet], cmd: str
+        droplets: list[Droplet],
+        cmd: str,
+        timeout: float | None = None,
+        deadline: float | None = None,
+        retry: RetryPolicy | None = None,
     ) -> dict[Droplet, CompletedProcess]:
+        """Run cmd on every droplet. timeout bounds each droplet's command,
+        deadline bounds the whole cluster operation; see _collect_results.
+        With retry, failures that classify as retryable are run again."""
         ensure_doctl()
+        cancel = CancelToken()
         futures: dict[Droplet, Future[CompletedProcess]] = (
-            DigitalOceanCluster.async_run_cluster_cmd(droplets, cmd)
+            DigitalOceanCluster.async_run_cluster_cmd(
+                droplets, cmd, timeout=timeout, cancel=cancel, retry=retry
+            )
         )
-        out: dict[Droplet, CompletedProcess] = {}
-        for droplet, future in futures.items():
-            out[droplet] = future.result()
+        return _collect_results(futures, deadline, cancel)
+
+    @staticmethod
+    def async_run_cluster_script(
+        droplets: list[Droplet],
+        script: str | list[tuple[str, str]] | RemoteScript,
+        args: list[str] | None = None,
+        env: dict[str, str] | None = None,
+        timeout: float | None = None,
+        cancel: CancelToken | None = None,
+    ) -> dict[Droplet, Future[ScriptResult]]:
+        ensure_doctl()
+        if not isinstance(script, RemoteScript):
+            script = RemoteScript(script)
+        out: dict[Droplet, Future[ScriptResult]] = {}
+        for droplet in droplets:
+
+            def task(
+                droplet: Droplet = droplet, script: RemoteScript = script
+            ) -> ScriptResult:
+                return droplet.run_script(
+                    script, args, env, timeout=timeout, cancel=cancel
+                )
+
+            out[droplet] = THREAD_POOL.submit(task)
         return out
 
+    @staticmethod
+    def run_cluster_script(
+        droplets: list[Droplet],
+        script: str | list[tuple[str, str]] | RemoteScript,
+        args: list[str] | None = None,
+        env: dict[str, str] | None = None,
+        timeout: float | None = None,
+        deadline: float | None = None,
+    ) -> dict[Droplet, ScriptResult]:
+        ensure_doctl()
+        cancel = CancelToken()
+        futures: dict[Droplet, Future[ScriptResult]] = (
+            DigitalOceanCluster.async_run_cluster_script(
+                droplets, script, args, env, timeout=timeout, cancel=cancel
+            )
+        )
+        return _collect_results(futures, deadline, cancel)
+
     @staticmethod
     def async_run_cluster_function(
         droplets: list[Droplet], function: Callable[[Droplet], Any]
@@ -319,7 +775,12 @@ class DigitalOceanCluster:
                 result = future.result()
                 out[droplet] = result
             except Exception as e:
-                out[droplet] = DropletException(str(e))
+                out[droplet] = DropletException.wrap(
+                    e,
+                    droplet=droplet.name,
+                    droplet_id=droplet.id,
+                    operation=getattr(function, "__name__", None),
+                )
         return out
 
     @staticmethod
@@ -328,11 +789,21 @@ class DigitalOceanCluster:
         local_path: Path,
         remote_path: Path,
         chmod: str | None = None,
+        timeout: float | None = None,
+        cancel: CancelToken | None = None,
+        progress: Progress | None = None,
     ) -> dict[Droplet, Future[CompletedProcess]]:
+        """Start copying local_path to every droplet. progress, if given, is
+        credited with bytes as the transport sends them, for MB/s and ETA.
+        With scp (OpenSSHTransport) a droplet's bytes only arrive when its
+        copy completes. Bytes resent by a retry are not counted twice."""
         ensure_doctl()
+        size = path_size(local_path) if progress is not None else 0
         futures: dict[Droplet, Future[CompletedProcess]] = {}
         droplet: Droplet
         for droplet in droplets:
+            if progress is not None:
+                progress.add(droplet.name, bytes_total=size)
 
             def task(
                 droplet: Droplet = droplet,
@@ -340,9 +811,33 @@ class DigitalOceanCluster:
                 remote_path: Path = remote_path,
                 chmod: str | None = chmod,
             ) -> CompletedProcess:
-                return droplet.copy_to(local_path, remote_path, chmod)
+                if progress is None:
+                    return droplet.copy_to(
+                        local_path, remote_path, chmod, timeout=timeout, cancel=cancel
+                    )
+                progress.set_phase(droplet.name, Phase.COPYING)
+                credited = 0
+
+                def on_bytes(count: int) -> None:
+                    nonlocal credited
+                    count = min(count, size - credited)
+                    credited += count
+                    if count > 0:
+                        progress.add_bytes(droplet.name, count)
+
+                cp = droplet.copy_to(
+                    local_path,
+                    remote_path,
+                    chmod,
+                    timeout=timeout,
+                    cancel=cancel,
+                    on_bytes=on_bytes,
+                )
+                if cp.ok:
+                    on_bytes(size)
+                return cp
 
-            future = THREAD_POOL.submit(task)
+            future = _submit_tracked(progress, droplet.name, task)
             futures[droplet] = future
         return futures
 
@@ -352,21 +847,78 @@ class DigitalOceanCluster:
         local_path: Path,
         remote_path: Path,
         chmod: str | None = None,
+        timeout: float | None = None,
+        deadline: float | None = None,
+        progress: Progress | None = None,
+        show_progress: bool = False,
     ) -> dict[Droplet, CompletedProcess]:
         ensure_doctl()
+        cancel = CancelToken()
+        if show_progress and progress is None:
+            progress = Progress("copy")
         futures: dict[Droplet, Future[CompletedProcess]] = (
             DigitalOceanCluster.async_run_cluster_copy_to(
-                droplets, local_path, remote_path, chmod=chmod
+                droplets,
+                local_path,
+                remote_path,
+                chmod=chmod,
+                timeout=timeout,
+                cancel=cancel,
+                progress=progress,
             )
         )
-        out: dict[Droplet, CompletedProcess] = {}
-        for droplet, future in futures.items():
-            out[droplet] = future.result()
-        return out
+        with _rendering(progress, show_progress):
+            return _collect_results(futures, deadline, cancel)
+
+    @staticmethod
+    def async_run_cluster_write_bytes(
+        droplets: list[Droplet],
+        data: bytes,
+        remote_path: Path,
+        chmod: str | None = None,
+        timeout: float | None = None,
+        cancel: CancelToken | None = None,
+    ) -> dict[Droplet, Future[CompletedProcess]]:
+        ensure_doctl()
+        futures: dict[Droplet, Future[CompletedProcess]] = {}
+        for droplet in droplets:
+
+            def task(droplet: Droplet = droplet) -> CompletedProcess:
+                return droplet.write_bytes(
+                    data, remote_path, chmod, timeout=timeout, cancel=cancel
+                )
+
+            futures[droplet] = THREAD_POOL.submit(task)
+        return futures
+
+    @staticmethod
+    def run_cluster_write_bytes(
+        droplets: list[Droplet],
+        data: bytes,
+        remote_path: Path,
+        chmod: str | None = None,
+        timeout: float | None = None,
+        deadline: float | None = None,
+    ) -> dict[Droplet, CompletedProcess]:
+        ensure_doctl()
+        cancel = CancelToken()
+        futures: dict[Droplet, Future[CompletedProcess]] = (
+            DigitalOceanCluster.async_run_cluster_write_bytes(
+                droplets,
+                data,
+                remote_path,
+                chmod=chmod,
+                timeout=timeout,
+                cancel=cancel,
+            )
+        )
+        return _collect_results(futures, deadline, cancel)
 
     @staticmethod
     def async_run_cluster_copy_from(
         args: list[DropletCopyArgs],
+        timeout: float | None = None,
+        cancel: CancelToken | None = None,
     ) -> dict[Droplet, Future[CompletedProcess]]:
         ensure_doctl()
         out: dict[Droplet, Future[CompletedProcess]] = {}
@@ -378,7 +930,12 @@ class DigitalOceanCluster:
                 local_path: Path = arg.local_path,
                 remote_path: Path = arg.remote_path,
             ) -> CompletedProcess:
-                return droplet.copy_from(local_path, remote_path)
+                return droplet.copy_from(
+                    remote_path=remote_path,
+                    local_path=local_path,
+                    timeout=timeout,
+                    cancel=cancel,
+                )
 
             out[arg.droplet] = THREAD_POOL.submit(task)
         return out
@@ -386,12 +943,14 @@ class DigitalOceanCluster:
     @staticmethod
     def run_cluster_copy_from(
         args: list[DropletCopyArgs],
+        timeout: float | None = None,
+        deadline: float | None = None,
     ) -> dict[Droplet, CompletedProcess]:
         ensure_doctl()
+        cancel = CancelToken()
         futures: dict[Droplet, Future[CompletedProcess]] = (
-            DigitalOceanCluster.async_run_cluster_copy_from(args)
+            DigitalOceanCluster.async_run_cluster_copy_from(
+                args, timeout=timeout, cancel=cancel
+            )
         )
-        out: dict[Droplet, CompletedProcess] = {}
-        for droplet, future in futures.items():
-            out[droplet] = future.result()
-        return out
+        return _collect_results(futures, deadline, cancel)
@@ -0,0 +1,354 @@
+"""
+Build a project's wheel once and install it on every droplet.
+
+deploy_wheel runs four stages and reports the time spent in each:
+
+  * hash: sha256 of the project's source files (build_wheel.source_hash);
+  * build: the wheel, unless the local cache already has one built from the
+    same source (build_wheel.cached_wheel);
+  * upload: the wheel, at most once per droplet and only to droplets that do
+    not already have it, each over a single ssh session with the sha256
+    checked before it is renamed into place. With relay_fanout, only a few
+    seed droplets get it from here and serve it to the rest over the private
+    network; a droplet whose relay fetch fails gets a direct upload instead;
+  * install: pip install on every droplet in parallel, with a pip cache that
+    persists on the droplet across deploys. A droplet that already installed
+    this build is skipped.
+"""
+
+import hashlib
+import math
+import shlex
+import time
+from concurrent.futures import Future, wait
+from dataclasses import dataclass, field
+from pathlib import Path, PurePosixPath
+from typing import Callable
+
+from digital_ocean_cluster.build_wheel import cached_wheel, source_hash
+from digital_ocean_cluster.droplet import Droplet
+from digital_ocean_cluster.log import get_logger
+from digital_ocean_cluster.retry import DEFAULT_POLICY
+from digital_ocean_cluster.types import THREAD_POOL, CompletedProcess, DropletException
+
+logger = get_logger(__name__)
+
+REMOTE_DEPLOY_DIR = "/root/.cache/digital-ocean-cluster/deploy"
+RELAY_PORT = 5202
+# Seconds a relay server lives at most, in case it is not stopped.
+RELAY_LIFETIME = 600
+
+_ALREADY = "already-installed"
+
+# Fetches the wheel from a relay seed: url, destination.
+_RELAY_FETCH = (
+    "import shutil, sys, urllib.request\n"
+    "with urllib.request.urlopen(sys.argv[1], timeout=60) as r, "
+    "open(sys.argv[2], 'wb') as f:\n"
+    "    shutil.copyfileobj(r, f, 1 << 20)\n"
+)
+
+
+@dataclass
+class NodeDeploy:
+    droplet: Droplet
+    transfer: str = ""  # "present", "direct" or "relay"
+    upload_time: float = 0.0
+    install_time: float = 0.0
+    installed: bool = False  # False when this build was already installed
+    error: str = ""
+
+    @property
+    def ok(self) -> bool:
+        return not self.error
+
+
+@dataclass
+class DeployReport:
+    wheel: Path
+    source_digest: str
+    built: bool
+    # Wall time per stage: hash, build, upload, install.
+    stages: dict[str, float] = field(default_factory=dict)
+    nodes: dict[Droplet, NodeDeploy] = field(default_factory=dict)
+
+    @property
+    def ok(self) -> bool:
+        return all(node.ok for node in self.nodes.values())
+
+    @property
+    def failed(self) -> dict[Droplet, NodeDeploy]:
+        return {d: n for d, n in self.nodes.items() if not n.ok}
+
+    def transfers(self) -> dict[str, int]:
+        out: dict[str, int] = {}
+        for node in self.nodes.values():
+            if node.transfer:
+                out[node.transfer] = out.get(node.transfer, 0) + 1
+        return out
+
+    def __str__(self) -> str:
+        stages = " ".join(f"{k}={v:.2f}s" for k, v in self.stages.items())
+        transfers = ", ".join(f"{k} {v}" for k, v in sorted(self.transfers().items()))
+        installed = sum(n.installed for n in self.nodes.values())
+        return (
+            f"Deployed {self.wheel.name} ({'built' if self.built else 'cached'}) "
+            f"to {len(self.nodes)} droplets: {stages}; uploads: {transfers or 'none'}; "
+            f"installed {installed}, failed {len(self.failed)}"
+        )
+
+
+def _sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _verify_and_place(tmp: str, dest: str, sha: str) -> str:
+    return (
+        f"echo {shlex.quote(f'{sha}  {tmp}')} | sha256sum -c --status "
+        f"&& mv {shlex.quote(tmp)} {shlex.quote(dest)}"
+    )
+
+
+def _error(cp: CompletedProcess) -> str:
+    return cp.stderr.strip() or f"exit {cp.returncode}"
+
+
+class _Deployment:
+    """The state of one deploy_wheel call."""
+
+    def __init__(
+        self,
+        droplets: list[Droplet],
+        wheel: Path,
+        digest: str,
+        remote_dir: str,
+        python: str,
+        pip_args: list[str],
+        timeout: float | None,
+    ) -> None:
+        self.droplets = droplets
+        self.wheel = wheel
+        self.sha = _sha256(wheel)
+        self.data = wheel.read_bytes()
+        self.key = digest[:16]
+        root = PurePosixPath(remote_dir)
+        self.wheel_dir = root / "wheels"
+        # The build's own directory, as wheels of one version may differ.
+        self.remote_wheel = str(self.wheel_dir / self.key / wheel.name)
+        self.pip_cache = str(root / "pip")
+        self.marker = str(root / f"installed-{self.key}")
+        self.python = python
+        self.pip_args = pip_args
+        self.timeout = timeout
+        self.nodes = {d: NodeDeploy(d) for d in droplets}
+        # Relay url per seed whose relay server is running.
+        self.relays: dict[Droplet, str] = {}
+
+    def _map(self, droplets: list[Droplet], fn: Callable[[Droplet], None]) -> None:
+        """Run fn on every droplet in parallel, recording what it raises as
+        the droplet's error."""
+        futures: dict[Droplet, Future[None]] = {
+            d: THREAD_POOL.submit(fn, d) for d in droplets
+        }
+        wait(futures.values())
+        for droplet, future in futures.items():
+            error = future.exception()
+            if error is not None:
+                self.nodes[droplet].error = str(error)
+
+    def _has_wheel(self, droplet: Droplet) -> None:
+        cp = droplet.ssh_exec(
+            f"test -f {shlex.quote(self.remote_wheel)} && "
+            f"echo {shlex.quote(f'{self.sha}  {self.remote_wheel}')} "
+            "| sha256sum -c --status",
+            timeout=self.timeout,
+        )
+        if cp.ok:
+            self.nodes[droplet].transfer = "present"
+
+    def _upload(self, droplet: Droplet) -> None:
+        node = self.nodes[droplet]
+        start = time.monotonic()
+        tmp = f"{self.remote_wheel}.tmp"
+        parent = str(PurePosixPath(self.remote_wheel).parent)
+        cp = droplet.ssh_exec(
+            f"mkdir -p {shlex.quote(parent)} && cat > {shlex.quote(tmp)} && "
+            + _verify_and_place(tmp, self.remote_wheel, self.sha),
+            timeout=self.timeout,
+            input=self.data,
+            retry=DEFAULT_POLICY,
+        )
+        node.upload_time += time.monotonic() - start
+        if cp.ok:
+            node.transfer = "direct"
+            node.error = ""
+        else:
+            node.error = f"upload failed: {_error(cp)}"
+
+    def _pid_file(self, port: int) -> str:
+        return shlex.quote(f"{self.wheel_dir}/relay-{port}.pid")
+
+    def _start_relay(self, seed: Droplet, port: int) -> None:
+        """Serve the wheel from seed over the private network, recording its
+        url in self.relays if that worked."""
+        try:
+            seed_ip = seed.private_ip()
+            cp = seed.ssh_exec(
+                f"setsid nohup timeout {RELAY_LIFETIME} python3 -m http.server "
+                f"{port} --bind {seed_ip} "
+                f"--directory {shlex.quote(str(self.wheel_dir))} "
+                f"</dev/null >/dev/null 2>&1 & echo $! > {self._pid_file(port)}",
+                timeout=self.timeout,
+            )
+            error = "" if cp.ok else _error(cp)
+        except DropletException as e:
+            error = str(e)
+        if error:
+            logger.warning(
+                "Could not start relay, its peers upload directly: %s",
+                error,
+                extra={"droplet": seed.name},
+            )
+            return
+        self.relays[seed] = f"http://{seed_ip}:{port}/{self.key}/{self.wheel.name}"
+
+    def _stop_relay(self, seed: Droplet, port: int) -> None:
+        pid_file = self._pid_file(port)
+        seed.ssh_exec(
+            f"kill $(cat {pid_file}) 2>/dev/null; rm -f {pid_file}; true",
+            timeout=self.timeout,
+        )
+
+    def _fetch(self, peer: Droplet, seed: Droplet) -> None:
+        """Get the wheel onto peer from seed's relay, or upload it directly
+        if seed has none or the fetch fails."""
+        url = self.relays.get(seed)
+        if url is None:
+            self._upload(peer)
+            return
+        node = self.nodes[peer]
+        start = time.monotonic()
+        tmp = f"{self.remote_wheel}.tmp"
+        parent = str(PurePosixPath(self.remote_wheel).parent)
+        fetch = (
+            f"mkdir -p {shlex.quote(parent)} && "
+            f"python3 -c {shlex.quote(_RELAY_FETCH)} "
+            f"{shlex.quote(url)} {shlex.quote(tmp)} && "
+            + _verify_and_place(tmp, self.remote_wheel, self.sha)
+        )
+        # The server may take a moment to listen.
+        for _ in range(3):
+            cp = peer.ssh_exec(fetch, timeout=self.timeout)
+            if cp.ok:
+                break
+            time.sleep(0.5)
+        node.upload_time += time.monotonic() - start
+        if cp.ok:
+            node.transfer = "relay"
+        else:
+            logger.info(
+                "Relay fetch failed, uploading directly: %s",
+                _error(cp),
+                extra={"droplet": peer.name},
+            )
+            self._upload(peer)
+
+    def upload(self, relay_fanout: int | None, relay_port: int) -> None:
+        # Every stage is one flat _map from this thread: a pool worker that
+        # waited on more pool work could deadlock once the pool is full.
+        self._map(self.droplets, self._has_wheel)
+        missing = [d for d in self.droplets if not self.nodes[d].transfer]
+        if not relay_fanout or len(missing) < 2:
+            self._map(missing, self._upload)
+            return
+        seeds = missing[: math.ceil(len(missing) / (relay_fanout + 1))]
+        self._map(seeds, self._upload)
+        ready = [s for s in seeds if self.nodes[s].ok]
+        peers = missing[len(seeds) :]
+        if not ready:
+            self._map(peers, self._upload)
+            return
+        seed_of = {peer: ready[i % len(ready)] for i, peer in enumerate(peers)}
+        self._map(ready, lambda seed: self._start_relay(seed, relay_port))
+        try:
+            self._map(peers, lambda peer: self._fetch(peer, seed_of[peer]))
+        finally:
+            self._map(
+                list(self.relays), lambda seed: self._stop_relay(seed, relay_port)
+            )
+
+    def _install(self, droplet: Droplet) -> None:
+        node = self.nodes[droplet]
+        if not node.ok:
+            return
+        start = time.monotonic()
+        wheel = shlex.quote(self.remote_wheel)
+        pip = (
+            f"PIP_CACHE_DIR={shlex.quote(self.pip_cache)} {self.python} -m pip "
+            f"install --quiet {' '.join(shlex.quote(a) for a in self.pip_args)}"
+        ).rstrip()
+        marker = shlex.quote(self.marker)
+        # The first install brings in dependencies; the second replaces the
+        # package even if its version did not change.
+        cp = droplet.ssh_exec(
+            f"if [ -f {marker} ]; then echo {_ALREADY}; else "
+            f"{pip} {wheel} && {pip} --force-reinstall --no-deps {wheel} && "
+            f"rm -f {shlex.quote(str(PurePosixPath(self.marker).parent))}/installed-* "
+            f"&& touch {marker}; fi",
+            timeout=self.timeout,
+        )
+        node.install_time = time.monotonic() - start
+        if not cp.ok:
+            node.error = f"install failed: {_error(cp)}"
+        else:
+            node.installed = _ALREADY not in cp.stdout
+
+    def install(self) -> None:
+        self._map(self.droplets, self._install)
+
+
+def deploy_wheel(
+    droplets: list[Droplet],
+    project: Path,
+    python: str = "python3",
+    pip_args: list[str] | None = None,
+    relay_fanout: int | None = None,
+    relay_port: int = RELAY_PORT,
+    remote_dir: str = REMOTE_DEPLOY_DIR,
+    cache_dir: Path | None = None,
+    timeout: float | None = 600.0,
+) -> DeployReport:
+    """Build project (a source tree, or an already built .whl) and install it
+    on every droplet, see the module docstring. python is the interpreter
+    on the droplets, pip_args are added to the pip installs (e.g.
+    ["--break-system-packages"] for the system python of recent Ubuntus)."""
+    stages: dict[str, float] = {}
+    start = time.monotonic()
+    if project.suffix == ".whl":
+        wheel, built, digest = project, False, _sha256(project)
+        stages["hash"] = time.monotonic() - start
+        stages["build"] = 0.0
+    else:
+        digest = source_hash(project)
+        stages["hash"] = time.monotonic() - start
+        start = time.monotonic()
+        wheel, built = cached_wheel(project, digest, cache_dir)
+        stages["build"] = time.monotonic() - start
+    deployment = _Deployment(
+        droplets, wheel, digest, remote_dir, python, pip_args or [], timeout
+    )
+    start = time.monotonic()
+    deployment.upload(relay_fanout, relay_port)
+    stages["upload"] = time.monotonic() - start
+    start = time.monotonic()
+    deployment.install()
+    stages["install"] = time.monotonic() - start
+    report = DeployReport(wheel, digest, built, stages, deployment.nodes)
+    logger.info("%s", report)
+    for droplet, node in report.failed.items():
+        logger.warning("Deploy failed: %s", node.error, extra={"droplet": droplet.name})
+    return report
@@ -1,26 +1,60 @@
 import os
+import shlex
 import subprocess
 import time
 import warnings
 from concurrent.futures import Future
 from pathlib import Path
-from tempfile import TemporaryDirectory
-from typing import Any
+from typing import IO, TYPE_CHECKING, Any, Callable
 
 from digital_ocean_cluster.ensure_doctl import ensure_doctl
-from digital_ocean_cluster.locked_print import locked_print
-from digital_ocean_cluster.types import THREAD_POOL, CompletedProcess, DropletException
+from digital_ocean_cluster.identity import (  # noqa: F401
+    Identity,
+    get_identity,
+    get_private_key,
+)
+from digital_ocean_cluster.known_hosts import known_hosts_store
+from digital_ocean_cluster.log import get_logger
+from digital_ocean_cluster.process import CancelToken, deadline_from, remaining
+from digital_ocean_cluster.remote_script import RemoteScript, ScriptResult, run_script
+from digital_ocean_cluster.retry import (
+    DEFAULT_POLICY,
+    ClassifiedError,
+    ErrorClass,
+    RetryPolicy,
+    retry_call,
+    run_with_retry,
+)
+from digital_ocean_cluster.transport import (  # noqa: F401
+    WINDOWS_OPENSSH,
+    Transport,
+    get_transport,
+)
+from digital_ocean_cluster.types import (
+    THREAD_POOL,
+    CommandError,
+    CompletedProcess,
+    DropletException,
+)
+
+if TYPE_CHECKING:
+    from digital_ocean_cluster.agent_client import AgentClient
+
+logger = get_logger(__name__)
 
 _TIME_DELETE_BEFORE_GONE = 10
 
 
-WINDOWS_OPENSSH = "C:\\Windows\\System32\\OpenSSH\\ssh.exe"
-
-
-def get_private_key() -> str:
-    """Get public key."""
-    home = Path.home()
-    return str(home / ".ssh/id_rsa")
+def _write_command(remote_path: Path, chmod: str | None = None) -> str:
+    """Remote command that stores stdin at remote_path via a temp file and an
+    atomic rename, so readers never see a partially written file."""
+    path = shlex.quote(remote_path.as_posix())
+    parent = shlex.quote(remote_path.parent.as_posix())
+    tmp = shlex.quote(remote_path.as_posix() + ".tmp.") + "$$"
+    cmd = f"mkdir -p {parent} && cat > {tmp}"
+    if chmod:
+        cmd += f" && chmod {shlex.quote(chmod)} {tmp}"
+    return f"{{ {cmd} && mv -f {tmp} {path}; }} || {{ rm -f {tmp}; exit 1; }}"
 
 
 class Droplet:
@@ -29,6 +63,8 @@ class Droplet:
         self.id = data["id"]
         self.name = data["name"]
         self.data = data
+        self._transport: Transport | None = None
+        self._identity: Identity | None = None
         assert self.tags is not None, f"No tags found for droplet: {self.name}"
 
     @property
@@ -37,7 +73,19 @@ class Droplet:
             return self.data["tags"]
         return []
 
+    def _payload_ip(self, kind: str) -> str | None:
+        """IPv4 address of the given type ("public"/"private") from the droplet
+        payload, which avoids a doctl round trip."""
+        networks = self.data.get("networks") or {}
+        for net in networks.get("v4") or []:
+            if net.get("type") == kind and net.get("ip_address"):
+                return net["ip_address"]
+        return None
+
     def public_ip(self) -> str:
+        ip = self._payload_ip("public")
+        if ip:
+            return ip
         doctl = str(ensure_doctl())
         cmd_list = [
             doctl,
@@ -49,165 +97,331 @@ class Droplet:
             "PublicIPv4",
             "--no-header",
         ]
-        for _ in range(10):
-            try:
-                cp = subprocess.run(
-                    cmd_list, capture_output=True, text=True, shell=False
+
+        def _lookup() -> str:
+            cp = subprocess.run(cmd_list, capture_output=True, text=True, shell=False)
+            if cp.returncode != 0:
+                raise CommandError.from_process(
+                    "Error getting public IP",
+                    cp,
+                    droplet=self.name,
+                    droplet_id=self.id,
+                    operation="public_ip",
+                )
+            ip = cp.stdout.strip()
+            if not ip:
+                # Not assigned yet right after creation.
+                raise ClassifiedError(
+                    "No public IP found.",
+                    ErrorClass.TRANSIENT,
+                    droplet=self.name,
+                    droplet_id=self.id,
+                    operation="public_ip",
                 )
-                if cp.returncode != 0:
-                    raise DropletException(f"Error getting public IP: {cp.stderr}")
-                ip = cp.stdout.strip()
-                if not ip:
-                    raise DropletException("No public IP found.")
-                return ip
-            except DropletException as e:
-                locked_print(f"Error getting public IP: {e}, waiting")
-                time.sleep(1)
-        raise DropletException(f"Failed to get public IP for droplet: {self.name}")
-
-    def ssh_exec(self, command: str) -> CompletedProcess:
-        key_path = get_private_key()
-        public_ip = self.public_ip()
-
-        with TemporaryDirectory() as tmpdir:
-            known_hosts = Path(tmpdir) / "known_hosts"
-            known_hosts.touch()  # Create empty known_hosts file
+            return ip
 
-            cmd_list = [
-                WINDOWS_OPENSSH,
-                "-n",  # prevents reading from stdin
-                "-o",
-                "BatchMode=yes",
-                "-o",
-                f"UserKnownHostsFile={known_hosts}",
-                "-o",
-                "StrictHostKeyChecking=no",
-                "-i",
-                key_path,
-                f"root@{public_ip}",
-                command,
-            ]
-            cmd_str = subprocess.list2cmdline(cmd_list)
-            locked_print(f"Executing: {cmd_str}")
-            proc: subprocess.Popen = subprocess.Popen(
-                cmd_list, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+        return retry_call("public_ip", _lookup, droplet=self.name)
+
+    def private_ip(self) -> str:
+        """Address on the region's VPC; traffic between droplets should use it."""
+        ip = self._payload_ip("private")
+        if ip:
+            return ip
+        doctl = str(ensure_doctl())
+        cmd_list = [
+            doctl,
+            "compute",
+            "droplet",
+            "get",
+            str(self.id),
+            "--format",
+            "PrivateIPv4",
+            "--no-header",
+        ]
+        cp = run_with_retry(cmd_list, "private_ip", droplet=self.name)
+        ip = cp.stdout.strip()
+        if cp.returncode != 0 or not ip:
+            raise CommandError.from_process(
+                "Failed to get private IP",
+                cp,
+                droplet=self.name,
+                droplet_id=self.id,
+                operation="private_ip",
             )
-            stdout, stderr = proc.communicate(input="\n")
-            cp: subprocess.CompletedProcess = subprocess.CompletedProcess(
-                cmd_list, proc.returncode, stdout.decode(), stderr.decode()
+        return ip
+
+    @property
+    def transport(self) -> Transport:
+        """How commands and files reach this droplet; the process wide
+        transport unless one was assigned to this droplet."""
+        return self._transport or get_transport()
+
+    @transport.setter
+    def transport(self, transport: Transport | None) -> None:
+        self._transport = transport
+
+    @property
+    def identity(self) -> Identity:
+        """The SSH identity to log in with; the process wide one unless the
+        droplet was created with its own."""
+        return self._identity or get_identity()
+
+    @identity.setter
+    def identity(self, identity: Identity | None) -> None:
+        self._identity = identity
+
+    def ssh_cmd_list(self, command: str, stdin: bool = False) -> list[str]:
+        """A local process running command on this droplet, for sessions."""
+        return self.transport.session_cmd_list(self, command, stdin=stdin)
+
+    def ssh_exec(
+        self,
+        command: str,
+        timeout: float | None = None,
+        cancel: CancelToken | None = None,
+        input: bytes | None = None,  # pylint: disable=redefined-builtin
+        stdout: IO[bytes] | None = None,
+        retry: RetryPolicy | None = None,
+    ) -> CompletedProcess:
+        """Run command on the droplet. On timeout or cancellation the command
+        is killed and the result has timed_out/cancelled set. If input is given
+        it is piped to the remote command's stdin; if stdout is given the remote
+        output is streamed into it instead of being captured.
+
+        Commands are not retried unless retry is given, since they may not be
+        safe to run twice; timeout then bounds all attempts together."""
+        if retry is None:
+            return self.transport.exec(
+                self,
+                command,
+                timeout=timeout,
+                cancel=cancel,
+                input=input,
+                stdout=stdout,
             )
-            return CompletedProcess(cmd_list, cp)
+        deadline = deadline_from(timeout)
+        return retry_call(
+            "ssh_exec",
+            lambda: self.transport.exec(
+                self,
+                command,
+                timeout=remaining(deadline),
+                cancel=cancel,
+                input=input,
+                stdout=stdout,
+            ),
+            retry,
+            cancel=cancel,
+            droplet=self.name,
+            deadline=deadline,
+        )
 
     def copy_to(
-        self, src: Path, dest: Path, chmod: str | None = None
+        self,
+        src: Path,
+        dest: Path,
+        chmod: str | None = None,
+        timeout: float | None = None,
+        cancel: CancelToken | None = None,
+        retry: RetryPolicy = DEFAULT_POLICY,
+        on_bytes: Callable[[int], None] | None = None,
     ) -> CompletedProcess:
+        """Copy src to dest on the droplet. timeout bounds the whole operation,
+        including the mkdir and chmod round trips. Each step is retried on
+        transient errors, as they are all safe to repeat. on_bytes is passed
+        to Transport.upload, so a retried upload reports its bytes again."""
         assert src.exists(), f"Source file does not exist: {src}"
-        key_path = get_private_key()
-
-        with TemporaryDirectory() as tmpdir:
-            known_hosts = Path(tmpdir) / "known_hosts"
-            known_hosts.touch()  # Create empty known_hosts file
-
-            cmd_list = [
-                "scp",
-                "-o",
-                f"UserKnownHostsFile={known_hosts}",
-                "-o",
-                "StrictHostKeyChecking=no",
-                "-i",
-                key_path,
-            ]
-
-            # Add recursive flag if source is a directory
-            if src.is_dir():
-                cmd_list.append("-r")
-
-            cmd_list.extend(
-                [
-                    str(src),
-                    f"root@{self.public_ip()}:{dest.as_posix()}",
-                ]
+        deadline = deadline_from(timeout)
+        # make sure the destination directory exists
+        mkdir = self.ssh_exec(
+            f"mkdir -p {dest.parent.as_posix()}",
+            timeout=remaining(deadline),
+            cancel=cancel,
+            retry=retry,
+        )
+        if mkdir.timed_out or mkdir.cancelled:
+            return mkdir
+        out = retry_call(
+            "copy_to",
+            lambda: self.transport.upload(
+                self,
+                src,
+                dest,
+                timeout=remaining(deadline),
+                cancel=cancel,
+                on_bytes=on_bytes,
+            ),
+            retry,
+            cancel=cancel,
+            droplet=self.name,
+            deadline=deadline,
+        )
+        if not out.ok:
+            logger.warning(
+                "Error copying %s to %s: %s",
+                src,
+                dest,
+                out.stderr,
+                extra={"droplet": self.name},
             )
-            cmd_str = subprocess.list2cmdline(cmd_list)
-
-            # make sure the destination directory exists
-            self.ssh_exec(f"mkdir -p {dest.parent.as_posix()}")
-            locked_print(f"Executing: {cmd_str}")
-            cp = subprocess.run(cmd_list, capture_output=True, text=True)
-            if cp.returncode != 0:
-                warnings.warn(f"Error copying file: {cp.stderr}")
-            if chmod:
-                chmod_path = dest.as_posix()
-                if src.is_dir():
-                    # Apply chmod recursively for directories
-                    self.ssh_exec(f"chmod -R {chmod} {chmod_path}")
-                else:
-                    self.ssh_exec(f"chmod {chmod} {chmod_path}")
-            out = CompletedProcess(cmd_list, cp)
             return out
-
-    def copy_from(self, remote_path: Path, local_path: Path) -> CompletedProcess:
-        key_path = get_private_key()
-
-        with TemporaryDirectory() as tmpdir:
-            known_hosts = Path(tmpdir) / "known_hosts"
-            known_hosts.touch()  # Create empty known_hosts file
-
-            cmd_list = [
-                "scp",
-                "-o",
-                f"UserKnownHostsFile={known_hosts}",
-                "-o",
-                "StrictHostKeyChecking=no",
-                "-i",
-                key_path,
-            ]
-
-            # Check if remote path is a directory
-            check_dir = self.ssh_exec(
-                f"test -d {remote_path} && echo 'DIR' || echo 'FILE'"
+        if chmod:
+            chmod_path = dest.as_posix()
+            if src.is_dir():
+                # Apply chmod recursively for directories
+                chmod_cmd = f"chmod -R {chmod} {chmod_path}"
+            else:
+                chmod_cmd = f"chmod {chmod} {chmod_path}"
+            chmod_cp = self.ssh_exec(
+                chmod_cmd, timeout=remaining(deadline), cancel=cancel, retry=retry
             )
-            is_dir = "DIR" in check_dir.stdout
-
-            # Add recursive flag if source is a directory
-            if is_dir:
-                cmd_list.append("-r")
-
-            # Make sure the local directory exists
-            local_path.parent.mkdir(parents=True, exist_ok=True)
-
-            cmd_list.extend(
-                [
-                    f"root@{self.public_ip()}:{remote_path}",
-                    str(local_path),
-                ]
+            if not chmod_cp.ok:
+                return chmod_cp
+        return out
+
+    def copy_from(
+        self,
+        remote_path: Path,
+        local_path: Path,
+        timeout: float | None = None,
+        cancel: CancelToken | None = None,
+        retry: RetryPolicy = DEFAULT_POLICY,
+    ) -> CompletedProcess:
+        deadline = deadline_from(timeout)
+
+        # Check if remote path is a directory
+        check_dir = self.ssh_exec(
+            f"test -d {remote_path} && echo 'DIR' || echo 'FILE'",
+            timeout=remaining(deadline),
+            cancel=cancel,
+            retry=retry,
+        )
+        if check_dir.timed_out or check_dir.cancelled:
+            return check_dir
+        is_dir = "DIR" in check_dir.stdout
+
+        # Make sure the local directory exists
+        local_path.parent.mkdir(parents=True, exist_ok=True)
+
+        cp = retry_call(
+            "copy_from",
+            lambda: self.transport.download(
+                self,
+                remote_path,
+                local_path,
+                recursive=is_dir,
+                timeout=remaining(deadline),
+                cancel=cancel,
+            ),
+            retry,
+            cancel=cancel,
+            droplet=self.name,
+            deadline=deadline,
+        )
+        if not cp.ok:
+            logger.warning(
+                "Error copying %s from the droplet: %s",
+                remote_path,
+                cp.stderr,
+                extra={"droplet": self.name},
             )
-
-            cmd_str = subprocess.list2cmdline(cmd_list)
-            locked_print(f"Executing: {cmd_str}")
-            cp = subprocess.run(cmd_list, capture_output=True, text=True)
-            if cp.returncode != 0:
-                warnings.warn(f"Error copying file: {cp.stderr}")
-            return CompletedProcess(cmd_list, cp)
+        return cp
+
+    def write_bytes(
+        self,
+        data: bytes,
+        remote_path: Path,
+        chmod: str | None = None,
+        timeout: float | None = None,
+        cancel: CancelToken | None = None,
+        retry: RetryPolicy = DEFAULT_POLICY,
+    ) -> CompletedProcess:
+        """Pipe data over a single ssh session into remote_path, creating the
+        parent directory, applying chmod and renaming atomically into place.
+        The atomic rename makes this safe to retry."""
+        return self.ssh_exec(
+            _write_command(remote_path, chmod),
+            timeout=timeout,
+            cancel=cancel,
+            input=data,
+            retry=retry,
+        )
+
+    def write_text(
+        self,
+        text: str,
+        remote_path: Path,
+        chmod: str | None = None,
+        timeout: float | None = None,
+        cancel: CancelToken | None = None,
+    ) -> CompletedProcess:
+        return self.write_bytes(
+            text.encode("utf-8"), remote_path, chmod, timeout=timeout, cancel=cancel
+        )
+
+    def read_bytes(
+        self,
+        remote_path: Path,
+        timeout: float | None = None,
+        cancel: CancelToken | None = None,
+    ) -> bytes:
+        cp = self.ssh_exec(
+            "cat " + shlex.quote(remote_path.as_posix()),
+            timeout=timeout,
+            cancel=cancel,
+            retry=DEFAULT_POLICY,
+        )
+        if not cp.ok:
+            raise CommandError.from_process(
+                f"Error reading {remote_path}",
+                cp,
+                droplet=self.name,
+                droplet_id=self.id,
+                operation="read_bytes",
+            )
+        return cp.stdout_bytes
 
     def copy_text_to(
-        self, text: str, remote_path: Path, chmod: str | None = None
+        self,
+        text: str,
+        remote_path: Path,
+        chmod: str | None = None,
+        timeout: float | None = None,
+        cancel: CancelToken | None = None,
     ) -> CompletedProcess:
-        with TemporaryDirectory() as tmpdir:
-            tmp = Path(tmpdir) / "tmp.txt"
-            with open(tmp, "w", newline="\n") as f:
-                f.write(text)
-            out = self.copy_to(tmp, remote_path, chmod)
-            return out
+        return self.write_text(text, remote_path, chmod, timeout=timeout, cancel=cancel)
 
-    def copy_text_from(self, remote_path: Path) -> CompletedProcess:
+    def copy_text_from(
+        self,
+        remote_path: Path,
+        timeout: float | None = None,
+        cancel: CancelToken | None = None,
+    ) -> CompletedProcess:
         cmd = "cat " + remote_path.as_posix()
-        results = self.ssh_exec(cmd)
+        results = self.ssh_exec(cmd, timeout=timeout, cancel=cancel)
         return results
 
+    def run_script(
+        self,
+        script: str | list[tuple[str, str]] | RemoteScript,
+        args: list[str] | None = None,
+        env: dict[str, str] | None = None,
+        timeout: float | None = None,
+        cancel: CancelToken | None = None,
+    ) -> ScriptResult:
+        if not isinstance(script, RemoteScript):
+            script = RemoteScript(script)
+        return run_script(self, script, args, env, timeout=timeout, cancel=cancel)
+
+    def start_agent(self, wheel: Path | None = None) -> "AgentClient":
+        """Start the remote worker agent for low latency RPC, see agent_client."""
+        from digital_ocean_cluster.agent_client import start_agent
+
+        return start_agent(self, wheel)
+
     def delete(self) -> DropletException | None:
         try:
-            locked_print(f"Deleting droplet: {self.name}")
+            logger.info("Deleting droplet: %s", self.name, extra={"droplet": self.name})
             # get_digital_ocean().compute.droplet.delete(str(self.id))
             # cmd_str = f"doctl compute droplet delete {self.id} --force --output json --interactive=false"
             doctl = str(ensure_doctl())
@@ -222,33 +436,85 @@ class Droplet:
                 "json",
                 "--interactive=false",
             ]
-            cp = subprocess.run(cmd_list, capture_output=True, text=True, shell=False)
+            cp = run_with_retry(cmd_list, "delete_droplet", droplet=self.name)
             if cp.returncode != 0:
                 warnings.warn(f"Error deleting droplet: {cp.stderr}")
-                # locked_print path to doctl
+                # log path to doctl
                 env_paths = Path(os.environ["PATH"]).parts
                 warnings.warn(f"PATH: {env_paths}")
-                return None
+                # Still there: keep trusting its host key.
+                return CommandError.from_process(
+                    "Error deleting droplet",
+                    cp,
+                    droplet=self.name,
+                    droplet_id=self.id,
+                    operation="delete_droplet",
+                )
         except DropletException as e:
             warnings.warn(f"Error deleting droplet: {e}")
             return e
+        # The IP may go to another droplet; don't keep trusting its old key.
+        ips = [self._payload_ip("public"), self._payload_ip("private")]
+        known_hosts_store().forget(*[ip for ip in ips if ip])
         time.sleep(_TIME_DELETE_BEFORE_GONE)
-        if cp.returncode != 0:
-            return DropletException(f"Error deleting droplet {self.name}: {cp.stderr}")
         return None
 
+    def rename(self, name: str) -> None:
+        """Rename the droplet in the API (its hostname is left as it is)."""
+        doctl = str(ensure_doctl())
+        cmd_list = [
+            doctl,
+            "compute",
+            "droplet-action",
+            "rename",
+            str(self.id),
+            "--droplet-name",
+            name,
+            "--wait",
+            "--interactive=false",
+        ]
+        cp = run_with_retry(cmd_list, "rename_droplet", droplet=self.name)
+        if cp.returncode != 0:
+            raise CommandError.from_process(
+                f"Error renaming droplet to {name}",
+                cp,
+                droplet=self.name,
+                droplet_id=self.id,
+                operation="rename_droplet",
+            )
+        self.name = name
+        self.data["name"] = name
+
     def async_delete(self) -> Future[DropletException | None]:
 
         return THREAD_POOL.submit(self.delete)
 
     def is_valid(self) -> bool:
-        from digital_ocean_cluster.droplet_manager import DropletManager
-
-        tmp_list: list[Droplet] = DropletManager.list_droplets()
-        for droplet in tmp_list:
-            if droplet.id == self.id:
-                return True
-        return False
+        """Whether the droplet still exists. Looks up this droplet only instead
+        of listing the whole account."""
+        doctl = str(ensure_doctl())
+        cmd_list = [
+            doctl,
+            "compute",
+            "droplet",
+            "get",
+            str(self.id),
+            "--output",
+            "json",
+            "--interactive=false",
+        ]
+        cp = run_with_retry(cmd_list, "get_droplet", droplet=self.name)
+        if cp.returncode == 0:
+            return True
+        if "404" in cp.stderr or "not found" in cp.stderr.lower():
+            return False
+        raise CommandError.from_process(
+            "Error checking droplet",
+            cp,
+            droplet=self.name,
+            droplet_id=self.id,
+            operation="get_droplet",
+        )
 
     def __str__(self) -> str:
         return f"Droplet: {self.name} {self.id}"
@@ -1,19 +1,35 @@
 import json
 import subprocess
 import time
+import uuid
 import warnings
+from typing import Any
 
 from digital_ocean_cluster.droplet import Droplet
 from digital_ocean_cluster.ensure_doctl import ensure_doctl
-from digital_ocean_cluster.locked_print import locked_print
-from digital_ocean_cluster.machines import ImageType, MachineSize, Region
+from digital_ocean_cluster.identity import Identity, account_ssh_key
+from digital_ocean_cluster.known_hosts import known_hosts_store
+from digital_ocean_cluster.log import get_logger
+from digital_ocean_cluster.machines import ImageType, MachineSize, Region, to_slug
+from digital_ocean_cluster.progress import Phase, Progress
+from digital_ocean_cluster.retry import (
+    DEFAULT_POLICY,
+    RetryPolicy,
+    retry_call,
+    run_with_retry,
+)
 from digital_ocean_cluster.settings import SLEEP_TIME_BEFORE_SSH
 from digital_ocean_cluster.types import (
     Authentication,
+    CommandError,
     DropletException,
     SSHKey,
 )
 
+logger = get_logger(__name__)
+
+IDEMPOTENCY_TAG_PREFIX = "create-key:"
+
 
 class DropletManager:
 
@@ -29,7 +45,7 @@ class DropletManager:
             "--interactive=false",
         ]
         # cmd_str = subprocess.list2cmdline(cmd_list)
-        cp = subprocess.run(cmd_list, capture_output=True, text=True, shell=False)
+        cp = run_with_retry(cmd_list, "account_get")
         if cp.returncode != 0:
             warnings.warn(f"Error checking authentication: {cp.stderr}")
             return None
@@ -50,12 +66,42 @@ class DropletManager:
             "--output=json",
             "--interactive=false",
         ]
-        cp = subprocess.run(cmd_list, capture_output=True, text=True, shell=False)
+        cp = run_with_retry(cmd_list, "list_machines")
         if cp.returncode != 0:
-            raise DropletException(f"Error listing machines: {cp.stderr}")
+            raise CommandError.from_process(
+                "Error listing machines", cp, operation="list_machines"
+            )
         data = json.loads(cp.stdout)
         return [d["slug"] for d in data]
 
+    @staticmethod
+    def _doctl_json(args: list[str], what: str) -> Any:
+        doctl = str(ensure_doctl())
+        cmd_list: list[str] = [doctl] + args + ["--output=json", "--interactive=false"]
+        cp = run_with_retry(cmd_list, f"list_{what}")
+        if cp.returncode != 0:
+            raise CommandError.from_process(
+                f"Error listing {what}", cp, operation=f"list_{what}"
+            )
+        return json.loads(cp.stdout)
+
+    @staticmethod
+    def list_sizes() -> list[dict[str, Any]]:
+        """Raw size payloads from `doctl compute size list`."""
+        return DropletManager._doctl_json(["compute", "size", "list"], "sizes")
+
+    @staticmethod
+    def list_regions() -> list[dict[str, Any]]:
+        """Raw region payloads from `doctl compute region list`."""
+        return DropletManager._doctl_json(["compute", "region", "list"], "regions")
+
+    @staticmethod
+    def list_images() -> list[dict[str, Any]]:
+        """Raw distribution image payloads."""
+        return DropletManager._doctl_json(
+            ["compute", "image", "list-distribution"], "images"
+        )
+
     @staticmethod
     def list_droplets() -> list[Droplet]:
         path = str(ensure_doctl())
@@ -68,11 +114,12 @@ class DropletManager:
             "--output=json",
             "--interactive=false",
         ]
-        cmd_str = subprocess.list2cmdline(cmd_list)
-        locked_print(f"Running: {cmd_str}")
-        cp_most = subprocess.run(cmd_list, capture_output=True, text=True, shell=False)
+        logger.debug("Running: %s", subprocess.list2cmdline(cmd_list))
+        cp_most = run_with_retry(cmd_list, "list_droplets")
         if cp_most.returncode != 0:
-            raise DropletException(f"Error listing droplets: {cp_most.stderr}")
+            raise CommandError.from_process(
+                "Error listing droplets", cp_most, operation="list_droplets"
+            )
         data_main = json.loads(cp_most.stdout)
         out = [Droplet(data) for data in data_main]
         return out
@@ -90,9 +137,11 @@ class DropletManager:
             "--output=json",
         ]
         # cp = subprocess.run(cmd_str, capture_output=True, text=True, shell=True)
-        cp = subprocess.run(cmd_list, capture_output=True, text=True, shell=False)
+        cp = run_with_retry(cmd_list, "list_ssh_keys")
         if cp.returncode != 0:
-            raise DropletException(f"Error listing SSH keys: {cp.stderr}")
+            raise CommandError.from_process(
+                "Error listing SSH keys", cp, operation="list_ssh_keys"
+            )
         # return json.loads(cp.stdout)
         tmp_list = json.loads(cp.stdout)
         out = [SSHKey(**data) for data in tmp_list]
@@ -103,12 +152,25 @@ class DropletManager:
         name: str,
         ssh_key: SSHKey | None = None,
         tags: list[str] | None = None,
-        size: MachineSize = MachineSize.S_2VCPU_2GB,
-        image: ImageType = ImageType.UBUNTU_24_10_X64,
-        region=Region.NYC_1,
+        size: MachineSize | str = MachineSize.S_2VCPU_2GB,
+        image: ImageType | str = ImageType.UBUNTU_24_10_X64,
+        region: Region | str = Region.NYC_1,
         check=True,
         enable_monitoring=True,
+        identity: Identity | None = None,
+        progress: Progress | None = None,
+        idempotency_key: str | None = None,
+        retry: RetryPolicy | None = None,
     ) -> Droplet | DropletException:
+        """Create a droplet and wait until it accepts ssh. Without ssh_key the
+        account key matching identity (default: the process wide identity)
+        is installed on it. progress, if given, is told the phase as it goes;
+        finishing it is left to the caller.
+
+        The droplet is tagged create-key:<idempotency_key> (random if not
+        given); a create that is retried after an error first looks for a
+        droplet with that tag, so a request that did go through is not
+        repeated."""
         doctl = str(ensure_doctl())
         if tags:
             for tag in tags:
@@ -118,61 +180,92 @@ class DropletManager:
             if DropletManager.find_droplets(name):
                 return DropletException(f"Droplet already exists: {name}")
         if ssh_key is None:
-            keys = DropletManager.list_ssh_keys()
-            if not keys:
-                return DropletException("No SSH keys found.")
-            ssh_key = keys[0]
+            try:
+                ssh_key = account_ssh_key(identity)
+            except DropletException as e:
+                return e
         if not ssh_key:
             return DropletException("No SSH key found.")
         args: list[str] = [
             name,
             "--image",
-            image.value,
+            to_slug(image),
             "--size",
-            size.value,
+            to_slug(size),
             "--region",
-            region.value,
+            to_slug(region),
             "--wait",
         ]
-        if tags is not None:
-            tag_names_joined = ",".join(tags)
-            args += [f"--tag-names={tag_names_joined}"]
-            # args += ["--tag-names", ",".join(tags)]
+        key_tag = IDEMPOTENCY_TAG_PREFIX + (idempotency_key or uuid.uuid4().hex)
+        tag_names_joined = ",".join((tags or []) + [key_tag])
+        args += [f"--tag-names={tag_names_joined}"]
         args += ["--ssh-keys", ssh_key.fingerprint]
         if enable_monitoring:
             args += ["--enable-monitoring"]
         cmd_list = [doctl, "compute", "droplet", "create"] + args
         cmd_str = subprocess.list2cmdline(cmd_list)
-        locked_print(f"Running: {cmd_str}")
-        cp = subprocess.run(
-            cmd_str,
-            capture_output=True,
-            text=True,
-            shell=True,
-        )
+        logger.debug("Running: %s", cmd_str, extra={"droplet": name})
+        if progress is not None:
+            progress.set_phase(name, Phase.CREATING)
+        first = True
+
+        def _create() -> subprocess.CompletedProcess:
+            nonlocal first
+            if not first and DropletManager.find_droplets(tags=[key_tag]):
+                logger.info(
+                    "Droplet %s was created by an earlier attempt",
+                    name,
+                    extra={"droplet": name},
+                )
+                return subprocess.CompletedProcess(cmd_str, 0, "", "")
+            first = False
+            return subprocess.run(
+                cmd_str,
+                capture_output=True,
+                text=True,
+                shell=True,
+            )
+
+        cp = retry_call("create_droplet", _create, retry, droplet=name)
         if cp.returncode != 0:
-            msg = f"Error creating droplet:\nReturn Value: {cp.returncode}\n\nstderr:\n{cp.stderr}\n\nstdout:\n{cp.stdout}"
-            return DropletException(msg)
-        locked_print("Created droplet:", name)
+            return CommandError.from_process(
+                "Error creating droplet", cp, droplet=name, operation="create_droplet"
+            )
+        logger.info("Created droplet: %s", name, extra={"droplet": name})
+        if progress is not None:
+            progress.set_phase(name, Phase.BOOTING)
         time.sleep(SLEEP_TIME_BEFORE_SSH)
         timeout = time.time() + 20
         droplet: Droplet
         while time.time() < timeout:
-            droplets = DropletManager.find_droplets(name=name, tags=tags)
+            droplets = DropletManager.find_droplets(name=name, tags=[key_tag])
             if droplets:
                 droplet = droplets[0]
                 break
             time.sleep(1)
         else:
-            all_droplets = DropletManager.list_droplets()
-            locked_print(
-                f"Error creating droplet: {name}, available droplets: {all_droplets}"
+            logger.error(
+                "Created droplet %s is not listed",
+                name,
+                extra={"droplet": name},
             )
             return DropletException(
-                f"Error creating droplet: {name}, available droplets: {all_droplets}"
+                "Created droplet is not listed",
+                droplet=name,
+                operation="create_droplet",
             )
 
-        stdout_cloudinit = droplet.ssh_exec("sudo cloud-init status --wait")
+        if identity is not None:
+            droplet.identity = identity
+        # A recycled IP may still have a previous droplet's key on record. The
+        # first connection below then records this droplet's key.
+        known_hosts_store().forget(droplet.public_ip())
+        if progress is not None:
+            progress.set_phase(name, Phase.CLOUD_INIT)
+        # sshd may refuse connections for a moment after boot.
+        stdout_cloudinit = droplet.ssh_exec(
+            "sudo cloud-init status --wait", retry=DEFAULT_POLICY
+        )
         timeout = time.time() + 20
         stdout_pwd = ""
         while time.time() < timeout:
@@ -182,7 +275,11 @@ class DropletManager:
             time.sleep(1)
         else:
             return DropletException(
-                f"Cloud Init failed to complete: {stdout_cloudinit}, pwd: {stdout_pwd}"
+                f"Cloud Init failed to complete, pwd: {stdout_pwd.strip()}",
+                droplet=name,
+                droplet_id=droplet.id,
+                operation="cloud_init",
+                stderr=stdout_cloudinit.stdout + stdout_cloudinit.stderr,
             )
 
     @staticmethod
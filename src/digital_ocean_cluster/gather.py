@@ -0,0 +1,202 @@
+"""
+Pull a file or directory from every droplet in a cluster.
+
+Each droplet streams `tar | gzip` over a single ssh session into a local
+partial archive, which is extracted into a per-droplet directory built from a
+template such as "logs/{name}/{id}". Failed compressed transfers resume from
+the end of the partial archive on retry; if the tree changed in between, the
+spliced gzip stream fails to decode and the transfer starts over. A spliced
+plain tar would still extract, so uncompressed transfers always start over.
+"""
+
+import shlex
+import tarfile
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from pathlib import Path, PurePosixPath
+from typing import TYPE_CHECKING
+
+from digital_ocean_cluster.log import get_logger
+from digital_ocean_cluster.process import CancelToken, deadline_from, remaining
+from digital_ocean_cluster.types import CompletedProcess
+
+if TYPE_CHECKING:
+    from digital_ocean_cluster.droplet import Droplet
+
+logger = get_logger(__name__)
+
+
+@dataclass
+class GatherResult:
+    local_path: Path
+    cp: CompletedProcess | None
+    bytes_received: int
+    elapsed: float
+    attempts: int
+    ok: bool
+    error: str = ""
+
+    @property
+    def mb_per_s(self) -> float:
+        if self.elapsed <= 0:
+            return 0.0
+        return self.bytes_received / self.elapsed / (1024 * 1024)
+
+
+@dataclass
+class GatherReport:
+    results: "dict[Droplet, GatherResult]"
+    elapsed: float
+
+    @property
+    def ok(self) -> bool:
+        return all(r.ok for r in self.results.values())
+
+    @property
+    def bytes_received(self) -> int:
+        return sum(r.bytes_received for r in self.results.values())
+
+    @property
+    def mb_per_s(self) -> float:
+        if self.elapsed <= 0:
+            return 0.0
+        return self.bytes_received / self.elapsed / (1024 * 1024)
+
+    def __str__(self) -> str:
+        failed = [d.name for d, r in self.results.items() if not r.ok]
+        return (
+            f"GatherReport(droplets={len(self.results)}, bytes={self.bytes_received}, "
+            f"elapsed={self.elapsed:.2f}s, mb_per_s={self.mb_per_s:.2f}, failed={failed})"
+        )
+
+
+def gather_command(remote_path: PurePosixPath, offset: int, compress: bool) -> str:
+    """Remote command streaming remote_path as a tar archive, skipping the
+    first offset bytes. gzip -n keeps the stream byte-identical between runs
+    so a partial download can be resumed."""
+    parent = shlex.quote(remote_path.parent.as_posix())
+    base = shlex.quote(remote_path.name)
+    cmd = f"set -o pipefail; cd {parent} && tar -cf - {base}"
+    if compress:
+        cmd += " | gzip -n -1"
+    if offset:
+        cmd += f" | tail -c +{offset + 1}"
+    return cmd
+
+
+def extract_archive(archive: Path, dest: Path, compress: bool) -> None:
+    dest.mkdir(parents=True, exist_ok=True)
+    with tarfile.open(archive, mode="r:gz" if compress else "r:") as tar:
+        if hasattr(tarfile, "data_filter"):
+            tar.extractall(dest, filter="data")
+        else:
+            tar.extractall(dest)  # nosec
+
+
+def _gather_one(
+    droplet: "Droplet",
+    remote_path: PurePosixPath,
+    dest: Path,
+    compress: bool,
+    retries: int,
+    timeout: float | None,
+    cancel: CancelToken,
+) -> GatherResult:
+    dest.mkdir(parents=True, exist_ok=True)
+    part = dest / f".{remote_path.name}.tar{'.gz' if compress else ''}.part"
+    start = time.time()
+    deadline = deadline_from(timeout)
+    cp: CompletedProcess | None = None
+    received = 0
+    attempts = 0
+    while attempts <= retries and not cancel.cancelled:
+        attempts += 1
+        # A plain tar spliced from two versions of the tree still extracts.
+        offset = part.stat().st_size if compress and part.exists() else 0
+        with open(part, "ab" if offset else "wb") as f:
+            cp = droplet.ssh_exec(
+                gather_command(remote_path, offset, compress),
+                timeout=remaining(deadline),
+                cancel=cancel,
+                stdout=f,
+            )
+        received += part.stat().st_size - offset
+        if not cp.ok:
+            logger.warning(
+                "Gather from %s failed (attempt %d): %s",
+                droplet.name,
+                attempts,
+                cp.stderr,
+                extra={"droplet": droplet.name},
+            )
+            if cp.timed_out or cp.cancelled:
+                break
+            continue
+        try:
+            extract_archive(part, dest, compress)
+        except (tarfile.TarError, EOFError, OSError) as e:
+            # A resumed stream that no longer matches; start over.
+            logger.warning(
+                "Corrupt archive from %s: %s, restarting",
+                droplet.name,
+                e,
+                extra={"droplet": droplet.name},
+            )
+            part.unlink(missing_ok=True)
+            continue
+        part.unlink(missing_ok=True)
+        return GatherResult(dest, cp, received, time.time() - start, attempts, True)
+    return GatherResult(dest, cp, received, time.time() - start, attempts, False)
+
+
+def gather(
+    droplets: "list[Droplet]",
+    remote_path: Path | str,
+    local_template: str,
+    max_parallel: int = 8,
+    retries: int = 2,
+    compress: bool = True,
+    timeout: float | None = None,
+    deadline: float | None = None,
+) -> GatherReport:
+    """Pull remote_path from every droplet into local_template, formatted with
+    the droplet's name and id, e.g. "logs/{name}/{id}". At most max_parallel
+    transfers run at once. timeout bounds each droplet, deadline the whole
+    gather; droplets that miss the deadline are reported as failed."""
+    remote = PurePosixPath(Path(remote_path).as_posix())
+    cancel = CancelToken()
+    start = time.time()
+    with ThreadPoolExecutor(max_workers=max_parallel) as pool:
+        futures: "dict[Droplet, Future[GatherResult]]" = {}
+        for droplet in droplets:
+            dest = Path(local_template.format(name=droplet.name, id=droplet.id))
+            futures[droplet] = pool.submit(
+                _gather_one, droplet, remote, dest, compress, retries, timeout, cancel
+            )
+        _, pending = wait(futures.values(), timeout=deadline)
+        if pending:
+            cancel.cancel()
+            for future in pending:
+                future.cancel()
+    results: "dict[Droplet, GatherResult]" = {}
+    for droplet, future in futures.items():
+        dest = Path(local_template.format(name=droplet.name, id=droplet.id))
+        if future.cancelled():
+            results[droplet] = GatherResult(dest, None, 0, 0.0, 0, False)
+            continue
+        error = future.exception()
+        if error is not None:
+            # e.g. no public IP, or the local dest is not writable
+            logger.warning(
+                "Gather from %s failed: %s",
+                droplet.name,
+                error,
+                extra={"droplet": droplet.name},
+            )
+            results[droplet] = GatherResult(dest, None, 0, 0.0, 1, False, str(error))
+            continue
+        results[droplet] = future.result()
+    report = GatherReport(results=results, elapsed=time.time() - start)
+    logger.info("%s", report)
+    return report
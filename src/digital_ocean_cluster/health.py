@@ -0,0 +1,224 @@
+"""
+Background health monitoring for a DropletCluster.
+
+Each check does one droplet listing for the whole cluster (instead of one per
+node) and one probe per droplet that gathers load, memory and disk usage in a
+single remote command. Probes go over the droplets' AgentClients when given,
+so they reuse persistent connections, and fall back to ssh_exec otherwise.
+State changes are published to subscribed callbacks.
+"""
+
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass
+from enum import Enum
+from threading import Event, Lock, Thread
+from typing import Any, Callable
+
+from digital_ocean_cluster.cluster import DropletCluster
+from digital_ocean_cluster.droplet_manager import Droplet, DropletManager
+from digital_ocean_cluster.log import get_logger
+from digital_ocean_cluster.types import THREAD_POOL, CompletedProcess, DropletException
+
+logger = get_logger(__name__)
+
+PROBE_CMD = (
+    "cat /proc/loadavg; nproc; grep -E '^(MemTotal|MemAvailable):' /proc/meminfo; "
+    "df -P / | tail -1"
+)
+
+
+class HealthState(Enum):
+    UNKNOWN = "unknown"
+    HEALTHY = "healthy"
+    DEGRADED = "degraded"  # reachable but overloaded or low on memory/disk
+    UNREACHABLE = "unreachable"  # failed failure_threshold probes in a row
+    GONE = "gone"  # deleted, or not active according to the API
+
+
+@dataclass
+class NodeHealth:
+    droplet: Droplet
+    state: HealthState = HealthState.UNKNOWN
+    status: str = ""
+    load1: float = 0.0
+    cpus: int = 0
+    mem_total_kb: int = 0
+    mem_available_kb: int = 0
+    disk_used_pct: int = 0
+    last_probe: float = 0.0
+    last_ok: float = 0.0
+    consecutive_failures: int = 0
+    error: str = ""
+
+    @property
+    def load_per_cpu(self) -> float:
+        return self.load1 / self.cpus if self.cpus else 0.0
+
+    @property
+    def mem_available_pct(self) -> float:
+        if not self.mem_total_kb:
+            return 100.0
+        return 100.0 * self.mem_available_kb / self.mem_total_kb
+
+
+def parse_probe(text: str) -> dict[str, Any]:
+    """Parse the output of PROBE_CMD."""
+    lines = [line for line in text.splitlines() if line.strip()]
+    out: dict[str, Any] = {"load1": float(lines[0].split()[0]), "cpus": int(lines[1])}
+    for line in lines[2:]:
+        if line.startswith("MemTotal:"):
+            out["mem_total_kb"] = int(line.split()[1])
+        elif line.startswith("MemAvailable:"):
+            out["mem_available_kb"] = int(line.split()[1])
+        else:
+            out["disk_used_pct"] = int(line.split()[4].rstrip("%"))
+    return out
+
+
+HealthCallback = Callable[[NodeHealth, HealthState], None]
+
+
+class HealthMonitor:
+    """Periodically checks every droplet of cluster. Callbacks receive the
+    node's new NodeHealth and its previous state whenever the state changes."""
+
+    def __init__(
+        self,
+        cluster: DropletCluster,
+        interval: float = 30.0,
+        probe_timeout: float = 10.0,
+        failure_threshold: int = 2,
+        max_load_per_cpu: float = 2.0,
+        min_mem_available_pct: float = 5.0,
+        max_disk_used_pct: int = 95,
+        agents: dict[Droplet, Any] | None = None,
+    ) -> None:
+        self.cluster = cluster
+        self.interval = interval
+        self.probe_timeout = probe_timeout
+        self.failure_threshold = failure_threshold
+        self.max_load_per_cpu = max_load_per_cpu
+        self.min_mem_available_pct = min_mem_available_pct
+        self.max_disk_used_pct = max_disk_used_pct
+        self.agents = agents or {}
+        self.nodes: dict[int, NodeHealth] = {}
+        self._callbacks: list[HealthCallback] = []
+        self._lock = Lock()
+        self._stop = Event()
+        self._thread: Thread | None = None
+
+    def subscribe(self, callback: HealthCallback) -> None:
+        self._callbacks.append(callback)
+
+    def healthy_droplets(self) -> list[Droplet]:
+        with self._lock:
+            return [
+                n.droplet for n in self.nodes.values() if n.state == HealthState.HEALTHY
+            ]
+
+    def _list_statuses(self) -> dict[int, Droplet]:
+        return {d.id: d for d in DropletManager.list_droplets()}
+
+    def _probe(self, droplet: Droplet) -> CompletedProcess:
+        agent = self.agents.get(droplet)
+        if agent is not None and not isinstance(agent, Exception):
+            return agent.exec(PROBE_CMD, timeout=self.probe_timeout)
+        return droplet.ssh_exec(PROBE_CMD, timeout=self.probe_timeout)
+
+    def check(self) -> dict[int, NodeHealth]:
+        """Run one round of checks and return the health of every node."""
+        droplets = list(self.cluster.droplets)
+        try:
+            listed: dict[int, Droplet] | None = self._list_statuses()
+        except DropletException as e:
+            logger.warning("Health monitor could not list droplets: %s", e)
+            listed = None
+        probes: dict[int, Future[CompletedProcess]] = {}
+        for droplet in droplets:
+            if listed is not None and droplet.id not in listed:
+                continue
+            probes[droplet.id] = THREAD_POOL.submit(self._probe, droplet)
+        # Wait for the probes before taking the lock, so readers of the
+        # node states never wait for a probe round.
+        outcomes: dict[int, CompletedProcess | Exception] = {}
+        for droplet_id, future in probes.items():
+            try:
+                outcomes[droplet_id] = future.result()
+            except Exception as e:  # pylint: disable=broad-except
+                outcomes[droplet_id] = e
+        changes: list[tuple[NodeHealth, HealthState]] = []
+        now = time.time()
+        with self._lock:
+            for droplet in droplets:
+                node = self.nodes.setdefault(droplet.id, NodeHealth(droplet))
+                previous = node.state
+                fresh = listed.get(droplet.id) if listed is not None else None
+                if fresh is not None:
+                    droplet.data = fresh.data
+                    node.status = fresh.data.get("status", "")
+                if listed is not None and (
+                    fresh is None or node.status in ("off", "archive")
+                ):
+                    node.state = HealthState.GONE
+                else:
+                    self._apply_probe(node, outcomes[droplet.id], now)
+                if node.state != previous:
+                    changes.append((node, previous))
+            nodes = dict(self.nodes)
+        for node, previous in changes:
+            for callback in self._callbacks:
+                try:
+                    callback(node, previous)
+                except Exception as e:  # pylint: disable=broad-except
+                    logger.exception("Health callback failed: %s", e)
+        return nodes
+
+    def _apply_probe(
+        self, node: NodeHealth, cp: CompletedProcess | Exception, now: float
+    ) -> None:
+        node.last_probe = now
+        try:
+            if isinstance(cp, Exception):
+                raise cp
+            if not cp.ok:
+                raise DropletException(cp.stderr.strip() or f"exit {cp.returncode}")
+            for key, value in parse_probe(cp.stdout).items():
+                setattr(node, key, value)
+        except Exception as e:  # pylint: disable=broad-except
+            node.consecutive_failures += 1
+            node.error = str(e)
+            if node.consecutive_failures >= self.failure_threshold:
+                node.state = HealthState.UNREACHABLE
+            return
+        node.consecutive_failures = 0
+        node.error = ""
+        node.last_ok = now
+        degraded = (
+            node.load_per_cpu > self.max_load_per_cpu
+            or node.mem_available_pct < self.min_mem_available_pct
+            or node.disk_used_pct > self.max_disk_used_pct
+        )
+        node.state = HealthState.DEGRADED if degraded else HealthState.HEALTHY
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stop.clear()
+
+        def _loop() -> None:
+            while not self._stop.is_set():
+                try:
+                    self.check()
+                except Exception:  # pylint: disable=broad-except
+                    logger.exception("Health check failed")
+                self._stop.wait(self.interval)
+
+        self._thread = Thread(target=_loop, name="health-monitor", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
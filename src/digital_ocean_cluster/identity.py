@@ -0,0 +1,192 @@
+"""
+The SSH identity used to create and log in to droplets.
+
+The identity is resolved once per process, from the first of:
+
+  * DIGITAL_OCEAN_CLUSTER_SSH_KEY, the path of a private key;
+  * ~/.ssh/id_ed25519, ~/.ssh/id_ecdsa, ~/.ssh/id_rsa (the first with a .pub);
+  * the first key held by ssh-agent (ssh-add -L).
+
+Its MD5 fingerprint, the form DigitalOcean reports, picks the matching key of
+the account when creating droplets, so the droplets accept the key we log in
+with. The account's key list is fetched once and cached.
+"""
+
+import base64
+import hashlib
+import os
+import subprocess
+from dataclasses import dataclass
+from pathlib import Path
+from threading import Lock
+from typing import Any
+
+from digital_ocean_cluster.log import get_logger
+from digital_ocean_cluster.types import DropletException, SSHKey
+
+logger = get_logger(__name__)
+
+DEFAULT_KEY_NAMES = ["id_ed25519", "id_ecdsa", "id_rsa"]
+
+
+def get_private_key() -> str:
+    """Get private key path of the resolved identity."""
+    identity = get_identity()
+    if identity.key_path is not None:
+        return str(identity.key_path)
+    return str(Path.home() / ".ssh/id_rsa")
+
+
+def fingerprint(public_key: str) -> str:
+    """MD5 fingerprint (aa:bb:...) of an OpenSSH public key line."""
+    parts = public_key.split()
+    if len(parts) < 2:
+        raise DropletException(f"Not an OpenSSH public key: {public_key[:40]!r}")
+    try:
+        blob = base64.b64decode(parts[1], validate=True)
+    except ValueError as e:
+        raise DropletException(f"Not an OpenSSH public key: {e}") from e
+    digest = hashlib.md5(blob, usedforsecurity=False).hexdigest()
+    return ":".join(digest[i : i + 2] for i in range(0, len(digest), 2))
+
+
+@dataclass(frozen=True)
+class Identity:
+    public_key: str
+    # None when the private key is only held by ssh-agent.
+    key_path: Path | None = None
+
+    @property
+    def fingerprint(self) -> str:
+        return fingerprint(self.public_key)
+
+    @property
+    def agent(self) -> bool:
+        return self.key_path is None
+
+    def ssh_options(self) -> list[str]:
+        """ssh/scp arguments that authenticate with this identity."""
+        if self.key_path is None:
+            return []  # ssh asks the agent
+        return ["-i", str(self.key_path), "-o", "IdentitiesOnly=yes"]
+
+    def paramiko_kwargs(self) -> dict[str, Any]:
+        """SSHClient.connect() arguments that authenticate with this identity."""
+        if self.key_path is None:
+            return {"allow_agent": True, "look_for_keys": False}
+        return {
+            "key_filename": str(self.key_path),
+            "allow_agent": False,
+            "look_for_keys": False,
+        }
+
+    @staticmethod
+    def from_key_file(key_path: Path) -> "Identity":
+        pub = key_path.with_name(key_path.name + ".pub")
+        if pub.exists():
+            public_key = pub.read_text(encoding="utf-8").strip()
+        else:
+            cp = subprocess.run(
+                ["ssh-keygen", "-y", "-f", str(key_path)],
+                capture_output=True,
+                text=True,
+                check=False,
+            )
+            if cp.returncode != 0:
+                raise DropletException(
+                    f"Could not read the public key of {key_path}: {cp.stderr}"
+                )
+            public_key = cp.stdout.strip()
+        return Identity(public_key, key_path)
+
+    def __str__(self) -> str:
+        where = "ssh-agent" if self.key_path is None else str(self.key_path)
+        return f"Identity: {where} {self.fingerprint}"
+
+
+def agent_identities() -> list[Identity]:
+    """Keys held by the running ssh-agent, if any."""
+    if not os.environ.get("SSH_AUTH_SOCK"):
+        return []
+    try:
+        cp = subprocess.run(
+            ["ssh-add", "-L"], capture_output=True, text=True, check=False
+        )
+    except OSError:
+        return []
+    if cp.returncode != 0:
+        return []
+    return [Identity(line.strip()) for line in cp.stdout.splitlines() if line.strip()]
+
+
+def resolve_identity(ssh_dir: Path | None = None) -> Identity:
+    """Find the identity to use, see the module docstring."""
+    explicit = os.environ.get("DIGITAL_OCEAN_CLUSTER_SSH_KEY")
+    if explicit:
+        return Identity.from_key_file(Path(explicit).expanduser())
+    ssh_dir = ssh_dir or Path.home() / ".ssh"
+    for name in DEFAULT_KEY_NAMES:
+        key_path = ssh_dir / name
+        if key_path.exists() and key_path.with_name(name + ".pub").exists():
+            return Identity.from_key_file(key_path)
+    agent = agent_identities()
+    if agent:
+        return agent[0]
+    raise DropletException(
+        f"No SSH key found in {ssh_dir} or ssh-agent; create one with ssh-keygen "
+        "or set DIGITAL_OCEAN_CLUSTER_SSH_KEY."
+    )
+
+
+_IDENTITY: Identity | None = None
+_ACCOUNT_KEYS: list[SSHKey] | None = None
+_LOCK = Lock()
+
+
+def get_identity() -> Identity:
+    """The process wide identity, resolved on first use."""
+    global _IDENTITY  # pylint: disable=global-statement
+    with _LOCK:
+        if _IDENTITY is None:
+            _IDENTITY = resolve_identity()
+            logger.debug("Using SSH %s", _IDENTITY)
+        return _IDENTITY
+
+
+def set_identity(identity: Identity | Path | None) -> Identity | None:
+    """Use identity (or the key at that path) from now on; None resolves again
+    on next use. Returns the previous identity."""
+    global _IDENTITY  # pylint: disable=global-statement
+    if isinstance(identity, Path):
+        identity = Identity.from_key_file(identity)
+    with _LOCK:
+        previous, _IDENTITY = _IDENTITY, identity
+    return previous
+
+
+def account_ssh_keys(refresh: bool = False) -> list[SSHKey]:
+    """The account's SSH keys, listed once per process."""
+    global _ACCOUNT_KEYS  # pylint: disable=global-statement
+    with _LOCK:
+        if _ACCOUNT_KEYS is None or refresh:
+            # pylint: disable=import-outside-toplevel
+            from digital_ocean_cluster.droplet_manager import DropletManager
+
+            _ACCOUNT_KEYS = DropletManager.list_ssh_keys()
+        return _ACCOUNT_KEYS
+
+
+def account_ssh_key(identity: Identity | None = None) -> SSHKey:
+    """The account key matching identity (default: get_identity()). Raises
+    DropletException if the account does not have it."""
+    identity = identity or get_identity()
+    wanted = identity.fingerprint
+    keys = account_ssh_keys()
+    for key in keys:
+        if key.fingerprint == wanted:
+            return key
+    names = ", ".join(f"{k.name} ({k.fingerprint})" for k in keys) or "none"
+    raise DropletException(
+        f"{identity} is not registered with the account (keys: {names}); add it "
+        "with `doctl compute ssh-key import`."
+    )
@@ -0,0 +1,324 @@
+"""
+Step-based, resumable droplet installs.
+
+An Installer is an ordered list of InstallSteps. Every step has a content key
+chained from the keys of the steps before it, so editing a step re-runs it
+and everything after it. When a step succeeds a marker named after its key is
+written on the droplet and mirrored to a local cache, so re-running the same
+install skips completed steps, usually without even opening an ssh session.
+
+Consecutive shell steps run as one RemoteScript (one ssh session); python
+steps run locally against the droplet. Every run reports per-step timing.
+
+An Installer is callable with a droplet, so it can be used directly as
+DropletCreationArgs.install.
+"""
+
+import hashlib
+import inspect
+import json
+import shlex
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from threading import Lock
+from typing import Any, Callable
+
+from appdirs import user_cache_dir
+
+from digital_ocean_cluster.droplet_manager import Droplet
+from digital_ocean_cluster.remote_script import RemoteScript
+from digital_ocean_cluster.types import THREAD_POOL, CommandError, DropletException
+
+REMOTE_MARKER_DIR = "/root/.cache/digital-ocean-cluster/install"
+MARKER_CACHE_FILE = (
+    Path(user_cache_dir("digital-ocean-cluster")) / "install-markers.json"
+)
+
+
+@dataclass
+class InstallStep:
+    name: str
+    script: str | None = None  # shell, run on the droplet
+    fn: Callable[[Droplet], Any] | None = None  # python, run locally
+    # Content key; derived from script or the source of fn when not given.
+    key: str | None = None
+
+    def __post_init__(self) -> None:
+        if (self.script is None) == (self.fn is None):
+            raise ValueError(f"Step {self.name} needs exactly one of script or fn.")
+
+    def content(self) -> str:
+        if self.key is not None:
+            return self.key
+        if self.script is not None:
+            return self.script
+        assert self.fn is not None
+        try:
+            return inspect.getsource(self.fn)
+        except (OSError, TypeError):
+            return f"{self.fn.__module__}.{self.fn.__qualname__}"
+
+
+@dataclass
+class StepTiming:
+    name: str
+    key: str
+    skipped: bool = False
+    ok: bool = True
+    elapsed: float = 0.0
+    error: str = ""
+
+
+@dataclass
+class InstallReport:
+    droplet: Droplet
+    steps: list[StepTiming] = field(default_factory=list)
+    elapsed: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return all(s.ok for s in self.steps)
+
+    @property
+    def ran(self) -> list[StepTiming]:
+        return [s for s in self.steps if not s.skipped]
+
+    def __str__(self) -> str:
+        parts = []
+        for s in self.steps:
+            state = "skipped" if s.skipped else ("ok" if s.ok else "FAILED")
+            parts.append(f"{s.name}={state} {s.elapsed:.1f}s")
+        return f"{self.droplet.name}: {', '.join(parts)}"
+
+
+class MarkerCache:
+    """Local mirror of the markers present on each droplet."""
+
+    def __init__(self, path: Path | None = MARKER_CACHE_FILE) -> None:
+        self.path = path
+        self._lock = Lock()
+        self._markers: dict[str, set[str]] = {}
+        if path is not None and path.exists():
+            try:
+                raw = json.loads(path.read_text())
+                self._markers = {k: set(v) for k, v in raw.items()}
+            except (ValueError, AttributeError):
+                self._markers = {}
+
+    def get(self, droplet_id: int) -> set[str]:
+        with self._lock:
+            return set(self._markers.get(str(droplet_id), ()))
+
+    def update(self, droplet_id: int, keys: set[str], replace: bool = False) -> None:
+        with self._lock:
+            current = set() if replace else self._markers.get(str(droplet_id), set())
+            self._markers[str(droplet_id)] = current | keys
+            self._save()
+
+    def forget(self, droplet_id: int) -> None:
+        with self._lock:
+            self._markers.pop(str(droplet_id), None)
+            self._save()
+
+    def _save(self) -> None:
+        if self.path is None:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps({k: sorted(v) for k, v in self._markers.items()}))
+        tmp.replace(self.path)
+
+
+_DEFAULT_CACHE: MarkerCache | None = None
+_DEFAULT_CACHE_LOCK = Lock()
+
+
+def default_marker_cache() -> MarkerCache:
+    global _DEFAULT_CACHE  # pylint: disable=global-statement
+    with _DEFAULT_CACHE_LOCK:
+        if _DEFAULT_CACHE is None:
+            _DEFAULT_CACHE = MarkerCache()
+        return _DEFAULT_CACHE
+
+
+class Installer:
+    """Ordered install steps with content-keyed completion markers."""
+
+    def __init__(
+        self,
+        steps: list[InstallStep],
+        cache: MarkerCache | None = None,
+        marker_dir: str = REMOTE_MARKER_DIR,
+    ) -> None:
+        names = [s.name for s in steps]
+        if len(names) != len(set(names)):
+            raise ValueError("Install step names must be unique.")
+        self.steps = steps
+        self.cache = cache
+        self.marker_dir = marker_dir
+        self.keys: list[str] = []
+        previous = ""
+        for step in steps:
+            hasher = hashlib.sha256(previous.encode("utf-8"))
+            hasher.update(step.name.encode("utf-8") + b"\0")
+            hasher.update(step.content().encode("utf-8"))
+            previous = hasher.hexdigest()[:24]
+            self.keys.append(previous)
+
+    @property
+    def version(self) -> str:
+        """Key of the last step: identifies the whole install."""
+        return self.keys[-1] if self.keys else ""
+
+    def _cache(self) -> MarkerCache:
+        return self.cache if self.cache is not None else default_marker_cache()
+
+    def _marker(self, key: str) -> str:
+        return shlex.quote(f"{self.marker_dir}/{key}")
+
+    def remote_markers(self, droplet: Droplet) -> set[str]:
+        cp = droplet.ssh_exec(f"ls -1 {shlex.quote(self.marker_dir)} 2>/dev/null; true")
+        if not cp.ok:
+            raise CommandError.from_process(
+                "Failed to list install markers",
+                cp,
+                droplet=droplet.name,
+                droplet_id=droplet.id,
+                operation="install",
+            )
+        return {line.strip() for line in cp.stdout.splitlines() if line.strip()}
+
+    def completed(self, droplet: Droplet) -> set[str]:
+        """Keys of the steps already done on droplet. Answered from the local
+        mirror when it covers every step, otherwise from the droplet."""
+        cache = self._cache()
+        local = cache.get(droplet.id)
+        if all(k in local for k in self.keys):
+            return local
+        remote = self.remote_markers(droplet)
+        cache.update(droplet.id, remote, replace=True)
+        return remote
+
+    def run(self, droplet: Droplet, force: bool = False) -> InstallReport:
+        """Run the steps that have not completed on droplet yet, stopping at
+        the first failure."""
+        start = time.time()
+        report = InstallReport(droplet)
+        done = set() if force else self.completed(droplet)
+        # A step only counts as done if every step before it is, since keys
+        # are chained; anything after the first pending step re-runs.
+        first_pending = next(
+            (i for i, k in enumerate(self.keys) if k not in done), len(self.keys)
+        )
+        for i in range(first_pending):
+            report.steps.append(
+                StepTiming(self.steps[i].name, self.keys[i], skipped=True)
+            )
+        i = first_pending
+        while i < len(self.steps):
+            if self.steps[i].script is not None:
+                j = i
+                while j < len(self.steps) and self.steps[j].script is not None:
+                    j += 1
+                ok = self._run_scripts(droplet, i, j, report)
+            else:
+                j = i + 1
+                ok = self._run_fn(droplet, i, report)
+            if not ok:
+                break
+            i = j
+        report.elapsed = time.time() - start
+        return report
+
+    def _run_scripts(
+        self, droplet: Droplet, lo: int, hi: int, report: InstallReport
+    ) -> bool:
+        bundle = []
+        marker_dir = shlex.quote(self.marker_dir)
+        for i in range(lo, hi):
+            body = (
+                f"(\n{self.steps[i].script}\n) || exit $?\n"
+                f"mkdir -p {marker_dir} && touch {self._marker(self.keys[i])}\n"
+            )
+            bundle.append((self.steps[i].name, body))
+        result = droplet.run_script(RemoteScript(bundle))
+        finished = set()
+        for offset, step in enumerate(result.steps):
+            i = lo + offset
+            timing = StepTiming(
+                step.name, self.keys[i], ok=step.ok, elapsed=step.elapsed
+            )
+            if step.ok:
+                finished.add(self.keys[i])
+            else:
+                timing.error = step.stderr.decode("utf-8", errors="replace")[-2000:]
+            report.steps.append(timing)
+        self._cache().update(droplet.id, finished)
+        ok = result.ok and len(result.steps) == hi - lo
+        i = lo + len(result.steps)
+        if not ok and i < hi and all(s.ok for s in report.steps):
+            # The session itself failed (timeout, ssh error) before a step did.
+            error = result.cp.stderr or f"exit {result.cp.returncode}"
+            report.steps.append(
+                StepTiming(self.steps[i].name, self.keys[i], ok=False, error=error)
+            )
+        return ok
+
+    def _run_fn(self, droplet: Droplet, i: int, report: InstallReport) -> bool:
+        step = self.steps[i]
+        assert step.fn is not None
+        timing = StepTiming(step.name, self.keys[i])
+        start = time.time()
+        try:
+            step.fn(droplet)
+            cp = droplet.ssh_exec(
+                f"mkdir -p {shlex.quote(self.marker_dir)} && touch {self._marker(self.keys[i])}"
+            )
+            if not cp.ok:
+                raise DropletException(f"Failed to write install marker: {cp.stderr}")
+        except Exception as e:  # pylint: disable=broad-except
+            timing.ok = False
+            timing.error = str(e)
+        timing.elapsed = time.time() - start
+        report.steps.append(timing)
+        if timing.ok:
+            self._cache().update(droplet.id, {self.keys[i]})
+        return timing.ok
+
+    def run_cluster(
+        self, droplets: list[Droplet], force: bool = False
+    ) -> dict[Droplet, InstallReport]:
+        """Install on every droplet in parallel."""
+        futures = {d: THREAD_POOL.submit(self.run, d, force) for d in droplets}
+        out: dict[Droplet, InstallReport] = {}
+        for droplet, future in futures.items():
+            try:
+                out[droplet] = future.result()
+            except Exception as e:  # pylint: disable=broad-except
+                report = InstallReport(droplet)
+                report.steps.append(StepTiming("(install)", "", ok=False, error=str(e)))
+                out[droplet] = report
+        return out
+
+    def __call__(self, droplet: Droplet) -> None:
+        """DropletCreationArgs.install compatible: raises on failure."""
+        report = self.run(droplet)
+        if not report.ok:
+            failed = next(s for s in report.steps if not s.ok)
+            raise DropletException(
+                f"Install step {failed.name} failed on {droplet.name}: {failed.error}"
+            )
+
+
+def step_timings(
+    reports: dict[Droplet, InstallReport],
+) -> list[tuple[str, float, float]]:
+    """(step name, total seconds, slowest droplet seconds) for the steps that
+    ran, slowest total first: where provisioning time goes."""
+    totals: dict[str, list[float]] = {}
+    for report in reports.values():
+        for step in report.ran:
+            totals.setdefault(step.name, []).append(step.elapsed)
+    rows = [(name, sum(v), max(v)) for name, v in totals.items()]
+    return sorted(rows, key=lambda r: r[1], reverse=True)
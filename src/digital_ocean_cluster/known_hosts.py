@@ -0,0 +1,110 @@
+"""
+Shared known_hosts store for the droplets we manage.
+
+All ssh/scp invocations point UserKnownHostsFile at one file kept apart from
+~/.ssh/known_hosts, with StrictHostKeyChecking=accept-new: a droplet's host
+key is recorded on the first connection (the cloud-init wait right after
+creation) and verified on every later one.
+
+DigitalOcean recycles public IPs, so a droplet's entries are dropped when it
+is deleted, and any stale entry for a new droplet's IP is dropped when it is
+created. Otherwise the next droplet given that IP would fail verification.
+"""
+
+import os
+from pathlib import Path
+from threading import Lock
+
+from appdirs import user_cache_dir
+
+KNOWN_HOSTS_FILE = Path(user_cache_dir("digital-ocean-cluster")) / "known_hosts"
+
+
+def _entry_hosts(line: str) -> list[str]:
+    """Host names of a known_hosts line, with [host]:port reduced to host."""
+    stripped = line.strip()
+    if not stripped or stripped.startswith("#"):
+        return []
+    field = stripped.split()[0]
+    if field.startswith("@"):  # @cert-authority / @revoked marker
+        parts = stripped.split()
+        field = parts[1] if len(parts) > 1 else ""
+    hosts = []
+    for host in field.split(","):
+        if host.startswith("[") and "]" in host:
+            host = host[1 : host.index("]")]
+        hosts.append(host)
+    return hosts
+
+
+class KnownHostsStore:
+    def __init__(self, path: Path = KNOWN_HOSTS_FILE) -> None:
+        self.path = path
+        self._lock = Lock()
+        self._ready = False
+
+    def _ensure(self) -> None:
+        if self._ready:
+            return
+        with self._lock:
+            if not self._ready:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                self.path.touch(exist_ok=True)
+                self._ready = True
+
+    def ssh_options(self) -> list[str]:
+        """ssh/scp arguments that use this store."""
+        self._ensure()
+        return [
+            "-o",
+            f"UserKnownHostsFile={self.path}",
+            "-o",
+            "StrictHostKeyChecking=accept-new",
+            # Unhashed entries, so forget() can find them.
+            "-o",
+            "HashKnownHosts=no",
+        ]
+
+    def hosts(self) -> set[str]:
+        self._ensure()
+        with self._lock:
+            lines = self.path.read_text(encoding="utf-8").splitlines()
+        return {host for line in lines for host in _entry_hosts(line)}
+
+    def add(self, host: str, key_type: str, key_base64: str) -> None:
+        """Record host's key, as ssh does for accept-new (used by paramiko)."""
+        self._ensure()
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(f"{host} {key_type} {key_base64}\n")
+
+    def forget(self, *hosts: str) -> int:
+        """Drop every entry for hosts. Returns the number of lines removed."""
+        wanted = {h for h in hosts if h}
+        if not wanted:
+            return 0
+        self._ensure()
+        with self._lock:
+            lines = self.path.read_text(encoding="utf-8").splitlines(keepends=True)
+            kept = [
+                line for line in lines if not wanted.intersection(_entry_hosts(line))
+            ]
+            removed = len(lines) - len(kept)
+            if removed:
+                tmp = self.path.with_name(f"{self.path.name}.tmp.{os.getpid()}")
+                tmp.write_text("".join(kept), encoding="utf-8")
+                tmp.replace(self.path)
+        return removed
+
+
+_STORE = KnownHostsStore()
+
+
+def known_hosts_store() -> KnownHostsStore:
+    return _STORE
+
+
+def set_known_hosts_store(store: KnownHostsStore) -> None:
+    """Use store for all ssh/scp calls from now on (e.g. one file per project)."""
+    global _STORE  # pylint: disable=global-statement
+    _STORE = store
@@ -1,13 +1,8 @@
-from threading import Lock
-
-_PRINT_LOCK = Lock()
+from digital_ocean_cluster.log import logger
 
 
 def locked_print(*args, **kwargs):
-    # open log file
-    with _PRINT_LOCK:
-        try:
-            print(*args, **kwargs)
-
-        except UnicodeDecodeError as ue:
-            print(f"Error in locked_print: {ue}")
+    """Deprecated: kept for callers outside the package. Logs at INFO through
+    the package logger (see log.py) instead of printing under a global lock."""
+    sep = kwargs.get("sep", " ")
+    logger.info(sep.join(str(arg) for arg in args))
@@ -0,0 +1,164 @@
+"""
+Logging for the library.
+
+Importing the package only adds a NullHandler to the "digital_ocean_cluster"
+logger; records propagate to whatever the application configured. To have
+the library print its own output instead, opt in (the docluster CLI does):
+
+    setup_logging(level="DEBUG", droplet_log_dir=Path("logs"))
+
+setup_logging's level defaults to DIGITAL_OCEAN_CLUSTER_LOG_LEVEL from the
+environment. With it, worker threads only merge a record's arguments into its
+message and put it on a queue (QueueHandler); a single background thread
+(QueueListener) formats the lines and does the console and file I/O, so a
+slow terminal never stalls an ssh fan-out.
+Disabled levels cost one integer comparison, and per-command lines
+("Executing: ...") are DEBUG, so they are off unless asked for.
+
+Records about a droplet carry extra={"droplet": name}; with droplet_log_dir set
+they are also written to <droplet_log_dir>/<name>.log.
+"""
+
+import atexit
+import copy
+import logging
+import logging.handlers
+import queue
+import sys
+from pathlib import Path
+from threading import Lock
+from typing import IO
+
+from digital_ocean_cluster.settings import LOG_LEVEL
+
+LOGGER_NAME = "digital_ocean_cluster"
+DEFAULT_FORMAT = "%(message)s"
+FILE_FORMAT = "%(asctime)s %(levelname)s %(message)s"
+_EXC_FORMATTER = logging.Formatter()
+
+logger = logging.getLogger(LOGGER_NAME)
+logger.addHandler(logging.NullHandler())
+
+
+def get_logger(name: str) -> logging.Logger:
+    """Logger for a module of this package, e.g. get_logger(__name__)."""
+    if name == LOGGER_NAME or name.startswith(LOGGER_NAME + "."):
+        return logging.getLogger(name)
+    return logger.getChild(name)
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """Enqueues a copy of each record with its message and traceback already
+    rendered, since the arguments (reports, exceptions) may change before the
+    writer thread gets to them. The line itself is formatted there."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = _EXC_FORMATTER.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class DropletFileHandler(logging.Handler):
+    """Writes records that have a droplet attribute to one file per droplet."""
+
+    def __init__(self, directory: Path) -> None:
+        super().__init__()
+        self.directory = directory
+        self.setFormatter(logging.Formatter(FILE_FORMAT))
+        self._files: dict[str, IO[str]] = {}
+
+    def emit(self, record: logging.LogRecord) -> None:
+        droplet = getattr(record, "droplet", None)
+        if droplet is None:
+            return
+        try:
+            f = self._files.get(droplet)
+            if f is None:
+                self.directory.mkdir(parents=True, exist_ok=True)
+                path = self.directory / f"{droplet}.log"
+                f = open(
+                    path, "a", encoding="utf-8"
+                )  # pylint: disable=consider-using-with
+                self._files[droplet] = f
+            f.write(self.format(record) + "\n")
+            f.flush()
+        except Exception:  # pylint: disable=broad-except
+            self.handleError(record)
+
+    def close(self) -> None:
+        for f in self._files.values():
+            f.close()
+        self._files.clear()
+        super().close()
+
+
+_LOCK = Lock()
+_LISTENER: logging.handlers.QueueListener | None = None
+_QUEUE_HANDLER: _QueueHandler | None = None
+
+
+def setup_logging(
+    level: int | str = LOG_LEVEL,
+    stream: IO[str] | None = None,
+    droplet_log_dir: Path | None = None,
+    fmt: str = DEFAULT_FORMAT,
+    handlers: list[logging.Handler] | None = None,
+) -> logging.Logger:
+    """(Re)configure the package logger. Output goes to stream (default
+    stdout; pass handlers=[] and no stream to log nowhere but the files).
+    Records still propagate to the root logger's handlers as well."""
+    global _LISTENER, _QUEUE_HANDLER  # pylint: disable=global-statement
+    with _LOCK:
+        _stop_listener()
+        targets: list[logging.Handler] = list(handlers or [])
+        if stream is not None or handlers is None:
+            console = logging.StreamHandler(stream or sys.stdout)
+            console.setFormatter(logging.Formatter(fmt))
+            targets.append(console)
+        if droplet_log_dir is not None:
+            targets.append(DropletFileHandler(droplet_log_dir))
+        record_queue: queue.SimpleQueue = queue.SimpleQueue()
+        _QUEUE_HANDLER = _QueueHandler(record_queue)
+        logger.addHandler(_QUEUE_HANDLER)
+        logger.setLevel(level)
+        _LISTENER = logging.handlers.QueueListener(
+            record_queue, *targets, respect_handler_level=True
+        )
+        _LISTENER.start()
+    return logger
+
+
+def _stop_listener() -> None:
+    global _LISTENER, _QUEUE_HANDLER  # pylint: disable=global-statement
+    if _QUEUE_HANDLER is not None:
+        logger.removeHandler(_QUEUE_HANDLER)
+        _QUEUE_HANDLER = None
+    if _LISTENER is not None:
+        _LISTENER.stop()  # drains the queue first
+        for handler in _LISTENER.handlers:
+            handler.close()
+        _LISTENER = None
+
+
+def shutdown_logging() -> None:
+    """Flush pending records and stop the writer thread."""
+    with _LOCK:
+        _stop_listener()
+
+
+def flush_logging() -> None:
+    """Block until every record logged so far has been written."""
+    with _LOCK:
+        if _LISTENER is None:
+            return
+        listener = _LISTENER
+        listener.stop()
+        listener.start()
+
+
+atexit.register(shutdown_logging)
@@ -1,5 +1,9 @@
+import re
 from enum import Enum
 
+_MEMORY_PATTERN = re.compile(r"\d+GB")
+_MEMORY_INDEX: dict[int, list["MachineSize"]] | None = None
+
 
 class ImageType(Enum):
     UBUNTU_24_10_X64 = "ubuntu-24-10-x64"
@@ -81,18 +85,20 @@ class MachineSize(Enum):
 
     @staticmethod
     def list_with_matching_memory(gb_memory: int) -> list["MachineSize"]:
-        all_sizes = list(MachineSize)
-        out: list["MachineSize"] = []
-        import re
-
-        pattern = re.compile(r"\d+GB")
-        for s in all_sizes:
-            match = pattern.search(s.name)
-            if match:
-                memory = int(match.group()[:-2])
-                if memory == gb_memory:
-                    out.append(s)
-        return out
+        global _MEMORY_INDEX  # pylint: disable=global-statement
+        if _MEMORY_INDEX is None:
+            index: dict[int, list["MachineSize"]] = {}
+            for s in MachineSize:
+                match = _MEMORY_PATTERN.search(s.name)
+                if match:
+                    index.setdefault(int(match.group()[:-2]), []).append(s)
+            _MEMORY_INDEX = index
+        return list(_MEMORY_INDEX.get(gb_memory, []))
+
+
+def to_slug(value: ImageType | Region | MachineSize | str) -> str:
+    """Enum members and raw catalog slugs are both accepted."""
+    return value if isinstance(value, str) else value.value
 
 
 def unit_test() -> None:
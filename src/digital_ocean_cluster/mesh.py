@@ -0,0 +1,235 @@
+"""
+Private network mesh for a cluster.
+
+Builds an /etc/hosts block and an ssh config from the droplets' private VPC
+addresses, pushes the hosts block to every droplet in one pass, and measures
+intra-cluster bandwidth and latency between droplets, returned as a matrix.
+
+The benchmark uses small python3 socket programs rather than iperf so it
+needs nothing installed beyond the stock Ubuntu image.
+"""
+
+import json
+import shlex
+import statistics
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING
+
+from digital_ocean_cluster.known_hosts import known_hosts_store
+from digital_ocean_cluster.types import THREAD_POOL, CompletedProcess, DropletException
+
+if TYPE_CHECKING:
+    from digital_ocean_cluster.droplet import Droplet
+
+HOSTS_BEGIN = "# BEGIN digital-ocean-cluster"
+HOSTS_END = "# END digital-ocean-cluster"
+BENCH_PORT = 5201
+
+BENCH_SERVER = r"""
+import socket, sys, threading
+host, port, idle = sys.argv[1], int(sys.argv[2]), float(sys.argv[3])
+srv = socket.create_server((host, port))
+srv.settimeout(idle)
+def handle(c):
+    with c:
+        mode = c.recv(1)
+        if mode == b"p":
+            while True:
+                d = c.recv(1)
+                if not d:
+                    break
+                c.sendall(d)
+        elif mode == b"b":
+            n = 0
+            while True:
+                d = c.recv(1 << 20)
+                if not d:
+                    break
+                n += len(d)
+            c.sendall(str(n).encode())
+while True:
+    try:
+        c, _ = srv.accept()
+    except socket.timeout:
+        break
+    c.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    threading.Thread(target=handle, args=(c,), daemon=True).start()
+"""
+
+BENCH_CLIENT = r"""
+import json, socket, statistics, sys, time
+host, port, nbytes, pings = sys.argv[1], int(sys.argv[2]), int(sys.argv[3]), int(sys.argv[4])
+deadline = time.time() + 10
+while True:
+    try:
+        s = socket.create_connection((host, port), timeout=10)
+        break
+    except OSError:
+        if time.time() > deadline:
+            raise
+        time.sleep(0.2)
+s.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+s.sendall(b"p")
+rtts = []
+for _ in range(pings):
+    t = time.perf_counter()
+    s.sendall(b"x")
+    s.recv(1)
+    rtts.append(time.perf_counter() - t)
+s.close()
+s = socket.create_connection((host, port), timeout=60)
+s.sendall(b"b")
+buf = bytes(1 << 20)
+sent = 0
+t = time.perf_counter()
+while sent < nbytes:
+    s.sendall(buf)
+    sent += len(buf)
+s.shutdown(socket.SHUT_WR)
+got = int(s.recv(64))
+elapsed = time.perf_counter() - t
+s.close()
+print(json.dumps({"mbps": got * 8 / elapsed / 1e6, "rtt_ms": statistics.median(rtts) * 1000}))
+"""
+
+
+def hosts_block(droplets: "list[Droplet]") -> str:
+    lines = [HOSTS_BEGIN]
+    for droplet in droplets:
+        lines.append(f"{droplet.private_ip()} {droplet.name}")
+    lines.append(HOSTS_END)
+    return "\n".join(lines) + "\n"
+
+
+def ssh_config(
+    droplets: "list[Droplet]", private: bool = True, identity_file: str | None = None
+) -> str:
+    """ssh config with a Host entry per droplet, addressed by private IP (for
+    use inside the VPC) or public IP (for use from outside)."""
+    blocks = []
+    for droplet in droplets:
+        ip = droplet.private_ip() if private else droplet.public_ip()
+        lines = [f"Host {droplet.name}", f"    HostName {ip}", "    User root"]
+        if identity_file:
+            lines.append(f"    IdentityFile {identity_file}")
+        if not private:
+            # Share host keys with the library's own ssh calls.
+            lines.append(f"    UserKnownHostsFile {known_hosts_store().path}")
+        lines.append("    StrictHostKeyChecking accept-new")
+        blocks.append("\n".join(lines))
+    return "\n\n".join(blocks) + "\n"
+
+
+def install_hosts_command() -> str:
+    """Remote command replacing our block in /etc/hosts with stdin."""
+    return (
+        f"T=$(mktemp) && sed '/^{HOSTS_BEGIN}$/,/^{HOSTS_END}$/d' /etc/hosts > \"$T\" "
+        '&& cat >> "$T" && cat "$T" > /etc/hosts && rm -f "$T"'
+    )
+
+
+def install_hosts(droplets: "list[Droplet]") -> "dict[Droplet, CompletedProcess]":
+    """Write the private address of every droplet into every droplet's
+    /etc/hosts, one ssh session per droplet, all in parallel."""
+    block = hosts_block(droplets).encode("utf-8")
+    cmd = install_hosts_command()
+    futures = {
+        d: THREAD_POOL.submit(d.ssh_exec, cmd, None, None, block) for d in droplets
+    }
+    return {d: f.result() for d, f in futures.items()}
+
+
+def ring_rounds(count: int) -> list[list[tuple[int, int]]]:
+    """A single round in which node i sends to node i + 1."""
+    if count < 2:
+        return []
+    return [[(i, (i + 1) % count) for i in range(count)]]
+
+
+def all_pairs_rounds(count: int) -> list[list[tuple[int, int]]]:
+    """count - 1 rounds covering every ordered pair. In each round every node
+    sends to exactly one node and receives from exactly one, so links aren't
+    shared within a round."""
+    return [[(i, (i + r) % count) for i in range(count)] for r in range(1, count)]
+
+
+@dataclass
+class BandwidthMatrix:
+    names: list[str]
+    mbps: list[list[float | None]] = field(default_factory=list)
+    rtt_ms: list[list[float | None]] = field(default_factory=list)
+
+    def __post_init__(self) -> None:
+        n = len(self.names)
+        if not self.mbps:
+            self.mbps = [[None] * n for _ in range(n)]
+        if not self.rtt_ms:
+            self.rtt_ms = [[None] * n for _ in range(n)]
+
+    def measured(self) -> list[float]:
+        return [v for row in self.mbps for v in row if v is not None]
+
+    @property
+    def median_mbps(self) -> float:
+        values = self.measured()
+        return statistics.median(values) if values else 0.0
+
+    def __str__(self) -> str:
+        width = max([len(n) for n in self.names] + [10])
+        header = " " * width + "".join(f"{n:>{width + 2}}" for n in self.names)
+        rows = [header]
+        for i, name in enumerate(self.names):
+            cells = []
+            for j in range(len(self.names)):
+                mbps, rtt = self.mbps[i][j], self.rtt_ms[i][j]
+                cell = "-" if mbps is None else f"{mbps:.0f}M/{rtt:.2f}ms"
+                cells.append(f"{cell:>{width + 2}}")
+            rows.append(f"{name:<{width}}" + "".join(cells))
+        return "\n".join(rows)
+
+
+def benchmark(
+    droplets: "list[Droplet]",
+    topology: str = "ring",
+    megabytes: int = 256,
+    pings: int = 50,
+    port: int = BENCH_PORT,
+) -> BandwidthMatrix:
+    """Measure throughput (Mbit/s) and median TCP round trip (ms) between
+    droplets over their private addresses. topology is "ring" or "all". The
+    servers listen on the private addresses only."""
+    if topology not in ("ring", "all"):
+        raise ValueError(f"Unknown topology: {topology}")
+    n = len(droplets)
+    rounds = ring_rounds(n) if topology == "ring" else all_pairs_rounds(n)
+    matrix = BandwidthMatrix(names=[d.name for d in droplets])
+    ips = [d.private_ip() for d in droplets]
+    idle = 60
+
+    def _start_server(droplet: "Droplet", ip: str) -> CompletedProcess:
+        return droplet.ssh_exec(
+            f"setsid nohup python3 -c {shlex.quote(BENCH_SERVER)} {ip} {port} "
+            f"{idle} </dev/null >/dev/null 2>&1 &"
+        )
+
+    for cp in THREAD_POOL.map(_start_server, droplets, ips):
+        if not cp.ok:
+            raise DropletException(f"Could not start benchmark server: {cp.stderr}")
+    nbytes = megabytes * 1024 * 1024
+    for pairs in rounds:
+
+        def _measure(pair: tuple[int, int]) -> tuple[int, int, CompletedProcess]:
+            src, dst = pair
+            cmd = (
+                f"python3 -c {shlex.quote(BENCH_CLIENT)} "
+                f"{ips[dst]} {port} {nbytes} {pings}"
+            )
+            return src, dst, droplets[src].ssh_exec(cmd)
+
+        for src, dst, cp in THREAD_POOL.map(_measure, pairs):
+            if not cp.ok:
+                continue
+            result = json.loads(cp.stdout.strip().splitlines()[-1])
+            matrix.mbps[src][dst] = result["mbps"]
+            matrix.rtt_ms[src][dst] = result["rtt_ms"]
+    return matrix
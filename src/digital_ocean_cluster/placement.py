@@ -0,0 +1,226 @@
+"""
+Multi-region placement of a cluster.
+
+plan_placement assigns every DropletCreationArgs to a region according to a
+PlacementPolicy. create_placed_droplets provisions all regions in parallel
+and moves droplets that fail to create to an alternate region.
+"""
+
+import socket
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from dataclasses import dataclass, field, replace
+from enum import Enum
+
+from digital_ocean_cluster.cluster import (
+    DigitalOceanCluster,
+    DropletCluster,
+    DropletCreationArgs,
+)
+from digital_ocean_cluster.droplet_manager import (
+    IDEMPOTENCY_TAG_PREFIX,
+    Droplet,
+    DropletManager,
+)
+from digital_ocean_cluster.ensure_doctl import ensure_doctl
+from digital_ocean_cluster.log import get_logger
+from digital_ocean_cluster.machines import Region, to_slug
+from digital_ocean_cluster.types import THREAD_POOL, DropletException
+
+logger = get_logger(__name__)
+
+
+class PlacementPolicy(Enum):
+    SPREAD = "spread"  # round robin across regions
+    PACK = "pack"  # fill regions in the given order
+    LATENCY = "latency"  # fill regions closest to this machine first
+
+
+@dataclass
+class RegionReport:
+    region: str
+    requested: int = 0
+    ready: int = 0
+    failed: int = 0
+    replaced_in: int = 0
+    time_to_ready: float = 0.0  # seconds until the region's last droplet was ready
+
+    def __str__(self) -> str:
+        return (
+            f"{self.region}: ready={self.ready}/{self.requested} failed={self.failed} "
+            f"replaced_in={self.replaced_in} time_to_ready={self.time_to_ready:.1f}s"
+        )
+
+
+@dataclass
+class PlacementResult:
+    cluster: DropletCluster
+    regions: dict[str, RegionReport] = field(default_factory=dict)
+
+
+def measure_region_latency(
+    regions: list[Region | str], timeout: float = 2.0
+) -> dict[str, float]:
+    """TCP connect time in seconds to each region's speedtest endpoint.
+    Unreachable regions get float("inf")."""
+
+    def _measure(region: str) -> float:
+        host = f"speedtest-{region}.digitalocean.com"
+        start = time.perf_counter()
+        try:
+            with socket.create_connection((host, 80), timeout=timeout):
+                return time.perf_counter() - start
+        except OSError:
+            return float("inf")
+
+    slugs = [to_slug(r) for r in regions]
+    return dict(zip(slugs, THREAD_POOL.map(_measure, slugs)))
+
+
+def order_regions(
+    regions: list[Region | str],
+    policy: PlacementPolicy,
+    latencies: dict[str, float] | None = None,
+) -> list[str]:
+    slugs = [to_slug(r) for r in regions]
+    if policy == PlacementPolicy.LATENCY:
+        if latencies is None:
+            latencies = measure_region_latency(slugs)
+        slugs.sort(key=lambda r: latencies.get(r, float("inf")))  # type: ignore
+    return slugs
+
+
+def plan_placement(
+    args: list[DropletCreationArgs],
+    regions: list[Region | str],
+    policy: PlacementPolicy = PlacementPolicy.SPREAD,
+    latencies: dict[str, float] | None = None,
+    capacity: dict[str, int] | None = None,
+) -> list[DropletCreationArgs]:
+    """Copies of args with their region set by policy. capacity optionally
+    caps how many droplets a region takes; PACK and LATENCY spill to the next
+    region once a region is full."""
+    order = order_regions(regions, policy, latencies)
+    if not order:
+        raise ValueError("At least one region is required.")
+    capacity = capacity or {}
+    counts = {r: 0 for r in order}
+
+    def _has_room(region: str) -> bool:
+        return counts[region] < capacity.get(region, len(args))
+
+    out: list[DropletCreationArgs] = []
+    for i, arg in enumerate(args):
+        if policy == PlacementPolicy.SPREAD:
+            candidates = order[i % len(order) :] + order[: i % len(order)]
+        else:
+            candidates = order
+        region = next((r for r in candidates if _has_room(r)), None)
+        if region is None:
+            raise ValueError(f"Not enough region capacity for {len(args)} droplets.")
+        counts[region] += 1
+        out.append(replace(arg, region=region))
+    return out
+
+
+def _remove_leftovers(arg: DropletCreationArgs) -> None:
+    """A creation can fail after the droplet exists (e.g. in install), remove
+    what this attempt made before re-placing it. Only droplets carrying the
+    attempt's idempotency tag are touched."""
+    assert arg.idempotency_key is not None
+    key_tag = IDEMPOTENCY_TAG_PREFIX + arg.idempotency_key
+    try:
+        for droplet in DropletManager.find_droplets(name=arg.name, tags=[key_tag]):
+            droplet.delete()
+    except DropletException as e:
+        logger.warning(
+            "Could not clean up %s before re-placing: %s",
+            arg.name,
+            e,
+            extra={"droplet": arg.name},
+        )
+
+
+def create_placed_droplets(
+    args: list[DropletCreationArgs],
+    regions: list[Region | str],
+    policy: PlacementPolicy = PlacementPolicy.SPREAD,
+    latencies: dict[str, float] | None = None,
+    capacity: dict[str, int] | None = None,
+) -> PlacementResult:
+    """Create args spread over regions, all regions in parallel. A droplet that
+    fails in one region is retried in the regions it has not tried yet and
+    that still have room under capacity, counting creations in flight. Each
+    attempt gets its own idempotency key so a failed attempt's leftovers can
+    be removed (in the background) without touching anything else."""
+    ensure_doctl()
+    if policy == PlacementPolicy.LATENCY and latencies is None:
+        latencies = measure_region_latency(regions)
+    order = order_regions(regions, policy, latencies)
+    placed = plan_placement(args, regions, policy, latencies, capacity)
+    reports = {r: RegionReport(region=r) for r in order}
+    capacity = capacity or {}
+    # Droplets ready or being created per region.
+    placed_count = {r: 0 for r in order}
+    start = time.time()
+    pending: dict[Future, tuple[DropletCreationArgs, list[str]]] = {}
+
+    def _submit(arg: DropletCreationArgs, tried: list[str]) -> None:
+        placed_count[tried[-1]] += 1
+        futures = DigitalOceanCluster.async_create_droplets([arg])
+        pending[futures[arg.name]] = (arg, tried)
+
+    for arg in placed:
+        region = to_slug(arg.region)
+        reports[region].requested += 1
+        if arg.idempotency_key is None:
+            arg = replace(arg, idempotency_key=uuid.uuid4().hex)
+        _submit(arg, [region])
+
+    droplets: list[Droplet] = []
+    failed: dict[str, DropletException] = {}
+    while pending:
+        done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+        for future in done:
+            arg, tried = pending.pop(future)
+            report = reports[tried[-1]]
+            result = future.result()
+            if isinstance(result, Droplet):
+                droplets.append(result)
+                report.ready += 1
+                report.time_to_ready = max(report.time_to_ready, time.time() - start)
+                continue
+            report.failed += 1
+            placed_count[tried[-1]] -= 1
+            alternates = [
+                r
+                for r in order
+                if r not in tried and placed_count[r] < capacity.get(r, len(args))
+            ]
+            if not alternates:
+                failed[arg.name] = DropletException.wrap(
+                    result, droplet=arg.name, operation="create_droplet"
+                )
+                continue
+            if policy == PlacementPolicy.SPREAD:
+                alternates.sort(key=lambda r: reports[r].requested)
+            region = alternates[0]
+            logger.warning(
+                "Creating %s in %s failed: %s, re-placing in %s",
+                arg.name,
+                tried[-1],
+                result,
+                region,
+                extra={"droplet": arg.name},
+            )
+            THREAD_POOL.submit(_remove_leftovers, arg)
+            reports[region].requested += 1
+            reports[region].replaced_in += 1
+            key = f"{arg.idempotency_key}-{region}"
+            _submit(replace(arg, region=region, idempotency_key=key), tried + [region])
+
+    for report in reports.values():
+        logger.info("%s", report)
+    cluster = DropletCluster(droplets=droplets, failed_droplets=failed)
+    return PlacementResult(cluster=cluster, regions=reports)
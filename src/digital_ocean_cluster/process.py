@@ -0,0 +1,106 @@
+import subprocess
+import time
+from threading import Event, Lock
+from typing import IO
+
+from digital_ocean_cluster.types import CompletedProcess
+
+
+class CancelToken:
+    """Cooperative cancellation shared between a caller and worker threads.
+
+    Child processes registered with the token are killed when it is cancelled,
+    so a worker blocked on a hung ssh/scp returns promptly."""
+
+    def __init__(self) -> None:
+        self._event = Event()
+        self._lock = Lock()
+        self._procs: set[subprocess.Popen] = set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def wait(self, timeout: float | None = None) -> bool:
+        """Sleep up to timeout seconds; returns early, True, once cancelled."""
+        return self._event.wait(timeout)
+
+    def cancel(self) -> None:
+        with self._lock:
+            self._event.set()
+            procs = list(self._procs)
+        for proc in procs:
+            _kill(proc)
+
+    def register(self, proc: subprocess.Popen) -> None:
+        with self._lock:
+            if not self._event.is_set():
+                self._procs.add(proc)
+                return
+        _kill(proc)
+
+    def unregister(self, proc: subprocess.Popen) -> None:
+        with self._lock:
+            self._procs.discard(proc)
+
+
+def _kill(proc: subprocess.Popen) -> None:
+    try:
+        proc.kill()
+    except OSError:
+        pass
+
+
+def deadline_from(timeout: float | None) -> float | None:
+    if timeout is None:
+        return None
+    return time.monotonic() + timeout
+
+
+def remaining(deadline: float | None) -> float | None:
+    """Seconds left until deadline, never negative. None means unbounded."""
+    if deadline is None:
+        return None
+    return max(0.0, deadline - time.monotonic())
+
+
+def run_process(
+    cmd_list: list[str],
+    input: bytes | None = None,  # pylint: disable=redefined-builtin
+    timeout: float | None = None,
+    cancel: CancelToken | None = None,
+    stdout: IO[bytes] | None = None,
+) -> CompletedProcess:
+    """Run a child process, killing it on timeout or cancellation.
+
+    If stdout is given the child writes straight into it and the result's
+    stdout is empty. Never raises for timeouts: the returned CompletedProcess
+    has timed_out or cancelled set and ok is False."""
+    if cancel is not None and cancel.cancelled:
+        cp: subprocess.CompletedProcess = subprocess.CompletedProcess(
+            cmd_list, -1, b"", b"Cancelled before start"
+        )
+        return CompletedProcess(cmd_list, cp, cancelled=True)
+    proc: subprocess.Popen = subprocess.Popen(
+        cmd_list,
+        stdin=subprocess.PIPE if input is not None else subprocess.DEVNULL,
+        stdout=stdout if stdout is not None else subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    if cancel is not None:
+        cancel.register(proc)
+    timed_out = False
+    try:
+        try:
+            out, err = proc.communicate(input=input, timeout=timeout)
+        except subprocess.TimeoutExpired:
+            timed_out = True
+            _kill(proc)
+            out, err = proc.communicate()
+            err = (err or b"") + f"\nTimed out after {timeout}s".encode()
+    finally:
+        if cancel is not None:
+            cancel.unregister(proc)
+    cancelled = cancel is not None and cancel.cancelled and proc.returncode != 0
+    cp = subprocess.CompletedProcess(cmd_list, proc.returncode, out, err)
+    return CompletedProcess(cmd_list, cp, timed_out=timed_out, cancelled=cancelled)
@@ -0,0 +1,267 @@
+"""
+Progress reporting for operations over many droplets.
+
+A Progress tracks one operation (create, copy, delete) per droplet: its phase,
+how long it has been in it, and for copies the bytes moved. Workers update it
+as they go; subscribed callbacks see every phase change, and
+TerminalRenderer redraws a one line summary (counts per phase, MB/s, ETA and
+the slowest unfinished droplets) so stragglers stand out while it runs:
+
+    progress = Progress("create", [a.name for a in args])
+    with TerminalRenderer(progress):
+        cluster = DigitalOceanCluster.create_droplets(args, progress=progress)
+"""
+
+import statistics
+import sys
+import time
+from dataclasses import dataclass, field, replace
+from enum import Enum
+from pathlib import Path
+from threading import Event, Lock, Thread
+from typing import IO, Callable
+
+from digital_ocean_cluster.log import get_logger
+
+logger = get_logger(__name__)
+
+
+class Phase(Enum):
+    QUEUED = "queued"
+    CREATING = "creating"  # waiting for the API to report the droplet active
+    BOOTING = "booting"  # active, waiting for it to be listed and reachable
+    CLOUD_INIT = "cloud-init"
+    INSTALLING = "installing"
+    COPYING = "copying"
+    DELETING = "deleting"
+    READY = "ready"
+    FAILED = "failed"
+
+    @property
+    def finished(self) -> bool:
+        return self in (Phase.READY, Phase.FAILED)
+
+
+@dataclass
+class NodeProgress:
+    name: str
+    phase: Phase = Phase.QUEUED
+    started: float = field(default_factory=time.monotonic)
+    phase_started: float = field(default_factory=time.monotonic)
+    finished: float | None = None
+    bytes_done: int = 0
+    bytes_total: int = 0
+    error: str = ""
+
+    @property
+    def elapsed(self) -> float:
+        end = self.finished if self.finished is not None else time.monotonic()
+        return end - self.started
+
+    @property
+    def phase_elapsed(self) -> float:
+        end = self.finished if self.finished is not None else time.monotonic()
+        return end - self.phase_started
+
+    @property
+    def mbps(self) -> float:
+        """Average transfer rate in MB/s."""
+        elapsed = self.elapsed
+        return self.bytes_done / elapsed / 1e6 if elapsed > 0 else 0.0
+
+
+ProgressCallback = Callable[[NodeProgress, Phase], None]
+
+
+def path_size(path: Path) -> int:
+    """Bytes in a file, or in all files under a directory."""
+    if path.is_dir():
+        return sum(p.stat().st_size for p in path.rglob("*") if p.is_file())
+    return path.stat().st_size
+
+
+def _duration(seconds: float) -> str:
+    seconds = int(seconds)
+    if seconds < 60:
+        return f"{seconds}s"
+    if seconds < 3600:
+        return f"{seconds // 60}m{seconds % 60:02d}s"
+    return f"{seconds // 3600}h{seconds % 3600 // 60:02d}m"
+
+
+class Progress:
+    """Per droplet progress of one operation. Thread safe; callbacks receive a
+    snapshot of the node and its previous phase, on the updating thread."""
+
+    def __init__(self, operation: str, names: list[str] | None = None) -> None:
+        self.operation = operation
+        self.started = time.monotonic()
+        self._nodes: dict[str, NodeProgress] = {}
+        self._callbacks: list[ProgressCallback] = []
+        self._lock = Lock()
+        for name in names or []:
+            self.add(name)
+
+    def subscribe(self, callback: ProgressCallback) -> None:
+        self._callbacks.append(callback)
+
+    def add(self, name: str, bytes_total: int = 0) -> None:
+        with self._lock:
+            node = self._nodes.setdefault(name, NodeProgress(name))
+            node.bytes_total = bytes_total
+
+    def set_phase(self, name: str, phase: Phase, error: str = "") -> None:
+        now = time.monotonic()
+        with self._lock:
+            node = self._nodes.setdefault(name, NodeProgress(name))
+            previous = node.phase
+            if previous == phase:
+                return
+            node.phase = phase
+            node.phase_started = now
+            node.error = error
+            if phase.finished:
+                node.finished = now
+            snapshot = replace(node)
+        for callback in self._callbacks:
+            try:
+                callback(snapshot, previous)
+            except Exception as e:  # pylint: disable=broad-except
+                logger.exception("Progress callback failed: %s", e)
+
+    def add_bytes(self, name: str, count: int) -> None:
+        with self._lock:
+            self._nodes.setdefault(name, NodeProgress(name)).bytes_done += count
+
+    def nodes(self) -> list[NodeProgress]:
+        with self._lock:
+            return [replace(node) for node in self._nodes.values()]
+
+    def counts(self) -> dict[Phase, int]:
+        out: dict[Phase, int] = {}
+        for node in self.nodes():
+            out[node.phase] = out.get(node.phase, 0) + 1
+        return out
+
+    @property
+    def done(self) -> bool:
+        return all(node.phase.finished for node in self.nodes())
+
+    def mbps(self) -> float:
+        """Aggregate transfer rate since the operation started, in MB/s."""
+        elapsed = time.monotonic() - self.started
+        moved = sum(node.bytes_done for node in self.nodes())
+        return moved / elapsed / 1e6 if elapsed > 0 else 0.0
+
+    def eta(self) -> float | None:
+        """Estimated seconds left: from the byte rate when sizes are known,
+        otherwise from the fraction of droplets finished. None until there is
+        something to extrapolate from."""
+        nodes = self.nodes()
+        if not nodes:
+            return None
+        elapsed = time.monotonic() - self.started
+        total = sum(node.bytes_total for node in nodes)
+        moved = sum(node.bytes_done for node in nodes)
+        if total and moved:
+            return max(0.0, (total - moved) * elapsed / moved)
+        finished = sum(node.phase.finished for node in nodes)
+        if not finished:
+            return None
+        return elapsed * (len(nodes) - finished) / finished
+
+    def stragglers(self, factor: float = 1.5) -> list[NodeProgress]:
+        """Unfinished droplets running longer than factor times the median
+        time of the finished ones, slowest first."""
+        nodes = self.nodes()
+        durations = [n.elapsed for n in nodes if n.phase == Phase.READY]
+        if not durations:
+            return []
+        limit = factor * statistics.median(durations)
+        slow = [n for n in nodes if not n.phase.finished and n.elapsed > limit]
+        return sorted(slow, key=lambda n: n.elapsed, reverse=True)
+
+    def summary(self, max_stragglers: int = 3) -> str:
+        counts = self.counts()
+        total = sum(counts.values())
+        parts = [
+            f"{self.operation} {counts.get(Phase.READY, 0)}/{total} ready",
+        ]
+        if counts.get(Phase.FAILED):
+            parts[0] += f", {counts[Phase.FAILED]} failed"
+        running = [
+            f"{phase.value} {counts[phase]}"
+            for phase in Phase
+            if not phase.finished and counts.get(phase)
+        ]
+        if running:
+            parts.append(", ".join(running))
+        if any(node.bytes_total for node in self.nodes()):
+            parts.append(f"{self.mbps():.1f} MB/s")
+        eta = self.eta()
+        if eta is not None and not self.done:
+            parts.append(f"ETA {_duration(eta)}")
+        slow = self.stragglers()[:max_stragglers]
+        if slow:
+            parts.append(
+                "slow: "
+                + ", ".join(
+                    f"{n.name} ({n.phase.value} {_duration(n.phase_elapsed)})"
+                    for n in slow
+                )
+            )
+        return " | ".join(parts)
+
+
+class TerminalRenderer:
+    """Redraws progress.summary() every interval seconds until stopped; in
+    place on a terminal, as a new line on changes otherwise (logs, CI)."""
+
+    def __init__(
+        self,
+        progress: Progress,
+        stream: IO[str] | None = None,
+        interval: float = 0.5,
+    ) -> None:
+        self.progress = progress
+        self.stream = stream or sys.stderr
+        self.interval = interval
+        self._tty = hasattr(self.stream, "isatty") and self.stream.isatty()
+        self._last = ""
+        self._stop = Event()
+        self._thread: Thread | None = None
+
+    def render(self) -> None:
+        line = self.progress.summary()
+        if self._tty:
+            self.stream.write("\r\x1b[2K" + line)
+        elif line != self._last:
+            self.stream.write(line + "\n")
+        self.stream.flush()
+        self._last = line
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.render()
+
+    def start(self) -> "TerminalRenderer":
+        self._stop.clear()
+        self._thread = Thread(target=self._run, daemon=True, name="progress")
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.render()
+        if self._tty:
+            self.stream.write("\n")
+            self.stream.flush()
+
+    def __enter__(self) -> "TerminalRenderer":
+        return self.start()
+
+    def __exit__(self, *exc: object) -> None:
+        self.stop()
@@ -0,0 +1,196 @@
+"""
+Upload-once, run-many remote scripts.
+
+A RemoteScript is a bundle of one or more shell steps. The first run on a
+droplet ships the bundle as a tar.gz over the stdin of the same ssh session
+that executes it, where it is cached under its content hash. Later runs only
+send a small runner command that executes the cached steps by hash.
+"""
+
+import hashlib
+import io
+import re
+import shlex
+import tarfile
+from dataclasses import dataclass, field
+from threading import Lock
+from typing import TYPE_CHECKING
+
+from digital_ocean_cluster.process import CancelToken
+from digital_ocean_cluster.types import CompletedProcess
+
+if TYPE_CHECKING:
+    from digital_ocean_cluster.droplet import Droplet
+
+REMOTE_SCRIPT_ROOT = "/root/.cache/digital-ocean-cluster/scripts"
+
+# Runner exit code meaning "the bundle is not cached on this droplet".
+_EXIT_NOT_CACHED = 86
+_STEP_HEADER = b"@@DOC-STEP "
+_ENV_NAME = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+
+# (droplet id, digest) pairs known to be cached remotely.
+_UPLOADED: set[tuple[int, str]] = set()
+_UPLOADED_LOCK = Lock()
+
+
+@dataclass
+class StepResult:
+    name: str
+    returncode: int
+    stdout: bytes
+    stderr: bytes
+    elapsed: float
+
+    @property
+    def ok(self) -> bool:
+        return self.returncode == 0
+
+
+@dataclass
+class ScriptResult:
+    cp: CompletedProcess
+    steps: list[StepResult] = field(default_factory=list)
+    uploaded: bool = False
+
+    @property
+    def ok(self) -> bool:
+        if self.cp.timed_out or self.cp.cancelled:
+            return False
+        return bool(self.steps) and all(s.ok for s in self.steps)
+
+    def __str__(self) -> str:
+        steps = ", ".join(f"{s.name}={s.returncode}" for s in self.steps)
+        return f"ScriptResult(ok={self.ok}, uploaded={self.uploaded}, steps=[{steps}])"
+
+
+class RemoteScript:
+    """An ordered bundle of named shell steps, identified by content hash."""
+
+    def __init__(self, script: "str | list[tuple[str, str]]") -> None:
+        if isinstance(script, str):
+            script = [("main", script)]
+        if not script:
+            raise ValueError("RemoteScript needs at least one step.")
+        self.steps: list[tuple[str, str]] = list(script)
+        hasher = hashlib.sha256()
+        for name, body in self.steps:
+            hasher.update(name.encode("utf-8") + b"\0")
+            hasher.update(body.encode("utf-8") + b"\0")
+        self.digest = hasher.hexdigest()
+
+    def payload(self) -> bytes:
+        """The bundle as tar.gz, one file per step in order."""
+        buf = io.BytesIO()
+        with tarfile.open(fileobj=buf, mode="w:gz") as tar:
+            for i, (_, body) in enumerate(self.steps):
+                data = body.encode("utf-8")
+                info = tarfile.TarInfo(f"step_{i:03d}.sh")
+                info.size = len(data)
+                info.mode = 0o755
+                tar.addfile(info, io.BytesIO(data))
+        return buf.getvalue()
+
+    def command(
+        self,
+        args: list[str] | None = None,
+        env: dict[str, str] | None = None,
+        upload: bool = True,
+        stop_on_error: bool = True,
+        root: str = REMOTE_SCRIPT_ROOT,
+    ) -> str:
+        """Shell command that (optionally) installs the bundle from stdin and
+        runs every step, framing each step's output for parse_output. Steps
+        run with stdin closed, so a cached bundle's unread payload never
+        reaches them."""
+        for key in env or {}:
+            if not _ENV_NAME.fullmatch(key):
+                raise ValueError(f"Invalid environment variable name: {key!r}")
+        d = shlex.quote(f"{root}/{self.digest}")
+        quoted_args = " ".join(shlex.quote(a) for a in args or [])
+        lines = [f"D={d}"]
+        if upload:
+            lines.append(
+                'if [ ! -d "$D" ]; then T="$D.tmp.$$"; mkdir -p "$T" '
+                '&& tar -xzf - -C "$T" && { mv "$T" "$D" 2>/dev/null || rm -rf "$T"; }; fi'
+            )
+        lines.append(f'[ -d "$D" ] || exit {_EXIT_NOT_CACHED}')
+        for key, value in (env or {}).items():
+            lines.append(f"export {key}={shlex.quote(value)}")
+        lines.append("R=$(mktemp -d); trap 'rm -rf \"$R\"' EXIT")
+        for i in range(len(self.steps)):
+            lines.append(
+                f'S=$(date +%s%N); bash "$D/step_{i:03d}.sh" {quoted_args} </dev/null >"$R/o" 2>"$R/e"; '
+                "RC=$?; E=$(date +%s%N); "
+                f"printf '@@DOC-STEP {i} %d %d %d %d\\n' \"$RC\" $(((E-S)/1000)) "
+                '$(wc -c <"$R/o") $(wc -c <"$R/e"); cat "$R/o" "$R/e"'
+            )
+            if stop_on_error:
+                lines.append('[ "$RC" -eq 0 ] || exit "$RC"')
+        return "\n".join(lines)
+
+    def parse_output(self, stdout: bytes) -> list[StepResult]:
+        out: list[StepResult] = []
+        pos = 0
+        while True:
+            start = stdout.find(_STEP_HEADER, pos)
+            if start < 0:
+                break
+            end = stdout.find(b"\n", start)
+            if end < 0:
+                break
+            fields = stdout[start + len(_STEP_HEADER) : end].split()
+            index, rc, micros, out_len, err_len = (int(f) for f in fields)
+            body = end + 1
+            step_out = stdout[body : body + out_len]
+            step_err = stdout[body + out_len : body + out_len + err_len]
+            out.append(
+                StepResult(
+                    name=self.steps[index][0],
+                    returncode=rc,
+                    stdout=step_out,
+                    stderr=step_err,
+                    elapsed=micros / 1e6,
+                )
+            )
+            pos = body + out_len + err_len
+        return out
+
+
+def run_script(
+    droplet: "Droplet",
+    script: RemoteScript,
+    args: list[str] | None = None,
+    env: dict[str, str] | None = None,
+    timeout: float | None = None,
+    cancel: CancelToken | None = None,
+) -> ScriptResult:
+    """Run script on droplet in a single ssh session, uploading the bundle only
+    if this process has not already cached it there."""
+    key = (droplet.id, script.digest)
+    with _UPLOADED_LOCK:
+        cached = key in _UPLOADED
+    uploaded = False
+    if cached:
+        cp = droplet.ssh_exec(
+            script.command(args, env, upload=False), timeout=timeout, cancel=cancel
+        )
+        # A step may exit 86 itself; then its frame is there.
+        if cp.returncode == _EXIT_NOT_CACHED and not script.parse_output(
+            cp.stdout_bytes
+        ):
+            # The remote cache was wiped (e.g. droplet rebuilt), resend it.
+            cached = False
+    if not cached:
+        cp = droplet.ssh_exec(
+            script.command(args, env, upload=True),
+            timeout=timeout,
+            cancel=cancel,
+            input=script.payload(),
+        )
+        uploaded = True
+    steps = script.parse_output(cp.stdout_bytes)
+    if steps:
+        with _UPLOADED_LOCK:
+            _UPLOADED.add(key)
+    return ScriptResult(cp=cp, steps=steps, uploaded=uploaded)
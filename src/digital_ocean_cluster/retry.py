@@ -0,0 +1,348 @@
+"""
+Retries for doctl calls, ssh and transfers.
+
+Failures (exceptions, error results, failed CompletedProcesses) are sorted by
+classify() into an ErrorClass from their text:
+
+  * TRANSIENT: network hiccups, timeouts, 5xx answers; retried quickly.
+  * RATE_LIMIT: HTTP 429; retried with long waits.
+  * CAPACITY: the region/size is out of stock or the droplet limit is hit;
+    retried a couple of times, slowly (placement moves such droplets to
+    another region).
+  * AUTH: bad token or key; never retried.
+  * PERMANENT: anything else, e.g. a remote command exiting non-zero; never
+    retried.
+
+retry_call runs an operation under a RetryPolicy (a Backoff per class) and
+counts attempts, retries and give-ups per operation in retry_metrics().
+"""
+
+import random
+import re
+import subprocess
+import time
+from dataclasses import dataclass, field
+from enum import Enum
+from threading import Lock
+from typing import Any, Callable, TypeVar
+
+from digital_ocean_cluster.log import get_logger
+from digital_ocean_cluster.process import CancelToken, remaining
+from digital_ocean_cluster.types import CompletedProcess, DropletException
+
+logger = get_logger(__name__)
+
+T = TypeVar("T")
+
+
+class ErrorClass(Enum):
+    TRANSIENT = "transient"
+    RATE_LIMIT = "rate_limit"
+    CAPACITY = "capacity"
+    AUTH = "auth"
+    PERMANENT = "permanent"
+
+
+# First match wins, so the more specific classes come first.
+_PATTERNS: list[tuple[ErrorClass, re.Pattern]] = [
+    (
+        ErrorClass.RATE_LIMIT,
+        re.compile(r"\b429\b|too many requests|rate.?limit", re.IGNORECASE),
+    ),
+    (
+        ErrorClass.AUTH,
+        re.compile(
+            r"\b401\b|\b403\b|unauthori[sz]ed|forbidden|invalid token|"
+            r"unable to authenticate|permission denied \(publickey|"
+            r"host key verification failed|no digitalocean access token",
+            re.IGNORECASE,
+        ),
+    ),
+    (
+        ErrorClass.CAPACITY,
+        re.compile(
+            r"droplet limit|out of capacity|insufficient capacity|"
+            r"(size|region|image) is (not|currently) available|"
+            r"not available in this region|currently unavailable",
+            re.IGNORECASE,
+        ),
+    ),
+    (
+        ErrorClass.TRANSIENT,
+        re.compile(
+            r"timed? ?out|connection (refused|reset|closed|lost)|lost connection|"
+            r"broken pipe|temporar(y|ily)|\b50[0234]\b|internal server error|"
+            r"bad gateway|service unavailable|could not resolve|"
+            r"network is unreachable|no route to host|kex_exchange_identification|"
+            r"ssh_exchange_identification|unexpected eof|i/o timeout|try again",
+            re.IGNORECASE,
+        ),
+    ),
+]
+
+
+class ClassifiedError(DropletException):
+    """A DropletException whose ErrorClass is known up front."""
+
+    def __init__(self, message: str, error_class: ErrorClass, **context: Any) -> None:
+        super().__init__(message, **context)
+        self.error_class = error_class
+
+
+def classify_text(text: str) -> ErrorClass:
+    for error_class, pattern in _PATTERNS:
+        if pattern.search(text):
+            return error_class
+    return ErrorClass.PERMANENT
+
+
+def classify(error: Any) -> ErrorClass:
+    """ErrorClass of an exception, a failed CompletedProcess (ours or the
+    stdlib's) or an error message."""
+    error_class = getattr(error, "error_class", None)
+    if isinstance(error_class, ErrorClass):
+        return error_class
+    if isinstance(error, CompletedProcess):
+        if error.cancelled:
+            return ErrorClass.PERMANENT
+        if error.timed_out:
+            return ErrorClass.TRANSIENT
+        return classify_text(error.stderr)
+    if isinstance(error, subprocess.CompletedProcess):
+        stderr = error.stderr
+        if isinstance(stderr, bytes):
+            stderr = stderr.decode("utf-8", errors="replace")
+        return classify_text(f"{stderr or ''}\n{error.stdout or ''}")
+    if isinstance(error, DropletException):
+        return classify_text(f"{error.message}\n{error.stderr or ''}")
+    return classify_text(str(error))
+
+
+@dataclass
+class Backoff:
+    retries: int  # retries after the first attempt; 0 = never retry
+    base: float = 1.0  # seconds before the first retry
+    cap: float = 30.0
+    multiplier: float = 2.0
+    jitter: float = 0.5  # each delay is scaled by 1 +- jitter at random
+
+    def delay(self, retry: int) -> float | None:
+        """Seconds to wait before retry number retry (1 based), None if the
+        retries are used up."""
+        if retry > self.retries:
+            return None
+        delay = min(self.cap, self.base * self.multiplier ** (retry - 1))
+        return delay * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+
+def _default_backoffs() -> dict[ErrorClass, Backoff]:
+    return {
+        ErrorClass.TRANSIENT: Backoff(retries=4, base=1.0, cap=15.0),
+        ErrorClass.RATE_LIMIT: Backoff(retries=6, base=5.0, cap=60.0),
+        ErrorClass.CAPACITY: Backoff(retries=2, base=10.0, cap=30.0),
+        ErrorClass.AUTH: Backoff(retries=0),
+        ErrorClass.PERMANENT: Backoff(retries=0),
+    }
+
+
+@dataclass
+class RetryPolicy:
+    backoffs: dict[ErrorClass, Backoff] = field(default_factory=_default_backoffs)
+    # Give up once this many seconds have passed since the first attempt.
+    total_timeout: float | None = None
+
+    def delay(self, error_class: ErrorClass, retry: int) -> float | None:
+        backoff = self.backoffs.get(error_class)
+        return backoff.delay(retry) if backoff is not None else None
+
+
+DEFAULT_POLICY = RetryPolicy()
+NO_RETRY = RetryPolicy({})
+
+
+@dataclass
+class OperationStats:
+    calls: int = 0
+    attempts: int = 0
+    successes: int = 0
+    retries: dict[ErrorClass, int] = field(default_factory=dict)
+    give_ups: dict[ErrorClass, int] = field(default_factory=dict)
+    sleep_seconds: float = 0.0
+
+
+class RetryMetrics:
+    """Attempts, retries and give-ups per operation, across threads."""
+
+    def __init__(self) -> None:
+        self._lock = Lock()
+        self._ops: dict[str, OperationStats] = {}
+
+    def _stats(self, operation: str) -> OperationStats:
+        return self._ops.setdefault(operation, OperationStats())
+
+    def attempt(self, operation: str, first: bool) -> None:
+        with self._lock:
+            stats = self._stats(operation)
+            stats.attempts += 1
+            stats.calls += first
+
+    def success(self, operation: str) -> None:
+        with self._lock:
+            self._stats(operation).successes += 1
+
+    def retry(self, operation: str, error_class: ErrorClass, delay: float) -> None:
+        with self._lock:
+            stats = self._stats(operation)
+            stats.retries[error_class] = stats.retries.get(error_class, 0) + 1
+            stats.sleep_seconds += delay
+
+    def give_up(self, operation: str, error_class: ErrorClass) -> None:
+        with self._lock:
+            stats = self._stats(operation)
+            stats.give_ups[error_class] = stats.give_ups.get(error_class, 0) + 1
+
+    def snapshot(self) -> dict[str, OperationStats]:
+        with self._lock:
+            return {
+                op: OperationStats(
+                    s.calls,
+                    s.attempts,
+                    s.successes,
+                    dict(s.retries),
+                    dict(s.give_ups),
+                    s.sleep_seconds,
+                )
+                for op, s in self._ops.items()
+            }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._ops.clear()
+
+    def __str__(self) -> str:
+        lines = []
+        for op, s in sorted(self.snapshot().items()):
+            retries = ", ".join(f"{c.value}={n}" for c, n in s.retries.items())
+            give_ups = ", ".join(f"{c.value}={n}" for c, n in s.give_ups.items())
+            lines.append(
+                f"{op}: calls={s.calls} attempts={s.attempts} ok={s.successes} "
+                f"retries=[{retries}] gave_up=[{give_ups}] "
+                f"slept={s.sleep_seconds:.1f}s"
+            )
+        return "\n".join(lines)
+
+
+_METRICS = RetryMetrics()
+
+
+def retry_metrics() -> RetryMetrics:
+    return _METRICS
+
+
+def _failure(result: Any) -> Any:
+    """The error in a result, if any: a returned exception or a failed
+    process."""
+    if isinstance(result, Exception):
+        return result
+    if isinstance(result, CompletedProcess) and not result.ok:
+        return result
+    if isinstance(result, subprocess.CompletedProcess) and result.returncode != 0:
+        return result
+    return None
+
+
+def _describe(error: Any) -> str:
+    if isinstance(error, (CompletedProcess, subprocess.CompletedProcess)):
+        stderr = error.stderr
+        if isinstance(stderr, bytes):
+            stderr = stderr.decode("utf-8", errors="replace")
+        text = (stderr or "").strip() or f"exit {error.returncode}"
+    else:
+        text = str(error)
+    return text if len(text) <= 300 else "..." + text[-300:]
+
+
+def retry_call(
+    operation: str,
+    fn: Callable[[], T],
+    policy: RetryPolicy | None = None,
+    cancel: CancelToken | None = None,
+    failure: Callable[[T], Any] = _failure,
+    droplet: str | None = None,
+    deadline: float | None = None,
+) -> T:
+    """Call fn until it succeeds or policy says to stop. A failure is a
+    DropletException raised by fn, or whatever failure(result) returns (by
+    default: a returned exception or a failed process). When giving up, the
+    last exception is re-raised, or the last result returned, so callers keep
+    their usual error handling.
+
+    deadline (a time.monotonic() value) bounds all attempts together: backoff
+    sleeps are cut short at it and no attempt starts once it has passed."""
+    policy = policy or DEFAULT_POLICY
+    extra = {"droplet": droplet} if droplet else {}
+    start = time.monotonic()
+    retries: dict[ErrorClass, int] = {}
+    first = True
+    while True:
+        _METRICS.attempt(operation, first)
+        first = False
+        raised: DropletException | None = None
+        result: Any = None
+        try:
+            result = fn()
+            error = failure(result)
+        except DropletException as e:
+            raised = error = e
+        if error is None:
+            _METRICS.success(operation)
+            return result
+        error_class = classify(error)
+        retries[error_class] = retries.get(error_class, 0) + 1
+        delay = policy.delay(error_class, retries[error_class])
+        if delay is not None and policy.total_timeout is not None:
+            if time.monotonic() + delay - start > policy.total_timeout:
+                delay = None
+        if delay is not None and deadline is not None:
+            left = remaining(deadline)
+            delay = min(delay, left) if left > 0 else None
+        if delay is None or (cancel is not None and cancel.cancelled):
+            _METRICS.give_up(operation, error_class)
+            if raised is not None:
+                raise raised
+            return result
+        _METRICS.retry(operation, error_class, delay)
+        logger.warning(
+            "%s failed (%s), retry %d in %.1fs: %s",
+            operation,
+            error_class.value,
+            retries[error_class],
+            delay,
+            _describe(error),
+            extra=extra,
+        )
+        if cancel is not None:
+            stopped = cancel.wait(delay)
+        else:
+            time.sleep(delay)
+            stopped = False
+        if stopped or remaining(deadline) == 0:
+            _METRICS.give_up(operation, error_class)
+            if raised is not None:
+                raise raised
+            return result
+
+
+def run_with_retry(
+    cmd_list: list[str],
+    operation: str,
+    policy: RetryPolicy | None = None,
+    droplet: str | None = None,
+) -> subprocess.CompletedProcess:
+    """subprocess.run(cmd_list) with text output, retried per policy."""
+    return retry_call(
+        operation,
+        lambda: subprocess.run(cmd_list, capture_output=True, text=True, shell=False),
+        policy,
+        droplet=droplet,
+    )
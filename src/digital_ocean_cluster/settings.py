@@ -1 +1,17 @@
+import os
+
 SLEEP_TIME_BEFORE_SSH = 10
+
+# Process output above this many bytes is spilled to a memory mapped temp file.
+OUTPUT_SPILL_THRESHOLD = 8 * 1024 * 1024
+
+# Level of the package logger (see log.py); DEBUG shows every ssh/doctl command.
+LOG_LEVEL = os.environ.get("DIGITAL_OCEAN_CLUSTER_LOG_LEVEL", "INFO").upper()
+
+# Characters of stderr kept on a DropletException.
+ERROR_STDERR_TAIL = 2000
+
+# Record where a DropletException was created even when it is returned rather
+# than raised (raised ones get it from their traceback). Costs a stack walk per
+# error, so it is off unless debugging.
+CAPTURE_ERROR_ORIGIN = os.environ.get("DIGITAL_OCEAN_CLUSTER_ERROR_ORIGIN") == "1"
@@ -0,0 +1,201 @@
+"""
+Declarative cluster specs.
+
+A ClusterSpec describes the cluster you want. plan_cluster diffs it against
+the droplets that currently carry the spec's tags and returns a ClusterPlan of
+droplets to create, keep, replace and delete; apply_plan carries out only that
+delta, in parallel. Redeploying an unchanged spec touches nothing.
+
+The install version is recorded as a tag on each droplet, so bumping it
+replaces droplets that were set up by an older install function.
+"""
+
+import hashlib
+import re
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Any, Callable
+
+from digital_ocean_cluster.cluster import (
+    DigitalOceanCluster,
+    DropletCluster,
+    DropletCreationArgs,
+)
+from digital_ocean_cluster.droplet_manager import Droplet, DropletManager
+from digital_ocean_cluster.identity import Identity
+from digital_ocean_cluster.machines import ImageType, MachineSize, Region, to_slug
+from digital_ocean_cluster.types import DropletException, SSHKey
+
+INSTALL_TAG_PREFIX = "install-version:"
+
+# Droplets in these states are running (or about to be) and can be kept.
+_LIVE_STATUSES = ("new", "active")
+
+
+def install_tag(version: str) -> str:
+    # Tags may only contain letters, numbers, colons, dashes and underscores.
+    # A version that needs escaping gets a hash of itself appended, so that
+    # e.g. 1.0+a and 1.0-a still get different tags.
+    tag = re.sub(r"[^A-Za-z0-9:_-]", "-", version)
+    if tag != version:
+        tag += "-" + hashlib.sha256(version.encode()).hexdigest()[:8]
+    return INSTALL_TAG_PREFIX + tag
+
+
+@dataclass
+class ClusterSpec:
+    name: str  # droplets are named {name}-0 .. {name}-{count - 1}
+    count: int
+    tags: list[str]
+    size: MachineSize | str = MachineSize.S_2VCPU_2GB
+    image: ImageType | str = ImageType.UBUNTU_24_10_X64
+    region: Region | str = Region.NYC_1
+    install: Callable[[Droplet], Any] | None = None
+    # Bump when install changes to have existing droplets replaced.
+    install_version: str | None = None
+    ssh_key: SSHKey | None = None
+    enable_monitoring: bool = True
+    identity: Identity | None = None
+
+    def __post_init__(self) -> None:
+        if not self.tags:
+            raise ValueError("A ClusterSpec needs tags to find its droplets by.")
+        self.name = self.name.replace("_", "-")
+
+    def names(self) -> list[str]:
+        return [f"{self.name}-{i}" for i in range(self.count)]
+
+    def creation_args(self, name: str) -> DropletCreationArgs:
+        tags = list(self.tags)
+        if self.install_version is not None:
+            tags.append(install_tag(self.install_version))
+        return DropletCreationArgs(
+            name=name,
+            tags=tags,
+            ssh_key=self.ssh_key,
+            size=self.size,
+            image=self.image,
+            region=self.region,
+            install=self.install,
+            enable_monitoring=self.enable_monitoring,
+            identity=self.identity,
+        )
+
+    def mismatch(self, droplet: Droplet) -> str | None:
+        """Why droplet does not satisfy this spec, or None if it does. Fields
+        missing from the payload are assumed to match, since a replacement is
+        destructive."""
+        data = droplet.data
+        status = data.get("status")
+        if status is not None and status not in _LIVE_STATUSES:
+            return f"status is {status}"
+        size = data.get("size_slug") or (data.get("size") or {}).get("slug")
+        if size is not None and size != to_slug(self.size):
+            return f"size {size} != {to_slug(self.size)}"
+        image = (data.get("image") or {}).get("slug")
+        if image is not None and image != to_slug(self.image):
+            return f"image {image} != {to_slug(self.image)}"
+        region = (data.get("region") or {}).get("slug")
+        if region is not None and region != to_slug(self.region):
+            return f"region {region} != {to_slug(self.region)}"
+        if self.install_version is not None:
+            wanted = install_tag(self.install_version)
+            if wanted not in droplet.tags:
+                have = [t for t in droplet.tags if t.startswith(INSTALL_TAG_PREFIX)]
+                return f"install {have[0] if have else 'unversioned'} != {wanted}"
+        return None
+
+
+@dataclass
+class ClusterPlan:
+    spec: ClusterSpec
+    create: list[DropletCreationArgs] = field(default_factory=list)
+    keep: list[Droplet] = field(default_factory=list)
+    # (existing droplet, args for its replacement, reason)
+    replace: list[tuple[Droplet, DropletCreationArgs, str]] = field(
+        default_factory=list
+    )
+    delete: list[Droplet] = field(default_factory=list)
+
+    @property
+    def empty(self) -> bool:
+        return not (self.create or self.replace or self.delete)
+
+    def __str__(self) -> str:
+        lines = [
+            f"Plan for {self.spec.name}: create {len(self.create)}, keep "
+            f"{len(self.keep)}, replace {len(self.replace)}, delete {len(self.delete)}"
+        ]
+        lines += [f"  + {a.name}" for a in self.create]
+        lines += [f"  ~ {d.name} ({reason})" for d, _, reason in self.replace]
+        lines += [f"  - {d.name}" for d in self.delete]
+        return "\n".join(lines)
+
+
+def plan_cluster(
+    spec: ClusterSpec, existing: list[Droplet] | None = None
+) -> ClusterPlan:
+    """Diff spec against existing droplets (by default, those carrying the
+    spec's tags)."""
+    if existing is None:
+        existing = DropletManager.find_droplets(tags=spec.tags)
+    plan = ClusterPlan(spec)
+    wanted = spec.names()
+    by_name: dict[str, Droplet] = {}
+    for droplet in sorted(existing, key=lambda d: d.id):
+        if droplet.name not in wanted or droplet.name in by_name:
+            # Not part of the spec, or a duplicate name: keep the oldest.
+            plan.delete.append(droplet)
+        else:
+            by_name[droplet.name] = droplet
+    for name in wanted:
+        droplet = by_name.get(name)
+        if droplet is None:
+            plan.create.append(spec.creation_args(name))
+            continue
+        reason = spec.mismatch(droplet)
+        if reason is None:
+            plan.keep.append(droplet)
+        else:
+            plan.replace.append((droplet, spec.creation_args(name), reason))
+    return plan
+
+
+def apply_plan(plan: ClusterPlan) -> DropletCluster:
+    """Carry out plan. New droplets are created while obsolete ones are being
+    deleted; a replacement is created once the droplet it replaces is gone, so
+    names stay unique."""
+    futures: dict[str, Future[Droplet | Exception]] = {}
+    droplets = list(plan.keep)
+    failed: dict[str, DropletException] = {}
+    try:
+        if plan.create:
+            futures.update(DigitalOceanCluster.async_create_droplets(plan.create))
+        to_delete = plan.delete + [d for d, _, _ in plan.replace]
+        if to_delete:
+            DigitalOceanCluster.delete_cluster(DropletCluster(to_delete, {}))
+        if plan.replace:
+            futures.update(
+                DigitalOceanCluster.async_create_droplets(
+                    [a for _, a, _ in plan.replace]
+                )
+            )
+    finally:
+        # Even if deleting raised, wait for the creates already started; the
+        # next plan finds those droplets by their tags.
+        for name, future in futures.items():
+            result = future.result()
+            if isinstance(result, Exception):
+                failed[name] = DropletException.wrap(
+                    result, droplet=name, operation="create_droplet"
+                )
+            else:
+                droplets.append(result)
+    order = {name: i for i, name in enumerate(plan.spec.names())}
+    droplets.sort(key=lambda d: order.get(d.name, len(order)))
+    return DropletCluster(droplets=droplets, failed_droplets=failed)
+
+
+def apply_spec(spec: ClusterSpec) -> tuple[ClusterPlan, DropletCluster]:
+    plan = plan_cluster(spec)
+    return plan, apply_plan(plan)
@@ -0,0 +1,294 @@
+"""
+Straggler mitigation for cluster creation.
+
+Most droplets of a batch are ready within a similar time, but now and then
+one sits in cloud-init for many minutes and holds up the whole cluster.
+create_with_stragglers creates the batch like create_droplets, and once
+StragglerPolicy.ready_fraction of it is ready, launches a replacement for
+every droplet that has been running much longer than the others took. Each
+name is kept by whichever of its two attempts is ready first; the other is
+deleted (a winning replacement is renamed to the original name).
+
+A losing original may keep running for loser_grace seconds in the background,
+so the report can tell when it would have been ready and thus how much wall
+time the replacement saved.
+"""
+
+import math
+import statistics
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from dataclasses import dataclass, field, replace
+from threading import Lock, Timer
+
+from digital_ocean_cluster.cluster import (
+    DigitalOceanCluster,
+    DropletCluster,
+    DropletCreationArgs,
+)
+from digital_ocean_cluster.droplet_manager import Droplet, DropletManager
+from digital_ocean_cluster.ensure_doctl import ensure_doctl
+from digital_ocean_cluster.log import get_logger
+from digital_ocean_cluster.progress import NodeProgress, Phase, Progress
+from digital_ocean_cluster.types import THREAD_POOL, DropletException
+
+logger = get_logger(__name__)
+
+REPLACEMENT_SUFFIX = "-spare"
+
+
+@dataclass
+class StragglerPolicy:
+    # Start replacing once this fraction of the droplets is ready ...
+    ready_fraction: float = 0.9
+    # ... the droplets running longer than slowdown times the median time the
+    # ready ones took.
+    slowdown: float = 1.5
+    # At most this many replacements at once (None: no limit).
+    max_replacements: int | None = None
+    # Seconds a losing original may keep running to measure the time saved.
+    loser_grace: float = 120.0
+    poll_interval: float = 1.0
+
+
+@dataclass
+class Speculation:
+    name: str
+    launched_at: float  # seconds after the start of the batch
+    decided_at: float | None = None
+    winner: str = ""  # "original" or "replacement"
+    # When the losing original was ready, if it was within its grace.
+    original_ready_at: float | None = None
+
+
+@dataclass
+class StragglerResult:
+    cluster: DropletCluster
+    wall_time: float  # seconds until the last name was ready
+    policy: StragglerPolicy
+    speculations: dict[str, Speculation] = field(default_factory=dict)
+    # Seconds after the start at which each name's original attempt was ready.
+    ready_at: dict[str, float] = field(default_factory=dict)
+    _retirements: dict[str, Future[float | None]] = field(default_factory=dict)
+
+    def time_saved(self, timeout: float | None = None) -> float:
+        """Wall time saved by the replacements: when the original attempts
+        would all have been ready, minus wall_time. Waits (up to timeout) for
+        the losing originals' grace periods. An original that was still not
+        ready when its grace ran out counts as ready then, so the result is a
+        lower bound in that case."""
+        wait(self._retirements.values(), timeout=timeout)
+        baseline = max(self.ready_at.values(), default=0.0)
+        for name, future in self._retirements.items():
+            spec = self.speculations[name]
+            assert spec.decided_at is not None
+            ready = future.result() if future.done() else None
+            spec.original_ready_at = ready
+            if ready is None:
+                ready = spec.decided_at + self.policy.loser_grace
+            baseline = max(baseline, ready)
+        return max(0.0, baseline - self.wall_time)
+
+    def __str__(self) -> str:
+        won = sum(s.winner == "replacement" for s in self.speculations.values())
+        return (
+            f"ready={len(self.cluster.droplets)} failed="
+            f"{len(self.cluster.failed_droplets)} wall_time={self.wall_time:.1f}s "
+            f"replacements={len(self.speculations)} won={won}"
+        )
+
+
+def _delete_quietly(droplet: Droplet) -> None:
+    try:
+        droplet.delete()
+    except DropletException as e:
+        logger.warning("Could not delete %s: %s", droplet.name, e)
+
+
+def _discard_later(future: Future, keep: Droplet) -> None:
+    """Delete what future creates, unless it is keep, whenever it completes."""
+
+    def _done(f: Future) -> None:
+        result = f.result() if not f.cancelled() else None
+        if result is None or isinstance(result, Exception):
+            return
+        if result.id != keep.id:
+            _delete_quietly(result)
+
+    future.add_done_callback(_done)
+
+
+def _retire_original(
+    future: Future,
+    found: list[Droplet],
+    winner: Droplet,
+    grace: float,
+    finished_at: dict[Future, float],
+    start: float,
+) -> Future[float | None]:
+    """Let the losing original run for up to grace seconds, then delete it.
+    The returned future gives when it was ready (seconds after start), if it
+    was. Nothing waits in the meantime: a timer and a done callback race to
+    retire it, and whichever comes first does."""
+    out: Future[float | None] = Future()
+    lock = Lock()
+    finished = False
+
+    def _finish() -> None:
+        nonlocal finished
+        with lock:
+            if finished:
+                return
+            finished = True
+        timer.cancel()
+        ready_at = None
+        if future.done() and not isinstance(future.result(), Exception):
+            ready_at = finished_at.get(future, time.monotonic()) - start
+        for droplet in found:
+            _delete_quietly(droplet)
+        _discard_later(future, winner)
+        out.set_result(ready_at)
+
+    timer = Timer(grace, _finish)
+    timer.start()
+    future.add_done_callback(lambda _: _finish())
+    return out
+
+
+def _retire_replacement(future: Future, spare_name: str, winner: Droplet) -> None:
+    _discard_later(future, winner)
+    try:
+        for droplet in DropletManager.find_droplets(name=spare_name):
+            _delete_quietly(droplet)
+    except DropletException as e:
+        logger.warning("Could not look up %s: %s", spare_name, e)
+
+
+def create_with_stragglers(
+    args: list[DropletCreationArgs],
+    policy: StragglerPolicy | None = None,
+    progress: Progress | None = None,
+) -> StragglerResult:
+    """Create args, replacing stragglers as described in the module docstring."""
+    ensure_doctl()
+    policy = policy or StragglerPolicy()
+    progress = progress or Progress("create")
+    by_name = {arg.name: arg for arg in args}
+    start = time.monotonic()
+    lock = Lock()
+    running_since: dict[str, float] = {}
+    finished_at: dict[Future, float] = {}
+
+    def _on_phase(node: NodeProgress, previous: Phase) -> None:
+        if previous == Phase.QUEUED and node.name in by_name:
+            with lock:
+                running_since.setdefault(node.name, time.monotonic())
+
+    progress.subscribe(_on_phase)
+
+    pending: dict[Future, tuple[str, bool]] = {}
+    attempts: dict[str, dict[bool, Future]] = {}
+
+    def _submit(arg: DropletCreationArgs, name: str, spare: bool) -> None:
+        futures = DigitalOceanCluster.async_create_droplets([arg], progress=progress)
+        future = futures[arg.name]
+        future.add_done_callback(lambda f: finished_at.setdefault(f, time.monotonic()))
+        pending[future] = (name, spare)
+        attempts.setdefault(name, {})[spare] = future
+
+    for arg in args:
+        _submit(arg, arg.name, False)
+
+    result = StragglerResult(DropletCluster([], {}), 0.0, policy)
+    winners: dict[str, Droplet] = {}
+    durations: list[float] = []
+    needed = math.ceil(policy.ready_fraction * len(args))
+    while pending:
+        done, _ = wait(
+            list(pending), timeout=policy.poll_interval, return_when=FIRST_COMPLETED
+        )
+        now = time.monotonic()
+        for future in done:
+            if future not in pending:
+                continue  # lost to its other attempt in this same batch
+            name, spare = pending.pop(future)
+            created = future.result()
+            other = attempts[name].get(not spare)
+            spec = result.speculations.get(name)
+            if isinstance(created, Exception):
+                if other is not None and other in pending:
+                    continue  # the other attempt may still make it
+                result.cluster.failed_droplets[name] = DropletException.wrap(
+                    created, droplet=name, operation="create_droplet"
+                )
+                continue
+            if not spare:
+                result.ready_at[name] = now - start
+                with lock:
+                    durations.append(now - running_since.get(name, start))
+            if spec is not None and other is not None:
+                spec.decided_at = now - start
+                spec.winner = "replacement" if spare else "original"
+                pending.pop(other, None)
+                if spare:
+                    # Find the original before the winner takes its name.
+                    try:
+                        found = DropletManager.find_droplets(name=name)
+                    except DropletException:
+                        found = []
+                    found = [d for d in found if d.id != created.id]
+                    try:
+                        created.rename(name)
+                    except DropletException as e:
+                        logger.warning("Keeping %s under its spare name: %s", name, e)
+                    result._retirements[name] = _retire_original(
+                        other,
+                        found,
+                        created,
+                        policy.loser_grace,
+                        finished_at,
+                        start,
+                    )
+                else:
+                    THREAD_POOL.submit(
+                        _retire_replacement, other, name + REPLACEMENT_SUFFIX, created
+                    )
+            winners[name] = created
+        decided = len(winners) + len(result.cluster.failed_droplets)
+        if decided < needed or not durations or not pending:
+            continue
+        limit = policy.slowdown * statistics.median(durations)
+        in_flight = sum(1 for _, spare in pending.values() if spare)
+        for name, arg in by_name.items():
+            if name in winners or name in result.speculations:
+                continue
+            if name in result.cluster.failed_droplets:
+                continue
+            with lock:
+                since = running_since.get(name)
+            if since is None or now - since <= limit:
+                continue
+            if (
+                policy.max_replacements is not None
+                and in_flight >= policy.max_replacements
+            ):
+                break
+            logger.info(
+                "%s has been creating for %.1fs (median %.1fs), launching a replacement",
+                name,
+                now - since,
+                statistics.median(durations),
+                extra={"droplet": name},
+            )
+            result.speculations[name] = Speculation(name, now - start)
+            # A fresh key: the spare is a second droplet, not a retry of arg.
+            spare_arg = replace(
+                arg, name=name + REPLACEMENT_SUFFIX, idempotency_key=None
+            )
+            _submit(spare_arg, name, True)
+            in_flight += 1
+
+    result.wall_time = time.monotonic() - start
+    result.cluster.droplets = [winners[name] for name in by_name if name in winners]
+    logger.info("Created with stragglers: %s", result)
+    return result
@@ -0,0 +1,532 @@
+"""
+Continuous hot-sync of a local directory to every droplet of a cluster.
+
+A watcher reports the paths that change under the local directory: through
+inotify on Linux (via ctypes, no extra dependency), by polling modification
+times elsewhere. HotSync batches the changes until the tree has been quiet
+for the debounce window, then pushes only those files to all droplets in
+parallel. Each droplet gets one ssh command per batch, which removes deleted
+paths, unpacks a tar of the changed files from stdin and runs the optional
+post-sync command. With the multiplexed connections of the OpenSSH transport
+that is a single round trip per droplet:
+
+    with cluster.hot_sync(Path("app"), Path("/root/app"),
+                          post_sync="systemctl restart app") as sync:
+        sync.wait()  # until Ctrl-C
+"""
+
+import ctypes
+import ctypes.util
+import errno
+import fnmatch
+import io
+import os
+import select
+import shlex
+import struct
+import sys
+import tarfile
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import Future, wait
+from dataclasses import dataclass, field
+from pathlib import Path, PurePosixPath
+from threading import Event, Thread
+from typing import Callable
+
+from digital_ocean_cluster.droplet import Droplet
+from digital_ocean_cluster.log import get_logger
+from digital_ocean_cluster.types import THREAD_POOL, CompletedProcess, DropletException
+
+logger = get_logger(__name__)
+
+DEFAULT_IGNORE = [
+    ".git",
+    "__pycache__",
+    "*.pyc",
+    ".mypy_cache",
+    ".pytest_cache",
+    "*.swp",
+    "*.swx",
+    "*~",
+    ".#*",
+    "4913",  # vim's write test file
+]
+
+# Payloads above this many bytes are gzipped.
+COMPRESS_THRESHOLD = 256 * 1024
+
+_IN_MODIFY = 0x2
+_IN_ATTRIB = 0x4
+_IN_CLOSE_WRITE = 0x8
+_IN_MOVED_FROM = 0x40
+_IN_MOVED_TO = 0x80
+_IN_CREATE = 0x100
+_IN_DELETE = 0x200
+_IN_DELETE_SELF = 0x400
+_IN_MOVE_SELF = 0x800
+_IN_Q_OVERFLOW = 0x4000
+_IN_IGNORED = 0x8000
+_IN_ISDIR = 0x40000000
+_IN_NONBLOCK = 0o4000
+_IN_CLOEXEC = 0o2000000
+_WATCH_MASK = (
+    _IN_MODIFY
+    | _IN_ATTRIB
+    | _IN_CLOSE_WRITE
+    | _IN_MOVED_FROM
+    | _IN_MOVED_TO
+    | _IN_CREATE
+    | _IN_DELETE
+    | _IN_DELETE_SELF
+    | _IN_MOVE_SELF
+)
+_EVENT = struct.Struct("iIII")
+
+
+def is_ignored(rel: PurePosixPath, ignore: list[str]) -> bool:
+    """True if any part of rel matches one of the ignore patterns."""
+    return any(fnmatch.fnmatch(part, pat) for part in rel.parts for pat in ignore)
+
+
+def _walk(root: Path, ignore: list[str]) -> dict[PurePosixPath, os.stat_result]:
+    """Every file under root that is not ignored, with its stat."""
+    out: dict[PurePosixPath, os.stat_result] = {}
+    for dirpath, dirnames, filenames in os.walk(root):
+        rel_dir = PurePosixPath(Path(dirpath).relative_to(root).as_posix())
+        dirnames[:] = [d for d in dirnames if not is_ignored(rel_dir / d, ignore)]
+        for name in filenames:
+            rel = rel_dir / name
+            if is_ignored(rel, ignore):
+                continue
+            try:
+                out[rel] = os.lstat(os.path.join(dirpath, name))
+            except FileNotFoundError:
+                pass
+    return out
+
+
+class Watcher(ABC):
+    """Reports paths, relative to root, that changed since the last poll."""
+
+    def __init__(self, root: Path, ignore: list[str] | None = None) -> None:
+        self.root = root
+        self.ignore = DEFAULT_IGNORE if ignore is None else ignore
+
+    @abstractmethod
+    def poll(self, timeout: float | None) -> set[PurePosixPath]:
+        """Changed paths, waiting up to timeout seconds for the first one.
+        Created, modified, deleted and renamed paths are all reported; the
+        caller tells them apart by looking at the tree."""
+
+    def close(self) -> None:
+        pass
+
+
+class PollingWatcher(Watcher):
+    """Compares modification times and sizes every interval seconds."""
+
+    def __init__(
+        self, root: Path, ignore: list[str] | None = None, interval: float = 0.25
+    ) -> None:
+        super().__init__(root, ignore)
+        self.interval = interval
+        self._snapshot = self._scan()
+
+    def _scan(self) -> dict[PurePosixPath, tuple[int, int, int]]:
+        return {
+            rel: (st.st_mtime_ns, st.st_size, st.st_mode)
+            for rel, st in _walk(self.root, self.ignore).items()
+        }
+
+    def poll(self, timeout: float | None) -> set[PurePosixPath]:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            snapshot = self._scan()
+            changed = {
+                rel
+                for rel in snapshot.keys() | self._snapshot.keys()
+                if snapshot.get(rel) != self._snapshot.get(rel)
+            }
+            self._snapshot = snapshot
+            if changed:
+                return changed
+            if deadline is not None:
+                left = deadline - time.monotonic()
+                if left <= 0:
+                    return set()
+                time.sleep(min(self.interval, left))
+            else:
+                time.sleep(self.interval)
+
+
+class InotifyWatcher(Watcher):
+    """Linux inotify, one watch per directory. New directories are watched
+    (and their files reported) as they appear; a queue overflow falls back to
+    reporting every file."""
+
+    def __init__(self, root: Path, ignore: list[str] | None = None) -> None:
+        super().__init__(root, ignore)
+        if not sys.platform.startswith("linux"):
+            raise DropletException("inotify is only available on Linux")
+        libc_name = ctypes.util.find_library("c") or "libc.so.6"
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        self._fd = self._libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if self._fd < 0:
+            raise DropletException(
+                f"inotify_init1 failed: {os.strerror(ctypes.get_errno())}"
+            )
+        self._dirs: dict[int, PurePosixPath] = {}
+        self._watch_tree(PurePosixPath("."))
+
+    def _watch(self, rel_dir: PurePosixPath) -> None:
+        path = os.fsencode(self.root / rel_dir)
+        wd = self._libc.inotify_add_watch(self._fd, path, _WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            if err in (errno.ENOENT, errno.ENOTDIR):
+                return  # gone again already
+            if err == errno.ENOSPC:
+                raise DropletException(
+                    "Out of inotify watches; raise fs.inotify.max_user_watches "
+                    "or use PollingWatcher"
+                )
+            raise DropletException(
+                f"inotify_add_watch {rel_dir} failed: {os.strerror(err)}"
+            )
+        self._dirs[wd] = rel_dir
+
+    def _watch_tree(self, rel_dir: PurePosixPath) -> set[PurePosixPath]:
+        """Watch rel_dir and the directories below it; returns its files."""
+        files: set[PurePosixPath] = set()
+        self._watch(rel_dir)
+        for dirpath, dirnames, filenames in os.walk(self.root / rel_dir):
+            rel = PurePosixPath(Path(dirpath).relative_to(self.root).as_posix())
+            dirnames[:] = [d for d in dirnames if not is_ignored(rel / d, self.ignore)]
+            for name in dirnames:
+                self._watch(rel / name)
+            files.update(
+                rel / name
+                for name in filenames
+                if not is_ignored(rel / name, self.ignore)
+            )
+        return files
+
+    def _read(self) -> bytes:
+        try:
+            return os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return b""
+
+    def poll(self, timeout: float | None) -> set[PurePosixPath]:
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if not ready:
+            return set()
+        changed: set[PurePosixPath] = set()
+        while True:
+            data = self._read()
+            if not data:
+                return changed
+            pos = 0
+            while pos < len(data):
+                wd, mask, _cookie, length = _EVENT.unpack_from(data, pos)
+                pos += _EVENT.size
+                name = data[pos : pos + length].rstrip(b"\0")
+                pos += length
+                if mask & _IN_Q_OVERFLOW:
+                    logger.warning("inotify queue overflowed, rescanning %s", self.root)
+                    changed.update(_walk(self.root, self.ignore))
+                    continue
+                if mask & _IN_IGNORED:
+                    self._dirs.pop(wd, None)
+                    continue
+                rel_dir = self._dirs.get(wd)
+                if rel_dir is None or not name:
+                    continue
+                rel = rel_dir / os.fsdecode(name)
+                if is_ignored(rel, self.ignore):
+                    continue
+                if mask & _IN_ISDIR and mask & (_IN_CREATE | _IN_MOVED_TO):
+                    changed.update(self._watch_tree(rel))
+                changed.add(rel)
+
+    def close(self) -> None:
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+def make_watcher(root: Path, ignore: list[str] | None = None) -> Watcher:
+    """inotify where available, polling otherwise."""
+    if sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(root, ignore)
+        except (DropletException, OSError, AttributeError) as e:
+            logger.info("inotify unavailable (%s), polling %s", e, root)
+    return PollingWatcher(root, ignore)
+
+
+@dataclass
+class SyncBatch:
+    """What one push sends: a tar of the changed files and the paths to
+    delete, both relative to the synced directory."""
+
+    files: list[PurePosixPath]
+    deleted: list[PurePosixPath]
+    payload: bytes
+    compressed: bool
+
+    def command(self, remote_dir: PurePosixPath, post_sync: str | None) -> str:
+        parts = [f"mkdir -p {shlex.quote(str(remote_dir))}"]
+        parts.append(f"cd {shlex.quote(str(remote_dir))}")
+        if self.deleted:
+            quoted = " ".join(shlex.quote(str(p)) for p in self.deleted)
+            parts.append(f"rm -rf -- {quoted}")
+        if self.files:
+            parts.append("tar -xzf -" if self.compressed else "tar -xf -")
+        if post_sync:
+            parts.append(f"{{ {post_sync}\n}}")
+        return " && ".join(parts)
+
+
+def build_batch(
+    root: Path, changed: set[PurePosixPath], ignore: list[str] | None = None
+) -> SyncBatch:
+    """Sort changed into files to send and paths to delete and pack the
+    files. A changed directory that still exists needs nothing: its files are
+    reported on their own."""
+    ignore = DEFAULT_IGNORE if ignore is None else ignore
+    files: list[PurePosixPath] = []
+    deleted: list[PurePosixPath] = []
+    for rel in sorted(changed):
+        if is_ignored(rel, ignore):
+            continue
+        path = root / rel
+        if path.is_symlink() or path.is_file():
+            files.append(rel)
+        elif not path.exists():
+            deleted.append(rel)
+    buf = io.BytesIO()
+    raw = sum(os.lstat(root / rel).st_size for rel in files if (root / rel).exists())
+    compressed = raw > COMPRESS_THRESHOLD
+    if files:
+        with tarfile.open(fileobj=buf, mode="w:gz" if compressed else "w") as tar:
+            for rel in files:
+                try:
+                    tar.add(root / rel, arcname=str(rel), recursive=False)
+                except FileNotFoundError:
+                    deleted.append(rel)  # removed while packing
+    return SyncBatch(files, deleted, buf.getvalue(), compressed)
+
+
+@dataclass
+class SyncReport:
+    files: list[PurePosixPath]
+    deleted: list[PurePosixPath]
+    payload_bytes: int
+    # Seconds from the first change of the batch until it was pushed
+    # everywhere, and the part of it spent pushing.
+    latency: float
+    push_time: float
+    results: dict[Droplet, CompletedProcess | DropletException] = field(
+        default_factory=dict
+    )
+
+    @property
+    def failed(self) -> dict[Droplet, CompletedProcess | DropletException]:
+        return {
+            d: r
+            for d, r in self.results.items()
+            if isinstance(r, Exception) or not r.ok
+        }
+
+    @property
+    def ok(self) -> bool:
+        return not self.failed
+
+    def __str__(self) -> str:
+        return (
+            f"synced {len(self.files)} files, deleted {len(self.deleted)} "
+            f"({self.payload_bytes} bytes) to {len(self.results)} droplets in "
+            f"{self.push_time * 1000:.0f}ms, {self.latency * 1000:.0f}ms after "
+            f"the change, {len(self.failed)} failed"
+        )
+
+
+SyncCallback = Callable[[SyncReport], None]
+
+
+class HotSync:
+    """Keeps remote_dir on every droplet in sync with local_dir while
+    running. Changes are pushed once no new ones arrived for debounce
+    seconds, or max_delay seconds after the first one while changes keep
+    coming. post_sync, if given, runs in remote_dir after each push."""
+
+    def __init__(
+        self,
+        droplets: list[Droplet],
+        local_dir: Path,
+        remote_dir: Path | PurePosixPath,
+        post_sync: str | None = None,
+        debounce: float = 0.1,
+        max_delay: float = 2.0,
+        ignore: list[str] | None = None,
+        timeout: float | None = 60.0,
+        initial_sync: bool = True,
+        watcher: Watcher | None = None,
+    ) -> None:
+        if not local_dir.is_dir():
+            raise DropletException(f"Not a directory: {local_dir}")
+        self.droplets = droplets
+        self.local_dir = local_dir
+        self.remote_dir = PurePosixPath(remote_dir.as_posix())
+        self.post_sync = post_sync
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.ignore = DEFAULT_IGNORE if ignore is None else ignore
+        self.timeout = timeout
+        self.initial_sync = initial_sync
+        self._watcher = watcher
+        self._callbacks: list[SyncCallback] = []
+        self._stop = Event()
+        self._thread: Thread | None = None
+        self._error: Exception | None = None
+
+    def subscribe(self, callback: SyncCallback) -> None:
+        self._callbacks.append(callback)
+
+    def push(
+        self, changed: set[PurePosixPath] | None = None, since: float | None = None
+    ) -> SyncReport:
+        """Push changed paths (default: the whole tree) to every droplet now.
+        since is when the first of the changes was seen, for the latency.
+        If there is nothing to send or delete, no droplet is contacted,
+        post_sync does not run and the subscribers are not called."""
+        start = time.monotonic()
+        if changed is None:
+            changed = set(_walk(self.local_dir, self.ignore))
+        batch = build_batch(self.local_dir, changed, self.ignore)
+        if not batch.files and not batch.deleted:
+            logger.debug("Nothing to sync for %d changed paths", len(changed))
+            return SyncReport([], [], 0, 0.0, 0.0)
+        cmd = batch.command(self.remote_dir, self.post_sync)
+        payload = batch.payload if batch.files else None
+
+        def _push(droplet: Droplet) -> CompletedProcess:
+            return droplet.ssh_exec(cmd, timeout=self.timeout, input=payload)
+
+        futures: dict[Droplet, Future[CompletedProcess]] = {
+            d: THREAD_POOL.submit(_push, d) for d in self.droplets
+        }
+        wait(futures.values())
+        results: dict[Droplet, CompletedProcess | DropletException] = {}
+        for droplet, future in futures.items():
+            try:
+                results[droplet] = future.result()
+            except Exception as e:  # pylint: disable=broad-except
+                results[droplet] = DropletException.wrap(
+                    e, droplet=droplet.name, droplet_id=droplet.id, operation="sync"
+                )
+        end = time.monotonic()
+        report = SyncReport(
+            batch.files,
+            batch.deleted,
+            len(batch.payload),
+            end - (since if since is not None else start),
+            end - start,
+            results,
+        )
+        if report.ok:
+            logger.info("%s", report)
+        else:
+            for droplet, result in report.failed.items():
+                if isinstance(result, Exception):
+                    error = str(result)
+                else:
+                    error = result.stderr.strip() or f"exit {result.returncode}"
+                logger.warning(
+                    "Sync failed: %s", error, extra={"droplet": droplet.name}
+                )
+        for callback in self._callbacks:
+            try:
+                callback(report)
+            except Exception as e:  # pylint: disable=broad-except
+                logger.exception("Sync callback failed: %s", e)
+        return report
+
+    def _next_batch(self, watcher: Watcher) -> tuple[set[PurePosixPath], float]:
+        """Wait for changes, then collect more until quiet for debounce
+        seconds or max_delay has passed. Empty if stopped first."""
+        changed: set[PurePosixPath] = set()
+        while not changed:
+            if self._stop.is_set():
+                return set(), 0.0
+            changed = watcher.poll(0.2)
+        first = time.monotonic()
+        while not self._stop.is_set():
+            left = first + self.max_delay - time.monotonic()
+            if left <= 0:
+                break
+            more = watcher.poll(min(self.debounce, left))
+            if not more:
+                break
+            changed |= more
+        return changed, first
+
+    def _run(self, watcher: Watcher) -> None:
+        try:
+            while not self._stop.is_set():
+                changed, first = self._next_batch(watcher)
+                if not changed:
+                    continue
+                try:
+                    self.push(changed, since=first)
+                except Exception as e:  # pylint: disable=broad-except
+                    # e.g. a file that cannot be read; later changes still sync
+                    logger.exception("Sync of %d paths failed: %s", len(changed), e)
+        except Exception as e:  # pylint: disable=broad-except
+            # The watcher failed, so nothing more would be seen: stop, and
+            # let wait() raise it.
+            logger.exception("Hot sync of %s stopped: %s", self.local_dir, e)
+            self._error = e
+            self._stop.set()
+        finally:
+            watcher.close()
+
+    def start(self) -> "HotSync":
+        if self._thread is not None:
+            return self
+        self._stop.clear()
+        self._error = None
+        # Watch before the initial push so nothing edited during it is missed.
+        watcher = self._watcher or make_watcher(self.local_dir, self.ignore)
+        self._watcher = None
+        if self.initial_sync:
+            self.push()
+        self._thread = Thread(
+            target=self._run, args=(watcher,), name="hot-sync", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def wait(self, timeout: float | None = None) -> None:
+        """Block until stopped (or timeout), returning on Ctrl-C. Raises the
+        error that stopped the sync, if one did."""
+        try:
+            self._stop.wait(timeout)
+        except KeyboardInterrupt:
+            pass
+        if self._error is not None:
+            raise self._error
+
+    def __enter__(self) -> "HotSync":
+        return self.start()
+
+    def __exit__(self, *exc: object) -> None:
+        self.stop()
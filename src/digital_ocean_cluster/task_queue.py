@@ -0,0 +1,268 @@
+"""
+Map-style work distribution across a cluster.
+
+Every droplet runs `concurrency` workers that pull tasks from one shared
+queue, so faster droplets naturally take more of the work. A task that fails
+is retried on a droplet it has not failed on yet, droplets that keep failing
+are retired, and results are streamed back as they complete.
+"""
+
+import shlex
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from queue import Queue
+from threading import Condition
+from typing import Any, Callable, Iterable, Iterator
+
+from digital_ocean_cluster.droplet_manager import Droplet
+from digital_ocean_cluster.log import get_logger
+from digital_ocean_cluster.types import CommandError, DropletException
+
+logger = get_logger(__name__)
+
+
+@dataclass
+class TaskResult:
+    index: int
+    item: Any
+    value: Any = None
+    error: Exception | None = None
+    droplet: Droplet | None = None
+    attempts: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+@dataclass
+class _Task:
+    index: int
+    item: Any
+    attempts: int = 0
+    failed_on: set[int] = field(default_factory=set)
+    last_error: Exception | None = None
+
+
+_DONE = object()
+
+
+class TaskQueue:
+    """Distribute tasks over droplets. fn(droplet, item) runs on the local
+    machine and typically drives the droplet with ssh_exec/copy_to."""
+
+    def __init__(
+        self,
+        droplets: list[Droplet],
+        concurrency: int = 4,
+        max_attempts: int = 3,
+        max_node_failures: int = 5,
+    ) -> None:
+        if not droplets:
+            raise ValueError("TaskQueue needs at least one droplet.")
+        self.droplets = droplets
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.max_node_failures = max_node_failures
+
+    def map(
+        self, fn: Callable[[Droplet, Any], Any], items: Iterable[Any]
+    ) -> Iterator[TaskResult]:
+        """Yield a TaskResult per item, in completion order. items is consumed
+        lazily, so it may be a large generator. If every droplet is retired,
+        the tasks already read fail and the rest of items is not read."""
+        run = _Run(self, fn, iter(items))
+        return run.results()
+
+    def map_cmd(
+        self, cmd_template: str, items: Iterable[Any], timeout: float | None = None
+    ) -> Iterator[TaskResult]:
+        """Run cmd_template.format(item=<shell quoted item>) per item. A
+        non-zero exit counts as a failure and is retried elsewhere."""
+
+        def _run_cmd(droplet: Droplet, item: Any) -> Any:
+            cmd = cmd_template.format(item=shlex.quote(str(item)))
+            cp = droplet.ssh_exec(cmd, timeout=timeout)
+            if not cp.ok:
+                raise CommandError.from_process(
+                    f"{cmd} failed",
+                    cp,
+                    droplet=droplet.name,
+                    droplet_id=droplet.id,
+                    operation="task",
+                )
+            return cp
+
+        return self.map(_run_cmd, items)
+
+
+class _Run:
+    """State of one TaskQueue.map call."""
+
+    def __init__(
+        self,
+        queue: TaskQueue,
+        fn: Callable[[Droplet, Any], Any],
+        source: Iterator[Any],
+    ) -> None:
+        self.queue = queue
+        self.fn = fn
+        self.source = source
+        self.exhausted = False
+        self.next_index = 0
+        self.pending: deque[_Task] = deque()
+        self.in_flight = 0
+        self.node_failures: dict[int, int] = {d.id: 0 for d in queue.droplets}
+        self.sick: set[int] = set()
+        self.stopped = False
+        self.cond = Condition()
+        self.out: Queue = Queue()
+        self.live_workers = 0
+
+    def results(self) -> Iterator[TaskResult]:
+        workers = len(self.queue.droplets) * self.queue.concurrency
+        self.live_workers = workers
+        pool = ThreadPoolExecutor(max_workers=workers)
+        for droplet in self.queue.droplets:
+            for _ in range(self.queue.concurrency):
+                pool.submit(self._worker, droplet)
+        try:
+            while True:
+                result = self.out.get()
+                if result is _DONE:
+                    break
+                yield result
+        finally:
+            with self.cond:
+                self.stopped = True
+                self.cond.notify_all()
+            pool.shutdown(wait=False)
+
+    def _healthy(self, task: _Task) -> bool:
+        """Whether some healthy droplet can still take task."""
+        return any(
+            d.id not in self.sick and d.id not in task.failed_on
+            for d in self.queue.droplets
+        )
+
+    def _fail(self, task: _Task, reason: str) -> None:
+        error = task.last_error or DropletException(reason)
+        self.out.put(
+            TaskResult(task.index, task.item, error=error, attempts=task.attempts)
+        )
+
+    def _next(self, droplet: Droplet) -> _Task | None:
+        with self.cond:
+            while True:
+                if self.stopped or droplet.id in self.sick:
+                    return None
+                for i, task in enumerate(self.pending):
+                    if droplet.id not in task.failed_on:
+                        del self.pending[i]
+                        self.in_flight += 1
+                        return task
+                if not self.exhausted:
+                    try:
+                        item = next(self.source)
+                    except StopIteration:
+                        self.exhausted = True
+                        self.cond.notify_all()
+                        continue
+                    task = _Task(self.next_index, item)
+                    self.next_index += 1
+                    self.in_flight += 1
+                    return task
+                if not self.pending and self.in_flight == 0:
+                    return None
+                self.cond.wait()
+
+    def _finish(
+        self,
+        task: _Task,
+        droplet: Droplet,
+        value: Any,
+        error: Exception | None,
+        elapsed: float,
+    ) -> None:
+        with self.cond:
+            self.in_flight -= 1
+            task.attempts += 1
+            if error is None:
+                self.node_failures[droplet.id] = 0
+                self.out.put(
+                    TaskResult(
+                        task.index,
+                        task.item,
+                        value,
+                        None,
+                        droplet,
+                        task.attempts,
+                        elapsed,
+                    )
+                )
+            else:
+                task.failed_on.add(droplet.id)
+                task.last_error = error
+                self.node_failures[droplet.id] += 1
+                if self.node_failures[droplet.id] >= self.queue.max_node_failures:
+                    logger.warning(
+                        "Retiring %s from task queue: %s",
+                        droplet.name,
+                        error,
+                        extra={"droplet": droplet.name},
+                    )
+                    self.sick.add(droplet.id)
+                if task.attempts < self.queue.max_attempts and self._healthy(task):
+                    self.pending.append(task)
+                else:
+                    self._fail(task, "No droplet left to retry on")
+                # Tasks that only sick droplets could take will never run.
+                for stuck in [t for t in self.pending if not self._healthy(t)]:
+                    self.pending.remove(stuck)
+                    self._fail(stuck, "No healthy droplet left to run task")
+            self.cond.notify_all()
+
+    def _worker(self, droplet: Droplet) -> None:
+        try:
+            while True:
+                task = self._next(droplet)
+                if task is None:
+                    return
+                start = time.time()
+                try:
+                    value = self.fn(droplet, task.item)
+                    error = None
+                except Exception as e:  # pylint: disable=broad-except
+                    value, error = None, e
+                self._finish(task, droplet, value, error, time.time() - start)
+        finally:
+            with self.cond:
+                self.live_workers -= 1
+                last = self.live_workers == 0
+                if last:
+                    self._drain_unrunnable()
+            if last:
+                self.out.put(_DONE)
+
+    def _drain_unrunnable(self) -> None:
+        """Called when no workers are left: every queued task fails. Items
+        not read from the source yet are left unread, as it may be endless;
+        a generator is closed."""
+        for task in self.pending:
+            self._fail(task, "No healthy droplet left to run task")
+        self.pending.clear()
+        if self.exhausted:
+            return
+        self.exhausted = True
+        close = getattr(self.source, "close", None)
+        if close is not None:
+            close()
+        if not self.stopped:
+            logger.warning(
+                "Task queue has no healthy droplet left; items after #%d were "
+                "not run",
+                self.next_index - 1,
+            )
@@ -0,0 +1,646 @@
+"""
+How commands and files reach a droplet.
+
+Droplet I/O (ssh_exec, copy_to, copy_from, the agent session) goes through a
+Transport, resolved once per process by get_transport():
+
+  * OpenSSHTransport: the system ssh/scp, found on PATH (or the Windows
+    OpenSSH install), with connection multiplexing where the platform
+    supports it so only the first command to a droplet pays the handshake.
+  * ParamikoTransport: in-process SSH via paramiko (optional dependency),
+    one cached connection per droplet and no process spawn per command.
+  * LocalTransport: runs everything on this machine; a fake for tests.
+
+Set DIGITAL_OCEAN_CLUSTER_TRANSPORT to openssh, paramiko or local to choose,
+or call set_transport(). By default OpenSSH is used when ssh is installed,
+otherwise paramiko.
+"""
+
+import atexit
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from abc import ABC, abstractmethod
+from pathlib import Path
+from threading import Lock
+from typing import IO, TYPE_CHECKING, Any, Callable
+
+from digital_ocean_cluster.known_hosts import known_hosts_store
+from digital_ocean_cluster.log import get_logger
+from digital_ocean_cluster.process import (
+    CancelToken,
+    deadline_from,
+    remaining,
+    run_process,
+)
+from digital_ocean_cluster.types import CompletedProcess, DropletException
+
+if TYPE_CHECKING:
+    from digital_ocean_cluster.droplet import Droplet
+
+logger = get_logger(__name__)
+
+WINDOWS_OPENSSH = "C:\\Windows\\System32\\OpenSSH\\ssh.exe"
+# Idle seconds a multiplexed master connection is kept open for.
+CONTROL_PERSIST = 60
+
+
+class TransportError(DropletException):
+    pass
+
+
+class Transport(ABC):
+    name = "transport"
+
+    @abstractmethod
+    def exec(
+        self,
+        droplet: "Droplet",
+        command: str,
+        timeout: float | None = None,
+        cancel: CancelToken | None = None,
+        input: bytes | None = None,  # pylint: disable=redefined-builtin
+        stdout: IO[bytes] | None = None,
+    ) -> CompletedProcess:
+        """Run command on droplet; see Droplet.ssh_exec."""
+
+    @abstractmethod
+    def upload(
+        self,
+        droplet: "Droplet",
+        src: Path,
+        dest: Path,
+        timeout: float | None = None,
+        cancel: CancelToken | None = None,
+        on_bytes: Callable[[int], None] | None = None,
+    ) -> CompletedProcess:
+        """Copy a local file or directory to dest on droplet. on_bytes, if
+        given, is called with the size of each chunk as it is sent, where the
+        transport can see that; scp can't, so OpenSSHTransport never calls it
+        and callers should credit whatever is left once the copy succeeds."""
+
+    @abstractmethod
+    def download(
+        self,
+        droplet: "Droplet",
+        remote_path: Path,
+        local_path: Path,
+        recursive: bool = False,
+        timeout: float | None = None,
+        cancel: CancelToken | None = None,
+    ) -> CompletedProcess:
+        """Copy remote_path on droplet to local_path."""
+
+    def session_cmd_list(
+        self, droplet: "Droplet", command: str, stdin: bool = False
+    ) -> list[str]:
+        """A local process running command on droplet, with its stdin/stdout
+        connected, for long lived sessions such as the agent."""
+        raise TransportError(f"The {self.name} transport has no session processes.")
+
+    def close(self) -> None:
+        """Release cached connections."""
+
+
+def _log_cmd(droplet: "Droplet", cmd_list: list[str]) -> None:
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(
+            "Executing: %s",
+            subprocess.list2cmdline(cmd_list),
+            extra={"droplet": droplet.name},
+        )
+
+
+class OpenSSHTransport(Transport):
+    name = "openssh"
+
+    def __init__(
+        self,
+        ssh: str | None = None,
+        scp: str | None = None,
+        multiplex: bool | None = None,
+    ) -> None:
+        self.ssh = ssh or self.find_binary("ssh")
+        self.scp = scp or self.find_binary("scp")
+        if multiplex is None:
+            # Windows OpenSSH has no ControlMaster support.
+            multiplex = sys.platform != "win32"
+        self.multiplex = multiplex
+        self._control_dir: str | None = None
+        self._hosts: set[str] = set()
+        self._lock = Lock()
+
+    @staticmethod
+    def find_binary(name: str) -> str:
+        found = shutil.which(name)
+        if found:
+            return found
+        if sys.platform == "win32":
+            candidate = Path(WINDOWS_OPENSSH).with_name(f"{name}.exe")
+            if candidate.exists():
+                return str(candidate)
+        raise TransportError(f"Could not find {name}; install OpenSSH.")
+
+    def _options(self, droplet: "Droplet", host: str) -> list[str]:
+        options = [
+            "-o",
+            "BatchMode=yes",
+            *known_hosts_store().ssh_options(),
+            *droplet.identity.ssh_options(),
+        ]
+        if self.multiplex:
+            with self._lock:
+                if self._control_dir is None:
+                    # Short path: unix socket paths are limited to ~104 bytes.
+                    self._control_dir = tempfile.mkdtemp(prefix="docssh-")
+                    atexit.register(self.close)
+                self._hosts.add(host)
+            options += [
+                "-o",
+                "ControlMaster=auto",
+                "-o",
+                f"ControlPath={self._control_dir}/%C",
+                "-o",
+                f"ControlPersist={CONTROL_PERSIST}",
+            ]
+        return options
+
+    def session_cmd_list(
+        self, droplet: "Droplet", command: str, stdin: bool = False
+    ) -> list[str]:
+        host = droplet.public_ip()
+        cmd_list = [self.ssh]
+        if not stdin:
+            cmd_list.append("-n")  # prevents reading from stdin
+        return cmd_list + self._options(droplet, host) + [f"root@{host}", command]
+
+    def exec(
+        self,
+        droplet: "Droplet",
+        command: str,
+        timeout: float | None = None,
+        cancel: CancelToken | None = None,
+        input: bytes | None = None,  # pylint: disable=redefined-builtin
+        stdout: IO[bytes] | None = None,
+    ) -> CompletedProcess:
+        cmd_list = self.session_cmd_list(droplet, command, stdin=input is not None)
+        _log_cmd(droplet, cmd_list)
+        return run_process(
+            cmd_list, input=input, timeout=timeout, cancel=cancel, stdout=stdout
+        )
+
+    def _scp(
+        self,
+        droplet: "Droplet",
+        host: str,
+        recursive: bool,
+        paths: list[str],
+        timeout: float | None,
+        cancel: CancelToken | None,
+    ) -> CompletedProcess:
+        cmd_list = [self.scp] + self._options(droplet, host)
+        if recursive:
+            cmd_list.append("-r")
+        cmd_list += paths
+        _log_cmd(droplet, cmd_list)
+        return run_process(cmd_list, timeout=timeout, cancel=cancel)
+
+    def upload(
+        self,
+        droplet: "Droplet",
+        src: Path,
+        dest: Path,
+        timeout: float | None = None,
+        cancel: CancelToken | None = None,
+        on_bytes: Callable[[int], None] | None = None,
+    ) -> CompletedProcess:
+        host = droplet.public_ip()
+        paths = [str(src), f"root@{host}:{dest.as_posix()}"]
+        return self._scp(droplet, host, src.is_dir(), paths, timeout, cancel)
+
+    def download(
+        self,
+        droplet: "Droplet",
+        remote_path: Path,
+        local_path: Path,
+        recursive: bool = False,
+        timeout: float | None = None,
+        cancel: CancelToken | None = None,
+    ) -> CompletedProcess:
+        host = droplet.public_ip()
+        paths = [f"root@{host}:{remote_path.as_posix()}", str(local_path)]
+        return self._scp(droplet, host, recursive, paths, timeout, cancel)
+
+    def close(self) -> None:
+        """Stop the master connections and remove their sockets."""
+        with self._lock:
+            control_dir, hosts = self._control_dir, list(self._hosts)
+            self._control_dir = None
+            self._hosts.clear()
+        if control_dir is None:
+            return
+        for host in hosts:
+            subprocess.run(
+                [self.ssh, "-o", f"ControlPath={control_dir}/%C"]
+                + ["-O", "exit", f"root@{host}"],
+                capture_output=True,
+                check=False,
+            )
+        shutil.rmtree(control_dir, ignore_errors=True)
+
+
+class _ChannelKiller:
+    """Lets a CancelToken close a paramiko channel like it kills a process."""
+
+    def __init__(self, channel: Any) -> None:
+        self.channel = channel
+
+    def kill(self) -> None:
+        self.channel.close()
+
+
+class _AcceptNewPolicy:
+    """paramiko counterpart of StrictHostKeyChecking=accept-new: unknown hosts
+    are recorded in the known_hosts store, changed keys are rejected."""
+
+    def missing_host_key(self, client: Any, hostname: str, key: Any) -> None:
+        client.get_host_keys().add(hostname, key.get_name(), key)
+        known_hosts_store().add(hostname, key.get_name(), key.get_base64())
+
+
+class _TransferAborted(Exception):
+    """Raised from an SFTP progress callback to stop the transfer."""
+
+
+class ParamikoTransport(Transport):
+    name = "paramiko"
+
+    def __init__(self, connect_timeout: float = 30.0) -> None:
+        try:
+            import paramiko  # pylint: disable=import-outside-toplevel
+        except ImportError as e:
+            raise TransportError(
+                "The paramiko transport needs paramiko: pip install paramiko"
+            ) from e
+        self._paramiko = paramiko
+        self.connect_timeout = connect_timeout
+        self._clients: dict[str, Any] = {}
+        # One connect at a time per host, so racing threads share a client.
+        self._connect_locks: dict[str, Lock] = {}
+        self._lock = Lock()
+
+    def _client(self, droplet: "Droplet") -> Any:
+        host = droplet.public_ip()
+        with self._lock:
+            connect_lock = self._connect_locks.setdefault(host, Lock())
+        with connect_lock:
+            with self._lock:
+                old = self._clients.get(host)
+            transport = old.get_transport() if old is not None else None
+            if transport is not None and transport.is_active():
+                return old
+            client = self._paramiko.SSHClient()
+            store = known_hosts_store()
+            store.ssh_options()  # makes sure the file exists
+            client.load_host_keys(str(store.path))
+            client.set_missing_host_key_policy(_AcceptNewPolicy())
+            client.connect(
+                host,
+                username="root",
+                timeout=self.connect_timeout,
+                **droplet.identity.paramiko_kwargs(),
+            )
+            with self._lock:
+                self._clients[host] = client
+        if old is not None:
+            old.close()
+        return client
+
+    def exec(
+        self,
+        droplet: "Droplet",
+        command: str,
+        timeout: float | None = None,
+        cancel: CancelToken | None = None,
+        input: bytes | None = None,  # pylint: disable=redefined-builtin
+        stdout: IO[bytes] | None = None,
+    ) -> CompletedProcess:
+        cmd_list = [command]
+        if cancel is not None and cancel.cancelled:
+            cp = subprocess.CompletedProcess(cmd_list, -1, b"", b"Cancelled")
+            return CompletedProcess(cmd_list, cp, cancelled=True)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        channel = self._client(droplet).get_transport().open_session()
+        killer = _ChannelKiller(channel)
+        if cancel is not None:
+            cancel.register(killer)  # type: ignore[arg-type]
+        out: list[bytes] = []
+        err: list[bytes] = []
+        timed_out = False
+        try:
+            channel.exec_command(command)
+            if input is not None:
+                channel.sendall(input)
+            channel.shutdown_write()
+            channel.settimeout(0.1)
+            while not (channel.exit_status_ready() and not channel.recv_ready()):
+                if channel.closed:
+                    break
+                if deadline is not None and time.monotonic() > deadline:
+                    timed_out = True
+                    channel.close()
+                    break
+                while channel.recv_stderr_ready():
+                    err.append(channel.recv_stderr(65536))
+                try:
+                    chunk = channel.recv(65536)
+                except TimeoutError:
+                    continue
+                if not chunk:  # output closed; wait for the exit status
+                    channel.status_event.wait(0.1)
+                    continue
+                if stdout is not None:
+                    stdout.write(chunk)
+                else:
+                    out.append(chunk)
+            while channel.recv_stderr_ready():
+                err.append(channel.recv_stderr(65536))
+            if timed_out or not channel.exit_status_ready():
+                rc = -1
+            else:
+                rc = channel.recv_exit_status()
+        finally:
+            if cancel is not None:
+                cancel.unregister(killer)  # type: ignore[arg-type]
+            channel.close()
+        stderr = b"".join(err)
+        if timed_out:
+            stderr += f"\nTimed out after {timeout}s".encode()
+        cancelled = cancel is not None and cancel.cancelled and rc != 0
+        cp = subprocess.CompletedProcess(cmd_list, rc, b"".join(out), stderr)
+        return CompletedProcess(cmd_list, cp, timed_out=timed_out, cancelled=cancelled)
+
+    def _sftp_call(
+        self,
+        droplet: "Droplet",
+        what: str,
+        fn: Any,
+        timeout: float | None = None,
+        cancel: CancelToken | None = None,
+    ) -> CompletedProcess:
+        """Run fn(sftp, check) on a fresh SFTP session. fn passes check as the
+        progress callback of its transfers, which stops them once timeout
+        passes or cancel fires; the channel timeout bounds a stalled read."""
+        cmd_list = [what]
+        if cancel is not None and cancel.cancelled:
+            cp = subprocess.CompletedProcess(cmd_list, -1, b"", b"Cancelled")
+            return CompletedProcess(cmd_list, cp, cancelled=True)
+        deadline = deadline_from(timeout)
+
+        def _check(_done: int = 0, _total: int = 0) -> None:
+            if cancel is not None and cancel.cancelled:
+                raise _TransferAborted("Cancelled")
+            if deadline is not None and time.monotonic() > deadline:
+                raise TimeoutError(f"Timed out after {timeout}s")
+
+        timed_out = False
+        try:
+            sftp = self._client(droplet).open_sftp()
+            channel = sftp.get_channel()
+            if deadline is not None:
+                channel.settimeout(max(0.1, remaining(deadline) or 0.0))
+            killer = _ChannelKiller(channel)
+            if cancel is not None:
+                cancel.register(killer)  # type: ignore[arg-type]
+            try:
+                fn(sftp, _check)
+            finally:
+                if cancel is not None:
+                    cancel.unregister(killer)  # type: ignore[arg-type]
+                sftp.close()
+            cp = subprocess.CompletedProcess(cmd_list, 0, b"", b"")
+        except _TransferAborted as e:
+            cp = subprocess.CompletedProcess(cmd_list, -1, b"", str(e).encode())
+        except TimeoutError as e:
+            timed_out = True
+            message = str(e) or f"Timed out after {timeout}s"
+            cp = subprocess.CompletedProcess(cmd_list, -1, b"", message.encode())
+        except (OSError, EOFError, self._paramiko.SSHException) as e:
+            cp = subprocess.CompletedProcess(cmd_list, 1, b"", str(e).encode())
+        cancelled = cancel is not None and cancel.cancelled and cp.returncode != 0
+        return CompletedProcess(cmd_list, cp, timed_out=timed_out, cancelled=cancelled)
+
+    def upload(
+        self,
+        droplet: "Droplet",
+        src: Path,
+        dest: Path,
+        timeout: float | None = None,
+        cancel: CancelToken | None = None,
+        on_bytes: Callable[[int], None] | None = None,
+    ) -> CompletedProcess:
+        def _put(sftp: Any, check: Any) -> None:
+            def put(local: str, remote: str) -> None:
+                # paramiko reports the running total per file; pass on deltas
+                sent = 0
+
+                def callback(done: int, total: int) -> None:
+                    nonlocal sent
+                    if on_bytes is not None and done > sent:
+                        on_bytes(done - sent)
+                    sent = done
+                    check(done, total)
+
+                sftp.put(local, remote, callback=callback)
+
+            if not src.is_dir():
+                put(str(src), dest.as_posix())
+                return
+            for root, _, files in os.walk(src):
+                check()
+                rel = Path(root).relative_to(src)
+                remote_dir = (dest / rel).as_posix()
+                try:
+                    sftp.mkdir(remote_dir)
+                except OSError:
+                    pass  # already exists
+                for name in files:
+                    check()
+                    put(str(Path(root) / name), f"{remote_dir}/{name}")
+
+        return self._sftp_call(
+            droplet, f"sftp put {src} {dest}", _put, timeout=timeout, cancel=cancel
+        )
+
+    def download(
+        self,
+        droplet: "Droplet",
+        remote_path: Path,
+        local_path: Path,
+        recursive: bool = False,
+        timeout: float | None = None,
+        cancel: CancelToken | None = None,
+    ) -> CompletedProcess:
+        import stat  # pylint: disable=import-outside-toplevel
+
+        def _get(sftp: Any, check: Any, remote: str, local: Path) -> None:
+            check()
+            if not recursive or not stat.S_ISDIR(sftp.stat(remote).st_mode):
+                sftp.get(remote, str(local), callback=check)
+                return
+            local.mkdir(parents=True, exist_ok=True)
+            for entry in sftp.listdir_attr(remote):
+                _get(sftp, check, f"{remote}/{entry.filename}", local / entry.filename)
+
+        return self._sftp_call(
+            droplet,
+            f"sftp get {remote_path} {local_path}",
+            lambda sftp, check: _get(sftp, check, remote_path.as_posix(), local_path),
+            timeout=timeout,
+            cancel=cancel,
+        )
+
+    def close(self) -> None:
+        with self._lock:
+            clients = list(self._clients.values())
+            self._clients.clear()
+        for client in clients:
+            client.close()
+
+
+class LocalTransport(Transport):
+    """Runs "remote" commands with the local bash and copies files locally.
+    Paths are used as given, so tests should point them at temp dirs."""
+
+    name = "local"
+    _COPY_CHUNK = 1 << 20
+
+    def session_cmd_list(
+        self, droplet: "Droplet", command: str, stdin: bool = False
+    ) -> list[str]:
+        return ["bash", "-c", command]
+
+    def exec(
+        self,
+        droplet: "Droplet",
+        command: str,
+        timeout: float | None = None,
+        cancel: CancelToken | None = None,
+        input: bytes | None = None,  # pylint: disable=redefined-builtin
+        stdout: IO[bytes] | None = None,
+    ) -> CompletedProcess:
+        cmd_list = self.session_cmd_list(droplet, command)
+        _log_cmd(droplet, cmd_list)
+        return run_process(
+            cmd_list, input=input, timeout=timeout, cancel=cancel, stdout=stdout
+        )
+
+    @staticmethod
+    def _copy(
+        src: Path,
+        dest: Path,
+        what: str,
+        on_bytes: Callable[[int], None] | None = None,
+    ) -> CompletedProcess:
+        cmd_list = [what, str(src), str(dest)]
+
+        def copy_file(file_src: str, file_dest: str) -> str:
+            if on_bytes is None:
+                return shutil.copy2(file_src, file_dest)
+            if os.path.isdir(file_dest):
+                file_dest = os.path.join(file_dest, os.path.basename(file_src))
+            with open(file_src, "rb") as fsrc, open(file_dest, "wb") as fdst:
+                while chunk := fsrc.read(LocalTransport._COPY_CHUNK):
+                    fdst.write(chunk)
+                    on_bytes(len(chunk))
+            shutil.copystat(file_src, file_dest)
+            return file_dest
+
+        try:
+            if src.is_dir():
+                target = dest / src.name if dest.is_dir() else dest
+                shutil.copytree(
+                    src, target, dirs_exist_ok=True, copy_function=copy_file
+                )
+            else:
+                copy_file(str(src), str(dest))
+            cp = subprocess.CompletedProcess(cmd_list, 0, b"", b"")
+        except OSError as e:
+            cp = subprocess.CompletedProcess(cmd_list, 1, b"", str(e).encode())
+        return CompletedProcess(cmd_list, cp)
+
+    def upload(
+        self,
+        droplet: "Droplet",
+        src: Path,
+        dest: Path,
+        timeout: float | None = None,
+        cancel: CancelToken | None = None,
+        on_bytes: Callable[[int], None] | None = None,
+    ) -> CompletedProcess:
+        return self._copy(src, dest, "upload", on_bytes)
+
+    def download(
+        self,
+        droplet: "Droplet",
+        remote_path: Path,
+        local_path: Path,
+        recursive: bool = False,
+        timeout: float | None = None,
+        cancel: CancelToken | None = None,
+    ) -> CompletedProcess:
+        return self._copy(remote_path, local_path, "download")
+
+
+_TRANSPORTS: dict[str, type[Transport]] = {
+    "openssh": OpenSSHTransport,
+    "paramiko": ParamikoTransport,
+    "local": LocalTransport,
+}
+_TRANSPORT: Transport | None = None
+_TRANSPORT_LOCK = Lock()
+
+
+def _resolve() -> Transport:
+    choice = os.environ.get("DIGITAL_OCEAN_CLUSTER_TRANSPORT", "").lower()
+    if choice:
+        if choice not in _TRANSPORTS:
+            raise TransportError(
+                f"Unknown transport {choice!r}, expected one of {sorted(_TRANSPORTS)}"
+            )
+        return _TRANSPORTS[choice]()
+    try:
+        return OpenSSHTransport()
+    except TransportError as ssh_error:
+        try:
+            return ParamikoTransport()
+        except TransportError:
+            raise ssh_error from None
+
+
+def get_transport() -> Transport:
+    """The process wide transport, resolved on first use."""
+    global _TRANSPORT  # pylint: disable=global-statement
+    with _TRANSPORT_LOCK:
+        if _TRANSPORT is None:
+            _TRANSPORT = _resolve()
+            logger.debug("Using the %s transport", _TRANSPORT.name)
+        return _TRANSPORT
+
+
+def set_transport(transport: Transport | str | None) -> Transport | None:
+    """Use transport (or the named one) for every droplet without its own;
+    None resolves again on next use. Returns the previous transport, which is
+    left open so it can be restored."""
+    global _TRANSPORT  # pylint: disable=global-statement
+    if isinstance(transport, str):
+        if transport not in _TRANSPORTS:
+            raise TransportError(f"Unknown transport {transport!r}")
+        transport = _TRANSPORTS[transport]()
+    with _TRANSPORT_LOCK:
+        previous, _TRANSPORT = _TRANSPORT, transport
+    return previous
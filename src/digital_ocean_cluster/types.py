@@ -1,8 +1,17 @@
+import mmap
 import subprocess
+import sys
+import tempfile
 from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
-from inspect import currentframe
-from types import FrameType
+from types import TracebackType
+from typing import Any
+
+from digital_ocean_cluster.settings import (
+    CAPTURE_ERROR_ORIGIN,
+    ERROR_STDERR_TAIL,
+    OUTPUT_SPILL_THRESHOLD,
+)
 
 THREAD_POOL = ThreadPoolExecutor(max_workers=64)
 
@@ -32,77 +41,301 @@ class SSHKey:
         return f"SSHKey: name={self.name},id={self.id},fingerprint={self.fingerprint}"
 
 
-def _inspect_frame(frame: FrameType | None) -> tuple[str, int]:
-    if frame:
-        # Get the caller's frame (1 level up)
-        caller_frame = frame.f_back
-        if caller_frame:
-            line = caller_frame.f_lineno
-            file = caller_frame.f_code.co_filename
-        else:
-            line = 0
-            file = "<unknown>"
-        # frame.clear()  # Clear the frame reference to prevent reference cycles
-    else:
-        line = 0
-        file = "<unknown>"
-    return file, line
+def _tail(text: str | bytes | None) -> str | None:
+    if text is None:
+        return None
+    if isinstance(text, bytes):
+        text = text[-ERROR_STDERR_TAIL * 4 :].decode("utf-8", errors="replace")
+    if len(text) > ERROR_STDERR_TAIL:
+        return "..." + text[-ERROR_STDERR_TAIL:].strip()
+    return text.strip()
+
+
+def _caller_origin(error: BaseException) -> tuple[str, int] | None:
+    """File and line of the code constructing error, skipping constructors
+    and helpers in this module."""
+    frame = sys._getframe(2)  # pylint: disable=protected-access
+    while frame is not None and (
+        frame.f_code.co_filename == __file__
+        or (frame.f_code.co_name == "__init__" and frame.f_locals.get("self") is error)
+    ):
+        frame = frame.f_back
+    if frame is None:
+        return None
+    return frame.f_code.co_filename, frame.f_lineno
+
+
+def _traceback_origin(tb: TracebackType | None) -> tuple[str, int] | None:
+    if tb is None:
+        return None
+    while tb.tb_next is not None:
+        tb = tb.tb_next
+    return tb.tb_frame.f_code.co_filename, tb.tb_lineno
+
+
+def _restore(cls: type, args: tuple, state: dict[str, Any]) -> "DropletException":
+    error = cls.__new__(cls, *args)
+    error.__dict__.update(state)
+    return error
 
 
 class DropletException(Exception):
-    def __init__(self, message: str) -> None:
-        self.message = message
-        # Get the caller's frame to find the line number and file
-        frame = currentframe()
-        self.file, self.line = _inspect_frame(frame)
+    """Error of a droplet or doctl operation.
+
+    Besides the message it carries what is known of the failure as fields:
+    droplet (name), droplet_id, operation and, for a failed process, its
+    returncode and the tail of its stderr. Nothing is formatted until str().
+
+    Where the error came from (origin, file, line) is read from the traceback
+    once it is raised. Errors returned as values (per droplet results) only
+    have it if CAPTURE_ERROR_ORIGIN is set, since walking the stack for each
+    failure adds up on large clusters."""
+
+    def __init__(
+        self,
+        message: str,
+        *,
+        droplet: str | None = None,
+        droplet_id: int | None = None,
+        operation: str | None = None,
+        returncode: int | None = None,
+        stderr: str | bytes | None = None,
+    ) -> None:
         super().__init__(message)
+        self.message = message
+        self.droplet = droplet
+        self.droplet_id = droplet_id
+        self.operation = operation
+        self.returncode = returncode
+        self.stderr = _tail(stderr)
+        self._origin = _caller_origin(self) if CAPTURE_ERROR_ORIGIN else None
+
+    @classmethod
+    def from_process(
+        cls,
+        message: str,
+        cp: "CompletedProcess | subprocess.CompletedProcess",
+        **context: Any,
+    ) -> "DropletException":
+        """An error for a failed process, keeping its return code and stderr."""
+        if isinstance(cp, CompletedProcess):
+            stderr: str | bytes = cp.stderr_bytes
+            if cp.timed_out:
+                message += " (timed out)"
+            elif cp.cancelled:
+                message += " (cancelled)"
+        else:
+            stderr = cp.stderr or b""
+        return cls(message, returncode=cp.returncode, stderr=stderr, **context)
+
+    @classmethod
+    def wrap(cls, error: BaseException, **context: Any) -> "DropletException":
+        """error as a DropletException with context filled in where missing.
+        Its origin is noted and its traceback dropped, so keeping the result
+        around (e.g. per droplet failures) does not keep stack frames alive."""
+        if isinstance(error, DropletException):
+            wrapped = error
+            for key, value in context.items():
+                if getattr(wrapped, key) is None:
+                    setattr(wrapped, key, value)
+        else:
+            wrapped = cls(f"{type(error).__name__}: {error}", **context)
+            wrapped.__cause__ = error
+        if wrapped._origin is None:
+            wrapped._origin = _traceback_origin(error.__traceback__)
+        error.__traceback__ = None
+        return wrapped
+
+    @property
+    def origin(self) -> tuple[str, int] | None:
+        """(file, line) the error was raised or created at, if known."""
+        if self._origin is None and self.__traceback__ is not None:
+            self._origin = _traceback_origin(self.__traceback__)
+        return self._origin
+
+    @property
+    def file(self) -> str:
+        origin = self.origin
+        return origin[0] if origin else "<unknown>"
+
+    @property
+    def line(self) -> int:
+        origin = self.origin
+        return origin[1] if origin else 0
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "type": type(self).__name__,
+            "message": self.message,
+            "droplet": self.droplet,
+            "droplet_id": self.droplet_id,
+            "operation": self.operation,
+            "returncode": self.returncode,
+            "stderr": self.stderr,
+            "file": self.file,
+            "line": self.line,
+        }
+
+    def __reduce__(self) -> tuple:
+        return _restore, (type(self), self.args, self.__dict__)
 
     def __str__(self) -> str:
-        return f"{self.message} in {self.file} at line {self.line}"
+        context = [
+            f"{key}={value}"
+            for key, value in (
+                ("droplet", self.droplet),
+                ("id", self.droplet_id),
+                ("operation", self.operation),
+                ("returncode", self.returncode),
+            )
+            if value is not None
+        ]
+        out = self.message
+        if context:
+            out += f" [{' '.join(context)}]"
+        if self.stderr and self.stderr not in self.message:
+            out += f": {self.stderr}"
+        origin = self.origin
+        if origin is not None:
+            out += f" in {origin[0]} at line {origin[1]}"
+        return out
+
+
+class CommandError(DropletException):
+    """A doctl, ssh or remote command failed; returncode and stderr are set."""
+
+
+class OutputBuffer:
+    """Raw process output, decoded at most once.
+
+    Output larger than OUTPUT_SPILL_THRESHOLD is spilled to a temp file and
+    memory mapped so big results don't pin process memory until they are
+    asked for as bytes or text; that copy is then kept."""
+
+    __slots__ = ("_data", "_text", "_file", "_mmap")
+
+    def __init__(self, data: bytes | str | None, spill_threshold: int) -> None:
+        self._text: str | None = None
+        self._file: Any = None
+        self._mmap: mmap.mmap | None = None
+        if data is None:
+            data = b""
+        if isinstance(data, str):
+            self._text = data
+            self._data: bytes | None = None
+            return
+        self._data = data
+        if len(data) > spill_threshold:
+            self._file = tempfile.TemporaryFile()
+            self._file.write(data)
+            self._file.flush()
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._data = None
+
+    @property
+    def spilled(self) -> bool:
+        return self._mmap is not None
+
+    def __len__(self) -> int:
+        return len(self.view)
+
+    @property
+    def view(self) -> memoryview:
+        """Zero-copy view of the raw bytes."""
+        if self._mmap is not None:
+            return memoryview(self._mmap)
+        return memoryview(self.bytes())
+
+    def bytes(self) -> bytes:
+        if self._data is not None:
+            return self._data
+        if self._mmap is not None:
+            self._data = self._mmap[:]
+            return self._data
+        assert self._text is not None
+        self._data = self._text.encode("utf-8")
+        return self._data
+
+    def text(self) -> str:
+        if self._text is None:
+            self._text = self.bytes().decode("utf-8", errors="replace")
+        return self._text
+
+    def close(self) -> None:
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
 
 
-@dataclass
 class CompletedProcess:
-    cmd_list: list[str]
-    subprocess: subprocess.CompletedProcess
-    ok: bool = True
-    cmd_str: str = ""
+    """Result of a subprocess. Output is kept as raw bytes and decoded lazily,
+    once; cmd_str is only built when asked for."""
 
-    def __post_init__(self) -> None:
-        self.cmd_str = subprocess.list2cmdline(self.cmd_list)
-        self.ok = self.subprocess.returncode == 0
+    def __init__(
+        self,
+        cmd_list: list[str],
+        subprocess: subprocess.CompletedProcess,  # pylint: disable=redefined-outer-name
+        timed_out: bool = False,
+        cancelled: bool = False,
+    ) -> None:
+        self.cmd_list = cmd_list
+        self.timed_out = timed_out
+        self.cancelled = cancelled
+        self._returncode: int = subprocess.returncode
+        self._stdout = OutputBuffer(subprocess.stdout, OUTPUT_SPILL_THRESHOLD)
+        self._stderr = OutputBuffer(subprocess.stderr, OUTPUT_SPILL_THRESHOLD)
+        self._cmd_str: str | None = None
+        self.ok = self._returncode == 0 and not timed_out and not cancelled
+
+    @property
+    def cmd_str(self) -> str:
+        if self._cmd_str is None:
+            self._cmd_str = subprocess.list2cmdline(self.cmd_list)
+        return self._cmd_str
+
+    @property
+    def subprocess(self) -> subprocess.CompletedProcess:
+        """The result as the stdlib type, with text output like the results
+        this class used to wrap."""
+        return subprocess.CompletedProcess(
+            self.cmd_list, self._returncode, self.stdout, self.stderr
+        )
 
     @property
     def stdout(self) -> str:
-        out: str | bytes = self.subprocess.stdout
-        if isinstance(out, bytes):
-            return out.decode(encoding="utf-8")
-        return out
+        return self._stdout.text()
 
     @property
     def stderr(self) -> str:
-        err: str | bytes = self.subprocess.stderr
-        if isinstance(err, bytes):
-            return err.decode(encoding="utf-8")
-        return err
+        return self._stderr.text()
 
     @property
     def stdout_bytes(self) -> bytes:
-        out: str | bytes = self.subprocess.stdout
-        if isinstance(out, str):
-            return out.encode(encoding="utf-8")
-        return out
+        return self._stdout.bytes()
 
     @property
     def stderr_bytes(self) -> bytes:
-        err: str | bytes = self.subprocess.stderr
-        if isinstance(err, str):
-            return err.encode(encoding="utf-8")
-        return err
+        return self._stderr.bytes()
+
+    @property
+    def stdout_view(self) -> memoryview:
+        return self._stdout.view
+
+    @property
+    def stderr_view(self) -> memoryview:
+        return self._stderr.view
 
     @property
     def returncode(self) -> int:
-        return self.subprocess.returncode
+        return self._returncode
+
+    def close(self) -> None:
+        """Release any spilled output files."""
+        self._stdout.close()
+        self._stderr.close()
 
     def __str__(self) -> str:
         return f"CompletedProcess(cmd={self.cmd_str}, returncode={self.returncode}, stdout={self.stdout}, stderr={self.stderr})"
@@ -0,0 +1,143 @@
+"""
+Unit test file.
+"""
+
+import ast
+import math
+import statistics
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from digital_ocean_cluster import agent
+from digital_ocean_cluster.agent_client import AgentClient, AgentError, start_agent
+from digital_ocean_cluster.droplet import Droplet
+from digital_ocean_cluster.identity import Identity
+from digital_ocean_cluster.transport import LocalTransport
+
+AGENT_CMD = [sys.executable, "-u", agent.__file__]
+
+# The oldest python3 of a supported image (Ubuntu 20.04).
+MIN_REMOTE_PYTHON = (3, 8)
+
+
+def _min_remote_python() -> str | None:
+    """An interpreter of MIN_REMOTE_PYTHON on this machine, if there is one."""
+    name = shutil.which("python%d.%d" % MIN_REMOTE_PYTHON)
+    if name is None:
+        return None
+    # pyenv shims exist even when that version is not selected.
+    cp = subprocess.run([name, "--version"], capture_output=True, check=False)
+    return name if cp.returncode == 0 else None
+
+
+class AgentTester(unittest.TestCase):
+    """Main tester class."""
+
+    def test_agent_protocol(self) -> None:
+        """Exec, file I/O and function calls over one local agent process."""
+        with AgentClient(AGENT_CMD) as client, tempfile.TemporaryDirectory() as tmp:
+            cp = client.exec("echo hello && echo oops >&2 && exit 3")
+            self.assertEqual(cp.returncode, 3)
+            self.assertEqual(cp.stdout, "hello\n")
+            self.assertEqual(cp.stderr, "oops\n")
+
+            path = Path(tmp) / "sub" / "data.bin"
+            client.write_bytes(path, b"\x00\x01binary", mode=0o600)
+            self.assertEqual(client.read_bytes(path), b"\x00\x01binary")
+            self.assertEqual(path.stat().st_mode & 0o777, 0o600)
+
+            self.assertEqual(client.call(math.factorial, 10), 3628800)
+            with self.assertRaises(AgentError):
+                client.read_bytes(Path(tmp) / "missing")
+
+            # Requests are multiplexed over the single channel.
+            futures = [
+                client.submit(agent.KIND_CALL, (abs, (-i,), {})) for i in range(200)
+            ]
+            self.assertEqual([f.result() for f in futures], list(range(200)))
+
+    def test_agent_runs_on_oldest_remote_python(self) -> None:
+        source = Path(agent.__file__).read_text(encoding="utf-8")
+        ast.parse(source, feature_version=MIN_REMOTE_PYTHON)
+        python = _min_remote_python()
+        if python is None:
+            self.skipTest("python%d.%d is not installed" % MIN_REMOTE_PYTHON)
+        with tempfile.TemporaryDirectory() as tmp:
+            # Alone, as on a droplet: next to the package, its types.py would
+            # shadow the stdlib module.
+            script = shutil.copy(agent.__file__, tmp)
+            # Annotations are evaluated at import unless postponed.
+            cp = subprocess.run(
+                [
+                    python,
+                    "-c",
+                    "import runpy, sys; runpy.run_path(sys.argv[1])",
+                    script,
+                ],
+                capture_output=True,
+                text=True,
+                check=False,
+            )
+            self.assertEqual(cp.returncode, 0, cp.stderr)
+            with AgentClient([python, "-u", script]) as client:
+                client.ping()
+                self.assertEqual(client.exec("echo hello").stdout, "hello\n")
+
+    def test_dispatch_latency(self) -> None:
+        """Benchmark: ping round trips without process spawns."""
+        with AgentClient(AGENT_CMD) as client:
+            client.ping()
+            samples = [client.ping() for _ in range(200)]
+        median = statistics.median(samples)
+        print(f"agent ping median: {median * 1e6:.0f}us")
+        self.assertLess(median, 0.01)
+
+    def test_agent_exit(self) -> None:
+        """Pending requests fail when the agent dies."""
+        client = AgentClient([sys.executable, "-c", "import sys; sys.stdin.read(1)"])
+        with self.assertRaises(AgentError):
+            client.ping()
+        client.close()
+
+    def test_start_agent_installs_wheel_once(self) -> None:
+        """A wheel is installed once per content hash, past PEP 668."""
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            log = root / "pip.log"
+            python = root / "python"
+            python.write_text(
+                "#!/bin/bash\n"
+                'if [ "$1" = "-m" ]; then\n'
+                f'  echo "$PIP_BREAK_SYSTEM_PACKAGES $*" >> {log}; exit 0\n'
+                "fi\n"
+                f'exec {sys.executable} "$@"\n',
+                encoding="utf-8",
+            )
+            python.chmod(0o755)
+            wheel = root / "pkg-0.1-py3-none-any.whl"
+            wheel.write_bytes(b"wheel v1")
+            with mock.patch("digital_ocean_cluster.droplet.ensure_doctl"):
+                droplet = Droplet({"id": 1, "name": "agent", "tags": []})
+            droplet.transport = LocalTransport()
+            droplet.identity = Identity("ssh-ed25519 AAAA", Path("/keys/id_ed25519"))
+            with mock.patch(
+                "digital_ocean_cluster.agent_client.REMOTE_AGENT_DIR", str(root / "r")
+            ):
+                for _ in range(2):
+                    with start_agent(droplet, wheel, python=str(python)) as client:
+                        client.ping()
+                installs = log.read_text(encoding="utf-8").splitlines()
+                self.assertEqual(len(installs), 1)
+                self.assertTrue(installs[0].startswith("1 -m pip install"))
+                wheel.write_bytes(b"wheel v2")
+                start_agent(droplet, wheel, python=str(python)).close()
+                self.assertEqual(len(log.read_text(encoding="utf-8").splitlines()), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
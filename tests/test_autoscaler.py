@@ -0,0 +1,175 @@
+"""
+Unit test file.
+"""
+
+import socket
+import subprocess
+import tempfile
+import threading
+import unittest
+import warnings
+from pathlib import Path
+from unittest import mock
+
+from digital_ocean_cluster.autoscaler import (
+    Autoscaler,
+    AutoscalerPolicy,
+    file_queue_depth,
+    redis_queue_depth,
+)
+from digital_ocean_cluster.cluster import DropletCluster, DropletCreationArgs
+from digital_ocean_cluster.droplet import Droplet
+from digital_ocean_cluster.types import DropletException
+
+NEVER = float("-inf")
+
+
+class _FakeAutoscaler(Autoscaler):
+    """Scales a list of ints instead of real droplets."""
+
+    def _scale_up(self, count: int) -> int:
+        self.cluster.droplets.extend([object()] * count)  # type: ignore
+        return count
+
+    def _scale_down(self, count: int) -> int:
+        del self.cluster.droplets[-count:]
+        return count
+
+
+class AutoscalerTester(unittest.TestCase):
+    """Main tester class."""
+
+    def test_decide_hysteresis(self) -> None:
+        """Scale decisions respect watermarks, cooldowns and max_step."""
+        policy = AutoscalerPolicy(min_size=1, max_size=8, tasks_per_droplet=10)
+        self.assertEqual(policy.decide(35, 2, 100, NEVER, NEVER), 2)
+        self.assertEqual(policy.decide(500, 2, 100, NEVER, NEVER), 5)
+        # Within the hysteresis band: hold.
+        self.assertEqual(policy.decide(25, 4, 1000, NEVER, NEVER), 0)
+        self.assertEqual(policy.decide(5, 4, 1000, NEVER, NEVER), -3)
+        # Cooldowns.
+        self.assertEqual(policy.decide(35, 2, 100, 90, NEVER), 0)
+        self.assertEqual(policy.decide(5, 4, 1000, 900, NEVER), 0)
+        # Never below min_size.
+        self.assertEqual(policy.decide(0, 0, 0, NEVER, NEVER), 1)
+
+    def test_step(self) -> None:
+        """The controller applies decisions to the cluster."""
+        depth = [50.0]
+        cluster = DropletCluster(droplets=[], failed_droplets={})
+        scaler = _FakeAutoscaler(
+            cluster,
+            DropletCreationArgs(name="worker", tags=["test"]),
+            lambda: depth[0],
+            AutoscalerPolicy(tasks_per_droplet=10, scale_down_cooldown=10),
+        )
+        self.assertEqual(scaler.step(now=0), 5)
+        depth[0] = 0
+        self.assertEqual(scaler.step(now=5), 0)
+        self.assertEqual(scaler.step(now=20), -5)
+        self.assertEqual(len(cluster), 0)
+
+    def test_failed_retire_keeps_droplet(self) -> None:
+        """Droplets whose drain or delete fails stay in the cluster."""
+        with mock.patch("digital_ocean_cluster.droplet.ensure_doctl"):
+            droplets = [Droplet({"id": i, "name": f"w-{i}"}) for i in range(3)]
+        cluster = DropletCluster(droplets=list(droplets), failed_droplets={})
+
+        def _drain(droplet: Droplet) -> None:
+            if droplet.id == 2:
+                raise RuntimeError("drain hook failed")
+
+        def _delete(droplet: Droplet) -> DropletException | None:
+            if droplet.id == 1:
+                return DropletException("delete failed")
+            return None
+
+        scaler = Autoscaler(
+            cluster,
+            DropletCreationArgs(name="worker", tags=["test"]),
+            lambda: 0.0,
+            AutoscalerPolicy(tasks_per_droplet=10),
+            drain=_drain,
+        )
+        with mock.patch.object(Droplet, "delete", _delete):
+            self.assertEqual(scaler.step(now=1000), -1)
+        self.assertEqual([d.id for d in cluster.droplets], [1, 2])
+        self.assertEqual(scaler.last_down, 1000)
+        with mock.patch.object(Droplet, "delete", lambda d: DropletException("no")):
+            self.assertEqual(scaler.step(now=2000), 0)
+        self.assertEqual(scaler.last_down, 1000)
+
+    def test_failed_doctl_delete_keeps_droplet(self) -> None:
+        """A delete that doctl rejects leaves the droplet in the cluster."""
+        with mock.patch("digital_ocean_cluster.droplet.ensure_doctl"):
+            droplets = [Droplet({"id": i, "name": f"w-{i}"}) for i in range(2)]
+        cluster = DropletCluster(droplets=list(droplets), failed_droplets={})
+        scaler = Autoscaler(
+            cluster,
+            DropletCreationArgs(name="worker", tags=["test"]),
+            lambda: 0.0,
+            AutoscalerPolicy(tasks_per_droplet=10),
+        )
+        cp = subprocess.CompletedProcess(["doctl"], 1, "", "Error: 500 server error")
+        with (
+            mock.patch("digital_ocean_cluster.droplet.ensure_doctl"),
+            mock.patch("digital_ocean_cluster.droplet.run_with_retry", return_value=cp),
+            mock.patch("digital_ocean_cluster.droplet.time.sleep"),
+            warnings.catch_warnings(),
+        ):
+            warnings.simplefilter("ignore")
+            self.assertEqual(scaler.step(now=1000), 0)
+        self.assertEqual([d.id for d in cluster.droplets], [0, 1])
+        self.assertEqual(scaler.last_down, NEVER)
+
+    def test_scale_up_uses_fresh_keys(self) -> None:
+        """Scaled-up droplets do not share the template's idempotency key."""
+        cluster = DropletCluster(droplets=[], failed_droplets={})
+        template = DropletCreationArgs(
+            name="worker", tags=["test"], idempotency_key="fixed"
+        )
+        scaler = Autoscaler(cluster, template, lambda: 20.0)
+        with mock.patch(
+            "digital_ocean_cluster.autoscaler.DigitalOceanCluster.create_droplets",
+            return_value=DropletCluster(droplets=[], failed_droplets={}),
+        ) as create:
+            scaler.step(now=0)
+        (args,) = create.call_args.args
+        self.assertEqual(len(args), 2)
+        self.assertEqual({a.idempotency_key for a in args}, {None})
+
+    def test_file_metric(self) -> None:
+        """File metrics accept a number or count lines."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = Path(tmpdir) / "queue"
+            metric = file_queue_depth(path)
+            self.assertEqual(metric(), 0)
+            path.write_text("42\n")
+            self.assertEqual(metric(), 42)
+            path.write_text("a\nb\n\nc\n")
+            self.assertEqual(metric(), 3)
+
+    def test_redis_metric(self) -> None:
+        """LLEN is spoken over the Redis protocol."""
+        server = socket.socket()
+        server.bind(("127.0.0.1", 0))
+        server.listen(1)
+        received: list[bytes] = []
+
+        def _serve() -> None:
+            conn, _ = server.accept()
+            with conn:
+                received.append(conn.recv(1024))
+                conn.sendall(b":17\r\n")
+
+        thread = threading.Thread(target=_serve)
+        thread.start()
+        depth = redis_queue_depth("jobs", port=server.getsockname()[1])()
+        thread.join()
+        server.close()
+        self.assertEqual(depth, 17)
+        self.assertEqual(received[0], b"*2\r\n$4\r\nLLEN\r\n$4\r\njobs\r\n")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,103 @@
+"""
+Unit test file.
+"""
+
+import json
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from digital_ocean_cluster import catalog as catalog_module
+from digital_ocean_cluster.catalog import Catalog, RegionInfo, SizeInfo, load_catalog
+from digital_ocean_cluster.machines import MachineSize, Region
+from digital_ocean_cluster.types import DropletException
+
+SIZES = [
+    SizeInfo("s-2vcpu-4gb", 2, 4096, 80, 4.0, 24.0, 0.0357, ("nyc1", "ams3")),
+    SizeInfo("s-4vcpu-8gb", 4, 8192, 160, 5.0, 48.0, 0.0714, ("nyc1",)),
+    SizeInfo("c-4", 4, 8192, 50, 5.0, 84.0, 0.125, ("nyc1", "ams3")),
+    SizeInfo("s-1vcpu-1gb", 1, 1024, 25, 1.0, 6.0, 0.0089, ("ams3",)),
+]
+
+
+class CatalogTester(unittest.TestCase):
+    """Main tester class."""
+
+    def _catalog(self) -> Catalog:
+        return Catalog(
+            sizes=list(SIZES),
+            regions=[RegionInfo("nyc1"), RegionInfo("ams3")],
+            images=[],
+            fetched_at=1.0,
+        )
+
+    def test_select_cheapest(self) -> None:
+        """The cheapest size that satisfies the constraints wins."""
+        catalog = self._catalog()
+        self.assertEqual(catalog.select_size(min_vcpus=4).slug, "s-4vcpu-8gb")
+        self.assertEqual(
+            catalog.select_size(min_vcpus=4, region=Region.AMSTERDAM_3).slug, "c-4"
+        )
+        self.assertEqual(catalog.select_size(min_network_gbps=10).slug, "c-4")
+        self.assertEqual(catalog.select_size().slug, "s-1vcpu-1gb")
+        with self.assertRaises(DropletException):
+            catalog.select_size(min_memory_gb=64)
+
+    def test_json_round_trip(self) -> None:
+        """The disk cache format round trips."""
+        catalog = self._catalog()
+        loaded = Catalog.from_json(catalog.to_json())
+        self.assertEqual(loaded.sizes, catalog.sizes)
+        self.assertTrue(loaded.available_in("c-4", "ams3"))
+        self.assertFalse(loaded.available_in("s-4vcpu-8gb", "ams3"))
+
+    def test_offline_fallback(self) -> None:
+        """The enums build a usable catalog without API access."""
+        catalog = Catalog.from_enums()
+        size = catalog.select_size(min_vcpus=8, min_memory_gb=32, region="nyc1")
+        self.assertEqual(size.vcpus, 8)
+        self.assertIsInstance(size.machine_size, MachineSize)
+
+    def test_load_from_disk_cache(self) -> None:
+        """A fresh disk cache is used without calling the API."""
+        catalog = self._catalog()
+        catalog.fetched_at = time.time()
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = Path(tmpdir) / "catalog.json"
+            path.write_text(json.dumps(catalog.to_json()))
+            catalog_module._CATALOG = None  # pylint: disable=protected-access
+            loaded = load_catalog(cache_file=path)
+            catalog_module._CATALOG = None  # pylint: disable=protected-access
+        self.assertEqual(
+            [s.slug for s in loaded.sizes], [s.slug for s in catalog.sizes]
+        )
+
+    def test_offline_fallback_is_retried(self) -> None:
+        """An API failure falls back to the enums only briefly."""
+        online = self._catalog()
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = Path(tmpdir) / "catalog.json"
+            catalog_module._CATALOG = None  # pylint: disable=protected-access
+            try:
+                with mock.patch.object(
+                    Catalog,
+                    "from_api",
+                    side_effect=json.JSONDecodeError("Expecting value", "", 0),
+                ):
+                    self.assertTrue(load_catalog(cache_file=path).offline)
+                with mock.patch.object(Catalog, "from_api", return_value=online):
+                    # Still within the offline fallback's short lifetime.
+                    self.assertTrue(load_catalog(cache_file=path).offline)
+                    later = time.time() + catalog_module.CATALOG_OFFLINE_MAX_AGE
+                    with mock.patch(
+                        "digital_ocean_cluster.catalog.time.time", return_value=later
+                    ):
+                        self.assertIs(load_catalog(cache_file=path), online)
+            finally:
+                catalog_module._CATALOG = None  # pylint: disable=protected-access
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,175 @@
+"""
+Unit test file.
+"""
+
+import contextlib
+import io
+import json
+import stat
+import subprocess
+import sys
+import threading
+import unittest
+from concurrent.futures import Future
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from typing import Any
+from unittest import mock
+
+from digital_ocean_cluster.cli import Session, _DaemonServer, forward, run_command
+from digital_ocean_cluster.process import run_process
+
+NAMES = ["web-0", "web-1", "web-2"]
+
+
+class _LocalDroplet:
+    def __init__(self, droplet_id: int, tags: list[str]) -> None:
+        self.id = droplet_id
+        self.name = f"node-{droplet_id}"
+        self.tags = tags
+        self.data = {"status": "active", "tags": tags}
+
+    def ssh_exec(self, command: str, timeout: Any = None, **_: Any) -> Any:
+        return run_process(["bash", "-c", command], timeout=timeout)
+
+
+class _FakeSession(Session):
+    def __init__(self) -> None:
+        super().__init__()
+        self._doctl_checked = True
+        self.listings = 0
+        self.droplets = [_LocalDroplet(1, ["a"]), _LocalDroplet(2, ["a", "b"])]
+
+    def find(self, tags: list[str]) -> list[Any]:
+        self.listings += 1
+        return [d for d in self.droplets if all(t in d.tags for t in tags)]
+
+
+class CliTester(unittest.TestCase):
+    """Main tester class."""
+
+    def _run(self, argv: list[str], session: Session) -> tuple[int, list[dict]]:
+        records: list[dict] = []
+        code = run_command(session, argv, ".", records.append)
+        return code, records
+
+    def test_exec_streams_json_records(self) -> None:
+        code, records = self._run(
+            ["exec", "--tag", "a", "--max-parallel", "1", "--", "echo", "hi there"],
+            _FakeSession(),
+        )
+        self.assertEqual(code, 0)
+        self.assertEqual(sorted(r["droplet"] for r in records), ["node-1", "node-2"])
+        self.assertTrue(all(r["stdout"] == "hi there\n" for r in records))
+
+    def test_exec_failure_and_timeout(self) -> None:
+        code, records = self._run(
+            ["exec", "--tag", "b", "--timeout", "0.5", "--", "sleep 5"], _FakeSession()
+        )
+        self.assertEqual(code, 1)
+        self.assertEqual(len(records), 1)
+        self.assertTrue(records[0]["timed_out"])
+
+    def test_list(self) -> None:
+        code, records = self._run(["list", "--tag", "b"], _FakeSession())
+        self.assertEqual(code, 0)
+        self.assertEqual([r["id"] for r in records], [2])
+
+    def test_daemon_round_trip(self) -> None:
+        with TemporaryDirectory() as tmp:
+            path = Path(tmp) / "d.sock"
+            session = _FakeSession()
+            server = _DaemonServer(path, session)
+            thread = threading.Thread(target=server.serve_forever, daemon=True)
+            thread.start()
+            self.assertEqual(stat.S_IMODE(path.stat().st_mode), 0o600)
+            try:
+                out = io.StringIO()
+                code = forward(path, ["exec", "--tag", "b", "--", "echo ok"], out)
+                self.assertEqual(code, 0)
+                record = json.loads(out.getvalue())
+                self.assertEqual(record["stdout"], "ok\n")
+                code = forward(path, ["list", "--tag", "a"], io.StringIO())
+                self.assertEqual(code, 0)
+                self.assertEqual(session.listings, 2)
+            finally:
+                server.shutdown()
+                server.server_close()
+            self.assertIsNone(forward(Path(tmp) / "missing.sock", ["list"], out))
+
+    def test_options_a_command_ignores_are_rejected(self) -> None:
+        stderr = io.StringIO()
+        with contextlib.redirect_stderr(stderr):
+            code, records = self._run(
+                ["create", "--tag", "a", "--name", "n", "--timeout", "5"],
+                _FakeSession(),
+            )
+        self.assertEqual(code, 2)
+        self.assertFalse(records[0]["ok"])
+        self.assertIn("unrecognized arguments: --timeout 5", records[0]["error"])
+        self.assertEqual(stderr.getvalue(), "")
+
+    def test_daemon_returns_usage_errors(self) -> None:
+        with TemporaryDirectory() as tmp:
+            path = Path(tmp) / "d.sock"
+            server = _DaemonServer(path, _FakeSession())
+            thread = threading.Thread(target=server.serve_forever, daemon=True)
+            thread.start()
+            try:
+                out = io.StringIO()
+                code = forward(path, ["list", "--max-parallel", "4"], out)
+            finally:
+                server.shutdown()
+                server.server_close()
+        self.assertEqual(code, 2)
+        record = json.loads(out.getvalue())
+        self.assertIn("usage: docluster list", record["error"])
+        self.assertIn("--tag", record["error"])
+
+    def test_create_is_one_batch(self) -> None:
+        calls: list[list[Any]] = []
+
+        def _async_create(args, progress=None):
+            calls.append(args)
+            futures = {}
+            for arg in args:
+                future: Future = Future()
+                future.set_result(RuntimeError(f"no capacity for {arg.name}"))
+                futures[arg.name] = future
+            return futures
+
+        with mock.patch(
+            "digital_ocean_cluster.cluster.DigitalOceanCluster.async_create_droplets",
+            side_effect=_async_create,
+        ):
+            code, records = self._run(
+                ["create", "--tag", "a", "--name", "web", "--count", "3"],
+                _FakeSession(),
+            )
+        self.assertEqual(code, 1)
+        self.assertEqual([[a.name for a in args] for args in calls], [NAMES])
+        self.assertEqual(sorted(r["droplet"] for r in records), NAMES)
+
+    def test_cli_import_is_light(self) -> None:
+        """Forwarding to the daemon doesn't need the library loaded."""
+        code = (
+            "import sys, digital_ocean_cluster.cli; "
+            "print(sorted(m for m in sys.modules if m.startswith('digital_ocean')))"
+        )
+        out = subprocess.run(
+            [sys.executable, "-c", code], capture_output=True, text=True, check=True
+        ).stdout
+        self.assertEqual(
+            out.strip(),
+            str(
+                [
+                    "digital_ocean_cluster",
+                    "digital_ocean_cluster.cli",
+                    "digital_ocean_cluster.settings",
+                ]
+            ),
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
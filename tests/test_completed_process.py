@@ -0,0 +1,56 @@
+"""
+Unit test file.
+"""
+
+import subprocess
+import unittest
+
+from digital_ocean_cluster.types import CompletedProcess, OutputBuffer
+
+
+class CompletedProcessTester(unittest.TestCase):
+    """Main tester class."""
+
+    def test_lazy_decode_is_cached(self) -> None:
+        """Decoding happens once and raw bytes are returned without copies."""
+        raw = b"hello \xff world"
+        cp = CompletedProcess(
+            ["echo", "hi there"], subprocess.CompletedProcess([], 0, raw, b"")
+        )
+        self.assertTrue(cp.ok)
+        self.assertIs(cp.stdout_bytes, raw)
+        self.assertIs(cp.stdout, cp.stdout)
+        self.assertEqual(cp.stdout, "hello � world")
+        self.assertEqual(cp.cmd_str, 'echo "hi there"')
+
+    def test_text_input(self) -> None:
+        """Processes run with text=True still expose bytes."""
+        cp = CompletedProcess(["x"], subprocess.CompletedProcess([], 1, "out", None))
+        self.assertFalse(cp.ok)
+        self.assertEqual(cp.stdout_bytes, b"out")
+        self.assertEqual(cp.stderr, "")
+
+    def test_subprocess_is_text(self) -> None:
+        """The stdlib view keeps the text output callers expect."""
+        cp = CompletedProcess(["x"], subprocess.CompletedProcess([], 0, b"out", b"err"))
+        self.assertEqual(cp.subprocess.stdout, "out")
+        self.assertEqual(cp.subprocess.stderr, "err")
+
+    def test_spill(self) -> None:
+        """Large output is spilled to an mmapped file."""
+        data = b"x" * 1000
+        buf = OutputBuffer(data, spill_threshold=100)
+        self.assertTrue(buf.spilled)
+        self.assertEqual(len(buf), 1000)
+        self.assertEqual(bytes(buf.view[:3]), b"xxx")
+        self.assertEqual(buf.bytes(), data)
+        self.assertEqual(buf.text(), "x" * 1000)
+        # Copied and decoded once, then kept.
+        self.assertIs(buf.bytes(), buf.bytes())
+        self.assertIs(buf.text(), buf.text())
+        buf.close()
+        self.assertFalse(OutputBuffer(data, spill_threshold=10000).spilled)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,187 @@
+"""
+Unit test file.
+"""
+
+import shlex
+import socket
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from threading import Thread
+from unittest import mock
+
+from digital_ocean_cluster.build_wheel import cached_wheel, source_hash
+from digital_ocean_cluster.deploy import deploy_wheel
+from digital_ocean_cluster.droplet import Droplet
+from digital_ocean_cluster.identity import Identity
+from digital_ocean_cluster.transport import LocalTransport
+
+NODES = 4
+
+SETUP_PY = """
+from setuptools import setup
+
+setup(name="tinypkg", version="0.1", packages=["tinypkg"])
+"""
+
+# Stands in for the droplets' python: records pip invocations.
+FAKE_PYTHON = """#!/bin/bash
+echo "$@" >> pip.log
+"""
+
+
+class RootedTransport(LocalTransport):
+    """Runs each droplet's commands in its own directory, standing in for the
+    droplet's home directory."""
+
+    def __init__(self, roots: dict[str, Path]) -> None:
+        self.roots = roots
+
+    def session_cmd_list(self, droplet, command, stdin=False):
+        root = shlex.quote(str(self.roots[droplet.name]))
+        # Grouped, so a backgrounded command does not take the cd with it.
+        return ["bash", "-c", f"cd {root} && {{ {command}\n}}"]
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class DeployTester(unittest.TestCase):
+    """Main tester class."""
+
+    def setUp(self) -> None:
+        self.tmp = TemporaryDirectory()
+        base = Path(self.tmp.name)
+        self.project = base / "project"
+        (self.project / "tinypkg").mkdir(parents=True)
+        (self.project / "setup.py").write_text(SETUP_PY, encoding="utf-8")
+        (self.project / "tinypkg" / "__init__.py").write_text(
+            "VALUE = 1\n", encoding="utf-8"
+        )
+        self.cache = base / "cache"
+        self.python = base / "python"
+        self.python.write_text(FAKE_PYTHON, encoding="utf-8")
+        self.python.chmod(0o755)
+        self.roots = {f"node-{i}": base / f"node-{i}" for i in range(NODES)}
+        transport = RootedTransport(self.roots)
+        self.droplets = []
+        for i, root in enumerate(self.roots.values()):
+            root.mkdir()
+            with mock.patch("digital_ocean_cluster.droplet.ensure_doctl"):
+                droplet = Droplet({"id": i, "name": f"node-{i}", "tags": []})
+            droplet.transport = transport
+            droplet.identity = Identity("ssh-ed25519 AAAA", Path("/keys/id_ed25519"))
+            self.droplets.append(droplet)
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def _deploy(self, **kwargs):
+        return deploy_wheel(
+            self.droplets,
+            self.project,
+            python=str(self.python),
+            remote_dir="deploy",
+            cache_dir=self.cache,
+            **kwargs,
+        )
+
+    def test_source_hash(self) -> None:
+        digest = source_hash(self.project)
+        (self.project / "build").mkdir()
+        (self.project / "build" / "junk.py").write_text("x", encoding="utf-8")
+        (self.project / "tinypkg" / "__pycache__").mkdir()
+        self.assertEqual(source_hash(self.project), digest)
+        (self.project / "tinypkg" / "__init__.py").write_text(
+            "VALUE = 2\n", encoding="utf-8"
+        )
+        self.assertNotEqual(source_hash(self.project), digest)
+
+    def test_cached_wheel(self) -> None:
+        wheel, built = cached_wheel(self.project, cache_dir=self.cache)
+        self.assertTrue(built)
+        self.assertTrue(wheel.name.startswith("tinypkg-0.1-"))
+        again, built = cached_wheel(self.project, cache_dir=self.cache)
+        self.assertFalse(built)
+        self.assertEqual(again, wheel)
+
+    def test_deploy_then_redeploy(self) -> None:
+        report = self._deploy()
+        self.assertTrue(report.ok, report.failed)
+        self.assertTrue(report.built)
+        self.assertEqual(report.transfers(), {"direct": NODES})
+        self.assertTrue(all(n.installed for n in report.nodes.values()))
+        self.assertEqual(list(report.stages), ["hash", "build", "upload", "install"])
+        for root in self.roots.values():
+            pip_log = (root / "pip.log").read_text(encoding="utf-8").splitlines()
+            self.assertEqual(len(pip_log), 2)
+            self.assertIn("--force-reinstall --no-deps", pip_log[1])
+            wheels = list((root / "deploy" / "wheels").rglob("*.whl"))
+            self.assertEqual([w.name for w in wheels], [report.wheel.name])
+        print(f"\nfirst deploy: {report}")
+
+        again = self._deploy()
+        self.assertTrue(again.ok, again.failed)
+        self.assertFalse(again.built)
+        self.assertEqual(again.transfers(), {"present": NODES})
+        self.assertFalse(any(n.installed for n in again.nodes.values()))
+        print(f"unchanged redeploy: {again}")
+
+        (self.project / "tinypkg" / "__init__.py").write_text(
+            "VALUE = 3\n", encoding="utf-8"
+        )
+        changed = self._deploy()
+        self.assertTrue(changed.built)
+        self.assertEqual(changed.transfers(), {"direct": NODES})
+        self.assertTrue(all(n.installed for n in changed.nodes.values()))
+        print(f"changed redeploy: {changed}")
+
+    def test_deploy_through_relay(self) -> None:
+        with mock.patch.object(Droplet, "private_ip", return_value="127.0.0.1"):
+            report = self._deploy(relay_fanout=NODES, relay_port=_free_port())
+        self.assertTrue(report.ok, report.failed)
+        self.assertEqual(report.transfers(), {"direct": 1, "relay": NODES - 1})
+        for root in self.roots.values():
+            self.assertTrue((root / "pip.log").exists())
+            self.assertEqual(list((root / "deploy" / "wheels").glob("*.pid")), [])
+        print(f"\nrelay deploy: {report}")
+
+    def test_relay_does_not_nest_pool_waits(self) -> None:
+        # Two seeds on a two worker pool: a seed that waited on its peers'
+        # fetches from inside the pool would never get them run.
+        reports = []
+        pool = ThreadPoolExecutor(2)
+        try:
+            with (
+                mock.patch("digital_ocean_cluster.deploy.THREAD_POOL", pool),
+                mock.patch.object(Droplet, "private_ip", return_value="127.0.0.1"),
+            ):
+                thread = Thread(
+                    target=lambda: reports.append(
+                        self._deploy(relay_fanout=1, relay_port=_free_port())
+                    ),
+                    daemon=True,
+                )
+                thread.start()
+                thread.join(60)
+            self.assertFalse(thread.is_alive(), "deploy deadlocked")
+        finally:
+            # Cancelling what is queued frees workers stuck waiting on it.
+            pool.shutdown(wait=False, cancel_futures=True)
+        self.assertTrue(reports[0].ok, reports[0].failed)
+        self.assertEqual(reports[0].transfers(), {"direct": 2, "relay": 2})
+
+    def test_failed_install_is_reported(self) -> None:
+        self.python.write_text("#!/bin/bash\nexit 3\n", encoding="utf-8")
+        report = self._deploy()
+        self.assertFalse(report.ok)
+        self.assertEqual(len(report.failed), NODES)
+        self.assertIn("install failed", report.nodes[self.droplets[0]].error)
+
+
+if __name__ == "__main__":
+    unittest.main()
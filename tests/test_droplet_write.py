@@ -0,0 +1,35 @@
+"""
+Unit test file.
+"""
+
+import os
+import subprocess
+import tempfile
+import unittest
+from pathlib import Path
+
+from digital_ocean_cluster.droplet import _write_command
+
+
+class DropletWriteTester(unittest.TestCase):
+    """Main tester class."""
+
+    def test_write_command(self) -> None:
+        """The remote write command stores stdin atomically with its mode."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            dest = Path(tmpdir) / "some dir" / "file.bin"
+            data = b"\x00binary\xffdata\n"
+            cp = subprocess.run(
+                ["bash", "-c", _write_command(dest, chmod="750")],
+                input=data,
+                capture_output=True,
+                check=False,
+            )
+            self.assertEqual(cp.returncode, 0, cp.stderr)
+            self.assertEqual(dest.read_bytes(), data)
+            self.assertEqual(os.stat(dest).st_mode & 0o777, 0o750)
+            self.assertEqual(os.listdir(dest.parent), ["file.bin"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,213 @@
+"""
+Unit test file.
+"""
+
+import gc
+import pickle
+import subprocess
+import time
+import timeit
+import tracemalloc
+import unittest
+from inspect import currentframe
+from unittest import mock
+
+from digital_ocean_cluster.cluster import DigitalOceanCluster
+from digital_ocean_cluster.droplet import Droplet
+from digital_ocean_cluster.retry import ClassifiedError, ErrorClass
+from digital_ocean_cluster.settings import ERROR_STDERR_TAIL
+from digital_ocean_cluster.types import (
+    CommandError,
+    CompletedProcess,
+    DropletException,
+)
+
+FAILURES = 1000
+OUTPUT_BYTES = 16 * 1024
+
+
+class _FrameException(Exception):
+    """The previous DropletException: inspects the caller frame on every
+    construction. Kept here as the benchmark baseline."""
+
+    def __init__(self, message: str) -> None:
+        self.message = message
+        frame = currentframe()
+        caller = frame.f_back if frame else None
+        self.file = caller.f_code.co_filename if caller else "<unknown>"
+        self.line = caller.f_lineno if caller else 0
+        super().__init__(message)
+
+
+def _droplets(count: int) -> list[Droplet]:
+    with mock.patch("digital_ocean_cluster.droplet.ensure_doctl"):
+        return [
+            Droplet({"id": i, "name": f"node-{i}", "tags": []}) for i in range(count)
+        ]
+
+
+def _failing(droplet: Droplet) -> None:
+    raise subprocess.CalledProcessError(1, ["false"], stderr=f"{droplet.name} died")
+
+
+class ErrorsTester(unittest.TestCase):
+    """Main tester class."""
+
+    def test_fields_and_str(self) -> None:
+        cp = subprocess.CompletedProcess(["doctl"], 1, b"", b"Error: 404 not found\n")
+        error = CommandError.from_process(
+            "Error checking droplet",
+            CompletedProcess(["doctl"], cp),
+            droplet="web-1",
+            droplet_id=7,
+            operation="get_droplet",
+        )
+        self.assertEqual(error.returncode, 1)
+        self.assertEqual(error.stderr, "Error: 404 not found")
+        self.assertEqual(error.droplet_id, 7)
+        self.assertEqual(
+            str(error),
+            "Error checking droplet [droplet=web-1 id=7 operation=get_droplet "
+            "returncode=1]: Error: 404 not found",
+        )
+        self.assertIsNone(error.origin)  # not raised, not captured
+        self.assertEqual(error.to_dict()["operation"], "get_droplet")
+
+    def test_stderr_tail(self) -> None:
+        error = DropletException("boom", stderr="x" * 10 * ERROR_STDERR_TAIL)
+        assert error.stderr is not None
+        self.assertEqual(len(error.stderr), ERROR_STDERR_TAIL + 3)
+
+    def test_origin_from_traceback(self) -> None:
+        try:
+            raise DropletException("boom")
+        except DropletException as e:
+            error = e
+        self.assertEqual(error.file, __file__)
+        self.assertIn(f"{__file__} at line {error.line}", str(error))
+
+    def test_origin_captured_when_enabled(self) -> None:
+        with mock.patch("digital_ocean_cluster.types.CAPTURE_ERROR_ORIGIN", True):
+            line = currentframe().f_lineno + 1  # type: ignore[union-attr]
+            error = ClassifiedError("slow", ErrorClass.TRANSIENT, droplet="a")
+        self.assertEqual(error.origin, (__file__, line))
+
+    def test_wrap_drops_traceback(self) -> None:
+        try:
+            raise ValueError("bad")
+        except ValueError as e:
+            cause = e
+        error = DropletException.wrap(cause, droplet="a", operation="install")
+        self.assertEqual(
+            str(error).split(" in ")[0], "ValueError: bad [droplet=a operation=install]"
+        )
+        self.assertIs(error.__cause__, cause)
+        self.assertIsNone(cause.__traceback__)
+        self.assertEqual(error.file, __file__)
+        same = DropletException("x", operation="first")
+        self.assertIs(DropletException.wrap(same, operation="second"), same)
+        self.assertEqual(same.operation, "first")
+
+    def test_pickle(self) -> None:
+        error = ClassifiedError(
+            "429", ErrorClass.RATE_LIMIT, droplet="a", returncode=1, stderr="slow"
+        )
+        copy = pickle.loads(pickle.dumps(error))
+        self.assertIsInstance(copy, ClassifiedError)
+        self.assertEqual(copy.error_class, ErrorClass.RATE_LIMIT)
+        self.assertEqual(str(copy), str(error))
+
+    def test_failed_delete_is_reported(self) -> None:
+        droplet = _droplets(1)[0]
+        cp = subprocess.CompletedProcess(["doctl"], 1, "", "Error: 500 server error")
+        with (
+            mock.patch("digital_ocean_cluster.droplet.ensure_doctl"),
+            mock.patch("digital_ocean_cluster.droplet.run_with_retry", return_value=cp),
+            mock.patch("digital_ocean_cluster.droplet.known_hosts_store") as store,
+            mock.patch("digital_ocean_cluster.droplet.time.sleep") as sleep,
+            self.assertWarns(UserWarning),
+        ):
+            error = droplet.delete()
+        self.assertIsInstance(error, CommandError)
+        self.assertEqual(error.operation, "delete_droplet")
+        self.assertEqual(error.droplet, "node-0")
+        store.assert_not_called()
+        sleep.assert_not_called()
+
+    def test_run_cluster_function_failures(self) -> None:
+        droplets = _droplets(FAILURES)
+        with mock.patch("digital_ocean_cluster.cluster.ensure_doctl"):
+            start = time.perf_counter()
+            out = DigitalOceanCluster.run_cluster_function(droplets, _failing)
+            elapsed = time.perf_counter() - start
+        self.assertEqual(len(out), FAILURES)
+        error = out[droplets[3]]
+        self.assertIsInstance(error, DropletException)
+        self.assertEqual(error.droplet, "node-3")
+        self.assertEqual(error.droplet_id, 3)
+        self.assertEqual(error.operation, "_failing")
+        self.assertIsNone(error.__cause__.__traceback__)
+        print(f"\nrun_cluster_function, {FAILURES} failures: {elapsed * 1000:.1f}ms")
+
+    def test_benchmark_error_path(self) -> None:
+        """Cost of FAILURES per droplet errors, each made in a function holding
+        a command's output: the old frame inspecting exception against the
+        structured one. The old one's frame cycle keeps the caller's frame,
+        and so its output, alive until the cycle collector runs."""
+
+        def _build(make) -> tuple[float, int, int]:
+            def fail(i: int) -> Exception:
+                output = bytes(OUTPUT_BYTES)  # pylint: disable=unused-variable
+                return make(i)
+
+            elapsed = min(
+                timeit.repeat(lambda: [fail(i) for i in range(FAILURES)], number=1)
+            )
+            gc.collect()
+            gc.disable()
+            tracemalloc.start()
+            try:
+                errors = [fail(i) for i in range(FAILURES)]
+                retained, _ = tracemalloc.get_traced_memory()
+                garbage = gc.collect()
+            finally:
+                tracemalloc.stop()
+                gc.enable()
+            self.assertEqual(len(errors), FAILURES)
+            return elapsed, retained, garbage
+
+        stderr = "ssh: connect to host 10.0.0.1 port 22: Connection refused\n" * 40
+        results = {
+            "frame inspection": _build(
+                lambda i: _FrameException(f"Error on node-{i}: {stderr}")
+            ),
+            "structured": _build(
+                lambda i: CommandError(
+                    "ssh failed",
+                    droplet=f"node-{i}",
+                    droplet_id=i,
+                    operation="ssh_exec",
+                    returncode=255,
+                    stderr=stderr,
+                )
+            ),
+        }
+        with mock.patch("digital_ocean_cluster.types.CAPTURE_ERROR_ORIGIN", True):
+            results["structured + origin"] = _build(
+                lambda i: CommandError(
+                    "ssh failed", droplet=f"node-{i}", returncode=255, stderr=stderr
+                )
+            )
+        print(f"\n{FAILURES} failures, {OUTPUT_BYTES // 1024}KiB output each:")
+        for name, (elapsed, retained, garbage) in results.items():
+            print(
+                f"  {name:20s} {elapsed * 1000:7.2f}ms  retained "
+                f"{retained / 1024 / 1024:6.1f}MiB  cyclic garbage {garbage}"
+            )
+        self.assertEqual(results["structured"][2], 0)
+        self.assertEqual(results["structured + origin"][2], 0)
+        self.assertLess(results["structured"][1], results["frame inspection"][1])
+
+
+if __name__ == "__main__":
+    unittest.main()
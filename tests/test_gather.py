@@ -0,0 +1,118 @@
+"""
+Unit test file.
+"""
+
+import subprocess
+import tempfile
+import unittest
+from pathlib import Path, PurePosixPath
+from unittest import mock
+
+from digital_ocean_cluster.droplet import Droplet
+from digital_ocean_cluster.gather import extract_archive, gather, gather_command
+from digital_ocean_cluster.identity import Identity
+from digital_ocean_cluster.transport import LocalTransport
+from digital_ocean_cluster.types import CompletedProcess, DropletException
+
+
+def _run(cmd: str, out: Path) -> None:
+    with open(out, "ab") as f:
+        subprocess.run(["bash", "-c", cmd], stdout=f, check=True)
+
+
+class GatherTester(unittest.TestCase):
+    """Main tester class."""
+
+    def test_resumed_stream_extracts(self) -> None:
+        """A stream resumed from a byte offset extracts to the same tree."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            root = Path(tmpdir)
+            logs = root / "remote" / "logs"
+            (logs / "sub").mkdir(parents=True)
+            (logs / "a.log").write_bytes(bytes(range(256)) * 100)
+            (logs / "sub" / "b.log").write_text("hello")
+            remote = PurePosixPath(logs.as_posix())
+
+            full = root / "full.tar.gz"
+            _run(gather_command(remote, 0, compress=True), full)
+            data = full.read_bytes()
+
+            # Simulate a transfer that died half way, then resume it.
+            part = root / "part.tar.gz"
+            part.write_bytes(data[: len(data) // 2])
+            _run(gather_command(remote, part.stat().st_size, compress=True), part)
+            self.assertEqual(part.read_bytes(), data)
+
+            dest = root / "local" / "droplet-1" / "123"
+            extract_archive(part, dest, compress=True)
+            self.assertEqual((dest / "logs" / "sub" / "b.log").read_text(), "hello")
+            self.assertEqual(
+                (dest / "logs" / "a.log").read_bytes(), (logs / "a.log").read_bytes()
+            )
+
+    def _droplets(self, count: int) -> list[Droplet]:
+        droplets = []
+        for i in range(count):
+            with mock.patch("digital_ocean_cluster.droplet.ensure_doctl"):
+                droplet = Droplet({"id": i, "name": f"node-{i}", "tags": []})
+            droplet.transport = LocalTransport()
+            droplet.identity = Identity("ssh-ed25519 AAAA", Path("/keys/id_ed25519"))
+            droplets.append(droplet)
+        return droplets
+
+    def test_one_failing_droplet_does_not_abort(self) -> None:
+        """An error on one droplet is its own failed result."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            root = Path(tmpdir)
+            (root / "remote" / "logs").mkdir(parents=True)
+            (root / "remote" / "logs" / "a.log").write_text("a")
+            good, bad = self._droplets(2)
+            bad.ssh_exec = mock.Mock(  # type: ignore[method-assign]
+                side_effect=DropletException("No public IP", droplet=bad.name)
+            )
+            report = gather(
+                [good, bad], root / "remote" / "logs", str(root / "local" / "{name}")
+            )
+            self.assertTrue(report.results[good].ok)
+            self.assertFalse(report.results[bad].ok)
+            self.assertIn("No public IP", report.results[bad].error)
+            self.assertEqual(
+                (root / "local" / "node-0" / "logs" / "a.log").read_text(), "a"
+            )
+
+    def test_uncompressed_retry_starts_over(self) -> None:
+        """A plain tar is never resumed, as a changed tree would splice."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            root = Path(tmpdir)
+            logs = root / "remote" / "logs"
+            logs.mkdir(parents=True)
+            (logs / "a.log").write_bytes(b"old " * 4096)
+            (droplet,) = self._droplets(1)
+            real = droplet.ssh_exec
+
+            def _dies_half_way(command, stdout=None, **kwargs):
+                with tempfile.TemporaryFile() as full:
+                    real(command, stdout=full, **kwargs)
+                    full.seek(0)
+                    data = full.read()
+                stdout.write(data[: len(data) // 2])
+                # The tree changes before the retry.
+                (logs / "a.log").write_bytes(b"new " * 4096)
+                droplet.ssh_exec = real
+                cp = subprocess.CompletedProcess(["ssh"], 255, b"", b"reset")
+                return CompletedProcess(["ssh"], cp)
+
+            droplet.ssh_exec = _dies_half_way  # type: ignore[method-assign]
+            report = gather(
+                [droplet], logs, str(root / "local" / "{name}"), compress=False
+            )
+            self.assertTrue(report.ok)
+            self.assertEqual(report.results[droplet].attempts, 2)
+            self.assertEqual(
+                (root / "local" / "node-0" / "logs" / "a.log").read_bytes(),
+                b"new " * 4096,
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
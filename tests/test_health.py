@@ -0,0 +1,140 @@
+"""
+Unit test file.
+"""
+
+import subprocess
+import unittest
+from threading import Event, Thread
+from types import SimpleNamespace
+from typing import Any
+
+from digital_ocean_cluster.cluster import DropletCluster
+from digital_ocean_cluster.health import HealthMonitor, HealthState, parse_probe
+from digital_ocean_cluster.types import CompletedProcess
+
+PROBE_OUTPUT = """0.52 0.40 0.33 1/123 4567
+2
+MemTotal:        2014588 kB
+MemAvailable:    1500000 kB
+/dev/vda1         50620216 4043612  46560220       9% /
+"""
+
+
+def _cp(returncode: int, stdout: str) -> CompletedProcess:
+    cp = subprocess.CompletedProcess([], returncode, stdout.encode(), b"down")
+    return CompletedProcess(["probe"], cp)
+
+
+class _FakeMonitor(HealthMonitor):
+    def __init__(self, cluster: Any) -> None:
+        super().__init__(cluster, failure_threshold=2)
+        self.listed: dict[int, Any] = {}
+        self.replies: dict[int, CompletedProcess] = {}
+
+    def _list_statuses(self) -> dict[int, Any]:
+        return self.listed
+
+    def _probe(self, droplet: Any) -> CompletedProcess:
+        return self.replies[droplet.id]
+
+
+class HealthTester(unittest.TestCase):
+    """Main tester class."""
+
+    def test_parse_probe(self) -> None:
+        """Load, memory and disk come from one probe."""
+        parsed = parse_probe(PROBE_OUTPUT)
+        self.assertEqual(parsed["load1"], 0.52)
+        self.assertEqual(parsed["cpus"], 2)
+        self.assertEqual(parsed["mem_available_kb"], 1500000)
+        self.assertEqual(parsed["disk_used_pct"], 9)
+
+    def test_state_changes(self) -> None:
+        """Transitions are published to subscribers."""
+        a = SimpleNamespace(id=1, name="a", data={})
+        b = SimpleNamespace(id=2, name="b", data={})
+        monitor = _FakeMonitor(DropletCluster(droplets=[a, b], failed_droplets={}))  # type: ignore
+        changes: list[tuple[str, HealthState, HealthState]] = []
+        monitor.subscribe(
+            lambda n, prev: changes.append((n.droplet.name, prev, n.state))
+        )
+        active = {"status": "active"}
+        monitor.listed = {
+            1: SimpleNamespace(data=active),
+            2: SimpleNamespace(data=active),
+        }
+        monitor.replies = {1: _cp(0, PROBE_OUTPUT), 2: _cp(0, PROBE_OUTPUT)}
+        monitor.check()
+        self.assertEqual(len(monitor.healthy_droplets()), 2)
+
+        # One failed probe is tolerated, two mark the node unreachable.
+        monitor.replies[2] = _cp(255, "")
+        monitor.check()
+        self.assertEqual(monitor.nodes[2].state, HealthState.HEALTHY)
+        monitor.check()
+        self.assertEqual(monitor.nodes[2].state, HealthState.UNREACHABLE)
+
+        # Disappearing from the listing means the droplet is gone.
+        del monitor.listed[1]
+        monitor.check()
+        self.assertEqual(monitor.nodes[1].state, HealthState.GONE)
+        self.assertEqual(
+            changes[-2:],
+            [
+                ("b", HealthState.HEALTHY, HealthState.UNREACHABLE),
+                ("a", HealthState.HEALTHY, HealthState.GONE),
+            ],
+        )
+
+    def test_readers_do_not_wait_for_probes(self) -> None:
+        """Node states stay readable while a probe round is in flight."""
+        a = SimpleNamespace(id=1, name="a", data={})
+        monitor = _FakeMonitor(DropletCluster(droplets=[a], failed_droplets={}))  # type: ignore
+        monitor.listed = {1: SimpleNamespace(data={"status": "active"})}
+        monitor.replies = {1: _cp(0, PROBE_OUTPUT)}
+        monitor.check()
+        probing, release = Event(), Event()
+
+        def _slow_probe(droplet: Any) -> CompletedProcess:
+            probing.set()
+            release.wait(10)
+            return monitor.replies[droplet.id]
+
+        monitor._probe = _slow_probe  # type: ignore[method-assign]
+        checker = Thread(target=monitor.check)
+        checker.start()
+        try:
+            self.assertTrue(probing.wait(5))
+            reader = Thread(target=monitor.healthy_droplets)
+            reader.start()
+            reader.join(1)
+            self.assertFalse(reader.is_alive(), "reader waited for the probe")
+        finally:
+            release.set()
+            checker.join()
+
+    def test_loop_survives_a_failed_check(self) -> None:
+        """An unexpected error is logged and the next check still runs."""
+        monitor = _FakeMonitor(DropletCluster(droplets=[], failed_droplets={}))
+        monitor.interval = 0.01
+        calls = []
+        listed = Event()
+
+        def _list_statuses() -> dict[int, Any]:
+            calls.append(1)
+            if len(calls) == 1:
+                raise RuntimeError("unexpected doctl output")
+            listed.set()
+            return {}
+
+        monitor._list_statuses = _list_statuses  # type: ignore[method-assign]
+        with self.assertLogs("digital_ocean_cluster", "ERROR"):
+            monitor.start()
+            try:
+                self.assertTrue(listed.wait(5))
+            finally:
+                monitor.stop()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,113 @@
+"""
+Unit test file.
+"""
+
+import os
+import subprocess
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import mock
+
+from digital_ocean_cluster import identity as identity_module
+from digital_ocean_cluster.cluster import DigitalOceanCluster, DropletCreationArgs
+from digital_ocean_cluster.identity import (
+    Identity,
+    account_ssh_key,
+    resolve_identity,
+    set_identity,
+)
+from digital_ocean_cluster.types import DropletException, SSHKey
+
+
+def _keygen(path: Path) -> None:
+    subprocess.run(
+        ["ssh-keygen", "-q", "-t", "ed25519", "-N", "", "-f", str(path)],
+        check=True,
+    )
+
+
+class IdentityTester(unittest.TestCase):
+    """Main tester class."""
+
+    def setUp(self) -> None:
+        self.tmp = TemporaryDirectory()
+        self.ssh_dir = Path(self.tmp.name)
+        _keygen(self.ssh_dir / "id_ed25519")
+        self.identity = Identity.from_key_file(self.ssh_dir / "id_ed25519")
+        self.previous = set_identity(self.identity)
+        identity_module._ACCOUNT_KEYS = None  # pylint: disable=protected-access
+
+    def tearDown(self) -> None:
+        set_identity(self.previous)
+        identity_module._ACCOUNT_KEYS = None  # pylint: disable=protected-access
+        self.tmp.cleanup()
+
+    def _account(self) -> list[SSHKey]:
+        other = SSHKey(1, "other", "00:11", "ssh-rsa AAAA")
+        mine = SSHKey(2, "mine", self.identity.fingerprint, self.identity.public_key)
+        return [other, mine]
+
+    def test_fingerprint_matches_ssh_keygen(self) -> None:
+        cp = subprocess.run(
+            ["ssh-keygen", "-E", "md5", "-lf", str(self.ssh_dir / "id_ed25519.pub")],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        expected = cp.stdout.split()[1].removeprefix("MD5:")
+        self.assertEqual(self.identity.fingerprint, expected)
+
+    def test_resolve(self) -> None:
+        _keygen(self.ssh_dir / "id_rsa")
+        with mock.patch.dict(os.environ, {}, clear=False):
+            os.environ.pop("DIGITAL_OCEAN_CLUSTER_SSH_KEY", None)
+            # ed25519 is preferred over rsa
+            self.assertEqual(resolve_identity(self.ssh_dir), self.identity)
+            os.environ["DIGITAL_OCEAN_CLUSTER_SSH_KEY"] = str(self.ssh_dir / "id_rsa")
+            explicit = resolve_identity(self.ssh_dir)
+        self.assertEqual(explicit.key_path, self.ssh_dir / "id_rsa")
+        self.assertIn("IdentitiesOnly=yes", explicit.ssh_options())
+        self.assertEqual(Identity(explicit.public_key).ssh_options(), [])
+
+    def test_account_key(self) -> None:
+        with mock.patch(
+            "digital_ocean_cluster.droplet_manager.DropletManager.list_ssh_keys",
+            return_value=self._account(),
+        ) as list_keys:
+            self.assertEqual(account_ssh_key().name, "mine")
+            self.assertEqual(account_ssh_key(self.identity).name, "mine")
+            stranger = Identity(self._account()[0].public_key)
+            with self.assertRaises(DropletException):
+                account_ssh_key(stranger)
+        self.assertEqual(list_keys.call_count, 1)
+
+    def test_bulk_create_lists_keys_once(self) -> None:
+        created: list[tuple[str, SSHKey]] = []
+
+        def _create(name: str, ssh_key: SSHKey, **kwargs) -> DropletException:
+            created.append((name, ssh_key))
+            return DropletException("not really")
+
+        args = [DropletCreationArgs(f"node-{i}", ["t"]) for i in range(20)]
+        with (
+            mock.patch("digital_ocean_cluster.cluster.ensure_doctl"),
+            mock.patch(
+                "digital_ocean_cluster.droplet_manager.DropletManager.list_ssh_keys",
+                return_value=self._account(),
+            ) as list_keys,
+            mock.patch(
+                "digital_ocean_cluster.droplet_manager.DropletManager.create_droplet",
+                side_effect=_create,
+            ),
+        ):
+            futures = DigitalOceanCluster.async_create_droplets(args)
+            for future in futures.values():
+                future.result()
+        self.assertEqual(list_keys.call_count, 1)
+        self.assertEqual(len(created), 20)
+        self.assertTrue(all(key.name == "mine" for _, key in created))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,119 @@
+"""
+Unit test file.
+"""
+
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from typing import Any
+
+from digital_ocean_cluster.install import (
+    Installer,
+    InstallStep,
+    MarkerCache,
+    step_timings,
+)
+from digital_ocean_cluster.process import run_process
+from digital_ocean_cluster.remote_script import RemoteScript, ScriptResult
+
+
+class _LocalDroplet:
+    """Runs "remote" commands with the local bash."""
+
+    def __init__(self, root: Path) -> None:
+        self.id = 1
+        self.name = "local"
+        self.root = root
+        self.sessions = 0
+
+    def ssh_exec(self, command: str, timeout: Any = None, **kwargs: Any) -> Any:
+        self.sessions += 1
+        return run_process(
+            ["bash", "-c", command], input=kwargs.get("input"), timeout=timeout
+        )
+
+    def run_script(self, script: RemoteScript) -> ScriptResult:
+        cmd = script.command(root=str(self.root / "scripts"))
+        cp = self.ssh_exec(cmd, input=script.payload())
+        return ScriptResult(cp, script.parse_output(cp.stdout_bytes), uploaded=True)
+
+
+class InstallTester(unittest.TestCase):
+    """Main tester class."""
+
+    def setUp(self) -> None:
+        self.tmp = TemporaryDirectory()
+        self.root = Path(self.tmp.name)
+        self.droplet = _LocalDroplet(self.root)
+        self.log = self.root / "log"
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def _installer(
+        self, second: str = "b", cache: MarkerCache | None = None
+    ) -> Installer:
+        calls = self.root / "fn_calls"
+
+        def fn_step(droplet: Any) -> None:
+            with open(calls, "a", encoding="utf-8") as f:
+                f.write(droplet.name + "\n")
+
+        steps = [
+            InstallStep("one", script=f"echo a >> {self.log}"),
+            InstallStep("two", script=f"echo {second} >> {self.log}"),
+            InstallStep("three", fn=fn_step, key="fn-v1"),
+        ]
+        return Installer(
+            steps,
+            cache=cache or MarkerCache(None),
+            marker_dir=str(self.root / "markers"),
+        )
+
+    def test_second_run_skips_everything(self) -> None:
+        cache = MarkerCache(None)
+        report = self._installer(cache=cache).run(self.droplet)  # type: ignore[arg-type]
+        self.assertTrue(report.ok, str(report))
+        self.assertEqual([s.skipped for s in report.steps], [False] * 3)
+        self.assertEqual(self.log.read_text(), "a\nb\n")
+        sessions = self.droplet.sessions
+        report = self._installer(cache=cache).run(self.droplet)  # type: ignore[arg-type]
+        self.assertEqual([s.skipped for s in report.steps], [True] * 3)
+        # Answered from the local mirror without touching the droplet.
+        self.assertEqual(self.droplet.sessions, sessions)
+        self.assertEqual(self.log.read_text(), "a\nb\n")
+
+    def test_remote_markers_survive_lost_local_cache(self) -> None:
+        self._installer().run(self.droplet)  # type: ignore[arg-type]
+        # Each _installer() has a fresh, empty local cache.
+        report = self._installer().run(self.droplet)  # type: ignore[arg-type]
+        self.assertEqual([s.skipped for s in report.steps], [True] * 3)
+
+    def test_changed_step_reruns_it_and_later_steps(self) -> None:
+        self._installer().run(self.droplet)  # type: ignore[arg-type]
+        report = self._installer(second="c").run(self.droplet)  # type: ignore[arg-type]
+        self.assertEqual([s.skipped for s in report.steps], [True, False, False])
+        self.assertEqual(self.log.read_text(), "a\nb\nc\n")
+        self.assertEqual((self.root / "fn_calls").read_text(), "local\nlocal\n")
+
+    def test_failure_stops_and_resumes(self) -> None:
+        steps = [
+            InstallStep("ok", script=f"echo ok >> {self.log}"),
+            InstallStep("flaky", script=f"test -f {self.root}/ready || exit 3"),
+        ]
+        installer = Installer(steps, MarkerCache(None), str(self.root / "markers"))
+        report = installer.run(self.droplet)  # type: ignore[arg-type]
+        self.assertFalse(report.ok)
+        with self.assertRaises(Exception):
+            installer(self.droplet)  # type: ignore[arg-type]
+        (self.root / "ready").touch()
+        report = installer.run(self.droplet)  # type: ignore[arg-type]
+        self.assertTrue(report.ok)
+        self.assertEqual([s.skipped for s in report.steps], [True, False])
+        self.assertEqual(self.log.read_text(), "ok\n")
+        timings = step_timings({self.droplet: report})  # type: ignore[dict-item]
+        self.assertEqual([t[0] for t in timings], ["flaky"])
+
+
+if __name__ == "__main__":
+    unittest.main()
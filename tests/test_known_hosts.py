@@ -0,0 +1,59 @@
+"""
+Unit test file.
+"""
+
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from digital_ocean_cluster.known_hosts import KnownHostsStore
+
+ENTRIES = """\
+1.2.3.4 ssh-ed25519 AAAAC3NzaC1lZDI1NTE5AAAAIA
+[5.6.7.8]:2222 ssh-ed25519 AAAAC3NzaC1lZDI1NTE5AAAAIB
+web-0,10.0.0.2 ecdsa-sha2-nistp256 AAAAE2VjZHNh
+@revoked 9.9.9.9 ssh-rsa AAAAB3NzaC1yc2E
+# a comment mentioning 1.2.3.4
+"""
+
+
+class KnownHostsTester(unittest.TestCase):
+    """Main tester class."""
+
+    def test_forget(self) -> None:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            store = KnownHostsStore(Path(tmpdir) / "sub" / "known_hosts")
+            options = store.ssh_options()
+            self.assertIn("StrictHostKeyChecking=accept-new", options)
+            self.assertIn(f"UserKnownHostsFile={store.path}", options)
+            store.path.write_text(ENTRIES, encoding="utf-8")
+            self.assertEqual(
+                store.hosts(), {"1.2.3.4", "5.6.7.8", "web-0", "10.0.0.2", "9.9.9.9"}
+            )
+            self.assertEqual(store.forget("1.2.3.4", "5.6.7.8"), 2)
+            self.assertEqual(store.forget("10.0.0.2"), 1)
+            self.assertEqual(store.forget("1.2.3.4"), 0)
+            self.assertEqual(store.hosts(), {"9.9.9.9"})
+            # Comments survive.
+            self.assertIn("# a comment", store.path.read_text(encoding="utf-8"))
+
+    def test_add_races_forget(self) -> None:
+        """Entries added while others are forgotten are never lost."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            store = KnownHostsStore(Path(tmpdir) / "known_hosts")
+            store.path.parent.mkdir(exist_ok=True)
+            store.path.write_text(ENTRIES, encoding="utf-8")
+
+            def _add(i: int) -> None:
+                store.add(f"10.1.0.{i}", "ssh-ed25519", "AAAA")
+                store.forget("1.2.3.4", f"web-{i}")
+
+            with ThreadPoolExecutor(8) as pool:
+                list(pool.map(_add, range(200)))
+            added = {h for h in store.hosts() if h.startswith("10.1.0.")}
+            self.assertEqual(len(added), 200)
+
+
+if __name__ == "__main__":
+    unittest.main()
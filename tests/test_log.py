@@ -0,0 +1,128 @@
+"""
+Unit test file.
+"""
+
+import logging
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from digital_ocean_cluster.log import (
+    LOGGER_NAME,
+    flush_logging,
+    get_logger,
+    setup_logging,
+    shutdown_logging,
+)
+
+logger = get_logger("tests")
+
+WORKERS = 64
+RECORDS_PER_WORKER = 50
+SINK_DELAY = 0.0002  # a slow console: 200us per line
+
+
+class _ListHandler(logging.Handler):
+    def __init__(self, delay: float = 0.0) -> None:
+        super().__init__()
+        self.delay = delay
+        self.messages: list[str] = []
+        self.formatted: list[str] = []
+
+    def emit(self, record: logging.LogRecord) -> None:
+        if self.delay:
+            time.sleep(self.delay)
+        self.messages.append(record.getMessage())
+        self.formatted.append(self.format(record))
+
+
+def _fan_out(log_one) -> None:
+    """WORKERS threads each log RECORDS_PER_WORKER records."""
+
+    def _work(i: int) -> None:
+        for j in range(RECORDS_PER_WORKER):
+            log_one(i, j)
+
+    with ThreadPoolExecutor(WORKERS) as pool:
+        list(pool.map(_work, range(WORKERS)))
+
+
+class LogTester(unittest.TestCase):
+    """Main tester class."""
+
+    def tearDown(self) -> None:
+        shutdown_logging()
+        logging.getLogger(LOGGER_NAME).setLevel(logging.NOTSET)
+
+    def test_library_is_quiet_until_set_up(self) -> None:
+        """Without setup_logging records only reach the application's root
+        handlers."""
+        package = logging.getLogger(LOGGER_NAME)
+        self.assertTrue(package.propagate)
+        self.assertEqual([type(h) for h in package.handlers], [logging.NullHandler])
+        root_sink = _ListHandler()
+        logging.getLogger().addHandler(root_sink)
+        try:
+            logger.warning("Could not start relay")
+            self.assertEqual(root_sink.messages, ["Could not start relay"])
+            sink = _ListHandler()
+            setup_logging("INFO", handlers=[sink])
+            logger.info("Created droplet: %s", "a")
+            flush_logging()
+            self.assertEqual(sink.messages, ["Created droplet: a"])
+            self.assertEqual(root_sink.messages[-1], "Created droplet: a")
+        finally:
+            logging.getLogger().removeHandler(root_sink)
+
+    def test_levels(self) -> None:
+        sink = _ListHandler()
+        setup_logging("INFO", handlers=[sink])
+        logger.debug("Executing: %s", "ssh ...")
+        logger.info("Created droplet: %s", "a")
+        flush_logging()
+        self.assertEqual(sink.messages, ["Created droplet: a"])
+
+    def test_per_droplet_files(self) -> None:
+        with TemporaryDirectory() as tmp:
+            setup_logging("DEBUG", handlers=[], droplet_log_dir=Path(tmp))
+            logger.debug("Executing: %s", "ls", extra={"droplet": "node-1"})
+            logger.info("not about a droplet")
+            logger.info("done", extra={"droplet": "node-2"})
+            shutdown_logging()
+            self.assertIn("Executing: ls", (Path(tmp) / "node-1.log").read_text())
+            self.assertIn("done", (Path(tmp) / "node-2.log").read_text())
+            self.assertEqual(len(list(Path(tmp).iterdir())), 2)
+
+    def test_arguments_are_rendered_when_logged(self) -> None:
+        sink = _ListHandler(SINK_DELAY)
+        setup_logging("INFO", handlers=[sink])
+        report = {"done": 0}
+        for i in range(100):
+            report["done"] = i
+            logger.info("%s", report)
+        try:
+            raise ValueError("first")
+        except ValueError:
+            logger.exception("Failed")
+        flush_logging()
+        self.assertEqual(sink.messages[:100], [str({"done": i}) for i in range(100)])
+        self.assertIn("ValueError: first", sink.formatted[-1])
+
+    def test_fan_out_to_slow_sink(self) -> None:
+        """Workers logging to a slow sink through the queue lose nothing."""
+        sink = _ListHandler(SINK_DELAY)
+        setup_logging("DEBUG", handlers=[sink])
+        _fan_out(lambda i, j: logger.debug("Executing: %d %d", i, j))
+        flush_logging()
+        self.assertEqual(len(sink.messages), WORKERS * RECORDS_PER_WORKER)
+
+        setup_logging("INFO", handlers=[sink])
+        _fan_out(lambda i, j: logger.debug("Executing: %d %d", i, j))
+        flush_logging()
+        self.assertEqual(len(sink.messages), WORKERS * RECORDS_PER_WORKER)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,120 @@
+"""
+Unit test file.
+"""
+
+import json
+import socket
+import subprocess
+import sys
+import unittest
+from types import SimpleNamespace
+
+from digital_ocean_cluster.mesh import (
+    BENCH_CLIENT,
+    BENCH_PORT,
+    BENCH_SERVER,
+    HOSTS_BEGIN,
+    HOSTS_END,
+    BandwidthMatrix,
+    all_pairs_rounds,
+    benchmark,
+    hosts_block,
+    ring_rounds,
+    ssh_config,
+)
+
+
+def _droplet(name: str, private: str, public: str) -> SimpleNamespace:
+    return SimpleNamespace(
+        name=name, private_ip=lambda: private, public_ip=lambda: public
+    )
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class MeshTester(unittest.TestCase):
+    """Main tester class."""
+
+    def test_hosts_and_ssh_config(self) -> None:
+        droplets = [
+            _droplet("a", "10.0.0.2", "1.1.1.1"),
+            _droplet("b", "10.0.0.3", "2.2.2.2"),
+        ]
+        block = hosts_block(droplets)  # type: ignore[arg-type]
+        self.assertEqual(block, f"{HOSTS_BEGIN}\n10.0.0.2 a\n10.0.0.3 b\n{HOSTS_END}\n")
+        config = ssh_config(droplets, private=False)  # type: ignore[arg-type]
+        self.assertIn("Host b\n    HostName 2.2.2.2", config)
+
+    def test_rounds_cover_every_pair_once(self) -> None:
+        rounds = all_pairs_rounds(4)
+        self.assertEqual(len(rounds), 3)
+        pairs = [p for r in rounds for p in r]
+        self.assertEqual(len(pairs), len(set(pairs)), "duplicate pair")
+        self.assertEqual(len(pairs), 4 * 3)
+        for r in rounds:
+            # Each node sends once and receives once per round.
+            self.assertEqual(sorted(s for s, _ in r), [0, 1, 2, 3])
+            self.assertEqual(sorted(d for _, d in r), [0, 1, 2, 3])
+        self.assertEqual(ring_rounds(3), [[(0, 1), (1, 2), (2, 0)]])
+        self.assertEqual(ring_rounds(1), [])
+
+    def test_matrix_str(self) -> None:
+        matrix = BandwidthMatrix(names=["a", "b"])
+        matrix.mbps[0][1] = 9400.0
+        matrix.rtt_ms[0][1] = 0.25
+        self.assertEqual(matrix.median_mbps, 9400.0)
+        self.assertIn("9400M/0.25ms", str(matrix))
+
+    def test_benchmark_servers_listen_on_private_ips(self) -> None:
+        commands: dict[str, list[str]] = {"a": [], "b": []}
+
+        def _node(name: str, private: str) -> SimpleNamespace:
+            def _ssh_exec(cmd: str) -> SimpleNamespace:
+                commands[name].append(cmd)
+                return SimpleNamespace(ok="nohup" in cmd, stderr="")
+
+            node = _droplet(name, private, "203.0.113.1")
+            node.ssh_exec = _ssh_exec
+            return node
+
+        droplets = [_node("a", "10.0.0.2"), _node("b", "10.0.0.3")]
+        benchmark(droplets)  # type: ignore[arg-type]
+        for name, ip in (("a", "10.0.0.2"), ("b", "10.0.0.3")):
+            self.assertIn(f" {ip} {BENCH_PORT} ", commands[name][0])
+            self.assertNotIn("203.0.113.1", commands[name][0])
+
+    def test_benchmark_programs_locally(self) -> None:
+        port = _free_port()
+        server = subprocess.Popen(
+            [sys.executable, "-c", BENCH_SERVER, "127.0.0.1", str(port), "10"]
+        )
+        try:
+            cp = subprocess.run(
+                [
+                    sys.executable,
+                    "-c",
+                    BENCH_CLIENT,
+                    "127.0.0.1",
+                    str(port),
+                    str(4 << 20),
+                    "5",
+                ],
+                capture_output=True,
+                text=True,
+                timeout=30,
+                check=True,
+            )
+        finally:
+            server.kill()
+            server.wait()
+        result = json.loads(cp.stdout)
+        self.assertGreater(result["mbps"], 0)
+        self.assertGreater(result["rtt_ms"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
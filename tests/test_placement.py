@@ -0,0 +1,120 @@
+"""
+Unit test file.
+"""
+
+import time
+import unittest
+from concurrent.futures import Future
+from unittest import mock
+
+from digital_ocean_cluster.cluster import DropletCreationArgs
+from digital_ocean_cluster.droplet import Droplet
+from digital_ocean_cluster.machines import Region, to_slug
+from digital_ocean_cluster.placement import (
+    PlacementPolicy,
+    create_placed_droplets,
+    plan_placement,
+)
+
+ARGS = [DropletCreationArgs(name=f"node-{i}", tags=["test"]) for i in range(5)]
+REGIONS: list[Region | str] = [Region.NYC_1, Region.AMSTERDAM_3, "sfo3"]
+
+
+def _regions(args: list[DropletCreationArgs]) -> list[str]:
+    return [to_slug(a.region) for a in args]
+
+
+class PlacementTester(unittest.TestCase):
+    """Main tester class."""
+
+    def test_spread(self) -> None:
+        """Spread assigns regions round robin."""
+        placed = plan_placement(ARGS, REGIONS, PlacementPolicy.SPREAD)
+        self.assertEqual(_regions(placed), ["nyc1", "ams3", "sfo3", "nyc1", "ams3"])
+        self.assertEqual([a.name for a in placed], [a.name for a in ARGS])
+
+    def test_pack_with_capacity(self) -> None:
+        """Pack fills regions in order, spilling once capacity is reached."""
+        placed = plan_placement(
+            ARGS, REGIONS, PlacementPolicy.PACK, capacity={"nyc1": 3, "ams3": 1}
+        )
+        self.assertEqual(_regions(placed), ["nyc1"] * 3 + ["ams3", "sfo3"])
+        with self.assertRaises(ValueError):
+            plan_placement(ARGS, ["nyc1"], PlacementPolicy.PACK, capacity={"nyc1": 2})
+
+    def test_latency(self) -> None:
+        """Latency packs into the closest region first."""
+        latencies = {"nyc1": 0.09, "ams3": 0.01, "sfo3": 0.05}
+        placed = plan_placement(
+            ARGS,
+            REGIONS,
+            PlacementPolicy.LATENCY,
+            latencies=latencies,
+            capacity={"ams3": 2},
+        )
+        self.assertEqual(_regions(placed), ["ams3", "ams3", "sfo3", "sfo3", "sfo3"])
+
+    def _create(self, fail_in: set[tuple[str, str]], attempts: list):
+        """Fake async_create_droplets failing the given (name, region)s."""
+
+        def _async_create(args):
+            (arg,) = args
+            attempts.append(arg)
+            future: Future = Future()
+            if (arg.name, to_slug(arg.region)) in fail_in:
+                future.set_result(RuntimeError("install failed"))
+            else:
+                with mock.patch("digital_ocean_cluster.droplet.ensure_doctl"):
+                    droplet = Droplet({"id": len(attempts), "name": arg.name})
+                future.set_result(droplet)
+            return {arg.name: future}
+
+        return _async_create
+
+    def _place(self, args, fail_in, **kwargs):
+        attempts: list[DropletCreationArgs] = []
+        with (
+            mock.patch("digital_ocean_cluster.placement.ensure_doctl"),
+            mock.patch(
+                "digital_ocean_cluster.placement.DigitalOceanCluster.async_create_droplets",
+                side_effect=self._create(fail_in, attempts),
+            ),
+            mock.patch(
+                "digital_ocean_cluster.placement.DropletManager.find_droplets",
+                return_value=[],
+            ) as find,
+        ):
+            result = create_placed_droplets(args, REGIONS, **kwargs)
+            deadline = time.monotonic() + 5
+            while find.call_count < len(attempts) - len(args):
+                self.assertLess(time.monotonic(), deadline)
+                time.sleep(0.01)
+        return result, attempts, find
+
+    def test_replace_removes_only_own_leftovers(self) -> None:
+        """A failed attempt is re-placed under a new key and only droplets
+        tagged with the failed attempt's key are cleaned up."""
+        result, attempts, find = self._place(ARGS[:1], {("node-0", "nyc1")})
+        self.assertEqual([d.name for d in result.cluster.droplets], ["node-0"])
+        first, second = attempts
+        self.assertEqual(to_slug(second.region), "ams3")
+        self.assertNotEqual(first.idempotency_key, second.idempotency_key)
+        find.assert_called_once_with(
+            name="node-0", tags=[f"create-key:{first.idempotency_key}"]
+        )
+
+    def test_replace_respects_capacity(self) -> None:
+        """Re-placement does not overfill a region with creations in flight."""
+        result, attempts, _ = self._place(
+            ARGS[:2],
+            {("node-0", "nyc1")},
+            policy=PlacementPolicy.PACK,
+            capacity={"nyc1": 1, "ams3": 1, "sfo3": 0},
+        )
+        self.assertEqual(len(attempts), 2)
+        self.assertEqual([d.name for d in result.cluster.droplets], ["node-1"])
+        self.assertIn("node-0", result.cluster.failed_droplets)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+"""
+Unit test file.
+"""
+
+import sys
+import time
+import unittest
+from concurrent.futures import Future
+
+from digital_ocean_cluster.cluster import _collect_results
+from digital_ocean_cluster.process import CancelToken, run_process
+from digital_ocean_cluster.types import THREAD_POOL
+
+SLEEP_CMD = [sys.executable, "-c", "import time; time.sleep(30)"]
+
+
+class ProcessTester(unittest.TestCase):
+    """Main tester class."""
+
+    def test_run_process_ok(self) -> None:
+        """A normal command completes with its output."""
+        cp = run_process([sys.executable, "-c", "print('hello')"])
+        self.assertTrue(cp.ok)
+        self.assertIn("hello", cp.stdout)
+
+    def test_run_process_timeout(self) -> None:
+        """A hung command is killed once its timeout expires."""
+        start = time.time()
+        cp = run_process(SLEEP_CMD, timeout=0.5)
+        self.assertLess(time.time() - start, 10)
+        self.assertTrue(cp.timed_out)
+        self.assertFalse(cp.ok)
+
+    def test_cancel_kills_child(self) -> None:
+        """Cancelling the token kills an in-flight child."""
+        cancel = CancelToken()
+        future = THREAD_POOL.submit(run_process, SLEEP_CMD, None, None, cancel)
+        time.sleep(0.5)
+        cancel.cancel()
+        cp = future.result(timeout=10)
+        self.assertTrue(cp.cancelled)
+        self.assertFalse(cp.ok)
+        # Processes started after cancellation never spawn.
+        self.assertTrue(run_process(SLEEP_CMD, cancel=cancel).cancelled)
+
+    def test_collect_results_deadline(self) -> None:
+        """The cluster deadline returns partial results."""
+        cancel = CancelToken()
+        fast: Future = THREAD_POOL.submit(
+            run_process, [sys.executable, "-c", "pass"], None, None, cancel
+        )
+        slow: Future = THREAD_POOL.submit(run_process, SLEEP_CMD, None, None, cancel)
+        start = time.time()
+        out = _collect_results({"fast": fast, "slow": slow}, 2, cancel)  # type: ignore
+        self.assertLess(time.time() - start, 15)
+        self.assertTrue(out["fast"].ok)  # type: ignore
+        self.assertTrue(out["slow"].cancelled)  # type: ignore
+
+
+if __name__ == "__main__":
+    unittest.main()
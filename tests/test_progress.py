@@ -0,0 +1,154 @@
+"""
+Unit test file.
+"""
+
+import io
+import subprocess
+import time
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import mock
+
+from digital_ocean_cluster.cluster import DigitalOceanCluster
+from digital_ocean_cluster.droplet import Droplet
+from digital_ocean_cluster.progress import (
+    NodeProgress,
+    Phase,
+    Progress,
+    TerminalRenderer,
+)
+from digital_ocean_cluster.transport import LocalTransport
+from digital_ocean_cluster.types import CompletedProcess
+
+
+def _droplet(i: int) -> Droplet:
+    with mock.patch("digital_ocean_cluster.droplet.ensure_doctl"):
+        droplet = Droplet({"id": i, "name": f"node-{i}", "tags": []})
+    droplet.transport = LocalTransport()
+    return droplet
+
+
+class ProgressTester(unittest.TestCase):
+    """Main tester class."""
+
+    def test_phases_and_callbacks(self) -> None:
+        progress = Progress("create", ["a", "b"])
+        seen: list[tuple[str, Phase, Phase]] = []
+
+        def _on_change(node: NodeProgress, previous: Phase) -> None:
+            seen.append((node.name, previous, node.phase))
+
+        progress.subscribe(_on_change)
+        progress.set_phase("a", Phase.CREATING)
+        progress.set_phase("a", Phase.CREATING)  # no change, no callback
+        progress.set_phase("a", Phase.READY)
+        progress.set_phase("b", Phase.FAILED, "boom")
+        self.assertEqual(
+            seen,
+            [
+                ("a", Phase.QUEUED, Phase.CREATING),
+                ("a", Phase.CREATING, Phase.READY),
+                ("b", Phase.QUEUED, Phase.FAILED),
+            ],
+        )
+        self.assertTrue(progress.done)
+        self.assertEqual(progress.counts(), {Phase.READY: 1, Phase.FAILED: 1})
+        self.assertIn("create 1/2 ready, 1 failed", progress.summary())
+
+    def test_eta_and_stragglers(self) -> None:
+        progress = Progress("create", [f"n{i}" for i in range(4)])
+        self.assertIsNone(progress.eta())
+        time.sleep(0.05)
+        progress.set_phase("n0", Phase.READY)
+        progress.set_phase("n1", Phase.READY)
+        progress.set_phase("n2", Phase.CLOUD_INIT)
+        self.assertGreater(progress.eta(), 0)
+        self.assertEqual(progress.stragglers(), [])
+        time.sleep(0.1)
+        slow = progress.stragglers()
+        self.assertEqual([n.name for n in slow], ["n2", "n3"])
+        self.assertIn("slow: n2 (cloud-init", progress.summary())
+
+    def test_renderer(self) -> None:
+        progress = Progress("copy", ["a"])
+        out = io.StringIO()
+        with TerminalRenderer(progress, stream=out, interval=0.01):
+            progress.set_phase("a", Phase.COPYING)
+            time.sleep(0.05)
+            progress.set_phase("a", Phase.READY)
+        lines = out.getvalue().splitlines()
+        self.assertIn("copying 1", lines[0])
+        self.assertEqual(lines[-1], "copy 1/1 ready")
+        self.assertEqual(len(lines), len(set(lines)))  # only changes are written
+
+    def test_copy_reports_bytes(self) -> None:
+        with TemporaryDirectory() as tmp:
+            src = Path(tmp) / "payload.bin"
+            src.write_bytes(b"x" * 100_000)
+            droplets = [_droplet(i) for i in range(3)]
+            progress = Progress("copy")
+            with mock.patch("digital_ocean_cluster.cluster.ensure_doctl"):
+                results = DigitalOceanCluster.run_cluster_copy_to(
+                    droplets,
+                    src,
+                    Path(tmp) / "remote" / "payload.bin",
+                    progress=progress,
+                )
+            self.assertTrue(all(cp.ok for cp in results.values()))
+        nodes = progress.nodes()
+        self.assertEqual({n.phase for n in nodes}, {Phase.READY})
+        self.assertEqual([n.bytes_done for n in nodes], [100_000] * 3)
+        self.assertGreater(progress.mbps(), 0)
+
+    def test_copy_reports_bytes_as_sent(self) -> None:
+        class ResetOnce(LocalTransport):
+            """Sends half the file, then drops the connection once."""
+
+            failed = False
+
+            def upload(
+                self, droplet, src, dest, timeout=None, cancel=None, on_bytes=None
+            ):
+                if not self.failed:
+                    self.failed = True
+                    on_bytes(src.stat().st_size // 2)
+                    cp = subprocess.CompletedProcess(
+                        ["scp"], 255, b"", b"Connection reset by peer\n"
+                    )
+                    return CompletedProcess(["scp"], cp)
+                return super().upload(droplet, src, dest, timeout, cancel, on_bytes)
+
+        with TemporaryDirectory() as tmp:
+            src = Path(tmp) / "payload.bin"
+            src.write_bytes(b"x" * 100_000)
+            droplet = _droplet(0)
+            droplet.transport = ResetOnce()
+            progress = Progress("copy")
+            credits: list[int] = []
+            add_bytes = progress.add_bytes
+
+            def record(name: str, count: int) -> None:
+                credits.append(count)
+                add_bytes(name, count)
+
+            with (
+                mock.patch.object(LocalTransport, "_COPY_CHUNK", 10_000),
+                mock.patch("digital_ocean_cluster.cluster.ensure_doctl"),
+                mock.patch.object(progress, "add_bytes", record),
+                mock.patch("digital_ocean_cluster.retry.time.sleep"),
+            ):
+                results = DigitalOceanCluster.run_cluster_copy_to(
+                    [droplet],
+                    src,
+                    Path(tmp) / "remote" / "payload.bin",
+                    progress=progress,
+                )
+            self.assertTrue(results[droplet].ok)
+        # credited chunk by chunk, and the resent half is not counted twice
+        self.assertGreater(len(credits), 2)
+        self.assertEqual(progress.nodes()[0].bytes_done, 100_000)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,100 @@
+"""
+Unit test file.
+"""
+
+import subprocess
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from digital_ocean_cluster.droplet import Droplet
+from digital_ocean_cluster.identity import Identity
+from digital_ocean_cluster.remote_script import RemoteScript, run_script
+from digital_ocean_cluster.transport import LocalTransport
+
+STEPS = [
+    ("hello", 'echo "hello $1 $GREETING"'),
+    ("binary", "printf '\\000\\001'; echo oops >&2"),
+    ("stdin", "cat"),
+    ("fail", "exit 3"),
+    ("never", "echo unreachable"),
+]
+
+
+def _run_local(script: RemoteScript, root: str, upload: bool) -> bytes:
+    cmd = script.command(["world"], {"GREETING": "hi there"}, upload=upload, root=root)
+    cp = subprocess.run(
+        ["bash", "-c", cmd],
+        input=script.payload() if upload else None,
+        capture_output=True,
+        check=False,
+    )
+    return cp.stdout
+
+
+class RemoteScriptTester(unittest.TestCase):
+    """Main tester class."""
+
+    def test_digest_is_content_addressed(self) -> None:
+        """Same steps give the same digest, different steps do not."""
+        self.assertEqual(RemoteScript(STEPS).digest, RemoteScript(STEPS).digest)
+        self.assertNotEqual(RemoteScript("a").digest, RemoteScript("b").digest)
+
+    def test_runner_protocol(self) -> None:
+        """Upload, cache by hash and parse per-step results using local bash."""
+        script = RemoteScript(STEPS)
+        with tempfile.TemporaryDirectory() as root:
+            # Not uploaded yet and no stdin: the runner reports a cache miss.
+            cp = subprocess.run(
+                ["bash", "-c", script.command(upload=False, root=root)],
+                capture_output=True,
+                check=False,
+            )
+            self.assertEqual(cp.returncode, 86)
+            # The second upload finds the bundle cached and leaves its payload
+            # unread on stdin.
+            for upload in (True, True, False):
+                steps = script.parse_output(_run_local(script, root, upload))
+                self.assertEqual(
+                    [s.name for s in steps], ["hello", "binary", "stdin", "fail"]
+                )
+                self.assertEqual(steps[0].stdout, b"hello world hi there\n")
+                self.assertEqual(steps[1].stdout, b"\x00\x01")
+                self.assertEqual(steps[1].stderr, b"oops\n")
+                # The payload is never readable by the steps.
+                self.assertEqual(steps[2].stdout, b"")
+                self.assertEqual(steps[3].returncode, 3)
+
+    def test_step_exiting_86_is_not_a_cache_miss(self) -> None:
+        """Only a runner that found no bundle makes run_script resend it."""
+        with tempfile.TemporaryDirectory() as root:
+            runs = Path(root) / "runs"
+            script = RemoteScript([("once", f"echo run >> {runs}; exit 86")])
+            with mock.patch("digital_ocean_cluster.droplet.ensure_doctl"):
+                droplet = Droplet({"id": 8600, "name": "node-86", "tags": []})
+            droplet.transport = LocalTransport()
+            droplet.identity = Identity("ssh-ed25519 AAAA", Path("/keys/id_ed25519"))
+            command = RemoteScript.command
+            with mock.patch.object(
+                RemoteScript,
+                "command",
+                lambda self, *a, **kw: command(self, *a, root=root, **kw),
+            ):
+                first = run_script(droplet, script)
+                second = run_script(droplet, script)
+            self.assertTrue(first.uploaded)
+            self.assertFalse(second.uploaded)
+            self.assertEqual(second.steps[0].returncode, 86)
+            self.assertEqual(runs.read_text(encoding="utf-8"), "run\nrun\n")
+
+    def test_env_names_are_validated(self) -> None:
+        script = RemoteScript("true")
+        for name in ("X; rm -rf /", "1ABC", "A-B", ""):
+            with self.assertRaises(ValueError):
+                script.command(env={name: "v"})
+        self.assertIn("export _OK1=v", script.command(env={"_OK1": "v"}))
+
+
+if __name__ == "__main__":
+    unittest.main()
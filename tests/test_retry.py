@@ -0,0 +1,199 @@
+"""
+Unit test file.
+"""
+
+import subprocess
+import time
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from threading import Timer
+from unittest import mock
+
+from digital_ocean_cluster.droplet import Droplet
+from digital_ocean_cluster.identity import Identity
+from digital_ocean_cluster.process import CancelToken
+from digital_ocean_cluster.retry import (
+    DEFAULT_POLICY,
+    Backoff,
+    ClassifiedError,
+    ErrorClass,
+    RetryPolicy,
+    classify,
+    retry_call,
+    retry_metrics,
+)
+from digital_ocean_cluster.transport import LocalTransport
+from digital_ocean_cluster.types import CompletedProcess, DropletException
+
+FAST = RetryPolicy(
+    {
+        ErrorClass.TRANSIENT: Backoff(retries=3, base=0.01, jitter=0),
+        ErrorClass.RATE_LIMIT: Backoff(retries=1, base=0.01, jitter=0),
+    }
+)
+
+
+def _failed(stderr: str, returncode: int = 1) -> subprocess.CompletedProcess:
+    return subprocess.CompletedProcess(["doctl"], returncode, "", stderr)
+
+
+class FlakyTransport(LocalTransport):
+    """Fails the first uploads with a dropped connection."""
+
+    def __init__(self, failures: int) -> None:
+        self.failures = failures
+        self.uploads = 0
+
+    def upload(self, droplet, src, dest, timeout=None, cancel=None, on_bytes=None):
+        self.uploads += 1
+        if self.uploads <= self.failures:
+            cp = subprocess.CompletedProcess(
+                ["scp"], 255, b"", b"Connection reset by peer\n"
+            )
+            return CompletedProcess(["scp"], cp)
+        return super().upload(droplet, src, dest, timeout, cancel, on_bytes)
+
+
+class RetryTester(unittest.TestCase):
+    """Main tester class."""
+
+    def setUp(self) -> None:
+        retry_metrics().reset()
+
+    def test_classify(self) -> None:
+        cases = {
+            "Error: POST https://api.digitalocean.com/v2/droplets: 429 Too Many "
+            "Requests": ErrorClass.RATE_LIMIT,
+            "Error: Unable to authenticate you": ErrorClass.AUTH,
+            "root@1.2.3.4: Permission denied (publickey).": ErrorClass.AUTH,
+            "422 You have reached the droplet limit": ErrorClass.CAPACITY,
+            "422 Size is not available in this region.": ErrorClass.CAPACITY,
+            "ssh: connect to host 1.2.3.4 port 22: Connection refused": (
+                ErrorClass.TRANSIENT
+            ),
+            "503 Service Unavailable": ErrorClass.TRANSIENT,
+            "cat: /nope: No such file or directory": ErrorClass.PERMANENT,
+        }
+        for text, expected in cases.items():
+            self.assertEqual(classify(text), expected, text)
+            self.assertEqual(classify(_failed(text)), expected, text)
+            self.assertEqual(classify(DropletException(text)), expected, text)
+        error = ClassifiedError("no ip yet", ErrorClass.TRANSIENT)
+        self.assertEqual(classify(error), ErrorClass.TRANSIENT)
+
+    def test_classify_completed_process(self) -> None:
+        cp = subprocess.CompletedProcess(["ssh"], -9, b"", b"")
+        self.assertEqual(
+            classify(CompletedProcess(["ssh"], cp, timed_out=True)),
+            ErrorClass.TRANSIENT,
+        )
+        self.assertEqual(
+            classify(CompletedProcess(["ssh"], cp, cancelled=True)),
+            ErrorClass.PERMANENT,
+        )
+
+    def test_backoff(self) -> None:
+        backoff = Backoff(retries=4, base=1.0, cap=5.0, jitter=0)
+        delays = [backoff.delay(n) for n in range(1, 6)]
+        self.assertEqual(delays, [1.0, 2.0, 4.0, 5.0, None])
+        jittered = Backoff(retries=1, base=10.0, jitter=0.5).delay(1)
+        assert jittered is not None
+        self.assertTrue(5.0 <= jittered <= 15.0)
+
+    def test_retries_transient_then_succeeds(self) -> None:
+        results = [_failed("i/o timeout"), _failed("connection reset")]
+        results.append(subprocess.CompletedProcess(["doctl"], 0, "ok", ""))
+        calls = iter(results)
+        cp = retry_call("list_droplets", lambda: next(calls), FAST)
+        self.assertEqual(cp.stdout, "ok")
+        stats = retry_metrics().snapshot()["list_droplets"]
+        self.assertEqual(stats.calls, 1)
+        self.assertEqual(stats.attempts, 3)
+        self.assertEqual(stats.successes, 1)
+        self.assertEqual(stats.retries, {ErrorClass.TRANSIENT: 2})
+        self.assertEqual(stats.give_ups, {})
+
+    def test_permanent_not_retried(self) -> None:
+        calls = []
+
+        def fn() -> subprocess.CompletedProcess:
+            calls.append(1)
+            return _failed("Error: droplet not found")
+
+        cp = retry_call("get_droplet", fn, FAST)
+        self.assertEqual(cp.returncode, 1)
+        self.assertEqual(len(calls), 1)
+        stats = retry_metrics().snapshot()["get_droplet"]
+        self.assertEqual(stats.give_ups, {ErrorClass.PERMANENT: 1})
+
+    def test_gives_up_and_reraises(self) -> None:
+        calls = []
+
+        def fn() -> str:
+            calls.append(1)
+            raise ClassifiedError("429 too many requests", ErrorClass.RATE_LIMIT)
+
+        with self.assertRaises(ClassifiedError):
+            retry_call("create_droplet", fn, FAST)
+        self.assertEqual(len(calls), 2)  # one retry for RATE_LIMIT in FAST
+        stats = retry_metrics().snapshot()["create_droplet"]
+        self.assertEqual(stats.give_ups, {ErrorClass.RATE_LIMIT: 1})
+
+    def test_total_timeout(self) -> None:
+        policy = RetryPolicy(
+            {ErrorClass.TRANSIENT: Backoff(retries=100, base=0.05, jitter=0)},
+            total_timeout=0.2,
+        )
+        start = time.monotonic()
+        cp = retry_call("slow", lambda: _failed("timed out"), policy)
+        self.assertEqual(cp.returncode, 1)
+        self.assertLess(time.monotonic() - start, 1.0)
+
+    def test_ssh_exec_timeout_bounds_retries(self) -> None:
+        with mock.patch("digital_ocean_cluster.droplet.ensure_doctl"):
+            droplet = Droplet({"id": 1, "name": "slow", "tags": []})
+        droplet.identity = Identity("ssh-ed25519 AAAA", Path("/keys/id_ed25519"))
+        droplet.transport = LocalTransport()
+        timeout = 1.0
+        commands = {
+            "hangs": "sleep 5",
+            "fails transiently": "sleep 0.3; echo 'Connection reset' >&2; exit 255",
+        }
+        for name, command in commands.items():
+            start = time.monotonic()
+            cp = droplet.ssh_exec(command, timeout=timeout, retry=DEFAULT_POLICY)
+            elapsed = time.monotonic() - start
+            self.assertFalse(cp.ok, name)
+            # Small allowance for killing the process and scheduling.
+            self.assertLessEqual(elapsed, timeout + 0.25, name)
+
+    def test_cancel_stops_backoff(self) -> None:
+        policy = RetryPolicy({ErrorClass.TRANSIENT: Backoff(retries=5, base=30.0)})
+        cancel = CancelToken()
+        Timer(0.1, cancel.cancel).start()
+        start = time.monotonic()
+        cp = retry_call("ssh_exec", lambda: _failed("timed out"), policy, cancel)
+        self.assertEqual(cp.returncode, 1)
+        self.assertLess(time.monotonic() - start, 5.0)
+
+    def test_copy_to_retries_transfer(self) -> None:
+        with TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            with mock.patch("digital_ocean_cluster.droplet.ensure_doctl"):
+                droplet = Droplet({"id": 1, "name": "flaky", "tags": []})
+            droplet.identity = Identity("ssh-ed25519 AAAA", Path("/keys/id_ed25519"))
+            transport = FlakyTransport(failures=2)
+            droplet.transport = transport
+            src = root / "src.txt"
+            src.write_text("payload", encoding="utf-8")
+            dest = root / "out" / "dest.txt"
+            cp = droplet.copy_to(src, dest, retry=FAST)
+            self.assertTrue(cp.ok, cp.stderr)
+            self.assertEqual(dest.read_text(encoding="utf-8"), "payload")
+            self.assertEqual(transport.uploads, 3)
+            print(retry_metrics())
+
+
+if __name__ == "__main__":
+    unittest.main()
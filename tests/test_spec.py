@@ -0,0 +1,112 @@
+"""
+Unit test file.
+"""
+
+import threading
+import unittest
+from concurrent.futures import Future
+from types import SimpleNamespace
+from typing import Any
+from unittest import mock
+
+from digital_ocean_cluster.machines import ImageType, MachineSize, Region
+from digital_ocean_cluster.spec import (
+    ClusterSpec,
+    apply_plan,
+    install_tag,
+    plan_cluster,
+)
+
+TAGS = ["spec-test"]
+
+
+def _droplet(
+    droplet_id: int,
+    name: str,
+    size: str = MachineSize.S_2VCPU_2GB.value,
+    status: str = "active",
+    tags: list[str] | None = None,
+) -> Any:
+    data = {
+        "id": droplet_id,
+        "name": name,
+        "status": status,
+        "size_slug": size,
+        "image": {"slug": ImageType.UBUNTU_24_10_X64.value},
+        "region": {"slug": Region.NYC_1.value},
+        "tags": tags if tags is not None else TAGS + [install_tag("v1")],
+    }
+    return SimpleNamespace(id=droplet_id, name=name, data=data, tags=data["tags"])
+
+
+class SpecTester(unittest.TestCase):
+    """Main tester class."""
+
+    def setUp(self) -> None:
+        self.spec = ClusterSpec(name="web", count=3, tags=TAGS, install_version="v1")
+
+    def test_matching_cluster_is_a_no_op(self) -> None:
+        existing = [_droplet(i, f"web-{i}") for i in range(3)]
+        plan = plan_cluster(self.spec, existing)
+        self.assertTrue(plan.empty)
+        self.assertEqual([d.name for d in plan.keep], ["web-0", "web-1", "web-2"])
+
+    def test_diff(self) -> None:
+        existing = [
+            _droplet(1, "web-0"),
+            _droplet(2, "web-1", size=MachineSize.S_1VCPU_1GB.value),
+            _droplet(3, "web-7"),
+            _droplet(4, "web-0"),  # duplicate name
+        ]
+        plan = plan_cluster(self.spec, existing)
+        self.assertEqual([d.id for d in plan.keep], [1])
+        self.assertEqual([d.id for d, _, _ in plan.replace], [2])
+        self.assertIn("size", plan.replace[0][2])
+        self.assertEqual(sorted(d.id for d in plan.delete), [3, 4])
+        self.assertEqual([a.name for a in plan.create], ["web-2"])
+        self.assertIn(install_tag("v1"), plan.create[0].tags)
+
+    def test_install_version_and_status_trigger_replace(self) -> None:
+        existing = [
+            _droplet(1, "web-0", tags=TAGS + [install_tag("v0")]),
+            _droplet(2, "web-1", status="off"),
+            _droplet(3, "web-2"),
+        ]
+        plan = plan_cluster(self.spec, existing)
+        self.assertEqual([d.id for d, _, _ in plan.replace], [1, 2])
+        self.assertEqual(install_tag("v1"), "install-version:v1")
+        self.assertTrue(
+            install_tag("1.2.3+local").startswith("install-version:1-2-3-local-")
+        )
+
+    def test_install_tag_is_injective(self) -> None:
+        versions = ["1.0+a", "1.0-a", "1.0/x", "1.0-x", "1.0.x", "1_0-x"]
+        self.assertEqual(len({install_tag(v) for v in versions}), len(versions))
+        for tag in map(install_tag, versions):
+            self.assertRegex(tag, r"^[A-Za-z0-9:_-]+$")
+
+    def test_failed_delete_still_collects_creates(self) -> None:
+        existing = [_droplet(1, "web-0", tags=TAGS + [install_tag("v0")])]
+        plan = plan_cluster(self.spec, existing)
+        created: Future = Future()
+        with (
+            mock.patch(
+                "digital_ocean_cluster.spec.DigitalOceanCluster.async_create_droplets",
+                return_value={"web-1": created},
+            ) as create,
+            mock.patch(
+                "digital_ocean_cluster.spec.DigitalOceanCluster.delete_cluster",
+                side_effect=TimeoutError("delete timed out"),
+            ),
+        ):
+            # The create completes while apply_plan is unwinding.
+            threading.Timer(0.1, created.set_result, ["web-1 droplet"]).start()
+            with self.assertRaises(TimeoutError):
+                apply_plan(plan)
+        self.assertTrue(created.done())
+        # The replacement is not created while its original may still exist.
+        self.assertEqual(create.call_count, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
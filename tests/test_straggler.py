@@ -0,0 +1,161 @@
+"""
+Unit test file.
+"""
+
+import time
+import unittest
+from concurrent.futures import Future, ThreadPoolExecutor
+from threading import Lock
+from unittest import mock
+
+from digital_ocean_cluster.cluster import DropletCreationArgs
+from digital_ocean_cluster.progress import Phase, Progress
+from digital_ocean_cluster.straggler import (
+    StragglerPolicy,
+    _retire_original,
+    create_with_stragglers,
+)
+
+FAST = 0.05
+POLICY = StragglerPolicy(
+    ready_fraction=0.8, slowdown=2.0, loser_grace=3.0, poll_interval=0.01
+)
+
+
+class _FakeDroplet:
+    def __init__(self, droplet_id: int, name: str) -> None:
+        self.id = droplet_id
+        self.name = name
+        self.deleted = False
+
+    def delete(self) -> None:
+        self.deleted = True
+
+    def rename(self, name: str) -> None:
+        self.name = name
+
+
+class _FakeCloud:
+    """Creation takes durations[name] seconds; the droplet is listed from the
+    start, like a real one sitting in cloud-init."""
+
+    def __init__(self, durations: dict[str, float]) -> None:
+        self.durations = durations
+        self.created: list[DropletCreationArgs] = []
+        self.droplets: list[_FakeDroplet] = []
+        self.pool = ThreadPoolExecutor(16)
+        self.lock = Lock()
+
+    def async_create_droplets(
+        self, args: list[DropletCreationArgs], progress: Progress
+    ) -> dict[str, Future]:
+        out = {}
+        for arg in args:
+            self.created.append(arg)
+            progress.add(arg.name)
+
+            def task(name: str = arg.name) -> _FakeDroplet:
+                progress.set_phase(name, Phase.CREATING)
+                with self.lock:
+                    droplet = _FakeDroplet(len(self.droplets) + 1, name)
+                    self.droplets.append(droplet)
+                time.sleep(self.durations.get(name, FAST))
+                progress.set_phase(name, Phase.READY)
+                return droplet
+
+            out[arg.name] = self.pool.submit(task)
+        return out
+
+    def find_droplets(self, name: str) -> list[_FakeDroplet]:
+        with self.lock:
+            return [d for d in self.droplets if d.name == name and not d.deleted]
+
+    def run(self, count: int):
+        args = [
+            DropletCreationArgs(f"node-{i}", ["t"], idempotency_key=f"key-{i}")
+            for i in range(count)
+        ]
+        with (
+            mock.patch("digital_ocean_cluster.straggler.ensure_doctl"),
+            mock.patch(
+                "digital_ocean_cluster.straggler.DigitalOceanCluster."
+                "async_create_droplets",
+                side_effect=self.async_create_droplets,
+            ),
+            mock.patch(
+                "digital_ocean_cluster.straggler.DropletManager.find_droplets",
+                side_effect=self.find_droplets,
+            ),
+        ):
+            result = create_with_stragglers(args, POLICY)
+            saved = result.time_saved()
+            # Let the losers finish, so they are deleted however late they
+            # were listed.
+            self.pool.shutdown(wait=True)
+        return result, saved
+
+
+class StragglerTester(unittest.TestCase):
+    """Main tester class."""
+
+    def test_replacement_wins(self) -> None:
+        cloud = _FakeCloud({"node-5": 1.0})
+        result, saved = cloud.run(6)
+        self.assertEqual(
+            sorted(d.name for d in result.cluster.droplets),
+            [f"node-{i}" for i in range(6)],
+        )
+        self.assertEqual(result.speculations["node-5"].winner, "replacement")
+        self.assertLess(result.wall_time, 0.8)
+        # The original finished within its grace, so the saving is measured.
+        self.assertIsNotNone(result.speculations["node-5"].original_ready_at)
+        self.assertGreater(saved, 0.3)
+        deleted = [d for d in cloud.droplets if d.deleted]
+        self.assertEqual(len(deleted), 1)
+        self.assertNotIn(deleted[0], result.cluster.droplets)
+        print(f"{result}, saved {saved:.2f}s")
+
+    def test_original_wins(self) -> None:
+        cloud = _FakeCloud({"node-5": 0.4, "node-5-spare": 1.0})
+        result, saved = cloud.run(6)
+        self.assertEqual(result.speculations["node-5"].winner, "original")
+        self.assertEqual(saved, 0.0)
+        kept = {d.id for d in result.cluster.droplets}
+        alive = [d for d in cloud.droplets if not d.deleted]
+        self.assertEqual({d.id for d in alive}, kept)
+
+    def test_spare_gets_a_fresh_key(self) -> None:
+        cloud = _FakeCloud({"node-5": 1.0})
+        cloud.run(6)
+        keys = {arg.name: arg.idempotency_key for arg in cloud.created}
+        self.assertEqual(keys["node-5"], "key-5")
+        self.assertIsNone(keys["node-5-spare"])
+
+    def test_grace_does_not_hold_a_worker(self) -> None:
+        cloud = _FakeCloud({"node-5": 1.0})
+        with mock.patch("digital_ocean_cluster.straggler.THREAD_POOL") as pool:
+            cloud.run(6)
+        pool.submit.assert_not_called()
+
+    def test_retire_original_finishes_once(self) -> None:
+        """The original finishing while the timer's retirement is deleting
+        does not retire it a second time."""
+        original: Future = Future()
+        winner = _FakeDroplet(2, "node-0")
+
+        class _SlowDelete(_FakeDroplet):
+            def delete(self) -> None:
+                # The done callback fires here, in the middle of _finish.
+                original.set_result(_FakeDroplet(3, "node-0"))
+                super().delete()
+
+        found = _SlowDelete(1, "node-0")
+        with self.assertNoLogs("concurrent.futures"):
+            retired = _retire_original(original, [found], winner, 0.05, {}, 0.0)
+            self.assertIsNone(retired.result(timeout=5))
+        self.assertTrue(found.deleted)
+        self.assertFalse(winner.deleted)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,279 @@
+"""
+Unit test file.
+"""
+
+import shlex
+import sys
+import time
+import unittest
+from queue import Empty, Queue
+from pathlib import Path, PurePosixPath
+from tempfile import TemporaryDirectory
+from threading import Event, Lock
+from unittest import mock
+
+from digital_ocean_cluster.droplet import Droplet
+from digital_ocean_cluster.identity import Identity
+from digital_ocean_cluster.sync import (
+    HotSync,
+    InotifyWatcher,
+    PollingWatcher,
+    SyncReport,
+    Watcher,
+    build_batch,
+)
+from digital_ocean_cluster.transport import LocalTransport
+from digital_ocean_cluster.types import DropletException
+
+NODES = 3
+
+
+class RootedTransport(LocalTransport):
+    """Runs each droplet's commands in its own directory, standing in for the
+    droplet's home directory."""
+
+    def __init__(self, roots: dict[str, Path]) -> None:
+        self.roots = roots
+
+    def session_cmd_list(self, droplet, command, stdin=False):
+        root = shlex.quote(str(self.roots[droplet.name]))
+        return ["bash", "-c", f"cd {root} && {command}"]
+
+
+def _droplets(base: Path) -> list[Droplet]:
+    droplets = []
+    roots = {f"node-{i}": base / f"node-{i}" for i in range(NODES)}
+    transport = RootedTransport(roots)
+    for i, root in enumerate(roots.values()):
+        root.mkdir()
+        with mock.patch("digital_ocean_cluster.droplet.ensure_doctl"):
+            droplet = Droplet({"id": i, "name": f"node-{i}", "tags": []})
+        droplet.transport = transport
+        droplet.identity = Identity("ssh-ed25519 AAAA", Path("/keys/id_ed25519"))
+        droplets.append(droplet)
+    return droplets
+
+
+class _Reports:
+    def __init__(self) -> None:
+        self.reports: list[SyncReport] = []
+        self.lock = Lock()
+        self.event = Event()
+
+    def __call__(self, report: SyncReport) -> None:
+        with self.lock:
+            self.reports.append(report)
+        self.event.set()
+
+    def next(self, timeout: float = 10.0) -> SyncReport:
+        assert self.event.wait(timeout), "no sync happened"
+        with self.lock:
+            self.event.clear()
+            return self.reports[-1]
+
+
+class _ScriptedWatcher(Watcher):
+    """Reports the change sets put in queue, one per poll."""
+
+    def __init__(self, root: Path) -> None:
+        super().__init__(root)
+        self.queue: Queue[set[PurePosixPath] | Exception] = Queue()
+
+    def poll(self, timeout: float | None) -> set[PurePosixPath]:
+        try:
+            changed = self.queue.get(timeout=timeout)
+        except Empty:
+            return set()
+        if isinstance(changed, Exception):
+            raise changed
+        return changed
+
+
+class SyncTester(unittest.TestCase):
+    """Main tester class."""
+
+    def setUp(self) -> None:
+        self.tmp = TemporaryDirectory()
+        base = Path(self.tmp.name)
+        self.local = base / "local"
+        (self.local / "pkg").mkdir(parents=True)
+        (self.local / "pkg" / "main.py").write_text("print(1)\n", encoding="utf-8")
+        (self.local / "README").write_text("readme\n", encoding="utf-8")
+        (self.local / "__pycache__").mkdir()
+        (self.local / "__pycache__" / "x.pyc").write_bytes(b"\0")
+        remote = base / "remote"
+        remote.mkdir()
+        self.droplets = _droplets(remote)
+        self.remotes = [remote / d.name / "app" for d in self.droplets]
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def _remote_files(self, index: int = 0) -> dict[str, str]:
+        root = self.remotes[index]
+        return {
+            p.relative_to(root).as_posix(): p.read_text(encoding="utf-8")
+            for p in sorted(root.rglob("*"))
+            if p.is_file()
+        }
+
+    def test_build_batch(self) -> None:
+        changed = {
+            PurePosixPath("pkg/main.py"),
+            PurePosixPath("gone.txt"),
+            PurePosixPath("__pycache__/x.pyc"),
+            PurePosixPath("pkg"),
+        }
+        batch = build_batch(self.local, changed)
+        self.assertEqual(batch.files, [PurePosixPath("pkg/main.py")])
+        self.assertEqual(batch.deleted, [PurePosixPath("gone.txt")])
+        self.assertFalse(batch.compressed)
+        cmd = batch.command(PurePosixPath("app"), "make run")
+        self.assertIn("rm -rf -- gone.txt", cmd)
+        self.assertTrue(cmd.endswith("{ make run\n}"))
+
+    def test_initial_push_and_post_sync(self) -> None:
+        sync = HotSync(
+            self.droplets,
+            self.local,
+            Path("app"),
+            post_sync="cat pkg/main.py > ran.txt",
+        )
+        report = sync.push()
+        self.assertTrue(report.ok, report.failed)
+        self.assertEqual(len(report.results), NODES)
+        for i in range(NODES):
+            self.assertEqual(
+                self._remote_files(i),
+                {
+                    "README": "readme\n",
+                    "pkg/main.py": "print(1)\n",
+                    "ran.txt": "print(1)\n",
+                },
+            )
+
+    def test_failed_post_sync_is_reported(self) -> None:
+        sync = HotSync(self.droplets, self.local, Path("app"), post_sync="false")
+        report = sync.push()
+        self.assertFalse(report.ok)
+        self.assertEqual(len(report.failed), NODES)
+        self.assertEqual(self._remote_files()["README"], "readme\n")
+
+    def test_empty_batch_contacts_no_droplet(self) -> None:
+        reports = _Reports()
+        sync = HotSync(self.droplets, self.local, Path("app"), post_sync="touch ran")
+        sync.subscribe(reports)
+        # A directory that still exists and an ignored file: nothing to send.
+        report = sync.push({PurePosixPath("pkg"), PurePosixPath("__pycache__/x.pyc")})
+        self.assertEqual(report.results, {})
+        self.assertEqual(reports.reports, [])
+        self.assertFalse(self.remotes[0].exists())
+
+    def test_failed_push_does_not_end_sync(self) -> None:
+        reports = _Reports()
+        watcher = _ScriptedWatcher(self.local)
+        sync = HotSync(
+            self.droplets,
+            self.local,
+            Path("app"),
+            debounce=0.01,
+            initial_sync=False,
+            watcher=watcher,
+        )
+        sync.subscribe(reports)
+        calls = []
+
+        def build_once_denied(*args):
+            calls.append(args)
+            if len(calls) == 1:
+                raise PermissionError("denied")
+            return build_batch(*args)
+
+        with mock.patch(
+            "digital_ocean_cluster.sync.build_batch", side_effect=build_once_denied
+        ):
+            with sync, self.assertLogs("digital_ocean_cluster", "ERROR"):
+                watcher.queue.put({PurePosixPath("README")})
+                watcher.queue.put(set())  # ends the batch
+                watcher.queue.put({PurePosixPath("pkg/main.py")})
+                report = reports.next()
+        self.assertEqual(report.files, [PurePosixPath("pkg/main.py")])
+        self.assertEqual(len(reports.reports), 1)
+
+    def test_wait_raises_watcher_error(self) -> None:
+        watcher = _ScriptedWatcher(self.local)
+        sync = HotSync(
+            self.droplets, self.local, Path("app"), initial_sync=False, watcher=watcher
+        )
+        with sync:
+            watcher.queue.put(DropletException("Out of inotify watches"))
+            with self.assertLogs("digital_ocean_cluster", "ERROR"):
+                with self.assertRaises(DropletException):
+                    sync.wait(10)
+
+    def _watch_roundtrip(self, watcher: Watcher) -> None:
+        reports = _Reports()
+        sync = HotSync(
+            self.droplets, self.local, Path("app"), debounce=0.05, watcher=watcher
+        )
+        sync.subscribe(reports)
+        with sync:
+            reports.next()  # the initial push
+            (self.local / "pkg" / "main.py").write_text("print(2)\n", encoding="utf-8")
+            report = reports.next()
+            self.assertEqual(report.files, [PurePosixPath("pkg/main.py")])
+            latencies = [report.latency]
+
+            (self.local / "README").unlink()
+            (self.local / "new").mkdir()
+            (self.local / "new" / "a.txt").write_text("a\n", encoding="utf-8")
+            deadline = time.monotonic() + 10
+            while time.monotonic() < deadline:
+                report = reports.next()
+                latencies.append(report.latency)
+                if self._remote_files(NODES - 1) == {
+                    "pkg/main.py": "print(2)\n",
+                    "new/a.txt": "a\n",
+                }:
+                    break
+            for i in range(NODES):
+                self.assertEqual(
+                    self._remote_files(i),
+                    {"pkg/main.py": "print(2)\n", "new/a.txt": "a\n"},
+                )
+        print(
+            f"\n{type(watcher).__name__}: edit to synced on {NODES} nodes "
+            f"in {min(latencies) * 1000:.0f}-{max(latencies) * 1000:.0f}ms"
+        )
+
+    @unittest.skipUnless(sys.platform.startswith("linux"), "inotify is Linux only")
+    def test_watch_inotify(self) -> None:
+        self._watch_roundtrip(InotifyWatcher(self.local))
+
+    def test_watch_polling(self) -> None:
+        self._watch_roundtrip(PollingWatcher(self.local, interval=0.05))
+
+    @unittest.skipUnless(sys.platform.startswith("linux"), "inotify is Linux only")
+    def test_debounce_batches_bursts(self) -> None:
+        reports = _Reports()
+        sync = HotSync(
+            self.droplets,
+            self.local,
+            Path("app"),
+            debounce=0.2,
+            initial_sync=False,
+            watcher=InotifyWatcher(self.local),
+        )
+        sync.subscribe(reports)
+        with sync:
+            for i in range(20):
+                (self.local / f"burst{i}.txt").write_text(str(i), encoding="utf-8")
+                time.sleep(0.005)
+            report = reports.next()
+            time.sleep(0.5)
+        self.assertEqual(len(reports.reports), 1)
+        self.assertEqual(len(report.files), 20)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+"""
+Unit test file.
+"""
+
+import itertools
+import time
+import unittest
+from types import SimpleNamespace
+from typing import Any
+
+from digital_ocean_cluster.task_queue import TaskQueue
+
+FAST = SimpleNamespace(id=1, name="fast")
+SLOW = SimpleNamespace(id=2, name="slow")
+BROKEN = SimpleNamespace(id=3, name="broken")
+
+
+def _work(droplet: Any, item: int) -> int:
+    if droplet is BROKEN:
+        raise RuntimeError("node is broken")
+    if droplet is SLOW:
+        time.sleep(0.05)
+    return item * 2
+
+
+class TaskQueueTester(unittest.TestCase):
+    """Main tester class."""
+
+    def test_work_stealing(self) -> None:
+        """Every item completes and the fast node takes most of the work."""
+        queue = TaskQueue([FAST, SLOW], concurrency=2)  # type: ignore
+        results = list(queue.map(_work, range(100)))
+        self.assertEqual(sorted(r.value for r in results), [i * 2 for i in range(100)])
+        self.assertTrue(all(r.ok for r in results))
+        on_fast = sum(1 for r in results if r.droplet is FAST)
+        self.assertGreater(on_fast, 70)
+
+    def test_retry_on_other_node(self) -> None:
+        """Tasks failing on a broken node are retried elsewhere."""
+        queue = TaskQueue([BROKEN, FAST], concurrency=1, max_node_failures=3)  # type: ignore
+        results = list(queue.map(_work, range(20)))
+        self.assertEqual(len(results), 20)
+        self.assertTrue(all(r.ok for r in results))
+        self.assertTrue(all(r.droplet is FAST for r in results))
+
+    def test_all_nodes_fail(self) -> None:
+        """With no healthy node left every task read is reported as failed,
+        and the rest of the items is not read."""
+        queue = TaskQueue([BROKEN], concurrency=2, max_node_failures=2)  # type: ignore
+        with self.assertLogs("digital_ocean_cluster", "WARNING"):
+            results = list(queue.map(_work, range(10)))
+        self.assertEqual(sorted(r.index for r in results), list(range(len(results))))
+        self.assertLess(len(results), 10)
+        self.assertFalse(any(r.ok for r in results))
+
+    def test_all_nodes_fail_on_endless_items(self) -> None:
+        """An endless source is closed, not drained, when no node is left."""
+        closed = []
+
+        def _items() -> Any:
+            try:
+                yield from itertools.count()
+            finally:
+                closed.append(True)
+
+        queue = TaskQueue([BROKEN], concurrency=2, max_node_failures=2)  # type: ignore
+        with self.assertLogs("digital_ocean_cluster", "WARNING"):
+            results = list(queue.map(_work, _items()))
+        self.assertFalse(any(r.ok for r in results))
+        self.assertEqual(closed, [True])
+
+    def test_streaming(self) -> None:
+        """Results stream before the input is exhausted."""
+
+        def _items() -> Any:
+            yield from range(5)
+            time.sleep(0.5)
+            yield 5
+
+        start = time.time()
+        iterator = TaskQueue([FAST], concurrency=1).map(_work, _items())  # type: ignore
+        next(iterator)
+        self.assertLess(time.time() - start, 0.4)
+        self.assertEqual(len(list(iterator)), 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,148 @@
+"""
+Unit test file.
+"""
+
+import os
+import statistics
+import time
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import mock
+
+from digital_ocean_cluster.droplet import Droplet
+from digital_ocean_cluster.identity import Identity
+from digital_ocean_cluster.process import CancelToken
+from digital_ocean_cluster.transport import (
+    LocalTransport,
+    OpenSSHTransport,
+    ParamikoTransport,
+    Transport,
+    TransportError,
+    get_transport,
+    set_transport,
+)
+
+# Set to an address whose root login accepts ~/.ssh/id_rsa to include the
+# real transports in the latency benchmark.
+BENCH_HOST = os.environ.get("DIGITAL_OCEAN_CLUSTER_BENCH_HOST")
+BENCH_COMMANDS = 20
+
+
+def _droplet(ip: str = "127.0.0.1") -> Droplet:
+    data = {
+        "id": 1,
+        "name": "local",
+        "tags": [],
+        "networks": {"v4": [{"type": "public", "ip_address": ip}]},
+    }
+    with mock.patch("digital_ocean_cluster.droplet.ensure_doctl"):
+        return Droplet(data)
+
+
+class TransportTester(unittest.TestCase):
+    """Main tester class."""
+
+    def setUp(self) -> None:
+        self.tmp = TemporaryDirectory()
+        self.root = Path(self.tmp.name)
+        self.droplet = _droplet()
+        self.droplet.transport = LocalTransport()
+        self.droplet.identity = Identity("ssh-ed25519 AAAA", Path("/keys/id_ed25519"))
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def test_exec(self) -> None:
+        cp = self.droplet.ssh_exec("echo hello && echo oops >&2")
+        self.assertTrue(cp.ok)
+        self.assertEqual(cp.stdout.strip(), "hello")
+        self.assertEqual(cp.stderr.strip(), "oops")
+        self.assertEqual(self.droplet.ssh_exec("cat", input=b"abc").stdout, "abc")
+
+    def test_timeout_and_cancel(self) -> None:
+        cp = self.droplet.ssh_exec("sleep 5", timeout=0.2)
+        self.assertTrue(cp.timed_out)
+        cancel = CancelToken()
+        cancel.cancel()
+        self.assertTrue(self.droplet.ssh_exec("true", cancel=cancel).cancelled)
+
+    def test_copy_round_trip(self) -> None:
+        src = self.root / "src"
+        (src / "sub").mkdir(parents=True)
+        (src / "sub" / "a.txt").write_text("a")
+        remote = self.root / "remote" / "dest"
+        self.assertTrue(self.droplet.copy_to(src, remote, chmod="700").ok)
+        self.assertEqual((remote / "sub" / "a.txt").read_text(), "a")
+        local = self.root / "local" / "back"
+        self.assertTrue(self.droplet.copy_from(remote, local).ok)
+        self.assertEqual((local / "sub" / "a.txt").read_text(), "a")
+        text = self.droplet.copy_text_from(remote / "sub" / "a.txt")
+        self.assertEqual(text.stdout, "a")
+
+    def test_openssh_command(self) -> None:
+        transport = OpenSSHTransport(ssh="ssh", scp="scp", multiplex=True)
+        try:
+            cmd_list = transport.session_cmd_list(self.droplet, "uptime")
+            self.assertEqual(cmd_list[:2], ["ssh", "-n"])
+            self.assertEqual(cmd_list[-2:], ["root@127.0.0.1", "uptime"])
+            self.assertIn("ControlMaster=auto", cmd_list)
+            self.assertIn("StrictHostKeyChecking=accept-new", cmd_list)
+            self.assertIn("/keys/id_ed25519", cmd_list)
+            stdin = transport.session_cmd_list(self.droplet, "cat", stdin=True)
+            self.assertNotIn("-n", stdin)
+        finally:
+            transport.close()
+        plain = OpenSSHTransport(ssh="ssh", scp="scp", multiplex=False)
+        cmd_list = plain.session_cmd_list(self.droplet, "uptime")
+        self.assertNotIn("ControlMaster=auto", cmd_list)
+
+    def test_global_transport(self) -> None:
+        droplet = _droplet()
+        local = LocalTransport()
+        previous = set_transport(local)
+        try:
+            self.assertIs(get_transport(), local)
+            self.assertIs(droplet.transport, local)
+        finally:
+            set_transport(previous)
+        with mock.patch.dict(os.environ, {"DIGITAL_OCEAN_CLUSTER_TRANSPORT": "nope"}):
+            previous = set_transport(None)
+            try:
+                with self.assertRaises(TransportError):
+                    get_transport()
+            finally:
+                set_transport(previous)
+
+    def test_benchmark_latency(self) -> None:
+        """Benchmark: per-command latency of a trivial command, by transport.
+        The real transports only run when DIGITAL_OCEAN_CLUSTER_BENCH_HOST is
+        set; for OpenSSH the first command sets up the shared connection."""
+        transports: list[Transport] = [LocalTransport()]
+        if BENCH_HOST:
+            transports.append(OpenSSHTransport(multiplex=False))
+            transports.append(OpenSSHTransport())
+            try:
+                transports.append(ParamikoTransport())
+            except TransportError:
+                print("paramiko: not installed, skipped")
+        droplet = _droplet(BENCH_HOST or "127.0.0.1")
+        for transport in transports:
+            times = []
+            for _ in range(BENCH_COMMANDS):
+                start = time.perf_counter()
+                cp = transport.exec(droplet, "true")
+                times.append(time.perf_counter() - start)
+                self.assertTrue(cp.ok, cp.stderr)
+            transport.close()
+            label = transport.name
+            if isinstance(transport, OpenSSHTransport) and transport.multiplex:
+                label += "+mux"
+            print(
+                f"{label:>13}: first {times[0] * 1000:8.1f} ms, "
+                f"median {statistics.median(times[1:]) * 1000:8.1f} ms"
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()